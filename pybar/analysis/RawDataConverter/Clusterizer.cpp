@@ -30,8 +30,12 @@ void Clusterizer::setStandardSettings()
 	info("setStandardSettings()");
 	_clusterHitInfo = 0;
 	_clusterInfo = 0;
+	_hitInfo = 0;
+	_compactHitInfo = 0;
 	_clusterHitInfoSize = 1000000;
 	_clusterInfoSize = 1000000;
+	_maxNclustersHits = 0;
+	_maxNclusters = 0;
 	_hitMap = 0;
 	_hitIndexMap = 0;
 	_chargeMap = 0;
@@ -50,6 +54,7 @@ void Clusterizer::setStandardSettings()
 	_maxClusterHitTot = 13;
 	_createClusterHitInfoArray = false;
 	_createClusterInfoArray = true;
+	_sparseClustering = false;
 	_minColHitPos = RAW_DATA_MAX_COLUMN - 1;
 	_maxColHitPos = 0;
 	_minRowHitPos = RAW_DATA_MAX_ROW - 1;
@@ -112,6 +117,33 @@ void Clusterizer::getClusterChargeHist(unsigned int& rNparameterValues, unsigned
 
 	rNparameterValues = tArrayLength;
 }
+
+void Clusterizer::setClusterSizeHist(unsigned int*& rClusterSize)
+{
+	info("setClusterSizeHist(...)");
+	std::copy(rClusterSize, rClusterSize + __MAXCLUSTERHITSBINS, _clusterHits);
+}
+
+void Clusterizer::setClusterTotHist(unsigned int*& rClusterTot)
+{
+	info("setClusterTotHist(...)");
+	std::copy(rClusterTot, rClusterTot + (size_t) __MAXTOTBINS * (size_t) __MAXCLUSTERHITSBINS, _clusterTots);
+}
+
+void Clusterizer::setClusterChargeHist(unsigned int*& rClusterCharge)
+{
+	info("setClusterChargeHist(...)");
+	std::copy(rClusterCharge, rClusterCharge + (size_t) __MAXCHARGEBINS * (size_t) __MAXCLUSTERHITSBINS, _clusterCharges);
+}
+void Clusterizer::setChargeCalibration(const float* rChargeCalibration, const unsigned int& rNtot)
+{
+	info("setChargeCalibration(...)");
+	if (rNtot > __MAXTOTLOOKUP)
+		throw std::out_of_range("Clusterizer::setChargeCalibration: the charge calibration has more TOT values than the charge lookup table");
+	initChargeCalibMap();
+	std::copy(rChargeCalibration, rChargeCalibration + (size_t) rNtot * (size_t) RAW_DATA_MAX_COLUMN * (size_t) RAW_DATA_MAX_ROW, _chargeMap);
+}
+
 void Clusterizer::getClusterPositionHist(unsigned int& rNparameterValues, unsigned int*& rClusterPosition, bool copy)
 {
 	info("getClusterPositionHist(...)");
@@ -170,6 +202,24 @@ void Clusterizer::setMaxHitTot(const unsigned int& pMaxHitTot)
 	_maxHitTot = pMaxHitTot;
 }
 
+void Clusterizer::copySettings(Clusterizer& rClusterizer)
+{
+	info("copySettings(...)");
+	_dx = rClusterizer._dx;
+	_dy = rClusterizer._dy;
+	_DbCID = rClusterizer._DbCID;
+	_maxClusterHitTot = rClusterizer._maxClusterHitTot;
+	_minClusterHits = rClusterizer._minClusterHits;
+	_maxClusterHits = rClusterizer._maxClusterHits;
+	_maxHitTot = rClusterizer._maxHitTot;
+	_sparseClustering = rClusterizer._sparseClustering;
+	std::copy(rClusterizer._chargeMap, rClusterizer._chargeMap + (size_t) RAW_DATA_MAX_COLUMN * (size_t) RAW_DATA_MAX_ROW * (size_t) __MAXTOTLOOKUP, _chargeMap);
+	setErrorOutput(rClusterizer.errorSet());
+	setWarningOutput(rClusterizer.warningSet());
+	setInfoOutput(rClusterizer.infoSet());
+	setDebugOutput(rClusterizer.debugSet());
+}
+
 unsigned int Clusterizer::getNclusters()
 {
 	info("getNclusters:");
@@ -183,6 +233,8 @@ void Clusterizer::reset()
 	clearResultHistograms();
 	clearActualClusterData();
 	clearActualEventVariables();
+	_maxNclustersHits = 0;
+	_maxNclusters = 0;
 }
 
 void Clusterizer::addHits(HitInfo*& rHitInfo, const unsigned int& rNhits)
@@ -191,24 +243,18 @@ void Clusterizer::addHits(HitInfo*& rHitInfo, const unsigned int& rNhits)
 		debug("addHits(...,rNhits=" + IntToStr(rNhits) + ")");
 
 	_hitInfo = rHitInfo;
-	_Nclusters = 0;
-	_NclustersHits = 0;
+	_compactHitInfo = 0;
+	clusterizeHits(rNhits);
+}
 
-	if (rNhits > 0 && _actualEventNumber != 0 && rHitInfo[0].eventNumber == _actualEventNumber)
-		warning("addHits: Hit chunks not aligned at events. Clusterizer will not work properly");
+void Clusterizer::addCompactHits(CompactHitInfo*& rCompactHitInfo, const unsigned int& rNhits)
+{
+	if (Basis::debugSet())
+		debug("addCompactHits(...,rNhits=" + IntToStr(rNhits) + ")");
 
-	for (unsigned int i = 0; i < rNhits; i++) {
-		if (_actualEventNumber != rHitInfo[i].eventNumber) {
-			clusterize();
-			addHitClusterInfo(i);
-			clearActualEventVariables();
-		}
-		_actualEventNumber = rHitInfo[i].eventNumber;
-		addHit(i);
-	}
-	//manually add remaining hit data
-	clusterize();
-	addHitClusterInfo(rNhits);
+	_hitInfo = 0;
+	_compactHitInfo = rCompactHitInfo;
+	clusterizeHits(rNhits);
 }
 
 void Clusterizer::getHitCluster(ClusterHitInfo*& rClusterHitInfo, unsigned int& rSize, bool copy)
@@ -246,32 +292,63 @@ bool Clusterizer::clusterize()
 
 	_runTime = 0;
 
+	if (_sparseClustering)
+		clusterizeEventHits();
+	else
+		clusterizeHitMap();
+
+	if (_nHits == 0) {
+		_eventHitPositions.clear();
+		return true;
+	}
+
+	warning("Clusterizer::clusterize: NOT ALL HITS CLUSTERED!");
+	showHits();
+	return false;
+}
+
+void Clusterizer::clusterizeHitMap()
+{
 	for (int iBCID = _bCIDfirstHit; iBCID <= _bCIDlastHit; ++iBCID) {			//loop over the hit array starting from the first hit BCID to the last hit BCID
 		for (int iCol = _minColHitPos; iCol <= _maxColHitPos; ++iCol) {		//loop over the hit array from the minimum to the maximum column with a hit
 			for (int iRow = _minRowHitPos; iRow <= _maxRowHitPos; ++iRow) {	//loop over the hit array from the minimum to the maximum row with a hit
-				if (hitExists(iCol, iRow, iBCID)) {								//if a hit in iCol,iRow,iBCID exists take this as a first hit of a cluster and do:
-					clearActualClusterData();								//  clear the last cluster data
-					_actualRelativeClusterBCID = iBCID;						//  set the minimum relative BCID [0:15] for the new cluster
-					searchNextHits(iCol, iRow, iBCID);						//  find hits next to the actual one and update the actual cluster values, here the clustering takes place
-					if (_actualClusterSize >= (int) _minClusterHits) {		//  only add cluster if it has at least _minClusterHits hits
-						addCluster();										//  add cluster to output cluster array
-						addClusterToResults();								//  add the actual cluster values to the histograms
-						_actualClusterID++;									//  increase the cluster id for this event
-					}
-					else
-						warning("clusterize: cluster size too small");
-				}
+				if (hitExists(iCol, iRow, iBCID))								//if a hit in iCol,iRow,iBCID exists take this as a first hit of a cluster
+					clusterizeSeedHit(iCol, iRow, iBCID);
 				if (_nHits == 0)											//saves a lot of average run time, the loop is aborted if every hit is in a cluster (_nHits == 0)
-					return true;
+					return;
 			}
 		}
 	}
-	if (_nHits == 0)
-		return true;
+}
 
-	warning("Clusterizer::clusterize: NOT ALL HITS CLUSTERED!");
-	showHits();
-	return false;
+void Clusterizer::clusterizeEventHits()
+{
+	std::sort(_eventHitPositions.begin(), _eventHitPositions.end());		//the position is rel. BCID, column, row, thus the hits are sorted like the hit map loop
+	for (std::vector<unsigned int>::iterator iHit = _eventHitPositions.begin(); iHit != _eventHitPositions.end(); ++iHit) {
+		unsigned short tRelBcid = (unsigned short) (*iHit / (RAW_DATA_MAX_COLUMN * RAW_DATA_MAX_ROW));
+		unsigned short tCol = (unsigned short) ((*iHit / RAW_DATA_MAX_ROW) % RAW_DATA_MAX_COLUMN);
+		unsigned short tRow = (unsigned short) (*iHit % RAW_DATA_MAX_ROW);
+		if ((short) tRelBcid < _bCIDfirstHit || (short) tRelBcid > _bCIDlastHit)	//the hit map loop only covers the BCIDs from the first to the last hit
+			continue;
+		if (hitExists(tCol, tRow, tRelBcid))								//hits already added to a cluster are deleted from the hit map
+			clusterizeSeedHit(tCol, tRow, tRelBcid);
+		if (_nHits == 0)
+			return;
+	}
+}
+
+void Clusterizer::clusterizeSeedHit(const unsigned short& pCol, const unsigned short& pRow, const unsigned short& pRelBcid)
+{
+	clearActualClusterData();								//clear the last cluster data
+	_actualRelativeClusterBCID = pRelBcid;					//set the minimum relative BCID [0:15] for the new cluster
+	searchNextHits(pCol, pRow, pRelBcid);					//find hits next to the actual one and update the actual cluster values, here the clustering takes place
+	if (_actualClusterSize >= (int) _minClusterHits) {		//only add cluster if it has at least _minClusterHits hits
+		addCluster();										//add cluster to output cluster array
+		addClusterToResults();								//add the actual cluster values to the histograms
+		_actualClusterID++;									//increase the cluster id for this event
+	}
+	else
+		warning("clusterize: cluster size too small");
 }
 
 void Clusterizer::test()
@@ -305,17 +382,68 @@ void Clusterizer::test()
 }
 
 //private
+void Clusterizer::clusterizeHits(const unsigned int& rNhits)
+{
+	_Nclusters = 0;
+	_NclustersHits = 0;
+
+	if (_createClusterHitInfoArray && rNhits > _clusterHitInfoSize)  // the cluster hit array is indexed by the input hit index
+		growClusterHitArray(rNhits);
+
+	if (rNhits > 0 && _actualEventNumber != 0 && (uint64_t) getHitEventNumber(0) == _actualEventNumber)
+		warning("addHits: Hit chunks not aligned at events. Clusterizer will not work properly");
+
+	for (unsigned int i = 0; i < rNhits; i++) {
+		if (_actualEventNumber != (uint64_t) getHitEventNumber(i)) {
+			clusterize();
+			addHitClusterInfo(i);
+			clearActualEventVariables();
+		}
+		_actualEventNumber = getHitEventNumber(i);
+		addHit(i);
+	}
+	//manually add remaining hit data
+	clusterize();
+	addHitClusterInfo(rNhits);
+
+	if (_NclustersHits > _maxNclustersHits)
+		_maxNclustersHits = _NclustersHits;
+	if (_Nclusters > _maxNclusters)
+		_maxNclusters = _Nclusters;
+}
+
+int64_t Clusterizer::getHitEventNumber(const unsigned int& pHitIndex)
+{
+	if (_compactHitInfo != 0)
+		return _compactHitInfo[pHitIndex].eventNumber;
+	return _hitInfo[pHitIndex].eventNumber;
+}
+
 void Clusterizer::addHit(const unsigned int& pHitIndex)
 {
 	debug("addHit");
-	uint64_t tEvent = _hitInfo[pHitIndex].eventNumber;
-	unsigned short tCol = _hitInfo[pHitIndex].column - 1;
-	unsigned short tRow = _hitInfo[pHitIndex].row - 1;
-	unsigned short tRelBcid = _hitInfo[pHitIndex].relativeBCID;
-	unsigned short tTot = _hitInfo[pHitIndex].tot;
+	uint64_t tEvent = 0;
+	unsigned short tCol = 0;
+	unsigned short tRow = 0;
+	unsigned short tRelBcid = 0;
+	unsigned short tTot = 0;
 	float tCharge = -1;
 
-	_actualEventStatus = _hitInfo[pHitIndex].eventStatus | _actualEventStatus;
+	if (_compactHitInfo != 0) {  // the compact hits have no event status
+		tEvent = _compactHitInfo[pHitIndex].eventNumber;
+		tCol = _compactHitInfo[pHitIndex].column - 1;
+		tRow = _compactHitInfo[pHitIndex].row - 1;
+		tRelBcid = _compactHitInfo[pHitIndex].relativeBCID;
+		tTot = _compactHitInfo[pHitIndex].tot;
+	}
+	else {
+		tEvent = _hitInfo[pHitIndex].eventNumber;
+		tCol = _hitInfo[pHitIndex].column - 1;
+		tRow = _hitInfo[pHitIndex].row - 1;
+		tRelBcid = _hitInfo[pHitIndex].relativeBCID;
+		tTot = _hitInfo[pHitIndex].tot;
+		_actualEventStatus = _hitInfo[pHitIndex].eventStatus | _actualEventStatus;
+	}
 
 	_nEventHits++;
 
@@ -343,6 +471,7 @@ void Clusterizer::addHit(const unsigned int& pHitIndex)
 	if (_hitMap[(size_t) tCol + (size_t) tRow * (size_t) RAW_DATA_MAX_COLUMN + (size_t) tRelBcid * (size_t) RAW_DATA_MAX_COLUMN * (size_t) RAW_DATA_MAX_ROW] == -1) {
 		_hitMap[(size_t) tCol + (size_t) tRow * (size_t) RAW_DATA_MAX_COLUMN + (size_t) tRelBcid * (size_t) RAW_DATA_MAX_COLUMN * (size_t) RAW_DATA_MAX_ROW] = tTot;
 		_hitIndexMap[(size_t) tCol + (size_t) tRow * (size_t) RAW_DATA_MAX_COLUMN + (size_t) tRelBcid * (size_t) RAW_DATA_MAX_COLUMN * (size_t) RAW_DATA_MAX_ROW] = pHitIndex;
+		_eventHitPositions.push_back((unsigned int) tRow + (unsigned int) tCol * RAW_DATA_MAX_ROW + (unsigned int) tRelBcid * RAW_DATA_MAX_COLUMN * RAW_DATA_MAX_ROW);
 		_nHits++;
 	}
 	else
@@ -355,19 +484,36 @@ void Clusterizer::addHit(const unsigned int& pHitIndex)
 		if (_clusterHitInfo == 0)
 			throw std::runtime_error("Cluster hit array is not defined and cannot be filled");
 		_NclustersHits++;
-		_clusterHitInfo[pHitIndex].eventNumber = _hitInfo[pHitIndex].eventNumber;
-		_clusterHitInfo[pHitIndex].triggerNumber = _hitInfo[pHitIndex].triggerNumber;
-		_clusterHitInfo[pHitIndex].relativeBCID = _hitInfo[pHitIndex].relativeBCID;
-		_clusterHitInfo[pHitIndex].LVLID = _hitInfo[pHitIndex].LVLID;
-		_clusterHitInfo[pHitIndex].column = _hitInfo[pHitIndex].column;
-		_clusterHitInfo[pHitIndex].row = _hitInfo[pHitIndex].row;
-		_clusterHitInfo[pHitIndex].tot = _hitInfo[pHitIndex].tot;
-		_clusterHitInfo[pHitIndex].TDC = _hitInfo[pHitIndex].TDC;
-		_clusterHitInfo[pHitIndex].TDCtimeStamp = _hitInfo[pHitIndex].TDCtimeStamp;
-		_clusterHitInfo[pHitIndex].BCID = _hitInfo[pHitIndex].BCID;
-		_clusterHitInfo[pHitIndex].triggerStatus = _hitInfo[pHitIndex].triggerStatus;
-		_clusterHitInfo[pHitIndex].serviceRecord = _hitInfo[pHitIndex].serviceRecord;
-		_clusterHitInfo[pHitIndex].eventStatus = _hitInfo[pHitIndex].eventStatus;
+		if (_compactHitInfo != 0) {
+			_clusterHitInfo[pHitIndex].eventNumber = _compactHitInfo[pHitIndex].eventNumber;
+			_clusterHitInfo[pHitIndex].triggerNumber = 0;
+			_clusterHitInfo[pHitIndex].relativeBCID = _compactHitInfo[pHitIndex].relativeBCID;
+			_clusterHitInfo[pHitIndex].LVLID = 0;
+			_clusterHitInfo[pHitIndex].column = _compactHitInfo[pHitIndex].column;
+			_clusterHitInfo[pHitIndex].row = _compactHitInfo[pHitIndex].row;
+			_clusterHitInfo[pHitIndex].tot = _compactHitInfo[pHitIndex].tot;
+			_clusterHitInfo[pHitIndex].TDC = 0;
+			_clusterHitInfo[pHitIndex].TDCtimeStamp = 0;
+			_clusterHitInfo[pHitIndex].BCID = 0;
+			_clusterHitInfo[pHitIndex].triggerStatus = 0;
+			_clusterHitInfo[pHitIndex].serviceRecord = 0;
+			_clusterHitInfo[pHitIndex].eventStatus = 0;
+		}
+		else {
+			_clusterHitInfo[pHitIndex].eventNumber = _hitInfo[pHitIndex].eventNumber;
+			_clusterHitInfo[pHitIndex].triggerNumber = _hitInfo[pHitIndex].triggerNumber;
+			_clusterHitInfo[pHitIndex].relativeBCID = _hitInfo[pHitIndex].relativeBCID;
+			_clusterHitInfo[pHitIndex].LVLID = _hitInfo[pHitIndex].LVLID;
+			_clusterHitInfo[pHitIndex].column = _hitInfo[pHitIndex].column;
+			_clusterHitInfo[pHitIndex].row = _hitInfo[pHitIndex].row;
+			_clusterHitInfo[pHitIndex].tot = _hitInfo[pHitIndex].tot;
+			_clusterHitInfo[pHitIndex].TDC = _hitInfo[pHitIndex].TDC;
+			_clusterHitInfo[pHitIndex].TDCtimeStamp = _hitInfo[pHitIndex].TDCtimeStamp;
+			_clusterHitInfo[pHitIndex].BCID = _hitInfo[pHitIndex].BCID;
+			_clusterHitInfo[pHitIndex].triggerStatus = _hitInfo[pHitIndex].triggerStatus;
+			_clusterHitInfo[pHitIndex].serviceRecord = _hitInfo[pHitIndex].serviceRecord;
+			_clusterHitInfo[pHitIndex].eventStatus = _hitInfo[pHitIndex].eventStatus;
+		}
 		_clusterHitInfo[pHitIndex].isSeed = 0;
 		_clusterHitInfo[pHitIndex].clusterSize = 666;
 		_clusterHitInfo[pHitIndex].nCluster = 666;
@@ -418,8 +564,8 @@ void Clusterizer::searchNextHits(const unsigned short& pCol, const unsigned shor
 
 	_actualClusterTot += tTot;		//add tot of the hit to the cluster tot
 	_actualClusterCharge += _chargeMap[(size_t) pCol + (size_t) pRow * (size_t) RAW_DATA_MAX_COLUMN + (size_t) tTot * (size_t) RAW_DATA_MAX_COLUMN * (size_t) RAW_DATA_MAX_ROW];	//add charge of the hit to the cluster tot
-	_actualClusterX += (float) ((float) pCol + 0.5) * (_chargeMap[(size_t) pCol + (size_t) pRow * (size_t) RAW_DATA_MAX_COLUMN + (size_t) tTot * (size_t) RAW_DATA_MAX_COLUMN * (size_t) RAW_DATA_MAX_ROW] + 1);	//add x position of actual cluster weigthed by the charge
-	_actualClusterY += (float) ((float) pRow + 0.5) * (_chargeMap[(size_t) pCol + (size_t) pRow * (size_t) RAW_DATA_MAX_COLUMN + (size_t) tTot * (size_t) RAW_DATA_MAX_COLUMN * (size_t) RAW_DATA_MAX_ROW] + 1);	//add y position of actual cluster weigthed by the charge
+	_actualClusterX += (float) ((float) pCol + 0.5) * (float) (tTot + 2);	//add x position of actual cluster weigthed by the standard charge TOT + 1 (+ 1), independent of the charge calibration
+	_actualClusterY += (float) ((float) pRow + 0.5) * (float) (tTot + 2);	//add y position of actual cluster weigthed by the standard charge TOT + 1 (+ 1), independent of the charge calibration
 
 	if (Basis::debugSet()) {
 //		std::cout<<"Clusterizer::searchNextHits"<<std::endl;
@@ -539,6 +685,7 @@ void Clusterizer::initHitMap()
 	_bCIDfirstHit = -1;
 	_bCIDlastHit = -1;
 	_nHits = 0;
+	_eventHitPositions.clear();
 }
 
 void Clusterizer::addClusterToResults()
@@ -559,10 +706,10 @@ void Clusterizer::addClusterToResults()
 			warning(tWarning.str());
 		}
 
-//		if((int) _actualClusterCharge<__MAXCHARGEBINS && _actualClusterSize<__MAXCLUSTERHITSBINS){
-//			_clusterCharges[(int) _actualClusterCharge][0]++;
-//			_clusterCharges[(int) _actualClusterCharge][_actualClusterSize]++;	//cluster size = 0 contains all cluster sizes
-//		}
+		if (_actualClusterCharge >= 0 && _actualClusterCharge < __MAXCHARGEBINS && _actualClusterSize < __MAXCLUSTERHITSBINS) {	//a NaN charge of not calibrated pixels is not histogrammed
+			_clusterCharges[(size_t)(_actualClusterCharge) + (size_t) _actualClusterSize * (size_t) __MAXCHARGEBINS]++;
+			_clusterCharges[(size_t)(_actualClusterCharge)]++;	//cluster size = 0 contains all cluster sizes
+		}
 //		if(_actualClusterCharge > 0){	//avoid division by zero
 //			int tActualClusterXbin = (int) (_actualClusterX/(__PIXELSIZEX*RAW_DATA_MAX_COLUMN) * __MAXPOSXBINS);
 //			int tActualClusterYbin = (int) (_actualClusterY/(__PIXELSIZEY*RAW_DATA_MAX_ROW) * __MAXPOSYBINS);
@@ -583,6 +730,32 @@ void Clusterizer::allocateClusterHitArray()
 	}
 }
 
+void Clusterizer::growClusterHitArray(const size_t& rMinSize)
+{
+	size_t tNewSize = std::max(rMinSize, 2 * _clusterHitInfoSize);
+	info("growClusterHitArray(): increase cluster hit array size from " + LongIntToStr(_clusterHitInfoSize) + " to " + LongIntToStr(tNewSize));
+	deleteClusterHitArray();
+	_clusterHitInfoSize = tNewSize;
+	allocateClusterHitArray();
+}
+
+void Clusterizer::growClusterInfoArray()
+{
+	size_t tNewSize = (_clusterInfoSize > 0) ? 2 * _clusterInfoSize : 1000;
+	info("growClusterInfoArray(): increase cluster array size from " + LongIntToStr(_clusterInfoSize) + " to " + LongIntToStr(tNewSize));
+	ClusterInfo* tClusterInfo = 0;
+	try {
+		tClusterInfo = new ClusterInfo[tNewSize];
+	} catch (std::bad_alloc& exception) {
+		error(std::string("growClusterInfoArray(): ") + std::string(exception.what()));
+		throw;
+	}
+	std::copy(_clusterInfo, _clusterInfo + _Nclusters, tClusterInfo);
+	delete[] _clusterInfo;
+	_clusterInfo = tClusterInfo;
+	_clusterInfoSize = tNewSize;
+}
+
 void Clusterizer::deleteClusterHitArray()
 {
 	debug(std::string("deleteClusterHitArray()"));
@@ -650,6 +823,7 @@ void Clusterizer::clearHitMap()
 	_bCIDfirstHit = -1;
 	_bCIDlastHit = -1;
 	_nHits = 0;
+	_eventHitPositions.clear();
 }
 
 void Clusterizer::deleteHitMap()
@@ -711,9 +885,7 @@ void Clusterizer::clearResultHistograms()  // this function takes a long time
 		for (size_t iClusterHit = 0; iClusterHit < (size_t) __MAXCLUSTERHITSBINS; ++iClusterHit)
 			_clusterTots[iTot + iClusterHit * (size_t) __MAXTOTBINS] = 0;
 	}
-//	for(unsigned int iCharge = 0; iCharge<__MAXCHARGEBINS; ++iCharge)
-//		for(unsigned int iClusterHit = 0; iClusterHit<__MAXCLUSTERHITSBINS; ++iClusterHit)
-//			_clusterCharges[(size_t)iCharge + (size_t)iClusterHit*(size_t)__MAXCLUSTERHITSBINS] = 0;
+	std::fill(_clusterCharges, _clusterCharges + (size_t) __MAXCHARGEBINS * (size_t) __MAXCLUSTERHITSBINS, 0);
 //	for(unsigned int iX = 0; iX<__MAXPOSXBINS; ++iX)
 //			for(unsigned int iY = 0; iY<__MAXPOSYBINS; ++iY)
 //				_clusterPosition[(size_t)iX + (size_t)iY*(size_t)__MAXPOSXBINS] = 0;
@@ -788,25 +960,23 @@ void Clusterizer::showHits()
 
 void Clusterizer::addCluster()
 {
-	_actualClusterX /= (_actualClusterCharge + _actualClusterSize);  // normalize cluster x position
-	_actualClusterY /= (_actualClusterCharge + _actualClusterSize);  // normalize cluster y position
+	_actualClusterX /= (float) (_actualClusterTot + 2 * _actualClusterSize);  // normalize cluster x position with the sum of the weights
+	_actualClusterY /= (float) (_actualClusterTot + 2 * _actualClusterSize);  // normalize cluster y position with the sum of the weights
 	if (_createClusterInfoArray) {
 		if (_clusterInfo == 0)
 			throw std::runtime_error("Cluster info array is not defined and cannot be filled");
-		if (_Nclusters < _clusterInfoSize) {
-			_clusterInfo[_Nclusters].eventNumber = _actualEventNumber;
-			_clusterInfo[_Nclusters].ID = _actualClusterID;
-			_clusterInfo[_Nclusters].size = _actualClusterSize;
-			_clusterInfo[_Nclusters].Tot = _actualClusterTot;
-			_clusterInfo[_Nclusters].charge = _actualClusterCharge;
-			_clusterInfo[_Nclusters].seed_column = _actualClusterSeed_column + 1;
-			_clusterInfo[_Nclusters].seed_row = _actualClusterSeed_row + 1;
-			_clusterInfo[_Nclusters].mean_column = (float) (_actualClusterX + 1.);
-			_clusterInfo[_Nclusters].mean_row = (float) (_actualClusterY + 1.);
-			_clusterInfo[_Nclusters].eventStatus = _actualEventStatus;
-		}
-		else
-			throw std::out_of_range("Too many clusters attempt to be stored in cluster array");
+		if (_Nclusters >= _clusterInfoSize)
+			growClusterInfoArray();
+		_clusterInfo[_Nclusters].eventNumber = _actualEventNumber;
+		_clusterInfo[_Nclusters].ID = _actualClusterID;
+		_clusterInfo[_Nclusters].size = _actualClusterSize;
+		_clusterInfo[_Nclusters].Tot = _actualClusterTot;
+		_clusterInfo[_Nclusters].charge = _actualClusterCharge;
+		_clusterInfo[_Nclusters].seed_column = _actualClusterSeed_column + 1;
+		_clusterInfo[_Nclusters].seed_row = _actualClusterSeed_row + 1;
+		_clusterInfo[_Nclusters].mean_column = (float) (_actualClusterX + 1.);
+		_clusterInfo[_Nclusters].mean_row = (float) (_actualClusterY + 1.);
+		_clusterInfo[_Nclusters].eventStatus = _actualEventStatus;
 	}
 
 	_Nclusters++;
@@ -43,20 +43,25 @@ public:
 	~Clusterizer(void);
 	//main functions
 	void addHits(HitInfo*& rHitInfo, const unsigned int& rNhits);		//add hits to cluster, starts clustering, warning hits have to be aligned at events
+	void addCompactHits(CompactHitInfo*& rCompactHitInfo, const unsigned int& rNhits);	//same as addHits for compact hits, the cluster hit info fields not available in the compact format are set to 0
 	void getHitCluster(ClusterHitInfo*& rClusterHitInfo, unsigned int& rSize, bool copy=false);
 	void getCluster(ClusterInfo*& rClusterHitInfo, unsigned int& rSize, bool copy=false);
 	void reset();														//resets all data but keeps the settings and the charge calibration
 	// get result histograms
 	void getClusterSizeHist(unsigned int& rNparameterValues, unsigned int*& rClusterSize, bool copy = false);
 	void getClusterTotHist(unsigned int& rNparameterValues, unsigned int*& rClusterTot, bool copy = false);
-	void getClusterChargeHist(unsigned int& rNparameterValues, unsigned int*& rClusterCharge, bool copy = false);  // no rested in reset function, deactivated at the moment since not used
+	void getClusterChargeHist(unsigned int& rNparameterValues, unsigned int*& rClusterCharge, bool copy = false);  // cluster charge histogram [__MAXCHARGEBINS][__MAXCLUSTERHITSBINS] in units of the charge calibration
 	void getClusterPositionHist(unsigned int& rNparameterValues, unsigned int*& rClusterPosition, bool copy = false);  // no rested in reset function, deactivated at the moment since not used
+	// set result histograms, e.g. to resume the clustering, the arrays have the size of the get functions
+	void setClusterSizeHist(unsigned int*& rClusterSize);
+	void setClusterTotHist(unsigned int*& rClusterTot);
+	void setClusterChargeHist(unsigned int*& rClusterCharge);
 
 	//options
 	void createClusterHitInfoArray(bool toggle = true){_createClusterHitInfoArray = toggle;};
 	void createClusterInfoArray(bool toggle = true){_createClusterInfoArray = toggle;};
-	void setClusterHitInfoArraySize(const unsigned int& rSize);	//set the cluster hit array size
-	void setClusterInfoArraySize(const unsigned int& rSize);	//set the cluster array size
+	void setClusterHitInfoArraySize(const unsigned int& rSize);	//set the initial cluster hit array size, the array grows automatically if needed
+	void setClusterInfoArraySize(const unsigned int& rSize);	//set the initial cluster array size, the array grows automatically if needed
 	void setXclusterDistance(const unsigned int& pDx);					//sets the x distance between two hits that they belong to one cluster
 	void setYclusterDistance(const unsigned int& pDy);					//sets the x distance between two hits that they belong to one cluster
 	void setBCIDclusterDistance(const unsigned int& pDbCID);			//sets the BCID depth between two hits that they belong to one cluster
@@ -64,11 +69,20 @@ public:
 	void setMaxClusterHits(const unsigned int&  pMaxNclusterHits);		//maximal hits per cluster allowed, otherwise cluster omitted
 	void setMaxClusterHitTot(const unsigned int&  pMaxClusterHitTot);	//maximal tot for a cluster hit, otherwise cluster omitted
 	void setMaxHitTot(const unsigned int&  pMaxHitTot);					//minimum tot a hit is considered to be a hit
+	void setChargeCalibration(const float* rChargeCalibration, const unsigned int& rNtot = __MAXTOTLOOKUP);	//sets the charge lookup table of all pixels in one call, array [rNtot][RAW_DATA_MAX_ROW][RAW_DATA_MAX_COLUMN], the TOT values not given keep the standard charge TOT + 1
+	void setSparseClustering(bool toggle = true){_sparseClustering = toggle;};	//find the cluster seeds by looping over the sorted hits of the event instead of the hit map area, same result but the run time only depends on the number of hits
+	void copySettings(Clusterizer& rClusterizer);							//takes the cluster settings, the charge calibration and the output settings of rClusterizer, the array settings are kept
 
 	unsigned int getNclusters();										//returns the number of clusters//main function to start the clustering of the hit array
+	unsigned int getMaxNclusterHits(){return _maxNclustersHits;};		//returns the maximum number of cluster hits stored for one addHits call (high-water mark)
+	unsigned int getMaxNclusters(){return _maxNclusters;};				//returns the maximum number of clusters stored for one addHits call (high-water mark)
+	size_t getClusterHitInfoArraySize(){return _clusterHitInfoSize;};	//returns the actual cluster hit array size, grows if needed
+	size_t getClusterInfoArraySize(){return _clusterInfoSize;};			//returns the actual cluster array size, grows if needed
 	void test();
 
 private:
+	void clusterizeHits(const unsigned int& rNhits);	//clusters the hits of the input hit array (_hitInfo or _compactHitInfo)
+	inline int64_t getHitEventNumber(const unsigned int& pHitIndex);	//returns the event number of the hit with index pHitIndex of the input hit array
 	void addHit(const unsigned int& pHitIndex);	//add hit with index pHitIndex of the input hit array
 	inline void searchNextHits(const unsigned short& pCol, const unsigned short& pRow, const unsigned short& pRelBcid);			//search for a hit next to the actual one in time (BCIDs) and space (col, row)
 	inline bool deleteHit(const unsigned short& pCol, const unsigned short& pRow, const unsigned short& pRelBcid);				//delete hit at position pCol,pRow from hit map, returns true if hit array is empty
@@ -76,11 +90,16 @@ private:
 	void initChargeCalibMap();											//sets the calibration map to all entries = 0
 	void addClusterToResults();											//adds the actual cluster data to the result arrays
 	bool clusterize();
+	void clusterizeHitMap();											//loops over the hit map area with hits to find the cluster seeds
+	void clusterizeEventHits();											//loops over the hits of the event sorted by rel. BCID, column and row (same order as the hit map loop) to find the cluster seeds
+	void clusterizeSeedHit(const unsigned short& pCol, const unsigned short& pRow, const unsigned short& pRelBcid);	//clusters the hits around the seed hit and adds the cluster
 
 	void setStandardSettings();
 
 	void allocateClusterHitArray();
 	void allocateClusterInfoArray();
+	void growClusterHitArray(const size_t& rMinSize);	//increases the cluster hit array size to at least rMinSize, the content is not kept
+	void growClusterInfoArray();						//doubles the cluster array size, the already stored clusters are kept
 	void deleteClusterHitArray();
 	void deleteClusterInfoArray();
 
@@ -108,6 +127,7 @@ private:
 
 	//input data structure
 	HitInfo* _hitInfo;
+	CompactHitInfo* _compactHitInfo;									//used instead of _hitInfo if compact hits are clustered
 
 	//output data structures
 	ClusterHitInfo* _clusterHitInfo;
@@ -116,6 +136,8 @@ private:
 	ClusterInfo* _clusterInfo;
 	size_t _clusterInfoSize;
 	unsigned int _Nclusters;
+	unsigned int _maxNclustersHits;										//maximum of _NclustersHits since the last reset (high-water mark)
+	unsigned int _maxNclusters;											//maximum of _Nclusters since the last reset (high-water mark)
 
 	//cluster results
 	unsigned int* _clusterTots;		//array [__MAXTOTBINS][__MAXCLUSTERHITSBINS] containing the cluster tots/cluster size for histogramming
@@ -127,6 +149,7 @@ private:
 	short int* _hitMap;       											//2d hit histogram for each relative BCID (in total 3d, linearly sorted via col, row, rel. BCID)
 	unsigned int* _hitIndexMap;
 	float* _chargeMap;													//array containing the lookup charge values for each pixel and TOT
+	std::vector<unsigned int> _eventHitPositions;						//positions (rel. BCID, column, row) of the hits in the hit map, used to find the cluster seeds without looping over the hit map area
 
 	//cluster settings
 	unsigned short _dx;													//max distance in x between two hits that they belong to a cluster
@@ -139,6 +162,7 @@ private:
 	unsigned int _maxHitTot;											//the tot value a hit is considered to a hit (usually 13)
 	bool _createClusterHitInfoArray;									//true if ClusterHitInfoArray has to be filled
 	bool _createClusterInfoArray;										//true if ClusterHitInfoArray has to be filled
+	bool _sparseClustering;												//true if the cluster seeds are searched in the sorted event hits instead of the hit map area
 
 	//actual clustering variables
 	unsigned int _nHits;												//number of hits for the actual event data to cluster
@@ -1,6 +1,92 @@
 #include "Histogram.h"
 
-Histogram::Histogram(void)
+SparsePixelHist::SparsePixelHist(const unsigned int& rNvalues)
+{
+  _nValues = rNvalues;
+}
+
+void SparsePixelHist::compress()
+{
+  if(_cooKeys.empty())
+    return;
+  std::sort(_cooKeys.begin(), _cooKeys.end());
+  std::vector<unsigned int> tKeys;
+  std::vector<unsigned int> tCounts;
+  tKeys.reserve(_keys.size() + _cooKeys.size());
+  tCounts.reserve(_keys.size() + _cooKeys.size());
+  size_t j = 0;  //index of the already compressed entries
+  for(size_t i = 0; i < _cooKeys.size();){
+    unsigned int tKey = _cooKeys[i];
+    unsigned int tCount = 0;
+    for(; i < _cooKeys.size() && _cooKeys[i] == tKey; ++i)
+      ++tCount;
+    for(; j < _keys.size() && _keys[j] < tKey; ++j){
+      tKeys.push_back(_keys[j]);
+      tCounts.push_back(_counts[j]);
+    }
+    if(j < _keys.size() && _keys[j] == tKey){
+      tCount += _counts[j];
+      ++j;
+    }
+    tKeys.push_back(tKey);
+    tCounts.push_back(tCount);
+  }
+  for(; j < _keys.size(); ++j){
+    tKeys.push_back(_keys[j]);
+    tCounts.push_back(_counts[j]);
+  }
+  _keys.swap(tKeys);
+  _counts.swap(tCounts);
+  _cooKeys.clear();
+}
+
+void SparsePixelHist::getCsr(unsigned int*& rPixelPointer, unsigned int*& rValueIndex, unsigned int*& rCounts, unsigned int& rNentries)
+{
+  compress();
+  _pixelPointer.assign((size_t)RAW_DATA_MAX_COLUMN * (size_t)RAW_DATA_MAX_ROW + 1, 0);
+  _valueIndex.resize(_keys.size());
+  for(size_t i = 0; i < _keys.size(); ++i){
+    ++_pixelPointer[_keys[i] / _nValues + 1];
+    _valueIndex[i] = _keys[i] % _nValues;
+  }
+  for(size_t i = 1; i < _pixelPointer.size(); ++i)
+    _pixelPointer[i] += _pixelPointer[i-1];
+  rPixelPointer = &_pixelPointer[0];
+  rValueIndex = _valueIndex.empty() ? 0 : &_valueIndex[0];
+  rCounts = _counts.empty() ? 0 : &_counts[0];
+  rNentries = (unsigned int) _keys.size();
+}
+
+void SparsePixelHist::setCsr(unsigned int*& rPixelPointer, unsigned int*& rValueIndex, unsigned int*& rCounts, const unsigned int& rNentries)
+{
+  reset();
+  _keys.reserve(rNentries);
+  _counts.assign(rCounts, rCounts + rNentries);
+  for(size_t i = 0; i < (size_t)RAW_DATA_MAX_COLUMN * (size_t)RAW_DATA_MAX_ROW; ++i){
+    if(rPixelPointer[i] > rPixelPointer[i+1] || rPixelPointer[i+1] > rNentries)
+      throw std::out_of_range("Sparse pixel histogram pixel pointer out of range.");
+    for(unsigned int j = rPixelPointer[i]; j < rPixelPointer[i+1]; ++j){
+      if(rValueIndex[j] >= _nValues || (j > rPixelPointer[i] && rValueIndex[j] <= rValueIndex[j-1]))
+        throw std::out_of_range("Sparse pixel histogram value index out of range or not sorted.");
+      _keys.push_back((unsigned int) i * _nValues + rValueIndex[j]);
+    }
+  }
+  if(_keys.size() != _counts.size())
+    throw std::out_of_range("Sparse pixel histogram pixel pointer does not match the number of entries.");
+}
+
+void SparsePixelHist::reset()
+{
+  std::vector<unsigned int>().swap(_cooKeys);  //also frees the memory
+  std::vector<unsigned int>().swap(_keys);
+  std::vector<unsigned int>().swap(_counts);
+  std::vector<unsigned int>().swap(_pixelPointer);
+  std::vector<unsigned int>().swap(_valueIndex);
+}
+
+Histogram::Histogram(void):
+  _tdcPixelSparse(__N_TDC_VALUES),
+  _totPixelSparse(16)
 {
   setSourceFileName("Histogram");
 //  setDebugOutput(true);
@@ -23,8 +109,10 @@ void Histogram::setStandardSettings()
 	info("setStandardSettings()");
     _metaEventIndex = 0;
 	_parInfo = 0;
-	_lastMetaEventIndex = 0;
 	_metaEventIndex = 0;
+	_nMetaEventIndexLength = 0;
+	_nParInfoLength = 0;
+	resetParameterRuns();
 	_occupancy = 0;
 	_relBcid = 0;
 	_tot = 0;
@@ -38,6 +126,9 @@ void Histogram::setStandardSettings()
 	_createTdcHist = false;
 	_createTdcPixelHist = false;
 	_createTotPixelHist = false;
+	_sparsePixelHists = false;
+	_occupancyWindow = 0;
+	_lastEventNumber = -1;
 	_maxTot = 13;
 }
 
@@ -46,6 +137,16 @@ void Histogram::createOccupancyHist(bool CreateOccHist)
 	_createOccHist = CreateOccHist;
 }
 
+void Histogram::setOccupancyWindow(const unsigned int& rNslices)
+{
+	info("setOccupancyWindow("+IntToStr(rNslices)+")");
+	_occupancyWindow = rNslices;
+	if(_occupancy != 0){  //scan parameters already set
+		allocateOccupancyArray();
+		resetOccupancyArray();
+	}
+}
+
 void Histogram::createRelBCIDHist(bool CreateRelBCIDHist)
 {
 	_createRelBCIDhist = CreateRelBCIDHist;
@@ -82,23 +183,32 @@ void Histogram::createTdcHist(bool CreateTdcHist)
 void Histogram::createTdcPixelHist(bool CreateTdcPixelHist)
 {
 	_createTdcPixelHist = CreateTdcPixelHist;
-	if (_createTdcPixelHist){
+	if (_createTdcPixelHist && !_sparsePixelHists){
 		allocateTdcPixelArray();
 		resetTdcPixelArray();
 	}
 	else
 		deleteTdcPixelArray();
+	_tdcPixelSparse.reset();
 }
 
 void Histogram::createTotPixelHist(bool CreateTotPixelHist)
 {
 	_createTotPixelHist = CreateTotPixelHist;
-	if (_createTotPixelHist){
+	if (_createTotPixelHist && !_sparsePixelHists){
 		allocateTotPixelArray();
 		resetTotPixelArray();
 	}
 	else
 		deleteTotPixelArray();
+	_totPixelSparse.reset();
+}
+
+void Histogram::setSparsePixelHists(bool SparsePixelHists)
+{
+	_sparsePixelHists = SparsePixelHists;
+	createTdcPixelHist(_createTdcPixelHist);  //(de)allocates the dense arrays
+	createTotPixelHist(_createTotPixelHist);
 }
 
 void Histogram::setMaxTot(const unsigned int& rMaxTot)
@@ -106,10 +216,12 @@ void Histogram::setMaxTot(const unsigned int& rMaxTot)
 	_maxTot = rMaxTot;
 }
 
-void Histogram::addHits(HitInfo*& rHitInfo, const unsigned int& rNhits)
+unsigned int Histogram::addHits(HitInfo*& rHitInfo, const unsigned int& rNhits)
 {
 	debug("addHits()");
 	for(unsigned int i = 0; i<rNhits; ++i){
+		if(rHitInfo[i].eventNumber > _lastEventNumber)
+			_lastEventNumber = rHitInfo[i].eventNumber;
 		if ((rHitInfo[i].eventStatus & __NO_HIT) == __NO_HIT) // ignore virtual hits
 			continue;
 		unsigned short tColumnIndex = rHitInfo[i].column-1;
@@ -135,10 +247,12 @@ void Histogram::addHits(HitInfo*& rHitInfo, const unsigned int& rNhits)
 			error("addHits: tParIndex "+IntToStr(tParIndex)+"\t> "+IntToStr(_NparameterValues));
 			throw std::out_of_range("Parameter index out of range.");
 		}
+		if(_createOccHist && tTot <= _maxTot && isOccupancyWindowFull(tParIndex))  //the finished parameters have to be taken out first
+			return i;
 		if(_createOccHist)
 			if(tTot <= _maxTot){
 				if(_occupancy!=0)
-					_occupancy[(size_t)tColumnIndex + (size_t)tRowIndex * (size_t)RAW_DATA_MAX_COLUMN + (size_t)tParIndex * (size_t)RAW_DATA_MAX_COLUMN * (size_t)RAW_DATA_MAX_ROW] += 1;
+					_occupancy[(size_t)tColumnIndex + (size_t)tRowIndex * (size_t)RAW_DATA_MAX_COLUMN + (size_t)getOccupancySlot(tParIndex) * (size_t)RAW_DATA_MAX_COLUMN * (size_t)RAW_DATA_MAX_ROW] += 1;
 				else
 					throw std::runtime_error("Occupancy array not intitialized. Set scan parameter first!.");
 			}
@@ -151,29 +265,87 @@ void Histogram::addHits(HitInfo*& rHitInfo, const unsigned int& rNhits)
 		if(_createTdcHist)
 			_tdc[tTdc] += 1;
 		if(_createTdcPixelHist){
-			if (_tdcPixel != 0){
-				 if(tTdc >= __N_TDC_PIXEL_VALUES){
-					info("TDC value out of range:" + IntToStr(tTdc) + ">" + IntToStr(__N_TDC_PIXEL_VALUES));
-					tTdc = 0;
-				}
+			if(tTdc >= __N_TDC_PIXEL_VALUES){
+				info("TDC value out of range:" + IntToStr(tTdc) + ">" + IntToStr(__N_TDC_PIXEL_VALUES));
+				tTdc = 0;
+			}
+			if(_sparsePixelHists)
+				_tdcPixelSparse.add(tColumnIndex + tRowIndex * RAW_DATA_MAX_COLUMN, tTdc);
+			else if (_tdcPixel != 0){
 				_tdcPixel[(size_t)tColumnIndex + (size_t)tRowIndex * (size_t)RAW_DATA_MAX_COLUMN + (size_t)tTdc * (size_t)RAW_DATA_MAX_COLUMN * (size_t)RAW_DATA_MAX_ROW] += 1;
 			}
 			else
 				throw std::runtime_error("Output TDC pixel array array not set.");
 		}
 		if(_createTotPixelHist){
-			if (tTot <= _maxTot)
-				_totPixel[(size_t)tColumnIndex + (size_t)tRowIndex * (size_t)RAW_DATA_MAX_COLUMN + (size_t)tTot * (size_t)RAW_DATA_MAX_COLUMN * (size_t)RAW_DATA_MAX_ROW] += 1;
+			if (tTot <= _maxTot){
+				if(_sparsePixelHists)
+					_totPixelSparse.add(tColumnIndex + tRowIndex * RAW_DATA_MAX_COLUMN, tTot);
+				else
+					_totPixel[(size_t)tColumnIndex + (size_t)tRowIndex * (size_t)RAW_DATA_MAX_COLUMN + (size_t)tTot * (size_t)RAW_DATA_MAX_COLUMN * (size_t)RAW_DATA_MAX_ROW] += 1;
+			}
 		}
 	}
 	//std::cout<<"addHits done"<<std::endl;
+	return rNhits;
+}
+
+unsigned int Histogram::addCompactHits(CompactHitInfo*& rCompactHitInfo, const unsigned int& rNhits)
+{
+	debug("addCompactHits()");
+	if(_createTdcHist || _createTdcPixelHist)
+		throw std::runtime_error("TDC histograms cannot be created from compact hits.");
+	for(unsigned int i = 0; i<rNhits; ++i){
+		if(rCompactHitInfo[i].eventNumber > _lastEventNumber)
+			_lastEventNumber = rCompactHitInfo[i].eventNumber;
+		unsigned short tColumnIndex = rCompactHitInfo[i].column-1;
+		if(tColumnIndex > RAW_DATA_MAX_COLUMN-1)
+			throw std::out_of_range("Column index out of range.");
+		unsigned int tRowIndex = rCompactHitInfo[i].row-1;
+		if(tRowIndex > RAW_DATA_MAX_ROW-1)
+			throw std::out_of_range("Row index out of range.");
+		unsigned int tTot = rCompactHitInfo[i].tot;
+		if(tTot > 15)
+			throw std::out_of_range("Tot index out of range.");
+		unsigned int tRelBcid = rCompactHitInfo[i].relativeBCID;
+		if(tRelBcid >= __MAXBCID)
+			throw std::out_of_range("Relative BCID index out of range.");
+
+		unsigned int tParIndex = getParIndex(rCompactHitInfo[i].eventNumber);
+
+		if(tParIndex < 0 || tParIndex > getNparameters()-1){
+			error("addCompactHits: tParIndex "+IntToStr(tParIndex)+"\t> "+IntToStr(_NparameterValues));
+			throw std::out_of_range("Parameter index out of range.");
+		}
+		if(tTot > _maxTot)
+			continue;
+		if(_createOccHist && isOccupancyWindowFull(tParIndex))  //the finished parameters have to be taken out first
+			return i;
+		if(_createOccHist){
+			if(_occupancy!=0)
+				_occupancy[(size_t)tColumnIndex + (size_t)tRowIndex * (size_t)RAW_DATA_MAX_COLUMN + (size_t)getOccupancySlot(tParIndex) * (size_t)RAW_DATA_MAX_COLUMN * (size_t)RAW_DATA_MAX_ROW] += 1;
+			else
+				throw std::runtime_error("Occupancy array not intitialized. Set scan parameter first!.");
+		}
+		if(_createRelBCIDhist)
+			_relBcid[tRelBcid] += 1;
+		if(_createTotHist)
+			_tot[tTot] += 1;
+		if(_createTotPixelHist && _sparsePixelHists)
+			_totPixelSparse.add(tColumnIndex + tRowIndex * RAW_DATA_MAX_COLUMN, tTot);
+		else if(_createTotPixelHist)
+			_totPixel[(size_t)tColumnIndex + (size_t)tRowIndex * (size_t)RAW_DATA_MAX_COLUMN + (size_t)tTot * (size_t)RAW_DATA_MAX_COLUMN * (size_t)RAW_DATA_MAX_ROW] += 1;
+	}
+	return rNhits;
 }
 
-void Histogram::addClusterSeedHits(ClusterInfo*& rClusterInfo, const unsigned int& rNcluster)
+unsigned int Histogram::addClusterSeedHits(ClusterInfo*& rClusterInfo, const unsigned int& rNcluster)
 {
 	if(Basis::debugSet())
 		debug("addClusterSeedHits(...,rNcluster="+IntToStr(rNcluster)+")");
 	for(unsigned int i = 0; i<rNcluster; ++i){
+		if(rClusterInfo[i].eventNumber > _lastEventNumber)
+			_lastEventNumber = rClusterInfo[i].eventNumber;
 		unsigned short tColumnIndex = rClusterInfo[i].seed_column-1;
 		if(tColumnIndex > RAW_DATA_MAX_COLUMN-1)
 			throw std::out_of_range("Column index out of range.");
@@ -187,35 +359,65 @@ void Histogram::addClusterSeedHits(ClusterInfo*& rClusterInfo, const unsigned in
 			error("addHits: tParIndex "+IntToStr(tParIndex)+"\t> "+IntToStr(_NparameterValues));
 			throw std::out_of_range("Parameter index out of range.");
 		}
+		if(_createOccHist && isOccupancyWindowFull(tParIndex))  //the finished parameters have to be taken out first
+			return i;
 		if(_createOccHist){
 			if(_occupancy!=0)
-				_occupancy[(size_t)tColumnIndex + (size_t)tRowIndex * (size_t)RAW_DATA_MAX_COLUMN + (size_t)tParIndex * (size_t)RAW_DATA_MAX_COLUMN * (size_t)RAW_DATA_MAX_ROW] += 1;
+				_occupancy[(size_t)tColumnIndex + (size_t)tRowIndex * (size_t)RAW_DATA_MAX_COLUMN + (size_t)getOccupancySlot(tParIndex) * (size_t)RAW_DATA_MAX_COLUMN * (size_t)RAW_DATA_MAX_ROW] += 1;
 			else
 				throw std::runtime_error("Occupancy array not intitialized. Set scan parameter first!.");
 		}
 	}
+	return rNcluster;
 }
 
 unsigned int Histogram::getParIndex(int64_t& rEventNumber)
 {
   if(_parInfo == 0)
     return 0;
-  for(uint64_t i=_lastMetaEventIndex; i<_nMetaEventIndexLength-1; ++i){
-    if(_metaEventIndex[i+1] > (uint64_t) rEventNumber || _metaEventIndex[i+1] < _metaEventIndex[i]){ // second case: meta event data not set yet (std value = 0), event number has to increase
-      _lastMetaEventIndex = i;
-      if (i < _nParInfoLength)
-      	return _parInfo[i];
-      else{
-    	  error("Scan parameter index " + LongIntToStr(i) + " out of range");
-    	  throw std::out_of_range("Scan parameter index out of range.");
-      }
+  if(_parRunStartEvent.empty()){
+    error("getParIndex: Correlation issues at event "+LongIntToStr(rEventNumber)+", no meta event index set");
+    throw std::logic_error("Event parameter correlation issues.");
+  }
+  if(_parRunsLimited && (uint64_t) rEventNumber >= _parRunsStopEvent){
+    error("Scan parameter index for event " + LongIntToStr(rEventNumber) + " out of range");
+    throw std::out_of_range("Scan parameter index out of range.");
+  }
+  // binary search for the last run starting at or before the event, events before the first read out belong to the first run
+  std::vector<uint64_t>::iterator tRun = std::upper_bound(_parRunStartEvent.begin(), _parRunStartEvent.end(), (uint64_t) rEventNumber);
+  if(tRun != _parRunStartEvent.begin())
+    --tRun;
+  return _parRunIndex[tRun - _parRunStartEvent.begin()];
+}
+
+void Histogram::updateParameterRuns()
+{
+  if(_parInfo == 0 || _metaEventIndex == 0)
+    return;
+  unsigned int i = _nMetaEventIndexMapped;
+  for(; i < _nMetaEventIndexLength; ++i){
+    if(i > 0 && _metaEventIndex[i] < _metaEventIndex[i-1])  // meta event data not set yet (std value = 0), event number has to increase
+      break;
+    if(i >= _nParInfoLength){
+      _parRunsLimited = true;
+      _parRunsStopEvent = _metaEventIndex[i];
+      break;
+    }
+    if(_parRunIndex.empty() || _parRunIndex.back() != _parInfo[i]){  // new run only if the parameter changes
+      _parRunStartEvent.push_back(_metaEventIndex[i]);
+      _parRunIndex.push_back(_parInfo[i]);
     }
   }
-  if(_metaEventIndex[_nMetaEventIndexLength-1] <= (uint64_t) rEventNumber) //last read outs
-    return _parInfo[_nMetaEventIndexLength-1];
-  error("getScanParameter: Correlation issues at event "+LongIntToStr(rEventNumber)+"\n_metaEventIndex[_nMetaEventIndexLength-1] "+LongIntToStr(_metaEventIndex[_nMetaEventIndexLength-1])+"\n_lastMetaEventIndex "+LongIntToStr(_lastMetaEventIndex));
-  throw std::logic_error("Event parameter correlation issues.");
-  return 0;
+  _nMetaEventIndexMapped = i;
+}
+
+void Histogram::resetParameterRuns()
+{
+  _parRunStartEvent.clear();
+  _parRunIndex.clear();
+  _nMetaEventIndexMapped = 0;
+  _parRunsLimited = false;
+  _parRunsStopEvent = 0;
 }
 
 void Histogram::addScanParameter(unsigned int*& rParInfo, const unsigned int& rNparInfoLength)
@@ -238,6 +440,14 @@ void Histogram::addScanParameter(unsigned int*& rParInfo, const unsigned int& rN
 
 	_NparameterValues = (unsigned int) tSet.size();
 
+	_parLastReadout.assign(_NparameterValues, 0);
+	for(unsigned int i = 0; i < _nParInfoLength; ++i)
+	  if(_parInfo[i] < _NparameterValues)
+		_parLastReadout[_parInfo[i]] = i;
+
+	resetParameterRuns();
+	updateParameterRuns();
+
 	if (_createOccHist){
 		allocateOccupancyArray();
 		resetOccupancyArray();
@@ -251,8 +461,11 @@ void Histogram::addScanParameter(unsigned int*& rParInfo, const unsigned int& rN
 void Histogram::addMetaEventIndex(uint64_t*& rMetaEventIndex, const unsigned int& rNmetaEventIndexLength)
 {
   debug("addMetaEventIndex()");
+  if(rMetaEventIndex != _metaEventIndex || rNmetaEventIndexLength < _nMetaEventIndexMapped)  // new meta event index array, otherwise only the new entries of the same array are added to the runs
+    resetParameterRuns();
   _nMetaEventIndexLength = rNmetaEventIndexLength;
   _metaEventIndex = rMetaEventIndex;
+  updateParameterRuns();
   if (Basis::debugSet())
 	  for(unsigned int i=0; i<_nMetaEventIndexLength; ++i)
 		 std::cout<<"index "<<i<<"\t event number "<<_metaEventIndex[i]<<"\n";
@@ -260,10 +473,10 @@ void Histogram::addMetaEventIndex(uint64_t*& rMetaEventIndex, const unsigned int
 
 void Histogram::allocateOccupancyArray()
 {
-  debug("allocateOccupancyArray() with "+IntToStr(getNparameters())+" parameters");
+  debug("allocateOccupancyArray() with "+IntToStr(getNoccupancySlices())+" of "+IntToStr(getNparameters())+" parameters");
   deleteOccupancyArray();
   try{
-    _occupancy = new unsigned int[(size_t)RAW_DATA_MAX_COLUMN * (size_t)RAW_DATA_MAX_ROW * (size_t)getNparameters()];
+    _occupancy = new unsigned int[(size_t)RAW_DATA_MAX_COLUMN * (size_t)RAW_DATA_MAX_ROW * (size_t)getNoccupancySlices()];
   }
   catch(std::bad_alloc& exception){
     error(std::string("allocateOccupancyArray: ")+std::string(exception.what()));
@@ -284,15 +497,117 @@ void Histogram::resetOccupancyArray()
   if (_occupancy != 0){
 	  for (unsigned int i = 0; i < RAW_DATA_MAX_COLUMN; i++)
 		for (unsigned int j = 0; j < RAW_DATA_MAX_ROW; j++)
-		  for(unsigned int k = 0; k < getNparameters();k++)
+		  for(unsigned int k = 0; k < getNoccupancySlices();k++)
 			  _occupancy[(size_t)i + (size_t)j * (size_t)RAW_DATA_MAX_COLUMN + (size_t)k * (size_t)RAW_DATA_MAX_COLUMN * (size_t)RAW_DATA_MAX_ROW] = 0;
   }
+  resetOccupancyWindow();
+}
+
+unsigned int Histogram::getNoccupancySlices()
+{
+  if(_occupancyWindow == 0 || _occupancyWindow > getNparameters())
+    return getNparameters();
+  return _occupancyWindow;
+}
+
+unsigned int Histogram::getOccupancySlot(const unsigned int& rParIndex)
+{
+  if(_occupancyWindow == 0)
+    return rParIndex;
+  int tSlot = _occupancySlot[rParIndex];
+  if(tSlot >= 0)
+    return (unsigned int) tSlot;
+  if(_parameterReleased[rParIndex]){
+    error("getOccupancySlot: occupancy of parameter index "+IntToStr(rParIndex)+" already released at event "+LongIntToStr(_lastEventNumber));
+    throw std::runtime_error("Occupancy of parameter already released. Hits have to be ordered by event number.");
+  }
+  if(_freeSlots.empty()){
+    error("getOccupancySlot: no free occupancy slice for parameter index "+IntToStr(rParIndex)+", the window has "+IntToStr(_occupancyWindow)+" slices");
+    throw std::runtime_error("Occupancy window full. Take out the finished parameters or increase the window.");
+  }
+  tSlot = (int) _freeSlots.back();
+  _freeSlots.pop_back();
+  _occupancySlot[rParIndex] = tSlot;
+  _slotParameter[tSlot] = (int) rParIndex;
+  return (unsigned int) tSlot;
+}
+
+bool Histogram::isOccupancyWindowFull(const unsigned int& rParIndex)
+{
+  if(_occupancyWindow == 0 || _occupancySlot[rParIndex] >= 0 || !_freeSlots.empty())
+    return false;
+  for(unsigned int i = 0; i < _slotParameter.size(); ++i){  //only a finished parameter can be taken out, otherwise the window is too small
+    if(_slotParameter[i] >= 0 && isParameterFinished((unsigned int) _slotParameter[i]))
+      return true;
+  }
+  return false;
+}
+
+bool Histogram::isParameterFinished(const unsigned int& rParIndex)
+{
+  if(rParIndex >= _parLastReadout.size())  //no scan parameter set
+    return false;
+  unsigned int tNextReadout = _parLastReadout[rParIndex] + 1;
+  if(tNextReadout >= _nParInfoLength || tNextReadout >= _nMetaEventIndexMapped)  //last read out or event number of next read out not known yet
+    return false;
+  return _lastEventNumber >= (int64_t) _metaEventIndex[tNextReadout];
+}
+
+void Histogram::resetOccupancyWindow()
+{
+  _lastEventNumber = -1;
+  _occupancySlot.assign(getNparameters(), -1);
+  _parameterReleased.assign(getNparameters(), false);
+  _slotParameter.assign(getNoccupancySlices(), -1);
+  _freeSlots.clear();
+  for(unsigned int i = getNoccupancySlices(); i > 0; --i)  //lowest slice used first
+    _freeSlots.push_back(i - 1);
+}
+
+int Histogram::getFinishedParameter(bool rAll)
+{
+  if(_occupancyWindow == 0)
+    throw std::runtime_error("No occupancy window set.");
+  for(unsigned int i = 0; i < _slotParameter.size(); ++i){
+    if(_slotParameter[i] >= 0 && (rAll || isParameterFinished((unsigned int) _slotParameter[i])))
+      return _slotParameter[i];
+  }
+  return -1;
+}
+
+void Histogram::getOccupancySlice(const unsigned int& rParIndex, unsigned int*& rOccupancySlice)
+{
+  debug("getOccupancySlice(...)");
+  if(_occupancy == 0)
+    throw std::runtime_error("Occupancy array not intitialized. Set scan parameter first!.");
+  if(rParIndex >= getNparameters() || (_occupancyWindow != 0 && _occupancySlot[rParIndex] < 0))
+    throw std::out_of_range("Occupancy slice of parameter index not in memory.");
+  rOccupancySlice = _occupancy + (size_t)getOccupancySlot(rParIndex) * (size_t)RAW_DATA_MAX_COLUMN * (size_t)RAW_DATA_MAX_ROW;
+}
+
+void Histogram::releaseOccupancySlice(const unsigned int& rParIndex)
+{
+  debug("releaseOccupancySlice("+IntToStr(rParIndex)+")");
+  if(_occupancyWindow == 0)
+    throw std::runtime_error("No occupancy window set.");
+  if(rParIndex >= getNparameters())
+    throw std::out_of_range("Parameter index out of range.");
+  int tSlot = _occupancySlot[rParIndex];
+  if(tSlot >= 0){
+    std::fill(_occupancy + (size_t)tSlot * (size_t)RAW_DATA_MAX_COLUMN * (size_t)RAW_DATA_MAX_ROW, _occupancy + (size_t)(tSlot + 1) * (size_t)RAW_DATA_MAX_COLUMN * (size_t)RAW_DATA_MAX_ROW, 0);
+    _occupancySlot[rParIndex] = -1;
+    _slotParameter[tSlot] = -1;
+    _freeSlots.push_back((unsigned int) tSlot);
+  }
+  _parameterReleased[rParIndex] = true;
 }
 
 void Histogram::resetTdcPixelArray()
 {
   info("resetTdcPixelArray()");
-  if (_createTdcPixelHist){
+  if (_createTdcPixelHist && _sparsePixelHists)
+	  _tdcPixelSparse.reset();
+  else if (_createTdcPixelHist){
 	  if (_tdcPixel != 0){
 		  for (unsigned int i = 0; i < RAW_DATA_MAX_COLUMN; i++)
 			for (unsigned int j = 0; j < RAW_DATA_MAX_ROW; j++)
@@ -307,7 +622,9 @@ void Histogram::resetTdcPixelArray()
 void Histogram::resetTotPixelArray()
 {
   info("resetTotPixelArray()");
-  if (_createTotPixelHist){
+  if (_createTotPixelHist && _sparsePixelHists)
+	  _totPixelSparse.reset();
+  else if (_createTotPixelHist){
 	  if (_totPixel != 0){
 		  for (unsigned int i = 0; i < RAW_DATA_MAX_COLUMN; i++)
 			for (unsigned int j = 0; j < RAW_DATA_MAX_ROW; j++)
@@ -477,6 +794,8 @@ unsigned int Histogram::getNparameters()
 void Histogram::getOccupancy(unsigned int& rNparameterValues, unsigned int*& rOccupancy, bool copy)
 {
   debug("getOccupancy(...)");
+  if(_occupancyWindow != 0)
+	  throw std::runtime_error("Occupancy window set, the occupancy is only available per parameter.");
   if(copy){
 	  unsigned int tArrayLength = (size_t)(RAW_DATA_MAX_COLUMN-1) + (size_t)(RAW_DATA_MAX_ROW-1) * (size_t)RAW_DATA_MAX_COLUMN + (size_t)(_NparameterValues-1) * (size_t)RAW_DATA_MAX_COLUMN * (size_t)RAW_DATA_MAX_ROW+1;
 	  std::copy(_occupancy, _occupancy+tArrayLength, rOccupancy);
@@ -532,6 +851,87 @@ void Histogram::getTdcPixelHist(unsigned short*& rTdcPixelHist, bool copy)
 	  rTdcPixelHist = _tdcPixel;
 }
 
+void Histogram::getTotPixelHistSparse(unsigned int*& rPixelPointer, unsigned int*& rValueIndex, unsigned int*& rCounts, unsigned int& rNentries)
+{
+  debug("getTotPixelHistSparse(...)");
+  _totPixelSparse.getCsr(rPixelPointer, rValueIndex, rCounts, rNentries);
+}
+
+void Histogram::getTdcPixelHistSparse(unsigned int*& rPixelPointer, unsigned int*& rValueIndex, unsigned int*& rCounts, unsigned int& rNentries)
+{
+  debug("getTdcPixelHistSparse(...)");
+  _tdcPixelSparse.getCsr(rPixelPointer, rValueIndex, rCounts, rNentries);
+}
+
+void Histogram::setOccupancy(const unsigned int& rNparameterValues, unsigned int*& rOccupancy)
+{
+  debug("setOccupancy(...)");
+  if(_occupancy == 0)
+	  throw std::runtime_error("Occupancy array not intitialized. Set scan parameter first!.");
+  if(_occupancyWindow != 0)
+	  throw std::runtime_error("Occupancy window set, the occupancy cannot be set.");
+  if(rNparameterValues > _NparameterValues)
+	  throw std::out_of_range("The occupancy has more parameters than the scan parameters set.");
+  size_t tNpixel = (size_t)RAW_DATA_MAX_COLUMN * (size_t)RAW_DATA_MAX_ROW;
+  std::copy(rOccupancy, rOccupancy + tNpixel * (size_t)rNparameterValues, _occupancy);
+  std::fill(_occupancy + tNpixel * (size_t)rNparameterValues, _occupancy + tNpixel * (size_t)_NparameterValues, 0);
+}
+
+void Histogram::setTotHist(unsigned int*& rTotHist)
+{
+  debug("setTotHist(...)");
+  if(_tot == 0)
+	  throw std::runtime_error("Tot array not set.");
+  std::copy(rTotHist, rTotHist+16, _tot);
+}
+
+void Histogram::setTdcHist(unsigned int*& rTdcHist)
+{
+  debug("setTdcHist(...)");
+  if(_tdc == 0)
+	  throw std::runtime_error("Tdc array not set.");
+  std::copy(rTdcHist, rTdcHist+__N_TDC_VALUES, _tdc);
+}
+
+void Histogram::setRelBcidHist(unsigned int*& rRelBcidHist, const unsigned int& rNbins)
+{
+  debug("setRelBcidHist(...)");
+  if(_relBcid == 0)
+	  throw std::runtime_error("Relative BCID array not set.");
+  if(rNbins > __MAXBCID)
+	  throw std::out_of_range("The relative BCID histogram has too many bins.");
+  std::copy(rRelBcidHist, rRelBcidHist+rNbins, _relBcid);
+  std::fill(_relBcid+rNbins, _relBcid+__MAXBCID, 0);
+}
+
+void Histogram::setTotPixelHist(unsigned short*& rTotPixelHist)
+{
+  debug("setTotPixelHist(...)");
+  if(_totPixel == 0)
+	  throw std::runtime_error("Output TOT pixel array array not set.");
+  std::copy(rTotPixelHist, rTotPixelHist+(size_t)RAW_DATA_MAX_COLUMN * (size_t)RAW_DATA_MAX_ROW * 16, _totPixel);
+}
+
+void Histogram::setTdcPixelHist(unsigned short*& rTdcPixelHist)
+{
+  debug("setTdcPixelHist(...)");
+  if(_tdcPixel == 0)
+	  throw std::runtime_error("Output TDC pixel array array not set.");
+  std::copy(rTdcPixelHist, rTdcPixelHist+(size_t)RAW_DATA_MAX_COLUMN * (size_t)RAW_DATA_MAX_ROW * (size_t)__N_TDC_VALUES, _tdcPixel);
+}
+
+void Histogram::setTotPixelHistSparse(unsigned int*& rPixelPointer, unsigned int*& rValueIndex, unsigned int*& rCounts, const unsigned int& rNentries)
+{
+  debug("setTotPixelHistSparse(...)");
+  _totPixelSparse.setCsr(rPixelPointer, rValueIndex, rCounts, rNentries);
+}
+
+void Histogram::setTdcPixelHistSparse(unsigned int*& rPixelPointer, unsigned int*& rValueIndex, unsigned int*& rCounts, const unsigned int& rNentries)
+{
+  debug("setTdcPixelHistSparse(...)");
+  _tdcPixelSparse.setCsr(rPixelPointer, rValueIndex, rCounts, rNentries);
+}
+
 void Histogram::calculateThresholdScanArrays(double rMuArray[], double rSigmaArray[], const unsigned int& rMaxInjections, const unsigned int& min_parameter, const unsigned int& max_parameter)
 {
   debug("calculateThresholdScanArrays(...)");
@@ -539,6 +939,8 @@ void Histogram::calculateThresholdScanArrays(double rMuArray[], double rSigmaArr
 
   if(_occupancy==0)
 	  throw std::runtime_error("Occupancy array not intitialized. Set scan parameter first!.");
+  if(_occupancyWindow != 0)
+	  throw std::runtime_error("Occupancy window set, the threshold calculation needs the occupancy of all parameters.");
 
   if (_NparameterValues<2)  //a minimum number of different scans is needed
     return;
@@ -549,28 +951,29 @@ void Histogram::calculateThresholdScanArrays(double rMuArray[], double rSigmaArr
   unsigned int A = rMaxInjections;
   unsigned int d = (int) ( ((double) q_max - (double) q_min)/(double) (n-1));
 
-  for(unsigned int i=0; i<RAW_DATA_MAX_COLUMN; ++i){
-    for(unsigned int j=0; j<RAW_DATA_MAX_ROW; ++j){
-      unsigned int M = 0;
-        
-      for(unsigned int k=0; k<getNparameters(); ++k){
-        M += _occupancy[(size_t)i + (size_t)j * (size_t)RAW_DATA_MAX_COLUMN  + (size_t)k * (size_t)RAW_DATA_MAX_COLUMN * (size_t)RAW_DATA_MAX_ROW];
-      }
-      double threshold = (double) q_max - d*(double)M/(double)A;
-      rMuArray[i+j*RAW_DATA_MAX_COLUMN] = threshold;
-
-      unsigned int mu1 = 0;
-      unsigned int mu2 = 0;
-      for(unsigned int k=0; k<getNparameters(); ++k){
-        if((double) k*d < threshold)
-          mu1 += _occupancy[(size_t)i + (size_t)j * (size_t)RAW_DATA_MAX_COLUMN  + (size_t)k * (size_t)RAW_DATA_MAX_COLUMN * (size_t)RAW_DATA_MAX_ROW];
-        else
-          mu2 += (A-_occupancy[(size_t)i + (size_t)j * (size_t)RAW_DATA_MAX_COLUMN  + (size_t)k * (size_t)RAW_DATA_MAX_COLUMN * (size_t)RAW_DATA_MAX_ROW]);
-      }
-      double noise = (double)d*(double)(mu1+mu2)/(double)A*sqrt(3.141592653589893238462643383/2);
-      rSigmaArray[i+j*RAW_DATA_MAX_COLUMN] = noise;
+  //the parameter slices are contiguous in memory, thus the pixels are the inner loop
+  size_t tNpixel = (size_t)RAW_DATA_MAX_COLUMN * (size_t)RAW_DATA_MAX_ROW;
+  std::vector<unsigned int> tM(tNpixel, 0);
+  for(unsigned int k=0; k<n; ++k){
+    unsigned int* tOccupancy = _occupancy + (size_t)k * tNpixel;
+    for(size_t i=0; i<tNpixel; ++i)
+      tM[i] += tOccupancy[i];
+  }
+  for(size_t i=0; i<tNpixel; ++i)
+    rMuArray[i] = (double) q_max - d*(double)tM[i]/(double)A;
+
+  std::vector<unsigned int> tMu(tNpixel, 0);  //mu1 + mu2
+  for(unsigned int k=0; k<n; ++k){
+    unsigned int* tOccupancy = _occupancy + (size_t)k * tNpixel;
+    for(size_t i=0; i<tNpixel; ++i){
+      if((double) k*d < rMuArray[i])
+        tMu[i] += tOccupancy[i];
+      else
+        tMu[i] += (A-tOccupancy[i]);
     }
   }
+  for(size_t i=0; i<tNpixel; ++i)
+    rSigmaArray[i] = (double)d*(double)tMu[i]/(double)A*sqrt(3.141592653589893238462643383/2);
 }
 
 void Histogram::setNoScanParameter()
@@ -578,6 +981,7 @@ void Histogram::setNoScanParameter()
   debug("setNoScanParameter()");
   deleteOccupancyArray();
   _NparameterValues = 1;
+  _parLastReadout.clear();
   allocateOccupancyArray();
   resetOccupancyArray();
 }
@@ -592,5 +996,6 @@ void Histogram::reset()
 	resetTdcPixelArray();
 	resetRelBcidArray();
 	_parInfo = 0;
+	resetParameterRuns();
 }
 
@@ -9,6 +9,35 @@
 #include "defines.h"
 #include "Basis.h"
 
+//sparse per pixel histogram, the hits are collected as coordinate list (COO) and compressed to sorted (key, count) entries if the buffer is full
+//the result is given in the compressed sparse row (CSR) format with one row per pixel (index = column + row * RAW_DATA_MAX_COLUMN)
+class SparsePixelHist
+{
+public:
+  SparsePixelHist(const unsigned int& rNvalues = 1);
+  inline void add(const unsigned int& rPixelIndex, const unsigned int& rValue);  //adds one entry for the pixel with the given value
+  void getCsr(unsigned int*& rPixelPointer, unsigned int*& rValueIndex, unsigned int*& rCounts, unsigned int& rNentries);  //returns the CSR arrays, valid until the next add/reset
+  void setCsr(unsigned int*& rPixelPointer, unsigned int*& rValueIndex, unsigned int*& rCounts, const unsigned int& rNentries);  //sets the histogram from CSR arrays with sorted value indices per pixel
+  void reset();
+
+private:
+  void compress();  //sorts the COO buffer and merges it into the compressed entries
+
+  unsigned int _nValues;                     //number of values per pixel (e.g. 16 for ToT)
+  std::vector<unsigned int> _cooKeys;        //not yet compressed entries, key = pixel index * _nValues + value
+  std::vector<unsigned int> _keys;           //compressed entries, sorted keys
+  std::vector<unsigned int> _counts;         //compressed entries, 32-bit counts
+  std::vector<unsigned int> _pixelPointer;   //CSR row pointer, the entries of pixel i are [_pixelPointer[i], _pixelPointer[i+1])
+  std::vector<unsigned int> _valueIndex;     //CSR column index = value of each entry
+};
+
+inline void SparsePixelHist::add(const unsigned int& rPixelIndex, const unsigned int& rValue)
+{
+  _cooKeys.push_back(rPixelIndex * _nValues + rValue);
+  if(_cooKeys.size() >= __MAX_SPARSE_BUFFER_SIZE)
+    compress();
+}
+
 class Histogram: public Basis
 {
 public:
@@ -22,6 +51,18 @@ public:
   void getRelBcidHist(unsigned int*& rRelBcidHist, bool copy = false);   //returns the relative BCID histogram for all hits
   void getTotPixelHist(unsigned short*& rTotPixelHist, bool copy = false); //returns the tot pixel histogram
   void getTdcPixelHist(unsigned short*& rTdcPixelHist, bool copy = false); //returns the tdc pixel histogram
+  void getTotPixelHistSparse(unsigned int*& rPixelPointer, unsigned int*& rValueIndex, unsigned int*& rCounts, unsigned int& rNentries); //returns the sparse tot pixel histogram in CSR format
+  void getTdcPixelHistSparse(unsigned int*& rPixelPointer, unsigned int*& rValueIndex, unsigned int*& rCounts, unsigned int& rNentries); //returns the sparse tdc pixel histogram in CSR format
+
+  //set histograms, e.g. to resume the histogramming; the scan parameters have to be set before
+  void setOccupancy(const unsigned int& rNparameterValues, unsigned int*& rOccupancy);  //sets the occupancy of the first rNparameterValues parameters, the other parameters are set to zero
+  void setTotHist(unsigned int*& rTotHist);
+  void setTdcHist(unsigned int*& rTdcHist);
+  void setRelBcidHist(unsigned int*& rRelBcidHist, const unsigned int& rNbins);  //the bins not given are set to zero
+  void setTotPixelHist(unsigned short*& rTotPixelHist);
+  void setTdcPixelHist(unsigned short*& rTdcPixelHist);
+  void setTotPixelHistSparse(unsigned int*& rPixelPointer, unsigned int*& rValueIndex, unsigned int*& rCounts, const unsigned int& rNentries);  //sets the sparse tot pixel histogram from the CSR format
+  void setTdcPixelHistSparse(unsigned int*& rPixelPointer, unsigned int*& rValueIndex, unsigned int*& rCounts, const unsigned int& rNentries);  //sets the sparse tdc pixel histogram from the CSR format
 
   //options set/get
   void createOccupancyHist(bool CreateOccHist = true);
@@ -30,10 +71,14 @@ public:
   void createTdcHist(bool CreateTdcHist = true);
   void createTdcPixelHist(bool CreateTdcPixelHist = true);
   void createTotPixelHist(bool CreateTotPixelHist = true);
+  void setSparsePixelHists(bool SparsePixelHists = true);  //fill the tot/tdc pixel histograms sparse with 32-bit counts instead of dense 16-bit arrays
   void setMaxTot(const unsigned int& rMaxTot);
+  void setOccupancyWindow(const unsigned int& rNslices);  //keep only rNslices parameter slices of the occupancy histogram in memory, 0 = all (standard), the hits have to be ordered by event number then
 
-  void addHits(HitInfo*& rHitInfo, const unsigned int& rNhits);
-  void addClusterSeedHits(ClusterInfo*& rClusterInfo, const unsigned int& rNcluster);
+  //the add functions return the number of added hits, this is less than the number of hits only if the occupancy window is full and finished parameters have to be taken out first
+  unsigned int addHits(HitInfo*& rHitInfo, const unsigned int& rNhits);
+  unsigned int addCompactHits(CompactHitInfo*& rCompactHitInfo, const unsigned int& rNhits);  //same as addHits for compact hits, the TDC histograms need the full hit info and cannot be created
+  unsigned int addClusterSeedHits(ClusterInfo*& rClusterInfo, const unsigned int& rNcluster);
   void addScanParameter(unsigned int*& rParInfo, const unsigned int& rNparInfoLength);
   void setNoScanParameter();
   void addMetaEventIndex(uint64_t*& rMetaEventIndex, const unsigned int& rNmetaEventIndexLength);
@@ -42,6 +87,11 @@ public:
 
   unsigned int getNparameters();  //returns the parameter range from _parInfo
 
+  //occupancy window functions, the finished parameter slices have to be taken out before the window is full
+  int getFinishedParameter(bool rAll = false);  //returns a parameter index with a finished occupancy slice in memory, -1 if there is none; if rAll is set any parameter in memory is returned (e.g. at the end of the data)
+  void getOccupancySlice(const unsigned int& rParIndex, unsigned int*& rOccupancySlice);  //returns the 80 x 336 occupancy slice of the parameter index
+  void releaseOccupancySlice(const unsigned int& rParIndex);  //frees the slot of the parameter index, no hits of this parameter are allowed afterwards
+
   void resetOccupancyArray();
   void resetTotArray();
   void resetTdcArray();
@@ -57,6 +107,11 @@ private:
   void setStandardSettings();
   void allocateOccupancyArray();
   void deleteOccupancyArray();
+  unsigned int getNoccupancySlices();  //number of parameter slices of the occupancy array in memory
+  unsigned int getOccupancySlot(const unsigned int& rParIndex);  //returns the occupancy slice index for the parameter index, assigns a free slice in window mode
+  bool isOccupancyWindowFull(const unsigned int& rParIndex);  //true if the parameter index needs a slice, no slice is free and a finished parameter can be taken out
+  bool isParameterFinished(const unsigned int& rParIndex);  //true if hits of the read out after the last read out with the parameter index were added
+  void resetOccupancyWindow();
   void allocateTotArray();
   void allocateTdcArray();
   void deleteTotArray();
@@ -73,17 +128,34 @@ private:
   unsigned int* _tdc;             //tdc histogram
   unsigned short* _tdcPixel;      //3d pixel tdc histogram  (in total 3d, linearly sorted via col, row, tdc value)
   unsigned short* _totPixel;      //3d pixel tot histogram  (in total 3d, linearly sorted via col, row, tot value)
+  SparsePixelHist _tdcPixelSparse;  //sparse pixel tdc histogram, used instead of _tdcPixel if _sparsePixelHists is set
+  SparsePixelHist _totPixelSparse;  //sparse pixel tot histogram, used instead of _totPixel if _sparsePixelHists is set
   unsigned int* _relBcid;         //realative BCID histogram
 
   unsigned int getParIndex(int64_t& rEventNumber);      //returns the parameter index for the given event number
+  void updateParameterRuns();                           //adds the new meta event index entries to the parameter runs used by getParIndex
+  void resetParameterRuns();
 
   unsigned int _nMetaEventIndexLength;//length of the meta data event index array
   uint64_t* _metaEventIndex;      	  //event index of meta data array
   unsigned int _nParInfoLength;       //length of the parInfo array
-  uint64_t _lastMetaEventIndex;   	  //for loop speed up
+
+  std::vector<uint64_t> _parRunStartEvent;   //first event number of each run of read outs with the same parameter index, sorted ascending
+  std::vector<unsigned int> _parRunIndex;    //parameter index of each run
+  unsigned int _nMetaEventIndexMapped;       //number of meta event index entries already added to the runs
+  bool _parRunsLimited;                      //true if there are more meta event index entries than parInfo entries
+  uint64_t _parRunsStopEvent;                //first event number without parInfo entry, only used if _parRunsLimited
 
   unsigned int _NparameterValues;     //needed for _occupancy histogram allocation
 
+  unsigned int _occupancyWindow;             //number of parameter slices kept in memory, 0 = all
+  std::vector<int> _occupancySlot;           //slice index of each parameter index, -1 if not in memory
+  std::vector<int> _slotParameter;           //parameter index of each slice, -1 if the slice is free
+  std::vector<unsigned int> _freeSlots;      //not used slices
+  std::vector<bool> _parameterReleased;      //true if the slice of the parameter index was released
+  std::vector<unsigned int> _parLastReadout; //last read out (meta event index entry) of each parameter index
+  int64_t _lastEventNumber;                  //largest event number of the added hits, hits are ordered by event number in window mode
+
   std::map<unsigned int, unsigned int> _parameterValues; //different parameter values used in ParInfo, key = parameter value, value = index
 
   //config variables
@@ -93,6 +165,7 @@ private:
   bool _createTdcHist;
   bool _createTdcPixelHist;
   bool _createTotPixelHist;
+  bool _sparsePixelHists;
   unsigned int _maxTot;               //maximum ToT value (inclusive) considered to be a hit
   
   unsigned int* _parInfo;
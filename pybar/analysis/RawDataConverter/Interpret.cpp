@@ -5,6 +5,7 @@ Interpret::Interpret(void)
 	setSourceFileName("Interpret");
 	setStandardSettings();
 	allocateHitArray();
+	allocateEventArray();
 	allocateHitBufferArray();
 	allocateTriggerErrorCounterArray();
 	allocateErrorCounterArray();
@@ -17,6 +18,7 @@ Interpret::~Interpret(void)
 {
 	debug("~Interpret(void): destructor called");
 	deleteHitArray();
+	deleteEventArray();
 	deleteHitBufferArray();
 	deleteTriggerErrorCounterArray();
 	deleteErrorCounterArray();
@@ -30,6 +32,13 @@ void Interpret::setStandardSettings()
 	_hitInfoSize = 1000000;
 	_hitInfo = 0;
 	_hitIndex = 0;
+	_maxHitIndex = 0;
+	_compactHitInfo = 0;
+	_eventInfoSize = 100000;
+	_eventInfo = 0;
+	_eventIndex = 0;
+	_createCompactHits = false;
+	_createEventInfoArray = false;
 	_NbCID = 16;
 	_maxTot = 13;
 	_fEI4B = false;
@@ -60,6 +69,7 @@ bool Interpret::interpretRawData(unsigned int* pDataWords, const unsigned int& p
 		debug(tDebug.str());
 	}
 	_hitIndex = 0;
+	_eventIndex = 0;
 	_actualMetaWordIndex = 0;
 
 	int tActualCol1 = 0;				//column position of the first hit in the actual data record
@@ -336,6 +346,26 @@ void Interpret::getHits(HitInfo*& rHitInfo, unsigned int& rSize, bool copy)
 	rSize = _hitIndex;
 }
 
+void Interpret::getCompactHits(CompactHitInfo*& rCompactHitInfo, unsigned int& rSize, bool copy)
+{
+	debug("getCompactHits(...)");
+	if (copy)
+		std::copy(_compactHitInfo, _compactHitInfo + _hitIndex, rCompactHitInfo);
+	else
+		rCompactHitInfo = _compactHitInfo;
+	rSize = _hitIndex;
+}
+
+void Interpret::getEvents(EventInfo*& rEventInfo, unsigned int& rSize, bool copy)
+{
+	debug("getEvents(...)");
+	if (copy)
+		std::copy(_eventInfo, _eventInfo + _eventIndex, rEventInfo);
+	else
+		rEventInfo = _eventInfo;
+	rSize = _eventIndex;
+}
+
 void Interpret::setHitsArraySize(const unsigned int &rSize)
 {
 	info("setHitsArraySize(...) with size " + IntToStr(rSize));
@@ -417,6 +447,24 @@ void Interpret::createEmptyEventHits(bool CreateEmptyEventHits)
 	_createEmptyEventHits = CreateEmptyEventHits;
 }
 
+void Interpret::createCompactHits(bool CreateCompactHits)
+{
+	debug("createCompactHits");
+	if (_createCompactHits == CreateCompactHits)
+		return;
+	deleteHitArray();
+	_createCompactHits = CreateCompactHits;
+	_hitIndex = 0;
+	_eventIndex = 0;
+	allocateHitArray();
+}
+
+void Interpret::createEventInfoArray(bool CreateEventInfoArray)
+{
+	debug("createEventInfoArray");
+	_createEventInfoArray = CreateEventInfoArray;
+}
+
 void Interpret::setNbCIDs(const unsigned int& NbCIDs)
 {
 	_NbCID = NbCIDs;
@@ -505,6 +553,134 @@ void Interpret::getTriggerErrorCounters(unsigned int*& rTriggerErrorCounter, uns
 	rNTriggerErrorCounters = __TRG_N_ERROR_CODES;
 }
 
+void Interpret::setServiceRecordsCounters(unsigned int*& rServiceRecordsCounter, const unsigned int& rNserviceRecords)
+{
+	debug("setServiceRecordsCounters(...)");
+	if (rNserviceRecords != __NSERVICERECORDS)
+		throw std::out_of_range("Service record counter array has the wrong size.");
+	std::copy(rServiceRecordsCounter, rServiceRecordsCounter + __NSERVICERECORDS, _serviceRecordCounter);
+}
+
+void Interpret::setErrorCounters(unsigned int*& rErrorCounter, const unsigned int& rNerrorCounters)
+{
+	debug("setErrorCounters(...)");
+	if (rNerrorCounters != __N_ERROR_CODES)
+		throw std::out_of_range("Error counter array has the wrong size.");
+	std::copy(rErrorCounter, rErrorCounter + __N_ERROR_CODES, _errorCounter);
+}
+
+void Interpret::setTriggerErrorCounters(unsigned int*& rTriggerErrorCounter, const unsigned int& rNTriggerErrorCounters)
+{
+	debug("setTriggerErrorCounters(...)");
+	if (rNTriggerErrorCounters != __TRG_N_ERROR_CODES)
+		throw std::out_of_range("Trigger error counter array has the wrong size.");
+	std::copy(rTriggerErrorCounter, rTriggerErrorCounter + __TRG_N_ERROR_CODES, _triggerErrorCounter);
+}
+
+void Interpret::setTdcCounters(unsigned int*& rTdcCounter, const unsigned int& rNtdcCounters)
+{
+	debug("setTdcCounters(...)");
+	if (rNtdcCounters != __N_TDC_VALUES)
+		throw std::out_of_range("TDC counter array has the wrong size.");
+	std::copy(rTdcCounter, rTdcCounter + __N_TDC_VALUES, _tdcCounter);
+}
+
+void Interpret::getState(InterpreterState& rState)
+{
+	debug("getState(...)");
+	rState.nEvents = _nEvents;
+	rState.nHits = _nHits;
+	rState.nDataWords = _nDataWords;
+	rState.nTriggers = _nTriggers;
+	rState.nMaxHitsPerEvent = _nMaxHitsPerEvent;
+	rState.nEmptyEvents = _nEmptyEvents;
+	rState.nIncompleteEvents = _nIncompleteEvents;
+	rState.nTDCWords = _nTDCWords;
+	rState.nUnknownWords = _nUnknownWords;
+	rState.nOtherWords = _nOtherWords;
+	rState.nServiceRecords = _nServiceRecords;
+	rState.nDataRecords = _nDataRecords;
+	rState.nDataHeaders = _nDataHeaders;
+	rState.firstTriggerNrSet = _firstTriggerNrSet;
+	rState.firstTdcSet = _firstTdcSet;
+	rState.lastTriggerNumber = _lastTriggerNumber;
+	rState.startWordIndex = _startWordIndex;
+	rState.dataWordIndex = _dataWordIndex;
+	rState.lastMetaIndexNotSet = _lastMetaIndexNotSet;
+	rState.lastWordIndexSet = _lastWordIndexSet;
+	rState.eventNdataHeader = tNdataHeader;
+	rState.eventNdataRecord = tNdataRecord;
+	rState.eventStartBCID = tStartBCID;
+	rState.eventStartLVL1ID = tStartLVL1ID;
+	rState.eventDbCID = tDbCID;
+	rState.eventTriggerError = tTriggerError;
+	rState.eventErrorCode = tErrorCode;
+	rState.eventServiceRecord = tServiceRecord;
+	rState.eventTriggerNumber = tEventTriggerNumber;
+	rState.eventTotalHits = tTotalHits;
+	rState.eventBCIDerror = tBCIDerror;
+	rState.eventTriggerWord = tTriggerWord;
+	rState.eventTdcCount = tTdcCount;
+	rState.eventTdcTimeStamp = tTdcTimeStamp;
+	rState.triggerNumber = tTriggerNumber;
+}
+
+void Interpret::setState(const InterpreterState& rState)
+{
+	debug("setState(...)");
+	_nEvents = rState.nEvents;
+	_nHits = rState.nHits;
+	_nDataWords = rState.nDataWords;
+	_nTriggers = rState.nTriggers;
+	_nMaxHitsPerEvent = rState.nMaxHitsPerEvent;
+	_nEmptyEvents = rState.nEmptyEvents;
+	_nIncompleteEvents = rState.nIncompleteEvents;
+	_nTDCWords = rState.nTDCWords;
+	_nUnknownWords = rState.nUnknownWords;
+	_nOtherWords = rState.nOtherWords;
+	_nServiceRecords = rState.nServiceRecords;
+	_nDataRecords = rState.nDataRecords;
+	_nDataHeaders = rState.nDataHeaders;
+	_firstTriggerNrSet = rState.firstTriggerNrSet != 0;
+	_firstTdcSet = rState.firstTdcSet != 0;
+	_lastTriggerNumber = rState.lastTriggerNumber;
+	_startWordIndex = rState.startWordIndex;
+	_dataWordIndex = rState.dataWordIndex;
+	_lastMetaIndexNotSet = rState.lastMetaIndexNotSet;
+	_lastWordIndexSet = rState.lastWordIndexSet;
+	tNdataHeader = rState.eventNdataHeader;
+	tNdataRecord = rState.eventNdataRecord;
+	tStartBCID = rState.eventStartBCID;
+	tStartLVL1ID = rState.eventStartLVL1ID;
+	tDbCID = rState.eventDbCID;
+	tTriggerError = rState.eventTriggerError;
+	tErrorCode = rState.eventErrorCode;
+	tServiceRecord = rState.eventServiceRecord;
+	tEventTriggerNumber = rState.eventTriggerNumber;
+	tTotalHits = rState.eventTotalHits;
+	tBCIDerror = rState.eventBCIDerror != 0;
+	tTriggerWord = rState.eventTriggerWord;
+	tTdcCount = rState.eventTdcCount;
+	tTdcTimeStamp = rState.eventTdcTimeStamp;
+	tTriggerNumber = rState.triggerNumber;
+}
+
+void Interpret::getHitBuffer(HitInfo*& rHitBuffer, unsigned int& rSize)
+{
+	debug("getHitBuffer(...)");
+	rHitBuffer = _hitBuffer;
+	rSize = tHitBufferIndex;
+}
+
+void Interpret::setHitBuffer(HitInfo*& rHitBuffer, const unsigned int& rSize)
+{
+	debug("setHitBuffer(...)");
+	if (rSize > __MAXHITBUFFERSIZE)
+		throw std::out_of_range("Hit buffer array is too small.");
+	std::copy(rHitBuffer, rHitBuffer + rSize, _hitBuffer);
+	tHitBufferIndex = rSize;
+}
+
 unsigned int Interpret::getNwords()
 {
 	return _nDataWords;
@@ -603,7 +779,7 @@ void Interpret::printStatus()
 
 void Interpret::printHits(const unsigned int& pNhits)
 {
-	if (pNhits > _hitInfoSize)
+	if (pNhits > _hitInfoSize || _hitInfo == 0)
 		return;
 	std::cout << "Event\tRelBCID\tTrigger\tLVL1ID\tCol\tRow\tTot\tBCID\tSR\tEventStatus\n";
 	for (unsigned int i = 0; i < pNhits; ++i)
@@ -627,6 +803,7 @@ void Interpret::reset()
 	info("reset()");
 	resetCounters();
 	resetEventVariables();
+	_maxHitIndex = 0;
 	_lastMetaIndexNotSet = 0;
 	_lastWordIndexSet = 0;
 	_metaEventIndexLength = 0;
@@ -673,20 +850,22 @@ void Interpret::addHit(const unsigned char& pRelBCID, const unsigned short int&
 void Interpret::storeHit(HitInfo& rHit)
 {
 	_nHits++;
-	if (_hitIndex < _hitInfoSize) {
-		if (_hitInfo != 0) {
-			_hitInfo[_hitIndex] = rHit;
-			_hitIndex++;
-		}
-		else {
-			throw std::runtime_error("Output hit array not set.");
-		}
-	}
-	else {
-		if (Basis::errorSet())
-			error("storeHit: _hitIndex = " + IntToStr(_hitIndex), __LINE__);
-		throw std::out_of_range("Hit index out of range.");
+	if (_hitInfo == 0 && _compactHitInfo == 0)
+		throw std::runtime_error("Output hit array not set.");
+	if (_hitIndex >= _hitInfoSize)
+		growHitArray();
+	if (_createCompactHits) {
+		_compactHitInfo[_hitIndex].eventNumber = rHit.eventNumber;
+		_compactHitInfo[_hitIndex].column = rHit.column;
+		_compactHitInfo[_hitIndex].row = rHit.row;
+		_compactHitInfo[_hitIndex].tot = rHit.tot;
+		_compactHitInfo[_hitIndex].relativeBCID = rHit.relativeBCID;
 	}
+	else
+		_hitInfo[_hitIndex] = rHit;
+	_hitIndex++;
+	if (_hitIndex > _maxHitIndex)
+		_maxHitIndex = _hitIndex;
 }
 
 void Interpret::addEvent()
@@ -700,7 +879,8 @@ void Interpret::addEvent()
 		_nEmptyEvents++;
 		if (_createEmptyEventHits) {
 			addEventErrorCode(__NO_HIT);
-			addHit(0, 0, 0, 0, 0, 0);
+			if (!_createCompactHits)  // empty events are already part of the event array
+				addHit(0, 0, 0, 0, 0, 0);
 		}
 	}
 	if (tTriggerWord == 0) {
@@ -716,7 +896,10 @@ void Interpret::addEvent()
 	if (_useTdcTriggerTimeStamp && tTdcTimeStamp >= 254)
 		addEventErrorCode(__TDC_OVERFLOW);
 
+	uint64_t tStartHitIndex = _nHits;
 	storeEventHits();
+	if (_createEventInfoArray || _createCompactHits)
+		storeEvent(tStartHitIndex);
 	if (tTotalHits > _nMaxHitsPerEvent)
 		_nMaxHitsPerEvent = tTotalHits;
 	histogramTriggerErrorCode();
@@ -749,6 +932,24 @@ void Interpret::storeEventHits()
 	}
 }
 
+void Interpret::storeEvent(const uint64_t& rStartHitIndex)
+{
+	if (_eventInfo == 0)
+		throw std::runtime_error("Output event array not set.");
+	if (_eventIndex >= _eventInfoSize)
+		growEventArray();
+	_eventInfo[_eventIndex].eventNumber = _nEvents;
+	_eventInfo[_eventIndex].triggerNumber = tEventTriggerNumber;
+	_eventInfo[_eventIndex].TDC = tTdcCount;
+	_eventInfo[_eventIndex].TDCtimeStamp = tTdcTimeStamp;
+	_eventInfo[_eventIndex].triggerStatus = tTriggerError;
+	_eventInfo[_eventIndex].serviceRecord = tServiceRecord;
+	_eventInfo[_eventIndex].eventStatus = tErrorCode;
+	_eventInfo[_eventIndex].startHitIndex = rStartHitIndex;
+	_eventInfo[_eventIndex].stopHitIndex = _nHits;
+	_eventIndex++;
+}
+
 void Interpret::correlateMetaWordIndex(const uint64_t& pEventNumer, const unsigned int& pDataWordIndex)
 {
 	if (_metaDataSet && pDataWordIndex == _lastWordIndexSet) { // this check is to speed up the _metaEventIndex access by using the fact that the index has to increase for consecutive events
@@ -1021,20 +1222,92 @@ void Interpret::allocateHitArray()
 {
 	debug(std::string("allocateHitArray()"));
 	try {
-		_hitInfo = new HitInfo[_hitInfoSize];
+		if (_createCompactHits)
+			_compactHitInfo = new CompactHitInfo[_hitInfoSize];
+		else
+			_hitInfo = new HitInfo[_hitInfoSize];
 	} catch (std::bad_alloc& exception) {
 		error(std::string("allocateHitArray(): ") + std::string(exception.what()));
 		throw;
 	}
 }
 
+void Interpret::growHitArray()
+{
+	if (_hitInfoSize >= std::numeric_limits<unsigned int>::max() / 2)
+		throw std::out_of_range("Hit index out of range.");
+	unsigned int tNewSize = (_hitInfoSize > 0) ? 2 * _hitInfoSize : 1000;
+	info("growHitArray(): increase hit array size from " + IntToStr(_hitInfoSize) + " to " + IntToStr(tNewSize));
+	try {
+		if (_createCompactHits) {
+			CompactHitInfo* tCompactHitInfo = new CompactHitInfo[tNewSize];
+			std::copy(_compactHitInfo, _compactHitInfo + _hitIndex, tCompactHitInfo);
+			delete[] _compactHitInfo;
+			_compactHitInfo = tCompactHitInfo;
+		}
+		else {
+			HitInfo* tHitInfo = new HitInfo[tNewSize];
+			std::copy(_hitInfo, _hitInfo + _hitIndex, tHitInfo);
+			delete[] _hitInfo;
+			_hitInfo = tHitInfo;
+		}
+	} catch (std::bad_alloc& exception) {
+		error(std::string("growHitArray(): ") + std::string(exception.what()));
+		throw;
+	}
+	_hitInfoSize = tNewSize;
+}
+
 void Interpret::deleteHitArray()
 {
 	debug(std::string("deleteHitArray()"));
-	if (_hitInfo == 0)
+	if (_hitInfo != 0) {
+		delete[] _hitInfo;
+		_hitInfo = 0;
+	}
+	if (_compactHitInfo != 0) {
+		delete[] _compactHitInfo;
+		_compactHitInfo = 0;
+	}
+}
+
+void Interpret::allocateEventArray()
+{
+	debug(std::string("allocateEventArray()"));
+	try {
+		_eventInfo = new EventInfo[_eventInfoSize];
+	} catch (std::bad_alloc& exception) {
+		error(std::string("allocateEventArray(): ") + std::string(exception.what()));
+		throw;
+	}
+}
+
+void Interpret::growEventArray()
+{
+	if (_eventInfoSize >= std::numeric_limits<unsigned int>::max() / 2)
+		throw std::out_of_range("Event index out of range.");
+	unsigned int tNewSize = (_eventInfoSize > 0) ? 2 * _eventInfoSize : 1000;
+	info("growEventArray(): increase event array size from " + IntToStr(_eventInfoSize) + " to " + IntToStr(tNewSize));
+	EventInfo* tEventInfo = 0;
+	try {
+		tEventInfo = new EventInfo[tNewSize];
+	} catch (std::bad_alloc& exception) {
+		error(std::string("growEventArray(): ") + std::string(exception.what()));
+		throw;
+	}
+	std::copy(_eventInfo, _eventInfo + _eventIndex, tEventInfo);
+	delete[] _eventInfo;
+	_eventInfo = tEventInfo;
+	_eventInfoSize = tNewSize;
+}
+
+void Interpret::deleteEventArray()
+{
+	debug(std::string("deleteEventArray()"));
+	if (_eventInfo == 0)
 		return;
-	delete[] _hitInfo;
-	_hitInfo = 0;
+	delete[] _eventInfo;
+	_eventInfo = 0;
 }
 
 void Interpret::allocateHitBufferArray()
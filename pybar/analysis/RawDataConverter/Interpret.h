@@ -22,6 +22,8 @@ public:
 	bool setMetaData(MetaInfo* &rMetaInfo, const unsigned int& tLength);         	  //sets the meta words for word number/event correlation
 	bool setMetaDataV2(MetaInfoV2* &rMetaInfo, const unsigned int& tLength);       	  //sets the meta words for word number/event correlation
 	void getHits(HitInfo*& rHitInfo, unsigned int& rSize, bool copy = false);    	  //returns the hit histogram
+	void getCompactHits(CompactHitInfo*& rCompactHitInfo, unsigned int& rSize, bool copy = false);  //returns the compact hits, only filled if compact hits are created
+	void getEvents(EventInfo*& rEventInfo, unsigned int& rSize, bool copy = false);  //returns the events of the actual interpreted raw data, only filled if the event array or compact hits are created
 
 	//set arrays to be filled
 	void setMetaDataEventIndex(uint64_t*& rEventNumber, const unsigned int& rSize);  //set the meta event index array to be filled
@@ -29,6 +31,9 @@ public:
 
 	//array info get functions
 	unsigned int getNarrayHits(){return _hitIndex;};								  // the number of hits of the actual interpreted raw data
+	unsigned int getMaxNarrayHits(){return _maxHitIndex;};							  // the maximum number of hits stored in the hit array for one interpretRawData call (high-water mark)
+	unsigned int getHitsArraySize(){return _hitInfoSize;};							  // the actual size of the hit array, grows if needed
+	unsigned int getNarrayEvents(){return _eventIndex;};							  // the number of events of the actual interpreted raw data
 	unsigned int getNmetaDataEvent(){return _lastMetaIndexNotSet;};				  	  // the filled length of the array storing the event number per read out
 	unsigned int getNmetaDataWord(){return _actualMetaWordIndex;};
 
@@ -37,9 +42,12 @@ public:
 	void resetEventVariables();											              //resets event variables before starting new event
 
 	//analysis options
-	void setHitsArraySize(const unsigned int &rSize);   			  //set the siye of the hit array, has to be able to hold hits of one event
+	void setHitsArraySize(const unsigned int &rSize);   			  //set the initial size of the hit array, the array grows automatically if more hits have to be stored
 	void createEmptyEventHits(bool CreateEmptyEventHits = true);  //create hits that are virtual hits (not real hits) for debugging, thus event no hit events will show up in the hit table
 	void createMetaDataWordIndex(bool CreateMetaDataWordIndex = true);
+	void createCompactHits(bool CreateCompactHits = true);  //store the hits in the compact format (CompactHitInfo) and the event information once per event (EventInfo)
+	bool getCreateCompactHits(){return _createCompactHits;};  //returns true if the hits are stored in the compact format
+	void createEventInfoArray(bool CreateEventInfoArray = true);  //store the event information with the hit index range once per event (EventInfo), always done for compact hits
 	void setNbCIDs(const unsigned int& NbCIDs);				  //set the number of BCIDs with hits for the actual trigger
 	void setMaxTot(const unsigned int& rMaxTot);			  //sets the maximum tot code that is considered to be a hit
 	void setFEI4B(bool pIsFEI4B = true){_fEI4B = pIsFEI4B;};  //set the FE flavor to be able to read the raw data correctly
@@ -59,7 +67,19 @@ public:
 	void getErrorCounters(unsigned int*& rErrorCounter, unsigned int &rNerrorCounters, bool copy = false);                      //returns the total errors counter array
 	void getTriggerErrorCounters(unsigned int*& rTriggerErrorCounter, unsigned int &rNTriggerErrorCounters, bool copy = false); //returns the total trigger errors counter array
 	void getTdcCounters(unsigned int*& rTdcCounter, unsigned int& rNtdcCounters, bool copy = false); //returns the TDC counter array
-	unsigned int getNhits(){return _nHits;};                 //returns the total numbers of hits found (global counter)
+
+	//set function of global counters, needed to resume the interpretation
+	void setServiceRecordsCounters(unsigned int*& rServiceRecordsCounter, const unsigned int& rNserviceRecords);
+	void setErrorCounters(unsigned int*& rErrorCounter, const unsigned int& rNerrorCounters);
+	void setTriggerErrorCounters(unsigned int*& rTriggerErrorCounter, const unsigned int& rNTriggerErrorCounters);
+	void setTdcCounters(unsigned int*& rTdcCounter, const unsigned int& rNtdcCounters);
+
+	//get/set the state of the interpretation (counters, variables and buffered hits of the not finished event), needed to resume the interpretation
+	void getState(InterpreterState& rState);
+	void setState(const InterpreterState& rState);
+	void getHitBuffer(HitInfo*& rHitBuffer, unsigned int& rSize);  //returns the buffered hits of the not finished event
+	void setHitBuffer(HitInfo*& rHitBuffer, const unsigned int& rSize);  //sets the buffered hits of the not finished event
+	uint64_t getNhits(){return _nHits;};                 //returns the total numbers of hits found (global counter)
 	unsigned int getNwords();                                //returns the total numbers of words analyzed (global counter)
 	unsigned int getNunknownWords(){return _nUnknownWords;}; //returns the total numbers of unknown words found (global counter)
 	uint64_t getNevents(){return _nEvents;};             	 //returns the total numbers of events analyzed (global counter)
@@ -82,6 +102,7 @@ private:
 	void addHit(const unsigned char& pRelBCID, const unsigned short int& pLVLID, const unsigned char& pColumn, const unsigned short int& pRow, const unsigned char& pTot, const unsigned short int& pBCID); //adds the hit to the event hits array _hitBuffer
 	void storeHit(HitInfo& rHit);	//stores the hit into the output hit array _hitInfo
 	void storeEventHits();          //adds the hits of the actual event to _hitInfo
+	void storeEvent(const uint64_t& rStartHitIndex);  //adds the actual event info to _eventInfo, rStartHitIndex is the index of the first event hit
 	void correlateMetaWordIndex(const uint64_t& pEventNumer, const unsigned int& pDataWordIndex);  //writes the event number for the meta data
 
 	//SRAM word check and interpreting methods
@@ -106,7 +127,11 @@ private:
 	//memory allocation/initialization
 	void setStandardSettings();
 	void allocateHitArray();
+	void growHitArray();			//doubles the size of the hit array, the already stored hits are kept
 	void deleteHitArray();
+	void allocateEventArray();
+	void growEventArray();			//doubles the size of the event array, the already stored events are kept
+	void deleteEventArray();
 	void allocateHitBufferArray();
 	void deleteHitBufferArray();
 	void allocateTriggerErrorCounterArray();
@@ -128,7 +153,12 @@ private:
 	//array variables for interpreted information
 	unsigned int _hitInfoSize;				  //size of the _hitInfo array
 	unsigned int _hitIndex;                   //max index of _hitInfo filled
+	unsigned int _maxHitIndex;                //maximum of _hitIndex since the last reset (high-water mark)
 	HitInfo* _hitInfo;                        //holds the actual interpreted hits
+	CompactHitInfo* _compactHitInfo;          //holds the actual interpreted hits in the compact format, used instead of _hitInfo if _createCompactHits is set
+	unsigned int _eventInfoSize;			  //size of the _eventInfo array
+	unsigned int _eventIndex;                 //max index of _eventInfo filled
+	EventInfo* _eventInfo;                    //holds the actual interpreted events
 
 	//array variables for the hit events buffer
 	unsigned int tHitBufferIndex;             //index for the buffer hit info array
@@ -179,7 +209,7 @@ private:
 	unsigned int _nServiceRecords;				//total number of service records found
 	unsigned int _nDataRecords;					//total number of data records found
 	unsigned int _nDataHeaders;					//total number of data headers found
-	unsigned int _nHits;						//total number of hits found
+	uint64_t _nHits;						//total number of hits found
 	unsigned int _nDataWords;					//total number of data words
 	bool _firstTriggerNrSet;                    //true if the first trigger was found
 	bool _firstTdcSet;                    		//true if the first tdc word was found
@@ -197,6 +227,8 @@ private:
 	unsigned int _metaWordIndexLength;		  //length of the word number array
 	unsigned int _actualMetaWordIndex;		  //counter for the actual meta word array index
 	bool _createEmptyEventHits;				  //true if empty event virtual hits are created
+	bool _createCompactHits;				  //true if the hits are stored in the compact format together with the event array
+	bool _createEventInfoArray;				  //true if the event array is filled
 	bool _createMetaDataWordIndex;			  //true if word index has to be set
 	bool _isMetaTableV2;                      //set to true if using MetaInfoV2 table
 
@@ -4,7 +4,7 @@
 import numpy as np
 cimport numpy as cnp
 from libcpp cimport bool as cpp_bool  # to be able to use bool variables, as cpp_bool according to http://code.google.com/p/cefpython/source/browse/cefpython/cefpython.pyx?spec=svne037c69837fa39ae220806c2faa1bbb6ae4500b9&r=e037c69837fa39ae220806c2faa1bbb6ae4500b9
-from data_struct cimport numpy_hit_info, numpy_cluster_hit_info, numpy_cluster_info
+from data_struct cimport numpy_hit_info, numpy_compact_hit_info, numpy_cluster_hit_info, numpy_cluster_info
 
 cnp.import_array()  # if array is used it has to be imported, otherwise possible runtime error
 
@@ -15,6 +15,8 @@ cdef extern from "Basis.h":
 cdef extern from "Clusterizer.h":
     cdef cppclass HitInfo:
         HitInfo()
+    cdef cppclass CompactHitInfo:
+        CompactHitInfo()
     cdef cppclass ClusterHitInfo:
         ClusterHitInfo()
     cdef cppclass ClusterInfo:
@@ -26,7 +28,8 @@ cdef extern from "Clusterizer.h":
         void setInfoOutput(cpp_bool pToggle)
         void setDebugOutput(cpp_bool pToggle)
 
-        void addHits(HitInfo *& rHitInfo, const unsigned int & rNhits) except +
+        void addHits(HitInfo *& rHitInfo, const unsigned int & rNhits) nogil except +
+        void addCompactHits(CompactHitInfo *& rCompactHitInfo, const unsigned int & rNhits) nogil except +
         void getHitCluster(ClusterHitInfo*& rClusterHitInfo, unsigned int& rSize, cpp_bool copy)
         void getCluster(ClusterInfo*& rClusterHitInfo, unsigned int& rSize, cpp_bool copy)
 
@@ -44,13 +47,24 @@ cdef extern from "Clusterizer.h":
         void setMaxClusterHitTot(const unsigned int & pMaxClusterHitTot)
 
         void setMaxHitTot(const unsigned int & pMaxHitTot)
+        void setChargeCalibration(const float* rChargeCalibration, const unsigned int& rNtot) except +
+        void setSparseClustering(cpp_bool toggle)
+        void copySettings(Clusterizer& rClusterizer)
 
         void getClusterSizeHist(unsigned int & rNparameterValues, unsigned int *& rClusterSize, cpp_bool copy)
         void getClusterTotHist(unsigned int & rNparameterValues, unsigned int *& rClusterTot, cpp_bool copy)
+        void getClusterChargeHist(unsigned int & rNparameterValues, unsigned int *& rClusterCharge, cpp_bool copy)
+        void setClusterSizeHist(unsigned int *& rClusterSize)
+        void setClusterTotHist(unsigned int *& rClusterTot)
+        void setClusterChargeHist(unsigned int *& rClusterCharge)
 
         # void clusterize()
 
         unsigned int getNclusters()
+        unsigned int getMaxNclusterHits()
+        unsigned int getMaxNclusters()
+        size_t getClusterHitInfoArraySize()
+        size_t getClusterInfoArraySize()
 
         void reset()
         void test()
@@ -91,8 +105,21 @@ cdef class PyDataClusterizer:
         self.thisptr.setWarningOutput(< cpp_bool > toggle)
     def set_error_output(self, toggle):
         self.thisptr.setErrorOutput(< cpp_bool > toggle)
-    def add_hits(self, cnp.ndarray[numpy_hit_info, ndim=1] hit_info):
-        self.thisptr.addHits(< HitInfo *&> hit_info.data, < unsigned int > hit_info.shape[0])
+    def add_hits(self, cnp.ndarray hit_info):  # hits in the full or in the compact format
+        if hit_info.dtype.itemsize == sizeof(CompactHitInfo):
+            self.add_compact_hits(hit_info)
+        else:
+            self.add_full_hits(hit_info)
+    def add_full_hits(self, cnp.ndarray[numpy_hit_info, ndim=1] hit_info):
+        cdef HitInfo* hits = <HitInfo*> hit_info.data
+        cdef unsigned int n_hits = <unsigned int> hit_info.shape[0]
+        with nogil:
+            self.thisptr.addHits(hits, n_hits)
+    def add_compact_hits(self, cnp.ndarray[numpy_compact_hit_info, ndim=1] hit_info):
+        cdef CompactHitInfo* hits = <CompactHitInfo*> hit_info.data
+        cdef unsigned int n_hits = <unsigned int> hit_info.shape[0]
+        with nogil:
+            self.thisptr.addCompactHits(hits, n_hits)
     def get_hit_cluster(self):
         self.thisptr.getHitCluster(<ClusterHitInfo*&> cluster_hits, <unsigned int&> size, <cpp_bool> False)
         if cluster_hits != NULL:
@@ -125,6 +152,16 @@ cdef class PyDataClusterizer:
         self.thisptr.setMaxClusterHitTot(< const unsigned int &> value)
     def set_max_tot(self, value):
         self.thisptr.setMaxHitTot(<const unsigned int &> value)
+    def set_charge_calibration(self, calibration):  # per pixel ToT to charge lookup table with the shape (column, row, ToT), e.g. from analysis_utils.get_tot_charge_calibration
+        cdef cnp.ndarray[cnp.float32_t, ndim=3, mode="fortran"] charge_calibration = np.asfortranarray(calibration, dtype=np.float32)  # column index changes fastest like in the c++ lookup table
+        if charge_calibration.shape[0] != 80 or charge_calibration.shape[1] != 336:
+            raise ValueError('The charge calibration has to have the shape (80, 336, n_tot)')
+        cdef unsigned int n_tot = <unsigned int> charge_calibration.shape[2]
+        self.thisptr.setChargeCalibration(<const float*> charge_calibration.data, n_tot)
+    def set_sparse_clustering(self, value=True):  # find the cluster seeds in the sorted hits of the event instead of the hit map area, same result but independent of the event area
+        self.thisptr.setSparseClustering(<cpp_bool> value)
+    def copy_settings(self, PyDataClusterizer clusterizer):  # takes the cluster settings, the charge calibration and the output settings of the given clusterizer, the array settings are kept
+        self.thisptr.copySettings(clusterizer.thisptr[0])
     def get_cluster_size_hist(self):
         self.thisptr.getClusterSizeHist(< unsigned int &> size, < unsigned int *&> data_32, < cpp_bool > False)
         if data_32 != NULL:
@@ -134,8 +171,36 @@ cdef class PyDataClusterizer:
         if data_32 != NULL:
             array = data_to_numpy_array_uint32(data_32, size)
             return array.reshape((128, 1024), order='F')  # make linear array to 3d array (col,row,parameter)
+    def get_cluster_charge_hist(self):
+        self.thisptr.getClusterChargeHist(< unsigned int &> size, < unsigned int *&> data_32, < cpp_bool > False)
+        if data_32 != NULL:
+            array = data_to_numpy_array_uint32(data_32, size)
+            return array.reshape((4096, 1024), order='F')  # make linear array to 2d array (charge, cluster size)
+    def set_cluster_size_hist(self, hist):  # the histograms have the shape of the get functions, e.g. to resume the clustering
+        cdef cnp.ndarray[cnp.uint32_t, ndim=1] cluster_size_hist = np.ascontiguousarray(hist, dtype=np.uint32)
+        if cluster_size_hist.shape[0] != 1024:
+            raise ValueError('The cluster size histogram has to have the shape (1024, )')
+        self.thisptr.setClusterSizeHist(< unsigned int *&> cluster_size_hist.data)
+    def set_cluster_tot_hist(self, hist):
+        cdef cnp.ndarray[cnp.uint32_t, ndim=2, mode="fortran"] cluster_tot_hist = np.asfortranarray(hist, dtype=np.uint32)
+        if cluster_tot_hist.shape[0] != 128 or cluster_tot_hist.shape[1] != 1024:
+            raise ValueError('The cluster ToT histogram has to have the shape (128, 1024)')
+        self.thisptr.setClusterTotHist(< unsigned int *&> cluster_tot_hist.data)
+    def set_cluster_charge_hist(self, hist):
+        cdef cnp.ndarray[cnp.uint32_t, ndim=2, mode="fortran"] cluster_charge_hist = np.asfortranarray(hist, dtype=np.uint32)
+        if cluster_charge_hist.shape[0] != 4096 or cluster_charge_hist.shape[1] != 1024:
+            raise ValueError('The cluster charge histogram has to have the shape (4096, 1024)')
+        self.thisptr.setClusterChargeHist(< unsigned int *&> cluster_charge_hist.data)
     def get_n_clusters(self):
         return < unsigned int > self.thisptr.getNclusters()
+    def get_max_n_cluster_hits(self):
+        return < unsigned int > self.thisptr.getMaxNclusterHits()
+    def get_max_n_clusters(self):
+        return < unsigned int > self.thisptr.getMaxNclusters()
+    def get_cluster_hit_info_array_size(self):
+        return self.thisptr.getClusterHitInfoArraySize()
+    def get_cluster_info_array_size(self):
+        return self.thisptr.getClusterInfoArraySize()
     def reset(self):
         self.thisptr.reset()
     def test(self):
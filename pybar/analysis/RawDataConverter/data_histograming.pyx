@@ -4,7 +4,7 @@
 import numpy as np
 cimport numpy as cnp
 from libcpp cimport bool as cpp_bool  # to be able to use bool variables, as cpp_bool according to http://code.google.com/p/cefpython/source/browse/cefpython/cefpython.pyx?spec=svne037c69837fa39ae220806c2faa1bbb6ae4500b9&r=e037c69837fa39ae220806c2faa1bbb6ae4500b9
-from data_struct cimport numpy_hit_info, numpy_meta_data, numpy_meta_data_v2, numpy_par_info, numpy_cluster_info
+from data_struct cimport numpy_hit_info, numpy_compact_hit_info, numpy_meta_data, numpy_meta_data_v2, numpy_par_info, numpy_cluster_info
 from libc.stdint cimport uint64_t
 
 cnp.import_array()  # if array is used it has to be imported, otherwise possible runtime error
@@ -16,6 +16,8 @@ cdef extern from "Basis.h":
 cdef extern from "Histogram.h":
     cdef cppclass HitInfo:
         HitInfo()
+    cdef cppclass CompactHitInfo:
+        CompactHitInfo()
     cdef cppclass ParInfo:
         ParInfo()
     cdef cppclass ClusterInfo:
@@ -33,17 +35,33 @@ cdef extern from "Histogram.h":
         void createTdcHist(cpp_bool CreateTdcPixelHist)
         void createTdcPixelHist(cpp_bool CreateTdcPixelHist)
         void createTotPixelHist(cpp_bool CreateTotPixelHist)
+        void setSparsePixelHists(cpp_bool SparsePixelHists)
         void setMaxTot(const unsigned int& rMaxTot)
+        void setOccupancyWindow(const unsigned int& rNslices) except +
 
-        void getOccupancy(unsigned int& rNparameterValues, unsigned int*& rOccupancy, cpp_bool copy)  # returns the occupancy histogram for all hits
+        void getOccupancy(unsigned int& rNparameterValues, unsigned int*& rOccupancy, cpp_bool copy) except +  # returns the occupancy histogram for all hits
+        int getFinishedParameter(cpp_bool rAll) except +  # returns a parameter index with a finished occupancy slice in memory, -1 if there is none
+        void getOccupancySlice(const unsigned int& rParIndex, unsigned int*& rOccupancySlice) except +
+        void releaseOccupancySlice(const unsigned int& rParIndex) except +
         void getTotHist(unsigned int*& rTotHist, cpp_bool copy)  # returns the tot histogram for all hits
         void getTdcHist(unsigned int*& rTdcHist, cpp_bool copy)
         void getRelBcidHist(unsigned int*& rRelBcidHist, cpp_bool copy)  # returns the relative BCID histogram for all hits
         void getTdcPixelHist(unsigned short*& rTdcPixelHist, cpp_bool copy)  # returns the tdc pixel histogram for all hits
         void getTotPixelHist(unsigned short*& rTotPixelHist, cpp_bool copy)  # returns the tot pixel histogram for all hits
+        void getTotPixelHistSparse(unsigned int*& rPixelPointer, unsigned int*& rValueIndex, unsigned int*& rCounts, unsigned int& rNentries)  # returns the sparse tot pixel histogram in CSR format
+        void getTdcPixelHistSparse(unsigned int*& rPixelPointer, unsigned int*& rValueIndex, unsigned int*& rCounts, unsigned int& rNentries)  # returns the sparse tdc pixel histogram in CSR format
+        void setOccupancy(const unsigned int& rNparameterValues, unsigned int*& rOccupancy) except +
+        void setTotHist(unsigned int*& rTotHist) except +
+        void setTdcHist(unsigned int*& rTdcHist) except +
+        void setRelBcidHist(unsigned int*& rRelBcidHist, const unsigned int& rNbins) except +
+        void setTotPixelHist(unsigned short*& rTotPixelHist) except +
+        void setTdcPixelHist(unsigned short*& rTdcPixelHist) except +
+        void setTotPixelHistSparse(unsigned int*& rPixelPointer, unsigned int*& rValueIndex, unsigned int*& rCounts, const unsigned int& rNentries) except +
+        void setTdcPixelHistSparse(unsigned int*& rPixelPointer, unsigned int*& rValueIndex, unsigned int*& rCounts, const unsigned int& rNentries) except +
 
-        void addHits(HitInfo*& rHitInfo, const unsigned int& rNhits) except +
-        void addClusterSeedHits(ClusterInfo*& rClusterInfo, const unsigned int& rNcluster) except +
+        unsigned int addHits(HitInfo*& rHitInfo, const unsigned int& rNhits) nogil except +
+        unsigned int addCompactHits(CompactHitInfo*& rCompactHitInfo, const unsigned int& rNhits) nogil except +
+        unsigned int addClusterSeedHits(ClusterInfo*& rClusterInfo, const unsigned int& rNcluster) nogil except +
         void addScanParameter(unsigned int*& rParInfo, const unsigned int& rNparInfoLength) except +
         void setNoScanParameter()
         void addMetaEventIndex(uint64_t*& rMetaEventIndex, const unsigned int& rNmetaEventIndexLength) except +
@@ -52,7 +70,7 @@ cdef extern from "Histogram.h":
         unsigned int getMaxParameter()  # returns the maximum parameter from _parInfo
         unsigned int getNparameters()  # returns the parameter range from _parInfo
 
-        void calculateThresholdScanArrays(double rMuArray[], double rSigmaArray[], const unsigned int& rMaxInjections, const unsigned int& min_parameter, const unsigned int& max_parameter)  # takes the occupancy histograms for different parameters for the threshold arrays
+        void calculateThresholdScanArrays(double rMuArray[], double rSigmaArray[], const unsigned int& rMaxInjections, const unsigned int& min_parameter, const unsigned int& max_parameter) except +  # takes the occupancy histograms for different parameters for the threshold arrays
 
         void reset() except +
         void test()
@@ -67,9 +85,23 @@ cdef data_to_numpy_array_uint32(cnp.uint32_t* ptr, cnp.npy_intp N):
     #PyArray_ENABLEFLAGS(arr, np.NPY_OWNDATA)
     return arr
 
+cdef sparse_pixel_hist_to_numpy_arrays(cnp.uint32_t* pixel_pointer, cnp.uint32_t* value_index, cnp.uint32_t* counts, unsigned int n_entries):  # copies, the C++ arrays are only valid until new hits are added
+    if n_entries == 0:
+        return np.zeros((0, ), dtype=np.uint32), np.zeros((0, ), dtype=np.uint32), np.zeros((80 * 336 + 1, ), dtype=np.uint32)
+    return data_to_numpy_array_uint32(counts, n_entries).copy(), data_to_numpy_array_uint32(value_index, n_entries).copy(), data_to_numpy_array_uint32(pixel_pointer, 80 * 336 + 1).copy()
+
+cdef sparse_pixel_hist_from_numpy_arrays(hist):  # returns the contiguous arrays (counts, values, pixel pointer) of a histogram in CSR format with one row per pixel
+    counts, value_index, pixel_pointer = [np.ascontiguousarray(array, dtype=np.uint32) for array in hist]
+    if pixel_pointer.shape[0] != 80 * 336 + 1 or value_index.shape[0] != counts.shape[0]:
+        raise ValueError('The sparse pixel histogram needs a pixel pointer with the shape (26881, ) and one value per count')
+    return counts, value_index, pixel_pointer
+
 cdef cnp.uint16_t* data_16
 cdef cnp.uint32_t* data_32
 cdef unsigned int Nparameter = 0
+cdef cnp.uint32_t* pixel_pointer_32
+cdef cnp.uint32_t* value_index_32
+cdef unsigned int n_entries = 0
 
 cdef class PyDataHistograming:
     cdef Histogram* thisptr  # hold a C++ instance which we're wrapping
@@ -97,8 +129,20 @@ cdef class PyDataHistograming:
         self.thisptr.createTdcPixelHist(<cpp_bool> toggle)
     def create_tot_pixel_hist(self,toggle):
         self.thisptr.createTotPixelHist(<cpp_bool> toggle)
+    def set_sparse_pixel_hists(self, toggle):
+        self.thisptr.setSparsePixelHists(<cpp_bool> toggle)
     def set_max_tot(self, max_tot):
         self.thisptr.setMaxTot(<const unsigned int&> max_tot)
+    def set_occupancy_window(self, n_slices):  # keep only n_slices parameters of the occupancy in memory, 0 = all
+        self.thisptr.setOccupancyWindow(<const unsigned int&> n_slices)
+    def get_finished_parameter(self, all_parameters=False):  # returns a parameter index with a finished occupancy slice in memory, -1 if there is none
+        return self.thisptr.getFinishedParameter(<cpp_bool> all_parameters)
+    def get_occupancy_slice(self, parameter_index):  # returns the occupancy (col, row) of one parameter index, the memory is reused after release_occupancy_slice
+        self.thisptr.getOccupancySlice(<const unsigned int&> parameter_index, <unsigned int*&> data_32)
+        array = data_to_numpy_array_uint32(data_32, 80 * 336)
+        return array.reshape((80, 336), order='F')
+    def release_occupancy_slice(self, parameter_index):
+        self.thisptr.releaseOccupancySlice(<const unsigned int&> parameter_index)
     def get_occupancy(self):
         self.thisptr.getOccupancy(Nparameter, <unsigned int*&> data_32, <cpp_bool> False)
         if data_32 != NULL:
@@ -126,10 +170,74 @@ cdef class PyDataHistograming:
         if data_16 != NULL:
             array = data_to_numpy_array_uint16(data_16, 80 * 336 * 4096)
             return array.reshape((80, 336, 4096), order='F')
-    def add_hits(self, cnp.ndarray[numpy_hit_info, ndim=1] hit_info):
-        self.thisptr.addHits(<HitInfo*&> hit_info.data, <const unsigned int&> hit_info.shape[0])
+    def get_tot_pixel_hist_sparse(self):  # returns (counts, tot values, pixel pointer) in CSR format with one row per pixel (index = column + row * 80), e.g. for scipy.sparse.csr_matrix(..., shape=(80 * 336, 16))
+        self.thisptr.getTotPixelHistSparse(<unsigned int*&> pixel_pointer_32, <unsigned int*&> value_index_32, <unsigned int*&> data_32, n_entries)
+        return sparse_pixel_hist_to_numpy_arrays(pixel_pointer_32, value_index_32, data_32, n_entries)
+    def get_tdc_pixel_hist_sparse(self):  # returns (counts, tdc values, pixel pointer) in CSR format with one row per pixel (index = column + row * 80), e.g. for scipy.sparse.csr_matrix(..., shape=(80 * 336, 4096))
+        self.thisptr.getTdcPixelHistSparse(<unsigned int*&> pixel_pointer_32, <unsigned int*&> value_index_32, <unsigned int*&> data_32, n_entries)
+        return sparse_pixel_hist_to_numpy_arrays(pixel_pointer_32, value_index_32, data_32, n_entries)
+    def set_occupancy(self, occupancy):  # sets the occupancy (col, row, parameter) of the first parameters, e.g. to resume the histogramming; the scan parameters have to be set before
+        cdef cnp.ndarray[cnp.uint32_t, ndim=3, mode="fortran"] occupancy_array = np.asfortranarray(occupancy, dtype=np.uint32)
+        if occupancy_array.shape[0] != 80 or occupancy_array.shape[1] != 336:
+            raise ValueError('The occupancy has to have the shape (80, 336, n_parameters)')
+        self.thisptr.setOccupancy(<const unsigned int&> occupancy_array.shape[2], <unsigned int*&> occupancy_array.data)
+    def set_tot_hist(self, hist):
+        cdef cnp.ndarray[cnp.uint32_t, ndim=1] tot_hist = np.ascontiguousarray(hist, dtype=np.uint32)
+        if tot_hist.shape[0] != 16:
+            raise ValueError('The ToT histogram has to have the shape (16, )')
+        self.thisptr.setTotHist(<unsigned int*&> tot_hist.data)
+    def set_tdc_hist(self, hist):
+        cdef cnp.ndarray[cnp.uint32_t, ndim=1] tdc_hist = np.ascontiguousarray(hist, dtype=np.uint32)
+        if tdc_hist.shape[0] != 4096:
+            raise ValueError('The TDC histogram has to have the shape (4096, )')
+        self.thisptr.setTdcHist(<unsigned int*&> tdc_hist.data)
+    def set_rel_bcid_hist(self, hist):  # the not given relative BCIDs are set to zero
+        cdef cnp.ndarray[cnp.uint32_t, ndim=1] rel_bcid_hist = np.ascontiguousarray(hist, dtype=np.uint32)
+        self.thisptr.setRelBcidHist(<unsigned int*&> rel_bcid_hist.data, <const unsigned int&> rel_bcid_hist.shape[0])
+    def set_tot_pixel_hist(self, hist):
+        cdef cnp.ndarray[cnp.uint16_t, ndim=3, mode="fortran"] tot_pixel_hist = np.asfortranarray(hist, dtype=np.uint16)
+        if tot_pixel_hist.shape[0] != 80 or tot_pixel_hist.shape[1] != 336 or tot_pixel_hist.shape[2] != 16:
+            raise ValueError('The ToT pixel histogram has to have the shape (80, 336, 16)')
+        self.thisptr.setTotPixelHist(<cnp.uint16_t*&> tot_pixel_hist.data)
+    def set_tdc_pixel_hist(self, hist):
+        cdef cnp.ndarray[cnp.uint16_t, ndim=3, mode="fortran"] tdc_pixel_hist = np.asfortranarray(hist, dtype=np.uint16)
+        if tdc_pixel_hist.shape[0] != 80 or tdc_pixel_hist.shape[1] != 336 or tdc_pixel_hist.shape[2] != 4096:
+            raise ValueError('The TDC pixel histogram has to have the shape (80, 336, 4096)')
+        self.thisptr.setTdcPixelHist(<cnp.uint16_t*&> tdc_pixel_hist.data)
+    def set_tot_pixel_hist_sparse(self, hist):  # sets the sparse tot pixel histogram from (counts, tot values, pixel pointer) in CSR format like returned by get_tot_pixel_hist_sparse
+        cdef cnp.ndarray[cnp.uint32_t, ndim=1] counts, value_index, pixel_pointer
+        counts, value_index, pixel_pointer = sparse_pixel_hist_from_numpy_arrays(hist)
+        self.thisptr.setTotPixelHistSparse(<unsigned int*&> pixel_pointer.data, <unsigned int*&> value_index.data, <unsigned int*&> counts.data, <const unsigned int&> counts.shape[0])
+    def set_tdc_pixel_hist_sparse(self, hist):  # sets the sparse tdc pixel histogram from (counts, tdc values, pixel pointer) in CSR format like returned by get_tdc_pixel_hist_sparse
+        cdef cnp.ndarray[cnp.uint32_t, ndim=1] counts, value_index, pixel_pointer
+        counts, value_index, pixel_pointer = sparse_pixel_hist_from_numpy_arrays(hist)
+        self.thisptr.setTdcPixelHistSparse(<unsigned int*&> pixel_pointer.data, <unsigned int*&> value_index.data, <unsigned int*&> counts.data, <const unsigned int&> counts.shape[0])
+    def add_hits(self, cnp.ndarray hit_info):  # hits in the full or in the compact format, returns the number of added hits (less than all hits only if the occupancy window is full)
+        if hit_info.dtype.itemsize == sizeof(CompactHitInfo):
+            return self.add_compact_hits(hit_info)
+        else:
+            return self.add_full_hits(hit_info)
+    def add_full_hits(self, cnp.ndarray[numpy_hit_info, ndim=1] hit_info):
+        cdef HitInfo* hits = <HitInfo*> hit_info.data
+        cdef unsigned int n_hits = <unsigned int> hit_info.shape[0]
+        cdef unsigned int n_added
+        with nogil:
+            n_added = self.thisptr.addHits(hits, n_hits)
+        return n_added
+    def add_compact_hits(self, cnp.ndarray[numpy_compact_hit_info, ndim=1] hit_info):
+        cdef CompactHitInfo* hits = <CompactHitInfo*> hit_info.data
+        cdef unsigned int n_hits = <unsigned int> hit_info.shape[0]
+        cdef unsigned int n_added
+        with nogil:
+            n_added = self.thisptr.addCompactHits(hits, n_hits)
+        return n_added
     def add_cluster_seed_hits(self, cnp.ndarray[numpy_cluster_info, ndim=1] cluster_info, Ncluster):
-        self.thisptr.addClusterSeedHits(<ClusterInfo*&> cluster_info.data, <const unsigned int&> Ncluster)
+        cdef ClusterInfo* clusters = <ClusterInfo*> cluster_info.data
+        cdef unsigned int n_cluster = <unsigned int> Ncluster
+        cdef unsigned int n_added
+        with nogil:
+            n_added = self.thisptr.addClusterSeedHits(clusters, n_cluster)
+        return n_added
     def add_scan_parameter(self, cnp.ndarray[cnp.uint32_t, ndim=1] parameter_info):
         self.thisptr.addScanParameter(<unsigned int*&> parameter_info.data, <const unsigned int&> parameter_info.shape[0])
     def set_no_scan_parameter(self):
@@ -5,7 +5,7 @@ import numpy as np
 cimport numpy as cnp
 from numpy cimport ndarray
 from libcpp cimport bool as cpp_bool  # to be able to use bool variables, as cpp_bool according to http://code.google.com/p/cefpython/source/browse/cefpython/cefpython.pyx?spec=svne037c69837fa39ae220806c2faa1bbb6ae4500b9&r=e037c69837fa39ae220806c2faa1bbb6ae4500b9
-from data_struct cimport numpy_hit_info, numpy_meta_data, numpy_meta_data_v2, numpy_meta_word_data
+from data_struct cimport numpy_hit_info, numpy_compact_hit_info, numpy_event_info, numpy_meta_data, numpy_meta_data_v2, numpy_meta_word_data
 from data_struct import MetaTable, MetaTableV2
 from tables import dtype_from_descr
 from libc.stdint cimport uint64_t
@@ -25,6 +25,12 @@ cdef extern from "Interpret.h":
         MetaWordInfoOut()
     cdef cppclass HitInfo:
         HitInfo()
+    cdef cppclass CompactHitInfo:
+        CompactHitInfo()
+    cdef cppclass EventInfo:
+        EventInfo()
+    cdef cppclass InterpreterState:
+        InterpreterState()
     cdef cppclass Interpret(Basis):
         Interpret() except +
         void printStatus()
@@ -47,15 +53,28 @@ cdef extern from "Interpret.h":
         void setMetaDataEventIndex(uint64_t*& rEventNumber, const unsigned int& rSize)
         void setMetaDataWordIndex(MetaWordInfoOut*& rWordNumber, const unsigned int& rSize)
 
-        void interpretRawData(unsigned int* pDataWords, const unsigned int& pNdataWords) except +
+        void interpretRawData(unsigned int* pDataWords, const unsigned int& pNdataWords) nogil except +
 #         void getMetaEventIndex(unsigned int& rEventNumberIndex, unsigned int*& rEventNumber)
         void getHits(HitInfo*& rHitInfo, unsigned int& rSize, cpp_bool copy)
+        void getCompactHits(CompactHitInfo*& rCompactHitInfo, unsigned int& rSize, cpp_bool copy)
+        void getEvents(EventInfo*& rEventInfo, unsigned int& rSize, cpp_bool copy)
 
         void getServiceRecordsCounters(unsigned int*& rServiceRecordsCounter, unsigned int& rNserviceRecords, cpp_bool copy)  # returns the total service record counter array
         void getErrorCounters(unsigned int*& rErrorCounter, unsigned int& rNerrorCounters, cpp_bool copy)  # returns the total errors counter array
         void getTriggerErrorCounters(unsigned int*& rTriggerErrorCounter, unsigned int& rNTriggerErrorCounters, cpp_bool copy)  # returns the total trigger errors counter array
         void getTdcCounters(unsigned int*& rTdcCounter, unsigned int& rNtdcCounters, cpp_bool copy)
+        void setServiceRecordsCounters(unsigned int*& rServiceRecordsCounter, const unsigned int& rNserviceRecords) except +
+        void setErrorCounters(unsigned int*& rErrorCounter, const unsigned int& rNerrorCounters) except +
+        void setTriggerErrorCounters(unsigned int*& rTriggerErrorCounter, const unsigned int& rNTriggerErrorCounters) except +
+        void setTdcCounters(unsigned int*& rTdcCounter, const unsigned int& rNtdcCounters) except +
+        void getState(InterpreterState& rState)
+        void setState(const InterpreterState& rState)
+        void getHitBuffer(HitInfo*& rHitBuffer, unsigned int& rSize)
+        void setHitBuffer(HitInfo*& rHitBuffer, const unsigned int& rSize) except +
         unsigned int getNarrayHits()  # returns the maximum index filled with hits in the hit array
+        unsigned int getMaxNarrayHits()  # returns the maximum number of hits stored for one interpret_raw_data call (high-water mark)
+        unsigned int getHitsArraySize()  # returns the actual hit array size
+        unsigned int getNarrayEvents()  # returns the maximum index filled with events in the event array
         unsigned int getNmetaDataEvent()  # returns the maximum index filled with event data infos
         unsigned int getNmetaDataWord()
         void alignAtTriggerNumber(cpp_bool alignAtTriggerNumber)
@@ -69,6 +88,9 @@ cdef extern from "Interpret.h":
         void resetCounters()
         void createMetaDataWordIndex(cpp_bool CreateMetaDataWordIndex)
         void createEmptyEventHits(cpp_bool CreateEmptyEventHits)
+        void createCompactHits(cpp_bool CreateCompactHits)
+        cpp_bool getCreateCompactHits()
+        void createEventInfoArray(cpp_bool CreateEventInfoArray)
 
         void printSummary()
         void debugEvents(const unsigned int& rStartEvent, const unsigned int& rStopEvent, const cpp_bool& debugEvents)
@@ -80,11 +102,13 @@ cdef extern from "Interpret.h":
         void reset()
         void resetMetaDataCounter()
 
-        unsigned int getNhits()
+        uint64_t getNhits()
         uint64_t getNevents()
 
 cdef cnp.uint32_t* data_32
 cdef HitInfo* hits
+cdef CompactHitInfo* compact_hits
+cdef EventInfo* events
 cdef unsigned int n_entries = 0
 cdef data_to_numpy_array_uint32(cnp.uint32_t* ptr, cnp.npy_intp N):
     cdef cnp.ndarray[cnp.uint32_t, ndim=1] arr = cnp.PyArray_SimpleNewFromData(1, <cnp.npy_intp*> &N, cnp.NPY_UINT32, <cnp.uint32_t*> ptr)
@@ -95,6 +119,22 @@ cdef hit_data_to_numpy_array(void* ptr, cnp.npy_intp N):
     cdef cnp.ndarray[numpy_hit_info, ndim=1] arr = cnp.PyArray_SimpleNewFromData(1, <cnp.npy_intp*> &N, cnp.NPY_INT8, <void*> ptr).view(hit_dt)
     arr.setflags(write=False)  # protect the hit data
     return arr
+cdef compact_hit_dt = cnp.dtype([('eventNumber', '<i8'), ('column', '<u1'), ('row', '<u2'), ('tot', '<u1'), ('relativeBCID', '<u1')])
+cdef compact_hit_data_to_numpy_array(void* ptr, cnp.npy_intp N):
+    cdef cnp.ndarray[numpy_compact_hit_info, ndim=1] arr = cnp.PyArray_SimpleNewFromData(1, <cnp.npy_intp*> &N, cnp.NPY_INT8, <void*> ptr).view(compact_hit_dt)
+    arr.setflags(write=False)  # protect the hit data
+    return arr
+cdef event_dt = cnp.dtype([('eventNumber', '<i8'), ('triggerNumber', '<u4'), ('TDC', '<u2'), ('TDCtimeStamp', '<u1'), ('triggerStatus', '<u1'), ('serviceRecord', '<u4'), ('eventStatus', '<u2'), ('startHitIndex', '<u8'), ('stopHitIndex', '<u8')])
+cdef event_data_to_numpy_array(void* ptr, cnp.npy_intp N):
+    cdef cnp.ndarray[numpy_event_info, ndim=1] arr = cnp.PyArray_SimpleNewFromData(1, <cnp.npy_intp*> &N, cnp.NPY_INT8, <void*> ptr).view(event_dt)
+    arr.setflags(write=False)  # protect the event data
+    return arr
+cdef state_dt = cnp.dtype([('nEvents', '<u8'), ('nHits', '<u8'), ('nDataWords', '<u4'), ('nTriggers', '<u4'), ('nMaxHitsPerEvent', '<u4'), ('nEmptyEvents', '<u4'), ('nIncompleteEvents', '<u4'), ('nTDCWords', '<u4'), ('nUnknownWords', '<u4'), ('nOtherWords', '<u4'), ('nServiceRecords', '<u4'), ('nDataRecords', '<u4'), ('nDataHeaders', '<u4'), ('firstTriggerNrSet', '<u1'), ('firstTdcSet', '<u1'), ('lastTriggerNumber', '<u4'), ('startWordIndex', '<u4'), ('dataWordIndex', '<u4'), ('lastMetaIndexNotSet', '<u4'), ('lastWordIndexSet', '<u4'), ('eventNdataHeader', '<u4'), ('eventNdataRecord', '<u4'), ('eventStartBCID', '<u4'), ('eventStartLVL1ID', '<u4'), ('eventDbCID', '<u4'), ('eventTriggerError', '<u1'), ('eventErrorCode', '<u2'), ('eventServiceRecord', '<u4'), ('eventTriggerNumber', '<u4'), ('eventTotalHits', '<u4'), ('eventBCIDerror', '<u1'), ('eventTriggerWord', '<u4'), ('eventTdcCount', '<u2'), ('eventTdcTimeStamp', '<u1'), ('triggerNumber', '<u4')])
+cdef counters_to_numpy_array(counters, cnp.npy_intp N):  # returns the counters as contiguous array with the size of the interpreter counter array
+    cdef cnp.ndarray[cnp.uint32_t, ndim=1] arr = np.ascontiguousarray(counters, dtype=np.uint32)
+    if arr.shape[0] != N:
+        raise ValueError('The counter array has to have the shape (%d, )' % N)
+    return arr
 
 cdef class PyDataInterpreter:
     cdef Interpret* thisptr  # hold a C++ instance which we're wrapping
@@ -115,13 +155,28 @@ cdef class PyDataInterpreter:
     def set_hits_array_size(self, size):
         self.thisptr.setHitsArraySize(<const unsigned int&> size)
     def interpret_raw_data(self, cnp.ndarray[cnp.uint32_t, ndim=1] data):
-        self.thisptr.interpretRawData(<unsigned int*> data.data, <unsigned int> data.shape[0])
+        cdef unsigned int* data_words = <unsigned int*> data.data
+        cdef unsigned int n_data_words = <unsigned int> data.shape[0]
+        with nogil:  # the interpretation does not touch python objects, other python threads (e.g. data reading/writing) can run meanwhile
+            self.thisptr.interpretRawData(data_words, n_data_words)
         return data, data.shape[0]
-    def get_hits(self):
+    def get_hits(self):  # returns the compact hits if compact hits are created
+        if self.thisptr.getCreateCompactHits():
+            return self.get_compact_hits()
         self.thisptr.getHits(<HitInfo*&> hits, <unsigned int&> n_entries, <cpp_bool> False)
         if hits != NULL:
             array = hit_data_to_numpy_array(hits, sizeof(HitInfo) * n_entries)
             return array
+    def get_compact_hits(self):
+        self.thisptr.getCompactHits(<CompactHitInfo*&> compact_hits, <unsigned int&> n_entries, <cpp_bool> False)
+        if compact_hits != NULL:
+            array = compact_hit_data_to_numpy_array(compact_hits, sizeof(CompactHitInfo) * n_entries)
+            return array
+    def get_events(self):
+        self.thisptr.getEvents(<EventInfo*&> events, <unsigned int&> n_entries, <cpp_bool> False)
+        if events != NULL:
+            array = event_data_to_numpy_array(events, sizeof(EventInfo) * n_entries)
+            return array
     def set_meta_data(self, ndarray meta_data):  # set_meta_data(self, cnp.ndarray[numpy_meta_data, ndim=1] meta_data)
         meta_data_dtype = meta_data.dtype
         if meta_data_dtype == dtype_from_descr(MetaTable):
@@ -154,8 +209,41 @@ cdef class PyDataInterpreter:
         self.thisptr.getTdcCounters(<unsigned int*&> data_32, <unsigned int&> n_entries, <cpp_bool> False)
         if data_32 != NULL:
             return data_to_numpy_array_uint32(data_32, n_entries)
+    def set_service_records_counters(self, counters):
+        cdef cnp.ndarray[cnp.uint32_t, ndim=1] arr = counters_to_numpy_array(counters, self.get_service_records_counters().shape[0])
+        self.thisptr.setServiceRecordsCounters(<unsigned int*&> arr.data, <const unsigned int&> arr.shape[0])
+    def set_error_counters(self, counters):
+        cdef cnp.ndarray[cnp.uint32_t, ndim=1] arr = counters_to_numpy_array(counters, self.get_error_counters().shape[0])
+        self.thisptr.setErrorCounters(<unsigned int*&> arr.data, <const unsigned int&> arr.shape[0])
+    def set_trigger_error_counters(self, counters):
+        cdef cnp.ndarray[cnp.uint32_t, ndim=1] arr = counters_to_numpy_array(counters, self.get_trigger_error_counters().shape[0])
+        self.thisptr.setTriggerErrorCounters(<unsigned int*&> arr.data, <const unsigned int&> arr.shape[0])
+    def set_tdc_counters(self, counters):
+        cdef cnp.ndarray[cnp.uint32_t, ndim=1] arr = counters_to_numpy_array(counters, self.get_tdc_counters().shape[0])
+        self.thisptr.setTdcCounters(<unsigned int*&> arr.data, <const unsigned int&> arr.shape[0])
+    def get_state(self):  # returns the counters and the variables of the not finished event as array with one entry, e.g. to resume the interpretation
+        cdef cnp.ndarray state = np.zeros((1, ), dtype=state_dt)
+        self.thisptr.getState((<InterpreterState*> state.data)[0])
+        return state
+    def set_state(self, state):
+        cdef cnp.ndarray state_array = np.ascontiguousarray(state, dtype=state_dt).reshape(-1)
+        if state_array.shape[0] != 1:
+            raise ValueError('The interpreter state has to have one entry')
+        self.thisptr.setState((<InterpreterState*> state_array.data)[0])
+    def get_hit_buffer(self):  # returns a copy of the buffered hits of the not finished event
+        self.thisptr.getHitBuffer(<HitInfo*&> hits, <unsigned int&> n_entries)
+        return hit_data_to_numpy_array(hits, sizeof(HitInfo) * n_entries).copy()
+    def set_hit_buffer(self, hit_buffer):
+        cdef cnp.ndarray hit_buffer_array = np.ascontiguousarray(hit_buffer, dtype=hit_dt)
+        self.thisptr.setHitBuffer(<HitInfo*&> hit_buffer_array.data, <const unsigned int&> hit_buffer_array.shape[0])
     def get_n_array_hits(self):
         return <unsigned int> self.thisptr.getNarrayHits()
+    def get_max_n_array_hits(self):
+        return <unsigned int> self.thisptr.getMaxNarrayHits()
+    def get_hit_array_size(self):
+        return <unsigned int> self.thisptr.getHitsArraySize()
+    def get_n_array_events(self):
+        return <unsigned int> self.thisptr.getNarrayEvents()
     def get_n_meta_data_word(self):
         return <unsigned int> self.thisptr.getNmetaDataWord()
     def align_at_trigger(self, use_trigger_number):
@@ -180,6 +268,10 @@ cdef class PyDataInterpreter:
         self.thisptr.createMetaDataWordIndex(<cpp_bool> value)
     def create_empty_event_hits(self, value = True):
         self.thisptr.createEmptyEventHits(<cpp_bool> value)
+    def create_compact_hits(self, value = True):
+        self.thisptr.createCompactHits(<cpp_bool> value)
+    def create_event_info_array(self, value = True):
+        self.thisptr.createEventInfoArray(<cpp_bool> value)
     def set_hit_array_size(self, size):
         self.thisptr.setHitsArraySize(<const unsigned int&> size)
     def print_summary(self):
@@ -212,6 +304,6 @@ cdef class PyDataInterpreter:
     def reset_meta_data_counter(self):
         self.thisptr.resetMetaDataCounter()
     def get_n_hits(self):
-        return <unsigned int> self.thisptr.getNhits()
+        return <uint64_t> self.thisptr.getNhits()
     def get_n_events(self):
         return <uint64_t> self.thisptr.getNevents()
@@ -39,6 +39,24 @@ cdef packed struct numpy_hit_info:
     cnp.uint32_t serviceRecord  # event service records
     cnp.uint16_t eventStatus  # event status value (unsigned char: 0 to 255)
 
+cdef packed struct numpy_compact_hit_info:
+    cnp.int64_t eventNumber  # event number value, also the index of the event in the event table
+    cnp.uint8_t column  # column value (unsigned char: 0 to 255)
+    cnp.uint16_t row  # row value (unsigned short int: 0 to 65.535)
+    cnp.uint8_t tot  # ToT value (unsigned char: 0 to 255)
+    cnp.uint8_t relativeBCID  # relative BCID value (unsigned char: 0 to 255)
+
+cdef packed struct numpy_event_info:
+    cnp.int64_t eventNumber  # event number value (unsigned long long: 0 to 18,446,744,073,709,551,615)
+    cnp.uint32_t triggerNumber  # external trigger number for read out system
+    cnp.uint16_t TDC  # the TDC count (12-bit value)
+    cnp.uint8_t TDCtimeStamp  # a TDC time stamp value (8-bit value), either trigger distance (640 MHz) or time stamp (40 MHz)
+    cnp.uint8_t triggerStatus  # event trigger status
+    cnp.uint32_t serviceRecord  # event service records
+    cnp.uint16_t eventStatus  # event status value (unsigned char: 0 to 255)
+    cnp.uint64_t startHitIndex  # index of the first hit of the event in the hit table
+    cnp.uint64_t stopHitIndex  # index of the last hit of the event in the hit table (exclusive)
+
 cdef packed struct numpy_cluster_hit_info:
     cnp.int64_t eventNumber  # event number value (unsigned long long: 0 to 18,446,744,073,709,551,615)
     cnp.uint32_t triggerNumber  # external trigger number for read out system
@@ -90,6 +90,31 @@ class HitInfoTable(tb.IsDescription):
     event_status = tb.UInt16Col(pos=12)
 
 
+class CompactHitInfoTable(tb.IsDescription):
+    event_number = tb.Int64Col(pos=0)
+    column = tb.UInt8Col(pos=1)
+    row = tb.UInt16Col(pos=2)
+    tot = tb.UInt8Col(pos=3)
+    relative_BCID = tb.UInt8Col(pos=4)
+
+
+class EventInfoTable(tb.IsDescription):
+    event_number = tb.Int64Col(pos=0)
+    trigger_number = tb.UInt32Col(pos=1)
+    TDC = tb.UInt16Col(pos=2)
+    TDC_time_stamp = tb.UInt8Col(pos=3)
+    trigger_status = tb.UInt8Col(pos=4)
+    service_record = tb.UInt32Col(pos=5)
+    event_status = tb.UInt16Col(pos=6)
+    start_hit_index = tb.UInt64Col(pos=7)
+    stop_hit_index = tb.UInt64Col(pos=8)
+
+
+class HitIndexTable(tb.IsDescription):
+    event_number = tb.Int64Col(pos=0)
+    start_hit_index = tb.UInt64Col(pos=1)
+
+
 class MetaInfoEventTable(tb.IsDescription):
     event_number = tb.Int64Col(pos=0)
     time_stamp = tb.Float64Col(pos=1)
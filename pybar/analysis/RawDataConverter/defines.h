@@ -29,6 +29,28 @@ typedef struct HitInfo{
   unsigned short int eventStatus;  //event status value (unsigned short int: 0 to 65.535)
 } HitInfo;
 
+//structure to store the hits in a compact form, the event information is stored only once per event (EventInfo)
+typedef struct CompactHitInfo{
+  int64_t eventNumber;   //event number value, also the index of the event in the event array/table
+  unsigned char column;       //column value (unsigned char: 0 to 255)
+  unsigned short int row;     //row value (unsigned short int: 0 to 65.535)
+  unsigned char tot;          //tot value (unsigned char: 0 to 255)
+  unsigned char relativeBCID; //relative BCID value (unsigned char: 0 to 255)
+} CompactHitInfo;
+
+//structure to store the information of one event
+typedef struct EventInfo{
+  int64_t eventNumber;   //event number value (unsigned long long: 0 to 18,446,744,073,709,551,615)
+  unsigned int triggerNumber; //external trigger number for read out system
+  unsigned short int TDC; 	  //the TDC count (12-bit value)
+  unsigned char TDCtimeStamp; //a TDC time stamp value (8-bit value), either trigger distance (640 MHz) or time stamp (40 MHz)
+  unsigned char triggerStatus;//event trigger status
+  unsigned int serviceRecord; //event service records
+  unsigned short int eventStatus;  //event status value (unsigned short int: 0 to 65.535)
+  uint64_t startHitIndex; //index of the first hit of the event in the hit array/table
+  uint64_t stopHitIndex;  //index of the last hit of the event in the hit array/table (exclusive!)
+} EventInfo;
+
 //structure to store the hits with cluster info
 typedef struct ClusterHitInfo{
   int64_t eventNumber;   //event number value (unsigned long long: 0 to 18,446,744,073,709,551,615)
@@ -96,6 +118,45 @@ typedef struct MetaWordInfoOut{
   unsigned int stopWordIdex; //stop word index
 } MetaWordInfoOut;
 
+//structure to store the interpreter counters and the variables of the not finished event, needed to resume the interpretation
+typedef struct InterpreterState{
+  uint64_t nEvents;                //total number of events
+  uint64_t nHits;                  //total number of hits
+  unsigned int nDataWords;         //total number of data words
+  unsigned int nTriggers;          //total number of trigger words
+  unsigned int nMaxHitsPerEvent;   //maximum number of hits per event
+  unsigned int nEmptyEvents;       //number of events without hits
+  unsigned int nIncompleteEvents;  //number of incomplete events
+  unsigned int nTDCWords;          //number of TDC words
+  unsigned int nUnknownWords;      //number of unknown words
+  unsigned int nOtherWords;        //number of address/value records
+  unsigned int nServiceRecords;    //number of service records
+  unsigned int nDataRecords;       //number of data records
+  unsigned int nDataHeaders;       //number of data headers
+  unsigned char firstTriggerNrSet; //1 if the first trigger number was found
+  unsigned char firstTdcSet;       //1 if the first TDC word was found
+  unsigned int lastTriggerNumber;  //trigger number of the last event
+  unsigned int startWordIndex;     //absolute word index of the first word of the actual event
+  unsigned int dataWordIndex;      //word index of the actual raw data file
+  unsigned int lastMetaIndexNotSet;//the first read out without event number
+  unsigned int lastWordIndexSet;   //the last word index used for the event number of the read outs
+  unsigned int eventNdataHeader;   //number of data header of the actual event
+  unsigned int eventNdataRecord;   //number of data records of the actual event
+  unsigned int eventStartBCID;     //BCID of the first data header of the actual event
+  unsigned int eventStartLVL1ID;   //LVL1ID of the first data header of the actual event
+  unsigned int eventDbCID;         //relative BCID counter of the actual event
+  unsigned char eventTriggerError; //trigger error code of the actual event
+  unsigned short eventErrorCode;   //error code of the actual event
+  unsigned int eventServiceRecord; //service records of the actual event
+  unsigned int eventTriggerNumber; //trigger number of the actual event
+  unsigned int eventTotalHits;     //number of hits of the actual event
+  unsigned char eventBCIDerror;    //1 if the actual event is incomplete
+  unsigned int eventTriggerWord;   //number of trigger words of the actual event
+  unsigned short eventTdcCount;    //TDC count of the actual event
+  unsigned char eventTdcTimeStamp; //TDC time stamp of the actual event
+  unsigned int triggerNumber;      //trigger number of the last trigger word
+} InterpreterState;
+
 //DUT and TLU defines
 const unsigned int __BCIDCOUNTERSIZE_FEI4A=256;	  //BCID counter for FEI4A has 8 bit
 const unsigned int __BCIDCOUNTERSIZE_FEI4B=1024;  //BCID counter for FEI4B has 10 bit
@@ -162,6 +223,7 @@ const unsigned int RAW_DATA_MAX_ROW=336;
 //TDC macros
 #define __N_TDC_VALUES 4096
 #define __N_TDC_PIXEL_VALUES 2048
+#define __MAX_SPARSE_BUFFER_SIZE 1048576 //number of sparse histogram entries buffered before they are compressed
 #define TDC_HEADER 0x40000000
 #define TDC_HEADER_MASK 0xF0000000  //first bit 0 means FE number word
 #define TDC_COUNT_MASK 0x00000FFF
@@ -4,10 +4,15 @@
 import logging
 import os
 import time
+import glob
+import collections
+import multiprocessing as mp
+from multiprocessing.queues import SimpleQueue
 import progressbar
 import numpy as np
 import tables as tb
 import re
+from functools import partial
 
 from pybar.analysis import analysis_utils
 from pybar.analysis.RawDataConverter import data_struct
@@ -16,6 +21,108 @@ from pybar.analysis.analyze_raw_data import AnalyzeRawData
 from pybar.analysis.RawDataConverter.data_histograming import PyDataHistograming
 
 
+def analyze_time_resolved(scan_base, combine_n_readouts=1000, chunk_size=10000000, analyze_hits=True, analyze_cluster=True, occupancy_callback=None, output_file=None):
+    ''' Determines the event rate, the mean beam spot position and the number of cluster per event as a function of time in one pass. The data of a fixed
+    number of read outs are combined to one time window ('combine_n_readouts'). The Hits and the Cluster table are read once, every row is assigned to its
+    time window with the event numbers of the meta data. Only sums per time window are kept, thus the memory does not depend on the number of hits.
+
+     Parameters
+    ----------
+    scan_base: list of str
+        scan base names (e.g.:  ['//data//SCC_50_fei4_self_trigger_scan_390', ]
+    combine_n_readouts: int
+        the number of read outs to combine (e.g. 1000)
+    chunk_size: int
+        the maximum chunk size used during read, if too big memory error occurs, if too small analysis takes longer
+    analyze_hits: bool
+        Determines the mean beam spot position from the Hits table.
+    analyze_cluster: bool
+        Determines the number of cluster per event from the Cluster table.
+    occupancy_callback: function
+        Called with the time window row and the occupancy (row, column) of every time window (e.g. to plot the occupancies). Needs analyze_hits.
+    output_file: str
+        Writes the result into the TimeResolved table of this file.
+
+    Returns
+    -------
+    numpy.recarray
+        One row per time window with the time stamp, the event number range, the event rate, the number of hits, the mean beam spot position
+        (column, row index), the number of events with cluster and the histogram of the number of cluster per event (0 to 9 cluster). The last time window of every file has no stop
+        event number (-1) and no event rate.
+    '''
+    description = [('time_stamp', np.float64), ('timestamp_stop', np.float64), ('start_event_number', np.int64), ('stop_event_number', np.int64), ('rate', np.float64), ('n_hits', np.uint64), ('x', np.float64), ('y', np.float64), ('n_cluster_events', np.uint64), ('n_cluster', np.uint32, (10, ))]
+    results = []
+    for data_file in scan_base:
+        with tb.openFile(data_file + '_interpreted.h5', mode="r") as in_file_h5:
+            meta_data_array = in_file_h5.root.meta_data[:]
+            window_start = np.arange(0, meta_data_array.shape[0], combine_n_readouts)
+            result = np.zeros(shape=(window_start.shape[0], ), dtype=description)
+            result['time_stamp'] = meta_data_array['timestamp_start'][window_start]
+            result['timestamp_stop'][:-1] = result['time_stamp'][1:]
+            result['timestamp_stop'][-1] = meta_data_array['timestamp_stop'][-1] if 'timestamp_stop' in meta_data_array.dtype.names else np.nan
+            result['start_event_number'] = meta_data_array['event_number'][window_start]
+            result['stop_event_number'][:-1] = result['start_event_number'][1:]
+            result['stop_event_number'][-1] = -1  # the events of the last window are not known
+            result['rate'][:-1] = (result['stop_event_number'][:-1] - result['start_event_number'][:-1]) / (result['timestamp_stop'][:-1] - result['time_stamp'][:-1])  # d#Events / dt
+            result['rate'][-1] = np.nan
+
+            if analyze_hits:
+                hit_table = in_file_h5.root.Hits
+                sum_x, sum_y = np.zeros(result.shape[0], dtype=np.float64), np.zeros(result.shape[0], dtype=np.float64)
+                occupancy, occupancy_window = np.zeros((336 * 80, ), dtype=np.uint32), 0  # the occupancy of the actual window, the windows are finished in order since the hits are sorted
+                progress_bar = progressbar.ProgressBar(widgets=['', progressbar.Percentage(), ' ', progressbar.Bar(marker='*', left='|', right='|'), ' ', analysis_utils.ETA()], maxval=hit_table.shape[0], term_width=80)
+                progress_bar.start()
+                for hits, index in analysis_utils.data_aligned_at_events(hit_table, chunk_size=chunk_size, hit_index=analysis_utils.read_hit_index(in_file_h5)):
+                    window = np.searchsorted(result['start_event_number'], hits['event_number'], side='right') - 1
+                    selection = window >= 0  # hits before the first read out are not used
+                    hits, window = hits[selection], window[selection]
+                    result['n_hits'] += np.bincount(window, minlength=result.shape[0]).astype(np.uint64)
+                    sum_x += np.bincount(window, weights=hits['column'] - 1, minlength=result.shape[0])
+                    sum_y += np.bincount(window, weights=hits['row'] - 1, minlength=result.shape[0])
+                    if occupancy_callback is not None:
+                        window_start_hit = np.append(np.searchsorted(window, np.unique(window)), window.shape[0])
+                        for first_hit, last_hit in zip(window_start_hit[:-1], window_start_hit[1:]):
+                            while occupancy_window < window[first_hit]:  # the hits of the actual window are complete
+                                occupancy_callback(result[occupancy_window], occupancy.reshape(336, 80))
+                                occupancy[:] = 0
+                                occupancy_window += 1
+                            occupancy += np.bincount((hits['row'][first_hit:last_hit].astype(np.int32) - 1) * 80 + hits['column'][first_hit:last_hit] - 1, minlength=336 * 80).astype(np.uint32)
+                    progress_bar.update(index)
+                progress_bar.finish()
+                if occupancy_callback is not None:
+                    for window in range(occupancy_window, result.shape[0]):
+                        occupancy_callback(result[window], occupancy.reshape(336, 80))
+                        occupancy[:] = 0
+                with np.errstate(invalid='ignore', divide='ignore'):  # no hits in the window
+                    result['x'] = sum_x / result['n_hits']
+                    result['y'] = sum_y / result['n_hits']
+
+            if analyze_cluster:
+                cluster_table = in_file_h5.root.Cluster
+                n_cluster = np.zeros(shape=(result.shape[0] * 10, ), dtype=np.uint32)  # the histograms of all windows in one array
+                progress_bar = progressbar.ProgressBar(widgets=['', progressbar.Percentage(), ' ', progressbar.Bar(marker='*', left='|', right='|'), ' ', analysis_utils.ETA()], maxval=cluster_table.shape[0], term_width=80)
+                progress_bar.start()
+                for clusters, index in analysis_utils.data_aligned_at_events(cluster_table, chunk_size=chunk_size):
+                    n_cluster_per_event = analysis_utils.get_n_cluster_in_events(clusters['event_number'])  # the number of cluster per event with cluster
+                    window = np.searchsorted(result['start_event_number'], n_cluster_per_event[:, 0], side='right') - 1
+                    result['n_cluster_events'] += np.bincount(window[window >= 0], minlength=result.shape[0]).astype(np.uint64)
+                    selection = (window >= 0) & (n_cluster_per_event[:, 1] <= 10)  # histogram range (0, 10) with 10 bins
+                    n_cluster += np.bincount(window[selection] * 10 + np.minimum(n_cluster_per_event[selection, 1], 9).astype(np.int64), minlength=n_cluster.shape[0]).astype(np.uint32)
+                    progress_bar.update(index)
+                progress_bar.finish()
+                result['n_cluster'] = n_cluster.reshape(-1, 10)
+            results.append(result)
+    result = np.concatenate(results).view(np.recarray)
+    if output_file:
+        with tb.openFile(output_file, mode="a") as out_file_h5:
+            try:
+                time_resolved_table = out_file_h5.createTable(out_file_h5.root, name='TimeResolved', description=result.dtype, title='Time resolved analysis', filters=tb.Filters(complib='blosc', complevel=5, fletcher32=False))
+                time_resolved_table.append(result)
+            except tb.exceptions.NodeError:
+                logging.warning(output_file + ' has already a TimeResolved node, do not overwrite existing.')
+    return result
+
+
 def analyze_beam_spot(scan_base, combine_n_readouts=1000, chunk_size=10000000, plot_occupancy_hists=False, output_pdf=None, output_file=None):
     ''' Determines the mean x and y beam spot position as a function of time. Therefore the data of a fixed number of read outs are combined ('combine_n_readouts'). The occupancy is determined
     for the given combined events and stored into a pdf file. At the end the beam x and y is plotted into a scatter plot with absolute positions in um.
@@ -31,58 +138,11 @@ def analyze_beam_spot(scan_base, combine_n_readouts=1000, chunk_size=10000000, p
     output_pdf: PdfPages
         PdfPages file object, if none the plot is printed to screen
     '''
-    time_stamp = []
-    x = []
-    y = []
-
-    for data_file in scan_base:
-        with tb.openFile(data_file + '_interpreted.h5', mode="r+") as in_hit_file_h5:
-            # get data and data pointer
-            meta_data_array = in_hit_file_h5.root.meta_data[:]
-            hit_table = in_hit_file_h5.root.Hits
-
-            # determine the event ranges to analyze (timestamp_start, start_event_number, stop_event_number)
-            parameter_ranges = np.column_stack((analysis_utils.get_ranges_from_array(meta_data_array['timestamp_start'][::combine_n_readouts]), analysis_utils.get_ranges_from_array(meta_data_array['event_number'][::combine_n_readouts])))
-
-            # create a event_numer index (important)
-            analysis_utils.index_event_number(hit_table)
-
-            # initialize the analysis and set settings
-            analyze_data = AnalyzeRawData()
-            analyze_data.create_tot_hist = False
-            analyze_data.create_bcid_hist = False
-            analyze_data.histograming.set_no_scan_parameter()
+    def plot_occupancy(window, occupancy):
+        plotting.plot_occupancy(occupancy, title='Occupancy for events between ' + time.strftime('%H:%M:%S', time.localtime(window['time_stamp'])) + ' and ' + time.strftime('%H:%M:%S', time.localtime(window['timestamp_stop'])), filename=output_pdf)
 
-            # variables for read speed up
-            index = 0  # index where to start the read out, 0 at the beginning, increased during looping
-            best_chunk_size = chunk_size
-
-            progress_bar = progressbar.ProgressBar(widgets=['', progressbar.Percentage(), ' ', progressbar.Bar(marker='*', left='|', right='|'), ' ', analysis_utils.ETA()], maxval=hit_table.shape[0], term_width=80)
-            progress_bar.start()
-
-            # loop over the selected events
-            for parameter_index, parameter_range in enumerate(parameter_ranges):
-                logging.debug('Analyze time stamp ' + str(parameter_range[0]) + ' and data from events = [' + str(parameter_range[2]) + ',' + str(parameter_range[3]) + '[ ' + str(int(float(float(parameter_index) / float(len(parameter_ranges)) * 100.))) + '%')
-                analyze_data.reset()  # resets the data of the last analysis
-
-                # loop over the hits in the actual selected events with optimizations: determine best chunk size, start word index given
-                readout_hit_len = 0  # variable to calculate a optimal chunk size value from the number of hits for speed up
-                for hits, index in analysis_utils.data_aligned_at_events(hit_table, start_event_number=parameter_range[2], stop_event_number=parameter_range[3], start=index, chunk_size=best_chunk_size):
-                    analyze_data.analyze_hits(hits)  # analyze the selected hits in chunks
-                    readout_hit_len += hits.shape[0]
-                    progress_bar.update(index)
-                best_chunk_size = int(1.5 * readout_hit_len) if int(1.05 * readout_hit_len) < chunk_size else chunk_size  # to increase the readout speed, estimated the number of hits for one read instruction
-
-                # get and store results
-                occupancy_array = analyze_data.histograming.get_occupancy()
-                projection_x = np.sum(occupancy_array, axis=0).ravel()
-                projection_y = np.sum(occupancy_array, axis=1).ravel()
-                x.append(analysis_utils.get_mean_from_histogram(projection_x, bin_positions=range(0, 80)))
-                y.append(analysis_utils.get_mean_from_histogram(projection_y, bin_positions=range(0, 336)))
-                time_stamp.append(parameter_range[0])
-                if plot_occupancy_hists:
-                    plotting.plot_occupancy(occupancy_array[:, :, 0], title='Occupancy for events between ' + time.strftime('%H:%M:%S', time.localtime(parameter_range[0])) + ' and ' + time.strftime('%H:%M:%S', time.localtime(parameter_range[1])), filename=output_pdf)
-            progress_bar.finish()
+    result = analyze_time_resolved(scan_base, combine_n_readouts=combine_n_readouts, chunk_size=chunk_size, analyze_cluster=False, occupancy_callback=plot_occupancy if plot_occupancy_hists else None)
+    time_stamp, x, y = result['time_stamp'].tolist(), result['x'].tolist(), result['y'].tolist()
     plotting.plot_scatter([i * 250 for i in x], [i * 50 for i in y], title='Mean beam position', x_label='x [um]', y_label='y [um]', marker_style='-o', filename=output_pdf)
     if output_file:
         with tb.openFile(output_file, mode="a") as out_file_h5:
@@ -110,24 +170,11 @@ def analyze_event_rate(scan_base, combine_n_readouts=1000, time_line_absolute=Tr
     output_pdf: PdfPages
         PdfPages file object, if none the plot is printed to screen
     '''
-    time_stamp = []
-    rate = []
-
-    start_time_set = False
-
-    for data_file in scan_base:
-        with tb.openFile(data_file + '_interpreted.h5', mode="r") as in_file_h5:
-            meta_data_array = in_file_h5.root.meta_data[:]
-            parameter_ranges = np.column_stack((analysis_utils.get_ranges_from_array(meta_data_array['timestamp_start'][::combine_n_readouts]), analysis_utils.get_ranges_from_array(meta_data_array['event_number'][::combine_n_readouts])))
-
-            if time_line_absolute:
-                time_stamp.extend(parameter_ranges[:-1, 0])
-            else:
-                if not start_time_set:
-                    start_time = parameter_ranges[0, 0]
-                    start_time_set = True
-                time_stamp.extend((parameter_ranges[:-1, 0] - start_time) / 60.)
-            rate.extend((parameter_ranges[:-1, 3] - parameter_ranges[:-1, 2]) / (parameter_ranges[:-1, 1] - parameter_ranges[:-1, 0]))  # d#Events / dt
+    result = analyze_time_resolved(scan_base, combine_n_readouts=combine_n_readouts, analyze_hits=False, analyze_cluster=False)
+    start_time = result['time_stamp'][0]
+    result = result[result['stop_event_number'] != -1]  # the event rate of the last window of every file is not known
+    time_stamp = result['time_stamp'].tolist() if time_line_absolute else ((result['time_stamp'] - start_time) / 60.).tolist()
+    rate = result['rate'].tolist()
     if time_line_absolute:
         plotting.plot_scatter_time(time_stamp, rate, title='Event rate [Hz]', marker_style='o', filename=output_pdf)
     else:
@@ -159,74 +206,20 @@ def analyse_n_cluster_per_event(scan_base, include_no_cluster=False, time_line_a
     output_pdf: PdfPages
         PdfPages file object, if none the plot is printed to screen
     '''
+    result = analyze_time_resolved(scan_base, combine_n_readouts=combine_n_readouts, chunk_size=chunk_size, analyze_hits=False)
+    start_time = result['time_stamp'][0]
 
     time_stamp = []
     n_cluster = []
-
-    start_time_set = False
-
-    for data_file in scan_base:
-        with tb.openFile(data_file + '_interpreted.h5', mode="r+") as in_cluster_file_h5:
-            # get data and data pointer
-            meta_data_array = in_cluster_file_h5.root.meta_data[:]
-            cluster_table = in_cluster_file_h5.root.Cluster
-
-            # determine the event ranges to analyze (timestamp_start, start_event_number, stop_event_number)
-            parameter_ranges = np.column_stack((analysis_utils.get_ranges_from_array(meta_data_array['timestamp_start'][::combine_n_readouts]), analysis_utils.get_ranges_from_array(meta_data_array['event_number'][::combine_n_readouts])))
-
-            # create a event_numer index (important for speed)
-            analysis_utils.index_event_number(cluster_table)
-
-            # initialize the analysis and set settings
-            analyze_data = AnalyzeRawData()
-            analyze_data.create_tot_hist = False
-            analyze_data.create_bcid_hist = False
-
-            # variables for read speed up
-            index = 0  # index where to start the read out, 0 at the beginning, increased during looping
-            best_chunk_size = chunk_size
-
-            total_cluster = cluster_table.shape[0]
-
-            progress_bar = progressbar.ProgressBar(widgets=['', progressbar.Percentage(), ' ', progressbar.Bar(marker='*', left='|', right='|'), ' ', analysis_utils.ETA()], maxval=total_cluster, term_width=80)
-            progress_bar.start()
-
-            # loop over the selected events
-            for parameter_index, parameter_range in enumerate(parameter_ranges):
-                logging.debug('Analyze time stamp ' + str(parameter_range[0]) + ' and data from events = [' + str(parameter_range[2]) + ',' + str(parameter_range[3]) + '[ ' + str(int(float(float(parameter_index) / float(len(parameter_ranges)) * 100.))) + '%')
-                analyze_data.reset()  # resets the data of the last analysis
-
-                # loop over the cluster in the actual selected events with optimizations: determine best chunk size, start word index given
-                readout_cluster_len = 0  # variable to calculate a optimal chunk size value from the number of hits for speed up
-                hist = None
-                for clusters, index in analysis_utils.data_aligned_at_events(cluster_table, start_event_number=parameter_range[2], stop_event_number=parameter_range[3], start=index, chunk_size=best_chunk_size):
-                    n_cluster_per_event = analysis_utils.get_n_cluster_in_events(clusters['event_number'])[:, 1]  # array with the number of cluster per event, cluster per event are at least 1
-                    if hist is None:
-                        hist = np.histogram(n_cluster_per_event, bins=10, range=(0, 10))[0]
-                    else:
-                        hist = np.add(hist, np.histogram(n_cluster_per_event, bins=10, range=(0, 10))[0])
-                    if include_no_cluster and parameter_range[3] is not None:  # happend for the last readout
-                        hist[0] = (parameter_range[3] - parameter_range[2]) - len(n_cluster_per_event)  # add the events without any cluster
-                    readout_cluster_len += clusters.shape[0]
-                    total_cluster -= len(clusters)
-                    progress_bar.update(index)
-                best_chunk_size = int(1.5 * readout_cluster_len) if int(1.05 * readout_cluster_len) < chunk_size else chunk_size  # to increase the readout speed, estimated the number of hits for one read instruction
-
-                if plot_n_cluster_hists:
-                    plotting.plot_1d_hist(hist, title='Number of cluster per event at ' + str(parameter_range[0]), x_axis_title='Number of cluster', y_axis_title='#', log_y=True, filename=output_pdf)
-                hist = hist.astype('f4') / np.sum(hist)  # calculate fraction from total numbers
-
-                if time_line_absolute:
-                    time_stamp.append(parameter_range[0])
-                else:
-                    if not start_time_set:
-                        start_time = parameter_ranges[0, 0]
-                        start_time_set = True
-                    time_stamp.append((parameter_range[0] - start_time) / 60.)
-                n_cluster.append(hist)
-            progress_bar.finish()
-            if total_cluster != 0:
-                logging.warning('Not all clusters were selected during analysis. Analysis is therefore not exact')
+    for window in result:
+        hist = window['n_cluster'].astype(np.int64)
+        if include_no_cluster and window['stop_event_number'] != -1:  # the number of events of the last window is not known
+            hist[0] = (window['stop_event_number'] - window['start_event_number']) - window['n_cluster_events']  # add the events without any cluster
+        if plot_n_cluster_hists:
+            plotting.plot_1d_hist(hist, title='Number of cluster per event at ' + str(window['time_stamp']), x_axis_title='Number of cluster', y_axis_title='#', log_y=True, filename=output_pdf)
+        hist = hist.astype('f4') / np.sum(hist)  # calculate fraction from total numbers
+        time_stamp.append(window['time_stamp'] if time_line_absolute else (window['time_stamp'] - start_time) / 60.)
+        n_cluster.append(hist)
 
     if time_line_absolute:
         plotting.plot_scatter_time(time_stamp, n_cluster, title='Number of cluster per event as a function of time', marker_style='o', filename=output_pdf, legend=('0 cluster', '1 cluster', '2 cluster', '3 cluster') if include_no_cluster else ('0 cluster not plotted', '1 cluster', '2 cluster', '3 cluster'))
@@ -256,9 +249,9 @@ def select_hits_from_cluster_info(input_file_hits, output_file_hits, cluster_siz
     output_file_hits: str
         the output file name for the hits
     cluster_size_condition: str
-        the cluster size condition to select events (e.g.: 'cluster_size_condition <= 2')
+        the cluster size condition to select events (e.g.: 'cluster_size <= 2')
     n_cluster_condition: str
-        the number of cluster in a event ((e.g.: 'n_cluster_condition == 1')
+        the number of cluster in a event (e.g.: 'n_cluster == 1')
     '''
     logging.info('Write hits of events from ' + str(input_file_hits) + ' with ' + cluster_size_condition + ' and ' + n_cluster_condition + ' into ' + str(output_file_hits))
     with tb.openFile(input_file_hits, mode="r+") as in_hit_file_h5:
@@ -268,11 +261,12 @@ def select_hits_from_cluster_info(input_file_hits, output_file_hits, cluster_siz
             hit_table_out = out_hit_file_h5.createTable(out_hit_file_h5.root, name='Hits', description=data_struct.HitInfoTable, title='hit_data', filters=tb.Filters(complib='blosc', complevel=5, fletcher32=False))
             cluster_table = in_hit_file_h5.root.Cluster
             last_word_number = 0
+            cluster_size_selection, n_cluster_selection = analysis_utils.Selection(cluster_size_condition), analysis_utils.Selection(n_cluster_condition)  # parse the conditions once for all chunks
             progress_bar = progressbar.ProgressBar(widgets=['', progressbar.Percentage(), ' ', progressbar.Bar(marker='*', left='|', right='|'), ' ', analysis_utils.ETA()], maxval=cluster_table.shape[0], term_width=80)
             progress_bar.start()
             for data, index in analysis_utils.data_aligned_at_events(cluster_table, chunk_size=chunk_size):
-                selected_events_1 = analysis_utils.get_events_with_cluster_size(event_number=data['event_number'], cluster_size=data['size'], condition=cluster_size_condition)  # select the events with clusters of a certain size
-                selected_events_2 = analysis_utils.get_events_with_n_cluster(event_number=data['event_number'], condition=n_cluster_condition)  # select the events with a certain cluster number
+                selected_events_1 = analysis_utils.get_events_with_cluster_size(event_number=data['event_number'], cluster_size=data['size'], condition=cluster_size_selection)  # select the events with clusters of a certain size
+                selected_events_2 = analysis_utils.get_events_with_n_cluster(event_number=data['event_number'], condition=n_cluster_selection)  # select the events with a certain cluster number
                 selected_events = analysis_utils.get_events_in_both_arrays(selected_events_1, selected_events_2)  # select events with both conditions above
                 logging.debug('Selected ' + str(len(selected_events)) + ' events with ' + n_cluster_condition + ' and ' + cluster_size_condition)
                 last_word_number = analysis_utils.write_hits_in_events(hit_table_in=in_hit_file_h5.root.Hits, hit_table_out=hit_table_out, events=selected_events, start_hit_word=last_word_number)  # write the hits of the selected events into a new table
@@ -292,7 +286,7 @@ def select_hits(input_file_hits, output_file_hits, condition=None, cluster_size_
         the input file name with hits
     output_file_hits: str
         the output file name for the hits
-    condition: str
+    condition: str, analysis_utils.Selection
         Numexpr string to select hits (e.g.: '(relative_BCID == 6) & (column == row)')
         All hit infos can be used (column, row, ...)
     cluster_size_condition: int
@@ -300,7 +294,8 @@ def select_hits(input_file_hits, output_file_hits, condition=None, cluster_size_
     n_cluster_condition: int
         Hit of events with the given cluster number are selected.
     '''
-    logging.info('Write hits with ' + condition + ' into ' + str(output_file_hits))
+    condition = analysis_utils.get_selection(condition)  # parse the condition once for all chunks
+    logging.info('Write hits with ' + (condition.condition if condition is not None else 'no condition') + ' into ' + str(output_file_hits))
     if cluster_size_condition is None and n_cluster_condition is None:  # no cluster cuts are done
         with tb.openFile(input_file_hits, mode="r+") as in_hit_file_h5:
             analysis_utils.index_event_number(in_hit_file_h5.root.Hits)  # create event index for faster selection
@@ -316,16 +311,18 @@ def select_hits(input_file_hits, output_file_hits, condition=None, cluster_size_
                 hit_table_out = out_hit_file_h5.createTable(out_hit_file_h5.root, name='Hits', description=data_struct.HitInfoTable, title='hit_data', filters=tb.Filters(complib='blosc', complevel=5, fletcher32=False))
                 cluster_table = in_hit_file_h5.root.Cluster
                 last_word_number = 0
+                cluster_size_selection = analysis_utils.Selection('cluster_size == ' + str(cluster_size_condition)) if cluster_size_condition is not None else None
+                n_cluster_selection = analysis_utils.Selection('n_cluster == ' + str(n_cluster_condition)) if n_cluster_condition is not None else None
                 progress_bar = progressbar.ProgressBar(widgets=['', progressbar.Percentage(), ' ', progressbar.Bar(marker='*', left='|', right='|'), ' ', analysis_utils.ETA()], maxval=cluster_table.shape[0], term_width=80)
                 progress_bar.start()
                 for data, index in analysis_utils.data_aligned_at_events(cluster_table, chunk_size=chunk_size):
                     if cluster_size_condition is not None:
-                        selected_events = analysis_utils.get_events_with_cluster_size(event_number=data['event_number'], cluster_size=data['size'], condition='cluster_size == ' + str(cluster_size_condition))  # select the events with only 1 hit cluster
+                        selected_events = analysis_utils.get_events_with_cluster_size(event_number=data['event_number'], cluster_size=data['size'], condition=cluster_size_selection)  # select the events with only 1 hit cluster
                         if n_cluster_condition is not None:
-                            selected_events_2 = analysis_utils.get_events_with_n_cluster(event_number=data['event_number'], condition='n_cluster == ' + str(n_cluster_condition))  # select the events with only 1 cluster
+                            selected_events_2 = analysis_utils.get_events_with_n_cluster(event_number=data['event_number'], condition=n_cluster_selection)  # select the events with only 1 cluster
                             selected_events = selected_events[analysis_utils.in1d_events(selected_events, selected_events_2)]  # select events with the first two conditions above
                     elif n_cluster_condition is not None:
-                        selected_events = analysis_utils.get_events_with_n_cluster(event_number=data['event_number'], condition='n_cluster == ' + str(n_cluster_condition))
+                        selected_events = analysis_utils.get_events_with_n_cluster(event_number=data['event_number'], condition=n_cluster_selection)
                     else:
                         raise RuntimeError('Cannot understand cluster selection criterion')
                     last_word_number = analysis_utils.write_hits_in_events(hit_table_in=in_hit_file_h5.root.Hits, hit_table_out=hit_table_out, events=selected_events, start_hit_word=last_word_number, condition=condition, chunk_size=chunk_size)  # write the hits of the selected events into a new table
@@ -535,5 +532,192 @@ def analyze_hits_per_scan_parameter(analyze_data, scan_parameters=None, chunk_si
     if opened_file:
         in_hit_file_h5.close()
 
+_batch_analyze_raw_data = None  # the AnalyzeRawData object of a batch analysis process, the c++ objects are reused for all files of the process
+_batch_started_queue = None  # the batch analysis processes report the started files (file name, process id, start time) to detect died processes
+
+
+def _init_batch_process(started_queue):  # initializes a batch analysis process, has to be global for the multiprocessing module
+    global _batch_started_queue
+    _batch_started_queue = started_queue
+
+
+def _get_alive_pool_pids(pool):
+    '''Returns the process ids of the alive processes of a multiprocessing pool, None if a process is just started and has no process id yet.
+    A died process is replaced by the pool, the result of its task never arrives.
+    '''
+    processes = list(pool._pool)  # the pool processes are only accessible via the private attribute Pool._pool (Python 2.7)
+    if any(process.pid is None for process in processes):
+        return
+    return set(process.pid for process in processes if process.is_alive())
+
+
+def _analyze_raw_data_file(raw_data_file, products=None, skip_existing=False, settings=None, scan_parameter_name=None, use_settings_from_file=True, fei4b=None, create_pdf=False, log_file=True):  # analyzes one file of a batch analysis, has to be global for the multiprocessing module
+    global _batch_analyze_raw_data
+    if _batch_started_queue is not None:  # the queue is written synchronously, thus the file is reported also if the process dies right afterwards
+        _batch_started_queue.put((raw_data_file, os.getpid(), time.time()))
+    analyzed_data_file = os.path.splitext(raw_data_file)[0] + '_interpreted.h5'
+    if log_file:  # the log of every file is also written into its own log file
+        log_handler = logging.FileHandler(os.path.splitext(raw_data_file)[0] + '_interpreted.log', mode='w')
+        log_handler.setFormatter(logging.Formatter("%(asctime)s - %(name)s - [%(levelname)-8s] (%(threadName)-10s) %(message)s"))
+        logging.getLogger().addHandler(log_handler)
+    start_time = time.time()
+    n_words, error = 0, ''
+    try:
+        n_words = analysis_utils.get_raw_data_file_info(raw_data_file)['n_words']
+        if _batch_analyze_raw_data is None:
+            _batch_analyze_raw_data = AnalyzeRawData(raw_data_file=raw_data_file, analyzed_data_file=analyzed_data_file, create_pdf=create_pdf, scan_parameter_name=scan_parameter_name)
+        else:
+            _batch_analyze_raw_data.reset()
+            _batch_analyze_raw_data.set_standard_settings()
+            _batch_analyze_raw_data.set_raw_data_file(raw_data_file=raw_data_file, analyzed_data_file=analyzed_data_file, create_pdf=create_pdf, scan_parameter_name=scan_parameter_name)
+        if settings is not None:
+            for setting, value in settings.items():
+                setattr(_batch_analyze_raw_data, setting, value)
+        if products is not None:
+            _batch_analyze_raw_data.plan_analysis(products, skip_existing=skip_existing)
+        _batch_analyze_raw_data.interpret_word_table(use_settings_from_file=use_settings_from_file, fei4b=fei4b)
+        if create_pdf:
+            _batch_analyze_raw_data.plot_histograms()
+            _batch_analyze_raw_data.output_pdf.close()
+            _batch_analyze_raw_data.output_pdf = None
+    except Exception, e:  # a failing file does not stop the batch analysis
+        logging.exception('Analysis of %s failed', raw_data_file)
+        error = '%s: %s' % (type(e).__name__, str(e))
+        if _batch_analyze_raw_data is not None:  # the state after a failure is undefined, thus new objects are created for the next file
+            if _batch_analyze_raw_data.out_file_h5 is not None and _batch_analyze_raw_data.out_file_h5.isopen:
+                _batch_analyze_raw_data.out_file_h5.close()
+            _batch_analyze_raw_data.__exit__(None, None, None)
+            _batch_analyze_raw_data = None
+    finally:
+        if log_file:
+            logging.getLogger().removeHandler(log_handler)
+            log_handler.close()
+    return raw_data_file, n_words, time.time() - start_time, error
+
+
+def analyze_raw_data_files(raw_data_files, products=None, skip_existing=False, settings=None, n_processes=None, scan_parameter_name=None, use_settings_from_file=True, fei4b=None, create_pdf=False, log_files=True):
+    '''Interprets many raw data files in a pool of processes, every raw data file into its own analyzed data file (raw data file name + _interpreted.h5).
+    The processes reuse their analysis objects for all their files. A failing file is logged and does not stop the analysis of the other files.
+    A process that dies during the analysis (e.g. in the c++ code) is replaced, its file is marked as failed.
+
+    Parameters
+    ----------
+    raw_data_files : string, iterable of strings
+        The raw data file names or a glob pattern (e.g. '/data/*_threshold_scan.h5').
+    products : iterable of strings
+        The output products, see AnalyzeRawData.plan_analysis. If None the standard settings (changed by the given settings) are used.
+    skip_existing : boolean
+        If True the products that exist already in the analyzed data files are kept and not created again. If False (standard) all products
+        are created again, e.g. to update the results after a calibration change. Only used if products are given.
+    settings : dict
+        The AnalyzeRawData settings {setting name: value} (e.g. {'chunk_size': 1000000, 'create_cluster_size_hist': True}).
+    n_processes : int
+        The number of processes, None = all cores. For 1 the files are analyzed in this process.
+    scan_parameter_name, use_settings_from_file, fei4b
+        See AnalyzeRawData and AnalyzeRawData.interpret_word_table.
+    create_pdf : boolean
+        Creates the plots of every file into a PDF file.
+    log_files : boolean
+        Writes the log of every file into a log file (raw data file name + _interpreted.log).
+
+    Returns
+    -------
+    numpy.recarray
+        Summary table with the raw data file name, the success, the number of raw data words, the analysis time and the throughput.
+    '''
+    global _batch_analyze_raw_data
+    if isinstance(raw_data_files, basestring):
+        raw_data_files = sorted(glob.glob(raw_data_files))
+    raw_data_files = [os.path.splitext(raw_data_file)[0] + ".h5" for raw_data_file in raw_data_files]
+    if not raw_data_files:
+        raise analysis_utils.IncompleteInputError('No raw data files given')
+    n_processes = min(n_processes if n_processes else mp.cpu_count(), len(raw_data_files))
+    logging.info('Analyze %d raw data file(s) in %d process(es)', len(raw_data_files), n_processes)
+
+    analyze_raw_data_file = partial(_analyze_raw_data_file, products=products, skip_existing=skip_existing, settings=settings, scan_parameter_name=scan_parameter_name, use_settings_from_file=use_settings_from_file, fei4b=fei4b, create_pdf=create_pdf, log_file=log_files)
+    results = {}
+    progress_bar = progressbar.ProgressBar(widgets=['', progressbar.Percentage(), ' ', progressbar.Bar(marker='*', left='|', right='|'), ' ', analysis_utils.ETA()], maxval=len(raw_data_files), term_width=80)
+    progress_bar.start()
+    start_time = time.time()
+    if n_processes > 1:
+        started_queue = SimpleQueue()
+        pool = mp.Pool(n_processes, initializer=_init_batch_process, initargs=(started_queue, ))
+        pending = collections.OrderedDict()  # {raw data file: async result}
+        process_died = False
+        try:
+            for raw_data_file in raw_data_files:
+                pending[raw_data_file] = pool.apply_async(analyze_raw_data_file, (raw_data_file, ))
+            started = {}  # {raw data file: (process id, start time)}
+            while pending:
+                pending.values()[0].wait(0.1)
+                while not started_queue.empty():
+                    raw_data_file, pid, file_start_time = started_queue.get()
+                    started[raw_data_file] = (pid, file_start_time)
+                alive_pids = _get_alive_pool_pids(pool)
+                for raw_data_file, result in pending.items():
+                    if result.ready():
+                        results[raw_data_file] = result.get()
+                    elif alive_pids is not None and raw_data_file in started and started[raw_data_file][0] not in alive_pids:
+                        pid, file_start_time = started[raw_data_file]
+                        logging.error('Analysis process %d of %s died', pid, raw_data_file)
+                        results[raw_data_file] = (raw_data_file, 0, time.time() - file_start_time, 'ProcessDied: the analysis process %d died' % pid)
+                        process_died = True
+                    else:
+                        continue
+                    del pending[raw_data_file]
+                    progress_bar.update(len(results))
+        finally:
+            if process_died or pending:  # join waits forever for the results of died processes
+                pool.terminate()
+            else:
+                pool.close()
+            pool.join()
+    else:
+        try:
+            for raw_data_file in raw_data_files:
+                results[raw_data_file] = analyze_raw_data_file(raw_data_file)
+                progress_bar.update(len(results))
+        finally:  # the analysis objects are not kept in this process
+            if _batch_analyze_raw_data is not None:
+                _batch_analyze_raw_data.__exit__(None, None, None)
+                _batch_analyze_raw_data = None
+    progress_bar.finish()
+    total_time = time.time() - start_time
+
+    summary = np.zeros(shape=(len(raw_data_files), ), dtype=[('raw_data_file', 'S%d' % max(len(raw_data_file) for raw_data_file in raw_data_files)), ('success', np.bool), ('n_words', np.uint64), ('time', np.float64), ('words_per_second', np.float64), ('error', 'S%d' % max([1] + [len(result[3]) for result in results.values()]))])
+    for index, raw_data_file in enumerate(raw_data_files):
+        _, n_words, analysis_time, error = results[raw_data_file]
+        summary[index] = (raw_data_file, not error, n_words, analysis_time, n_words / analysis_time if analysis_time > 0 else 0., error)
+    logging.info('Batch analysis summary:')
+    for entry in summary:
+        logging.info('%s: %s, %d words in %.1f s (%.0f words/s)%s', os.path.basename(entry['raw_data_file']), 'OK' if entry['success'] else 'FAILED', entry['n_words'], entry['time'], entry['words_per_second'], (' ' + entry['error']) if entry['error'] else '')
+    logging.info('Analyzed %d of %d file(s) successfully, %d words in %.1f s (%.0f words/s)', np.count_nonzero(summary['success']), summary.shape[0], np.sum(summary['n_words']), total_time, np.sum(summary['n_words']) / total_time if total_time > 0 else 0.)
+    return summary.view(np.recarray)
+
+
+def plot_deferred_histograms(analyzed_data_file, pdf_filename=None, n_processes=None):
+    '''Creates the plots of an analysis with deferred plotting (AnalyzeRawData.defer_plotting) from the analyzed data file. The raw data files are not needed.
+
+    Parameters
+    ----------
+    analyzed_data_file : string
+        The analyzed data file with the stored plot settings.
+    pdf_filename : string
+        The output PDF file name. If None the PDF file name of the analysis is used.
+    n_processes : int
+        The number of processes rendering the plots, None = all cores.
+    '''
+    with tb.openFile(analyzed_data_file, mode="r") as in_file_h5:
+        try:
+            plot_settings = in_file_h5.root._v_attrs.plot_settings
+        except AttributeError:
+            raise analysis_utils.IncompleteInputError('No deferred plots in %s' % analyzed_data_file)
+    with AnalyzeRawData(raw_data_file=None, analyzed_data_file=analyzed_data_file, create_pdf=False) as analyze_raw_data:
+        for setting, value in plot_settings['settings'].items():
+            setattr(analyze_raw_data, setting, value)
+        analyze_raw_data.n_plot_processes = n_processes
+        analyze_raw_data.plot_histograms(pdf_filename=pdf_filename if pdf_filename is not None else plot_settings['pdf_filename'], analyzed_data_file=plot_settings['analyzed_data_file'], maximum=plot_settings['maximum'], create_hit_hists_only=plot_settings['create_hit_hists_only'], plsr_dac_range=plot_settings['plsr_dac_range'])
+
+
 if __name__ == "__main__":
     print 'run analysis as main'
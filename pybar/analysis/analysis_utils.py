@@ -4,16 +4,22 @@
 import logging
 import re
 import os
+import sys
 import time
+import threading
+import weakref
+import Queue
 import collections
 import numpy as np
 import progressbar
 import glob
 import tables as tb
 import numexpr as ne
+from numexpr.necompiler import getExprNames
 from operator import itemgetter
 from scipy.interpolate import interp1d
 from scipy.interpolate import splrep, splev
+from scipy.sparse import csr_matrix, spmatrix
 from tables import dtype_from_descr
 from stat import ST_CTIME
 
@@ -65,6 +71,60 @@ def generate_threshold_mask(hist):
     return np.ma.getmaskarray(masked_array)
 
 
+_scan_parameter_blocks_cache = {}  # {(id(array), columns): (weak reference to the array, array shape, block start indices)}
+
+
+def get_scan_parameter_blocks(array, columns=None):
+    '''Run length encodes the values of the given columns (e.g. the scan parameters of the meta data): returns the index of the first row of every block
+    of consecutive rows with the same values. The change points of all columns are determined at once without looping over the rows. The result is
+    cached as long as the array exists, thus the array must not be changed in place.
+
+    Parameters
+    ----------
+    array : numpy.ndarray
+        Array with named columns (e.g. meta data) or 1-d/2-d array.
+    columns : iterable
+        Names of the columns (indices for a 2-d array) to be used to define a block. If None all columns are used.
+
+    Returns
+    -------
+    numpy.ndarray
+        The index of the first row of every block. A block ends at the start of the next block, the last block at the end of the array.
+    '''
+    if columns is None:
+        columns = tuple(array.dtype.names) if array.dtype.names is not None else (tuple(range(array.shape[1])) if array.ndim == 2 else ())
+    else:
+        columns = tuple(columns)
+    key = (id(array), columns)
+    cached = _scan_parameter_blocks_cache.get(key)
+    if cached is not None and cached[0]() is array and cached[1] == array.shape:
+        return cached[2]
+    if array.dtype.names is not None:
+        values = [array[column] for column in columns]
+    elif array.ndim == 2:
+        values = [array[:, column] for column in columns]
+    else:
+        values = [array]
+    change = np.zeros(shape=(array.shape[0], ), dtype=np.bool)
+    change[:1] = True  # the first row starts a block
+    for value in values:  # loop over the few columns only
+        change[1:] |= value[1:] != value[:-1]
+    block_start = np.flatnonzero(change)
+    try:
+        reference = weakref.ref(array, lambda _, key=key: _scan_parameter_blocks_cache.pop(key, None))  # removes the cached result with the array
+    except TypeError:  # array cannot be referenced weakly, do not cache
+        return block_start
+    _scan_parameter_blocks_cache[key] = (reference, array.shape, block_start)
+    return block_start
+
+
+def _get_first_unique_index(array, block_start):
+    '''Returns the sorted indices of the first rows with a unique value. Only the first rows of the blocks of equal consecutive rows are searched.
+    '''
+    _, index = np.unique(array[block_start], return_index=True)
+    return block_start[np.sort(index)]  # sort to preserve order
+
+
 def unique_row(array, use_columns=None, selected_columns_only=False):
     '''Takes a numpy array and returns the array reduced to unique rows. If columns are defined only these columns are taken to define a unique row.
     The returned array can have all columns of the original array or only the columns defined in use_columns.
@@ -85,26 +145,28 @@ def unique_row(array, use_columns=None, selected_columns_only=False):
             a_cut = array[:, use_columns]
         else:
             a_cut = array
+            use_columns = range(array.shape[1])
+        block_start = get_scan_parameter_blocks(array, columns=use_columns)
         if len(use_columns) > 1:
             b = np.ascontiguousarray(a_cut).view(np.dtype((np.void, a_cut.dtype.itemsize * a_cut.shape[1])))
         else:
             b = np.ascontiguousarray(a_cut)
-        _, index = np.unique(b, return_index=True)
+        index = _get_first_unique_index(b, block_start)
         if not selected_columns_only:
-            return array[np.sort(index)]  # sort to preserve order
+            return array[index]
         else:
-            return a_cut[np.sort(index)]  # sort to preserve order
+            return a_cut[index]
     else:  # names for dtype founnd --> array is recarray
         names = list(array.dtype.names)
         if use_columns is not None:
             new_names = [names[i] for i in use_columns]
         else:
             new_names = names
-        a_cut, index = np.unique(array[new_names], return_index=True)
+        index = _get_first_unique_index(array[new_names], get_scan_parameter_blocks(array, columns=new_names))
         if not selected_columns_only:
-            return array[np.sort(index)]  # sort to preserve order
+            return array[index]
         else:
-            return array[np.sort(index)][new_names]  # sort to preserve order
+            return array[index][new_names]
 
 
 def get_ranges_from_array(array, append_last=True):
@@ -131,6 +193,37 @@ def get_mean_from_histogram(counts, bin_positions):
     return np.dot(counts, np.array(bin_positions)) / np.sum(counts).astype('f4')
 
 
+def get_mean_from_sparse_pixel_hist(counts, values, pixel_pointer, max_value=None):
+    """
+    Calculates the mean value of every pixel from a sparse per pixel histogram (e.g. ToT/TDC) in the CSR format
+    with one row per pixel (index = column + row * 80) without creating the dense histogram.
+    Parameters
+    ----------
+    counts : array like
+        The number of entries of every non empty bin.
+    values : array like
+        The value (column index) of every non empty bin.
+    pixel_pointer : array like
+        The bins of pixel i are [pixel_pointer[i], pixel_pointer[i + 1]).
+    max_value : int
+        Only values < max_value are taken into account. If None all values are used.
+
+    Returns
+    -------
+    np.ndarray with shape (336, 80) (row, column), NaN for pixels without entries
+
+    """
+    n_pixel = pixel_pointer.shape[0] - 1
+    pixel_index = np.repeat(np.arange(n_pixel), np.diff(pixel_pointer).astype(np.int64))
+    counts = counts.astype(np.float64)
+    if max_value is not None:
+        counts[values >= max_value] = 0
+    n_entries = np.bincount(pixel_index, weights=counts, minlength=n_pixel)
+    value_sum = np.bincount(pixel_index, weights=counts * values, minlength=n_pixel)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (value_sum / n_entries).reshape((336, 80))
+
+
 def get_median_from_histogram(counts, bin_positions):
     values = []
     for index, one_bin in enumerate(counts):
@@ -292,25 +385,81 @@ def get_rate_normalization(hit_file, parameter, reference='event', cluster_file=
     return np.amax(np.array(normalization_rate)).astype('f16') / np.array(normalization_rate)
 
 
+_raw_data_file_info_cache = collections.OrderedDict()  # {file name: (modification time, raw data file info)}, the least recently used file first
+_raw_data_file_info_cache_size = 1000  # maximum number of cached raw data files, the least recently used files are removed
+_raw_data_file_info_lock = threading.Lock()
+
+
+def clear_raw_data_file_info_cache():
+    '''Removes all cached raw data file information (see get_raw_data_file_info), e.g. to free the memory after the analysis of many files.
+    '''
+    with _raw_data_file_info_lock:
+        _raw_data_file_info_cache.clear()
+
+
+def get_raw_data_file_info(file_name):
+    '''Reads the number of raw data words, the meta data, the scan parameters and the configuration needed for the analysis of a raw data file.
+    The file is opened once and every node is read once, the result is cached by file name and modification time. Thus
+    the repeated lookups during the analysis of many files do not open the files again, a changed file is read again.
+    The information of the last _raw_data_file_info_cache_size files is cached, see also clear_raw_data_file_info_cache.
+    The returned dictionary and arrays are shared between all callers (results cached by the array id, e.g. of
+    get_scan_parameter_blocks, rely on that), thus they must not be changed. The arrays are read-only, copy them to change them.
+
+    Parameters
+    ----------
+    file_name : string
+
+    Returns
+    -------
+    dict
+        With the keys n_words, meta_data, scan_parameters (None if not existing) and configuration. The configuration is a dictionary
+        {node name: configuration}, the configuration tables are given as dictionaries {name: value}, arrays as numpy arrays.
+    '''
+    modification_time = os.path.getmtime(file_name)
+    with _raw_data_file_info_lock:
+        cached = _raw_data_file_info_cache.pop(file_name, None)
+        if cached is not None and cached[0] == modification_time:
+            _raw_data_file_info_cache[file_name] = cached  # most recently used
+            return cached[1]
+    raw_data_file_info = {'configuration': {}}
+    with hdf5_lock:
+        with tb.openFile(file_name, mode="r") as in_file_h5:
+            raw_data_file_info['n_words'] = in_file_h5.root.raw_data.shape[0] if 'raw_data' in in_file_h5.root else 0
+            raw_data_file_info['meta_data'] = in_file_h5.root.meta_data[:] if 'meta_data' in in_file_h5.root else None
+            raw_data_file_info['scan_parameters'] = in_file_h5.root.scan_parameters[:] if 'scan_parameters' in in_file_h5.root else None
+            if 'configuration' in in_file_h5.root:
+                for node in in_file_h5.root.configuration:
+                    if isinstance(node, tb.Table) and node.colnames[:2] == ['name', 'value']:
+                        configuration = node[:]
+                        raw_data_file_info['configuration'][node.name] = dict(zip(configuration['name'][::-1], configuration['value'][::-1]))  # the first entry of a name is taken
+                    elif node.name in ('C_Low', 'C_High'):  # the injection capacitor masks are needed for the charge calibration
+                        raw_data_file_info['configuration'][node.name] = node[:]
+    for array in [raw_data_file_info['meta_data'], raw_data_file_info['scan_parameters']] + raw_data_file_info['configuration'].values():
+        if isinstance(array, np.ndarray):
+            array.flags.writeable = False  # the arrays are shared by all callers
+    with _raw_data_file_info_lock:
+        _raw_data_file_info_cache[file_name] = (modification_time, raw_data_file_info)
+        while len(_raw_data_file_info_cache) > _raw_data_file_info_cache_size:
+            _raw_data_file_info_cache.popitem(last=False)  # remove the least recently used file
+    return raw_data_file_info
+
+
 def get_total_n_data_words(files_dict, precise=False):
     n_words = 0
-    if precise:  # open all files and determine the total number of words precicely, can take some time
+    if precise:  # determine the total number of words of all files precicely, can take some time if the files are not cached yet
         if len(files_dict) > 10:
             progress_bar = progressbar.ProgressBar(widgets=['', progressbar.Percentage(), ' ', progressbar.Bar(marker='*', left='|', right='|'), ' ', ETA()], maxval=len(files_dict), term_width=80)
             progress_bar.start()
         for index, file_name in enumerate(files_dict.iterkeys()):
-            with tb.openFile(file_name, mode="r") as in_file_h5:  # open the actual file
-                n_words += in_file_h5.root.raw_data.shape[0]
+            n_words += get_raw_data_file_info(file_name)['n_words']
             if len(files_dict) > 10:
                 progress_bar.update(index)
         if len(files_dict) > 10:
             progress_bar.finish()
         return n_words
-    else:  # open just first an last file and take the mean to estimate the total numbe rof words
-        with tb.openFile(files_dict.keys()[0], mode="r") as in_file_h5:  # open the actual file
-            n_words += in_file_h5.root.raw_data.shape[0]
-        with tb.openFile(files_dict.keys()[-1], mode="r") as in_file_h5:  # open the actual file
-            n_words += in_file_h5.root.raw_data.shape[0]
+    else:  # take just first an last file and take the mean to estimate the total numbe rof words
+        n_words += get_raw_data_file_info(files_dict.keys()[0])['n_words']
+        n_words += get_raw_data_file_info(files_dict.keys()[-1])['n_words']
         return n_words * len(files_dict) / 2
 
 
@@ -494,54 +643,51 @@ def get_parameter_from_files(files, parameters=None, unique=False, sort=True):
         parameters = (parameters, )
     parameter_values_from_file_names_dict = get_parameter_value_from_file_names(files, parameters, unique=unique, sort=sort)  # get the parameter from the file name
     for file_name in files:
-        with tb.openFile(file_name, mode="r") as in_file_h5:  # open the actual file
-            scan_parameter_values = collections.OrderedDict()
-            try:
-                scan_parameters = in_file_h5.root.scan_parameters[:]  # get the scan parameters from the scan parameter table
-                if parameters is None:
-                    parameters = get_scan_parameter_names(scan_parameters)
-                for parameter in parameters:
-                    try:
-                        scan_parameter_values[parameter] = np.unique(scan_parameters[parameter]).tolist()  # different scan parameter values used
-                    except ValueError:  # the scan parameter does not exists
-                        pass
-            except tb.NoSuchNodeError:  # scan parameter table does not exist
+        raw_data_file_info = get_raw_data_file_info(file_name)  # the file is only opened if not cached yet
+        scan_parameter_values = collections.OrderedDict()
+        if raw_data_file_info['scan_parameters'] is not None:
+            scan_parameters = raw_data_file_info['scan_parameters']  # get the scan parameters from the scan parameter table
+            if parameters is None:
+                parameters = get_scan_parameter_names(scan_parameters)
+            for parameter in parameters:
                 try:
-                    scan_parameters = get_scan_parameter(in_file_h5.root.meta_data[:])  # get the scan parameters from the meta data
-                    if scan_parameters:
-                        try:
-                            scan_parameter_values = np.unique(scan_parameters[parameters]).tolist()  # different scan parameter values used
-                        except ValueError:  # the scan parameter does not exists
-                            pass
-                except tb.NoSuchNodeError:  # meta data table does not exist
+                    scan_parameter_values[parameter] = np.unique(scan_parameters[parameter]).tolist()  # different scan parameter values used
+                except ValueError:  # the scan parameter does not exists
                     pass
-            if not scan_parameter_values:  # if no scan parameter values could be set from file take the parameter found in the file name
-                try:
-                    scan_parameter_values = parameter_values_from_file_names_dict[file_name]
-                except KeyError:  # no scan parameter found at all, neither in the file name nor in the file
-                    scan_parameter_values = None
-            else:  # use the parameter given in the file and cross check if it matches the file name parameter if these is given
+        elif raw_data_file_info['meta_data'] is not None:  # scan parameter table does not exist
+            scan_parameters = get_scan_parameter(raw_data_file_info['meta_data'])  # get the scan parameters from the meta data
+            if scan_parameters:
                 try:
-                    for key, value in scan_parameter_values.items():
-                        if value and value[0] != parameter_values_from_file_names_dict[file_name][key][0]:  # parameter value exists: check if the first value is the file name value
-                            logging.warning('Parameter values in the file name and in the file differ. Take ' + str(key) + ' parameters ' + str(value) + ' found in %s.', file_name)
-                except KeyError:  # parameter does not exists in the file name
+                    scan_parameter_values = np.unique(scan_parameters[parameters]).tolist()  # different scan parameter values used
+                except ValueError:  # the scan parameter does not exists
                     pass
-                except IndexError:
-                    raise IncompleteInputError('Something wrong check!')
-            if unique and scan_parameter_values is not None:
-                existing = False
-                for parameter in scan_parameter_values:  # loop to determine if any value of any scan parameter exists already
-                    all_par_values = [values[parameter] for values in files_dict.values()]
-                    if any(x in [scan_parameter_values[parameter]] for x in all_par_values):
-                        existing = True
-                        break
-                if not existing:
-                    files_dict[file_name] = scan_parameter_values
-                else:
-                    logging.warning('Scan parameter value(s) from %s exists already, do not add to result', file_name)
-            else:
+        if not scan_parameter_values:  # if no scan parameter values could be set from file take the parameter found in the file name
+            try:
+                scan_parameter_values = parameter_values_from_file_names_dict[file_name]
+            except KeyError:  # no scan parameter found at all, neither in the file name nor in the file
+                scan_parameter_values = None
+        else:  # use the parameter given in the file and cross check if it matches the file name parameter if these is given
+            try:
+                for key, value in scan_parameter_values.items():
+                    if value and value[0] != parameter_values_from_file_names_dict[file_name][key][0]:  # parameter value exists: check if the first value is the file name value
+                        logging.warning('Parameter values in the file name and in the file differ. Take ' + str(key) + ' parameters ' + str(value) + ' found in %s.', file_name)
+            except KeyError:  # parameter does not exists in the file name
+                pass
+            except IndexError:
+                raise IncompleteInputError('Something wrong check!')
+        if unique and scan_parameter_values is not None:
+            existing = False
+            for parameter in scan_parameter_values:  # loop to determine if any value of any scan parameter exists already
+                all_par_values = [values[parameter] for values in files_dict.values()]
+                if any(x in [scan_parameter_values[parameter]] for x in all_par_values):
+                    existing = True
+                    break
+            if not existing:
                 files_dict[file_name] = scan_parameter_values
+            else:
+                logging.warning('Scan parameter value(s) from %s exists already, do not add to result', file_name)
+        else:
+            files_dict[file_name] = scan_parameter_values
     return collections.OrderedDict(sorted(files_dict.iteritems(), key=itemgetter(1)) if sort else files_dict)
 
 
@@ -573,18 +719,16 @@ def combine_meta_data(files_dict):
     total_length = 0  # the total length of the new table
     meta_data_v2 = True
     for file_name in files_dict.iterkeys():
-        with tb.openFile(file_name, mode="r") as in_file_h5:  # open the actual file
-            total_length += in_file_h5.root.meta_data.shape[0]
-            if total_length == 0:  # length = 0 for the first raw data file that only contains config data
-                continue
-            try:
-                in_file_h5.root.meta_data[0]['error']  # error column exists in old and new meta data format
-            except IndexError:
-                return None
-            try:
-                in_file_h5.root.meta_data[0]['timestamp_stop']  # this only exists in the new data format, https://silab-redmine.physik.uni-bonn.de/news/7
-            except IndexError:
-                meta_data_v2 = False
+        meta_data = get_raw_data_file_info(file_name)['meta_data']  # the meta data is read once and cached
+        if meta_data is None:
+            return None
+        total_length += meta_data.shape[0]
+        if meta_data.shape[0] == 0:  # length = 0 for the first raw data file that only contains config data
+            continue
+        if 'error' not in meta_data.dtype.names:  # error column exists in old and new meta data format
+            return None
+        if 'timestamp_stop' not in meta_data.dtype.names:  # this only exists in the new data format, https://silab-redmine.physik.uni-bonn.de/news/7
+            meta_data_v2 = False
 
     if meta_data_v2:
         meta_data_combined = np.empty((total_length, ), dtype=[
@@ -610,12 +754,12 @@ def combine_meta_data(files_dict):
 
     # fill actual result array
     for file_name in files_dict.iterkeys():
-        with tb.openFile(file_name, mode="r") as in_file_h5:  # open the actual file
-            array_length = in_file_h5.root.meta_data.shape[0]
-            meta_data_combined[index:index + array_length] = in_file_h5.root.meta_data[:]
-            index += array_length
-            if len(files_dict) > 10:
-                progress_bar.update(index)
+        meta_data = get_raw_data_file_info(file_name)['meta_data']
+        array_length = meta_data.shape[0]
+        meta_data_combined[index:index + array_length] = meta_data
+        index += array_length
+        if len(files_dict) > 10:
+            progress_bar.update(index)
     if len(files_dict) > 10:
         progress_bar.finish()
     return meta_data_combined
@@ -669,6 +813,40 @@ def get_events_in_both_arrays(events_one, events_two):
     return event_result[:count]
 
 
+def get_event_join_index(events_one, events_two):
+    """
+    Calculates the indices of all pairs of rows with the same event number of two sorted event number arrays (inner join on the event number). Every
+    row of the first array is combined with every row of the second array of the same event.
+
+    Parameters
+    ----------
+    events_one : array like
+        The sorted event numbers of the first array.
+    events_two : array like
+        The sorted event numbers of the second array.
+
+    Returns
+    -------
+    index_one, index_two : np.ndarray, np.ndarray
+        The row indices of the pairs in the first and second array.
+
+    """
+    events_one = np.asarray(events_one)
+    events_two = np.asarray(events_two)
+    if events_one.shape[0] == 0 or events_two.shape[0] == 0:
+        return np.zeros(shape=(0, ), dtype=np.int64), np.zeros(shape=(0, ), dtype=np.int64)
+    events = events_one[np.append(True, events_one[1:] != events_one[:-1])]  # the unique events of the sorted array
+    events = events[in1d_events(events.astype(np.int64), events_two.astype(np.int64))]  # the events in both arrays
+    start_one = np.searchsorted(events_one, events, side='left')
+    n_one = np.searchsorted(events_one, events, side='right') - start_one
+    start_two = np.searchsorted(events_two, events, side='left')
+    n_two = np.searchsorted(events_two, events, side='right') - start_two
+    n_pairs = n_one * n_two  # every row of the first array is combined with every row of the second array of the event
+    pair_event = np.repeat(np.arange(events.shape[0]), n_pairs)
+    pair_index = np.arange(pair_event.shape[0]) - np.repeat(np.cumsum(n_pairs) - n_pairs, n_pairs)  # the index of the pair within the event
+    return start_one[pair_event] + pair_index // n_two[pair_event], start_two[pair_event] + pair_index % n_two[pair_event]
+
+
 def hist_1d_index(x, shape):
     """
     Fast 1d histogram of 1D indices with C++ inner loop optimization.
@@ -874,6 +1052,57 @@ def get_meta_data_at_scan_parameter(meta_data_array, scan_parameter_name):
     return meta_data_array[get_meta_data_index_at_scan_parameter(meta_data_array, scan_parameter_name)['index']]
 
 
+class Selection(object):
+    '''A selection expression in numexpr syntax (e.g. '(relative_BCID == 6) & (column == row)') on the columns of structured arrays (e.g. hits).
+    The expression is parsed once and evaluated for every array (e.g. every chunk of a hit table). The columns are given to numexpr as views without
+    copying the data and numexpr evaluates the expression in its threads (numexpr.set_num_threads).
+
+    Parameters
+    ----------
+    condition : string
+        The selection expression. The variables are column names of the array or names of additional arrays given at evaluation.
+
+    Example
+    -------
+    selection = Selection('(relative_BCID == 6) & (column == row)')
+    for hits, _ in data_aligned_at_events(hit_table):
+        selected_hits = selection.select(hits)
+    '''
+
+    def __init__(self, condition):
+        self.condition = condition
+        try:
+            self.variables, _ = getExprNames(condition, {})
+        except Exception, e:  # numexpr raises different exceptions for invalid expressions
+            raise InvalidInputError('Invalid selection %s: %s' % (condition, str(e)))
+
+    def evaluate(self, array=None, **arrays):
+        '''Returns the boolean selection of the rows of the array. Additional arrays (e.g. masks) are used in the expression by their keyword.
+        '''
+        local_dict = {}
+        for variable in self.variables:
+            if variable in arrays:
+                local_dict[variable] = arrays[variable]
+            elif array is not None and array.dtype.names is not None and variable in array.dtype.names:
+                local_dict[variable] = array[variable]
+            else:
+                raise InvalidInputError('Unknown variable %s in selection %s' % (variable, self.condition))
+        return ne.evaluate(self.condition, local_dict=local_dict, global_dict={})
+
+    def select(self, array, **arrays):
+        '''Returns the rows of the array where the selection is true.
+        '''
+        return array[self.evaluate(array, **arrays)]
+
+
+def get_selection(condition):
+    '''Returns the Selection of a condition string, a Selection is returned unchanged and None stays None.
+    '''
+    if condition is None or isinstance(condition, Selection):
+        return condition
+    return Selection(condition)
+
+
 def select_hits(hits_array, condition=None):
     '''Selects the hits with condition.
     E.g.: condition = 'rel_BCID == 7 & event_number < 1000'
@@ -881,7 +1110,7 @@ def select_hits(hits_array, condition=None):
     Parameters
     ----------
     hits_array : numpy.array
-    condition : string
+    condition : string, Selection
         A condition that is applied to the hits in numexpr. Only if the expression evaluates to True the hit is taken.
 
     Returns
@@ -891,11 +1120,7 @@ def select_hits(hits_array, condition=None):
     '''
     if condition is None:
         return hits_array
-
-    for variable in set(re.findall(r'[a-zA-Z_]+', condition)):
-        exec(variable + ' = hits_array[\'' + variable + '\']')
-
-    return hits_array[ne.evaluate(condition)]
+    return get_selection(condition).select(hits_array)
 
 
 def get_hits_in_events(hits_array, events, assume_sorted=True, condition=None):
@@ -908,7 +1133,7 @@ def get_hits_in_events(hits_array, events, assume_sorted=True, condition=None):
     events : array
     assume_sorted : bool
         Is true if the events to select are sorted from low to high value. Increases speed by 35%.
-    condition : string
+    condition : string, Selection
         A condition that is applied to the hits in numexpr. Only if the expression evaluates to True the hit is taken.
 
     Returns
@@ -931,11 +1156,7 @@ def get_hits_in_events(hits_array, events, assume_sorted=True, condition=None):
         if condition is None:
             hits_in_events = hits_array[selection]
         else:
-            # bad hack to be able to use numexpr
-            for variable in set(re.findall(r'[a-zA-Z_]+', condition)):
-                exec(variable + ' = hits_array[\'' + variable + '\']')
-
-            hits_in_events = hits_array[ne.evaluate(condition + ' & selection')]
+            hits_in_events = hits_array[get_selection(condition).evaluate(hits_array) & selection]
     except MemoryError:
         logging.error('There are too many hits to do in RAM operations. Consider decreasing chunk size and use the write_hits_in_events function instead.')
         raise MemoryError
@@ -969,8 +1190,10 @@ def get_hits_of_scan_parameter(input_file_hits, scan_parameters=None, try_speedu
         meta_data_table_at_scan_parameter = get_unique_scan_parameter_combinations(meta_data, scan_parameters=scan_parameters)
         parameter_values = get_scan_parameters_table_from_meta_data(meta_data_table_at_scan_parameter, scan_parameters)
         event_number_ranges = get_ranges_from_array(meta_data_table_at_scan_parameter['event_number'])  # get the event number ranges for the different scan parameter settings
-        index_event_number(hit_table)  # create a event_numer index to select the hits by their event number fast, no needed but important for speed up
-#
+        hit_index = read_hit_index(in_file_h5)  # the hit index written during interpretation selects the hits of the events directly
+        if hit_index is None:
+            index_event_number(hit_table)  # create a event_numer index to select the hits by their event number fast, no needed but important for speed up
+
         # variables for read speed up
         index = 0  # index where to start the read out of the hit table, 0 at the beginning, increased during looping
         best_chunk_size = chunk_size  # number of hits to copy to RAM during looping, the optimal chunk size is determined during looping
@@ -981,7 +1204,7 @@ def get_hits_of_scan_parameter(input_file_hits, scan_parameters=None, try_speedu
 
             readout_hit_len = 0  # variable to calculate a optimal chunk size value from the number of hits for speed up
             # loop over the hits in the actual selected events with optimizations: determine best chunk size, start word index given
-            for hits, index in data_aligned_at_events(hit_table, start_event_number=start_event_number, stop_event_number=stop_event_number, start=index, try_speedup=try_speedup, chunk_size=best_chunk_size):
+            for hits, index in data_aligned_at_events(hit_table, start_event_number=start_event_number, stop_event_number=stop_event_number, start=index, try_speedup=try_speedup, chunk_size=best_chunk_size, hit_index=hit_index):
                 yield parameter_values[parameter_index], hits
                 readout_hit_len += hits.shape[0]
             best_chunk_size = int(1.5 * readout_hit_len) if int(1.05 * readout_hit_len) < chunk_size and int(1.05 * readout_hit_len) > 1e3 else chunk_size  # to increase the readout speed, estimated the number of hits for one read instruction
@@ -1046,7 +1269,7 @@ def write_hits_in_events(hit_table_in, hit_table_out, events, start_hit_word=0,
         Index of the first hit word to be analyzed. Used for speed up.
     chunk_size : int
         defines how many hits are analyzed in RAM. Bigger numbers increase the speed, too big numbers let the program crash with a memory error.
-    condition : string
+    condition : string, Selection
         A condition that is applied to the hits in numexpr style. Only if the expression evaluates to True the hit is taken.
 
     Returns
@@ -1059,6 +1282,7 @@ def write_hits_in_events(hit_table_in, hit_table_out, events, start_hit_word=0,
         max_event = np.amax(events)
         logging.debug("Write hits from hit number >= %d that exists in the selected %d events with %d <= event number <= %d into a new hit table." % (start_hit_word, len(events), min_event, max_event))
         table_size = hit_table_in.shape[0]
+        condition = get_selection(condition)  # parse the condition once for all chunks
         iHit = 0
         for iHit in range(start_hit_word, table_size, chunk_size):
             hits = hit_table_in.read(iHit, iHit + chunk_size)
@@ -1082,7 +1306,7 @@ def write_hits_in_event_range(hit_table_in, hit_table_out, event_start=None, eve
         start/stop event numbers. Stop event number is excluded. If None start/stop is set automatically.
     chunk_size : int
         defines how many hits are analyzed in RAM. Bigger numbers increase the speed, too big numbers let the program crash with a memory error.
-    condition : string
+    condition : string, Selection
         A condition that is applied to the hits in numexpr style. Only if the expression evaluates to True the hit is taken.
     Returns
     -------
@@ -1092,21 +1316,54 @@ def write_hits_in_event_range(hit_table_in, hit_table_out, event_start=None, eve
 
     logging.debug('Write hits that exists in the given event range from + ' + str(event_start) + ' to ' + str(event_stop) + ' into a new hit table')
     table_size = hit_table_in.shape[0]
-    for iHit in range(0, table_size, chunk_size):
+    condition = get_selection(condition)  # parse the condition once for all chunks
+    for iHit in range(start_hit_word, table_size, chunk_size):
         hits = hit_table_in.read(iHit, iHit + chunk_size)
         last_event_number = hits[-1]['event_number']
         selected_hits = get_data_in_event_range(hits, event_start=event_start, event_stop=event_stop)
         if condition is not None:
-            # bad hack to be able to use numexpr
-            for variable in set(re.findall(r'[a-zA-Z_]+', condition)):
-                exec(variable + ' = hits[\'' + variable + '\']')
-            selected_hits = selected_hits[ne.evaluate(condition)]
+            selected_hits = condition.select(selected_hits)
         hit_table_out.append(selected_hits)
-        if last_event_number > event_stop:  # speed up, use the fact that the hits are sorted by event_number
+        if event_stop is not None and last_event_number > event_stop:  # speed up, use the fact that the hits are sorted by event_number
             return iHit + chunk_size
     return start_hit_word
 
 
+def read_hits_in_event_range(hit_table, event_table, event_start=None, event_stop=None):
+    '''Reads the hits of the events in the event range [event_start, event_stop[. The hit index range of the events is looked up in the
+    indexed event table (Events node), thus only the selected hits are read and the hit table does not have to be searched.
+
+    Parameters
+    ----------
+    hit_table : pytables.table
+    event_table : pytables.table
+        The event table with the start/stop hit index of every event.
+    event_start, event_stop : int, None
+        start/stop event numbers. Stop event number is excluded. If None start/stop is set automatically.
+
+    Returns
+    -------
+    numpy.array
+        hit array with the hits in the event range.
+    '''
+    logging.debug('Read hits in the event range from %s to %s', str(event_start), str(event_stop))
+    condition = []
+    if event_start is not None:
+        condition.append('(event_number >= %d)' % event_start)
+    if event_stop is not None:
+        condition.append('(event_number < %d)' % event_stop)
+    if condition:
+        event_rows = event_table.get_where_list(' & '.join(condition))
+        if event_rows.shape[0] == 0:
+            return hit_table[0:0]
+        first_event_row, last_event_row = event_rows.min(), event_rows.max()
+    else:
+        if event_table.nrows == 0:
+            return hit_table[0:0]
+        first_event_row, last_event_row = 0, event_table.nrows - 1
+    return hit_table.read(event_table[first_event_row]['start_hit_index'], event_table[last_event_row]['stop_hit_index'])
+
+
 def get_events_with_n_cluster(event_number, condition='n_cluster==1'):
     '''Selects the events with a certain number of cluster.
 
@@ -1119,11 +1376,10 @@ def get_events_with_n_cluster(event_number, condition='n_cluster==1'):
     numpy.array
     '''
 
-    logging.debug("Calculate events with clusters where " + condition)
+    condition = get_selection(condition)
+    logging.debug("Calculate events with clusters where " + condition.condition)
     n_cluster_in_events = get_n_cluster_in_events(event_number)
-    n_cluster = n_cluster_in_events[:, 1]
-# return np.take(n_cluster_in_events, ne.evaluate(condition), axis=0)  # does not return only one dimension, Bug?
-    return n_cluster_in_events[ne.evaluate(condition), 0]
+    return n_cluster_in_events[condition.evaluate(n_cluster=n_cluster_in_events[:, 1]), 0]
 
 
 def get_events_with_cluster_size(event_number, cluster_size, condition='cluster_size==1'):
@@ -1140,8 +1396,9 @@ def get_events_with_cluster_size(event_number, cluster_size, condition='cluster_
     numpy.array
     '''
 
-    logging.debug("Calculate events with clusters with " + condition)
-    return np.unique(event_number[ne.evaluate(condition)])
+    condition = get_selection(condition)
+    logging.debug("Calculate events with clusters with " + condition.condition)
+    return np.unique(event_number[condition.evaluate(event_number=event_number, cluster_size=cluster_size)])
 
 
 def get_events_with_error_code(event_number, event_status, select_mask=0b1111111111111111, condition=0b0000000000000000):
@@ -1212,7 +1469,7 @@ def get_scan_parameter(meta_data_array, unique=True):
         return
     scan_parameters = collections.OrderedDict()
     for scan_par_name in meta_data_array.dtype.names[4:]:  # scan parameters are in columns 5 (= index 4) and above
-        scan_parameters[scan_par_name] = np.unique(meta_data_array[scan_par_name]) if unique else meta_data_array[scan_par_name]
+        scan_parameters[scan_par_name] = np.unique(meta_data_array[scan_par_name][get_scan_parameter_blocks(meta_data_array, columns=(scan_par_name, ))]) if unique else meta_data_array[scan_par_name]
     return scan_parameters
 
 
@@ -1258,8 +1515,7 @@ def get_scan_parameters_index(scan_parameter):
     -------
     numpy.Histogram
     '''
-    _, index = np.unique(scan_parameter, return_index=True)
-    index = np.sort(index)
+    index = _get_first_unique_index(scan_parameter, get_scan_parameter_blocks(scan_parameter))
     values = np.array(range(0, len(index)), dtype='u4')
     index = np.append(index, len(scan_parameter))
     counts = np.diff(index)
@@ -1309,11 +1565,62 @@ def index_event_number(table_with_event_numer):
         logging.debug('Event_number index exists already, omit creation')
 
 
-def data_aligned_at_events(table, start_event_number=None, stop_event_number=None, start=None, stop=None, try_speedup=True, chunk_size=10000000):
+def get_hit_index(event_number, hit_offset=0, last_event_number=None):
+    '''Takes the event numbers of sorted hits and returns the hit index (HitIndex node) with the event number and the index of the first hit of every event.
+
+    Parameters
+    ----------
+    event_number : numpy.array
+        The event numbers of the hits.
+    hit_offset : int
+        The index of the first hit in the hit table.
+    last_event_number : int
+        The event number of the last event already in the hit index. If the hits continue this event no new index entry is created.
+
+    Returns
+    -------
+    numpy.array
+        The hit index of the hits.
+    '''
+    event_start = np.flatnonzero(np.diff(event_number)) + 1 if event_number.shape[0] != 0 else np.zeros(0, dtype=np.int64)
+    if event_number.shape[0] != 0 and (last_event_number is None or event_number[0] != last_event_number):
+        event_start = np.append(0, event_start)
+    hit_index = np.empty(event_start.shape[0], dtype=dtype_from_descr(data_struct.HitIndexTable))
+    hit_index['event_number'] = event_number[event_start]
+    hit_index['start_hit_index'] = event_start + hit_offset
+    return hit_index
+
+
+def read_hit_index(in_file_h5):
+    '''Reads the hit index (HitIndex node) of the hit table (Hits node) of an opened file. Returns None if there is no valid hit index
+    (e.g. the file was interpreted without create_hit_index), then the event boundaries have to be searched in the hit table.
+    '''
+    try:
+        hit_index = in_file_h5.root.HitIndex[:]
+        n_hits = in_file_h5.root.Hits.nrows
+    except tb.NoSuchNodeError:
+        return
+    if hit_index.shape[0] != 0 and hit_index['start_hit_index'][-1] >= n_hits:  # index of another hit table
+        logging.warning('Hit index does not fit to the hit table, omit hit index')
+        return
+    return hit_index
+
+
+def get_hit_index_range(hit_index, n_hits, start_event_number=None, stop_event_number=None):
+    '''Returns the hit table index range [start, stop[ of the hits in the event range [start_event_number, stop_event_number[ from the hit index.
+    '''
+    event_start = np.append(hit_index['start_hit_index'], n_hits)
+    start = event_start[np.searchsorted(hit_index['event_number'], start_event_number, side='left')] if start_event_number is not None else 0
+    stop = event_start[np.searchsorted(hit_index['event_number'], stop_event_number, side='left')] if stop_event_number is not None else n_hits
+    return int(start), int(max(start, stop))
+
+
+def data_aligned_at_events(table, start_event_number=None, stop_event_number=None, start=None, stop=None, try_speedup=True, chunk_size=10000000, hit_index=None):
     '''Takes the table with a event_number column and returns chunks with the size up to chunk_size. The chunks are chosen in a way that the events are not splitted. Additional
     parameters can be set to increase the readout speed. If only events between a certain event range are used one can specify this. Also the start and the
     stop indices for the reading of the table can be specified for speed up.
-    It is important to index the event_number with pytables before using this function, otherwise the queries are very slow.
+    It is important to index the event_number with pytables before using this function, otherwise the queries are very slow. If the hit index of the table
+    is given (see read_hit_index) the chunks are sliced directly at the event boundaries and the table is not searched.
 
     Parameters
     ----------
@@ -1325,6 +1632,8 @@ def data_aligned_at_events(table, start_event_number=None, stop_event_number=Non
     try_speedup : bool
         Try to reduce the index range to read by searching for the indices of start and stop event number. If these event numbers are usually
         not in the data this speedup can even slow down the function!
+    hit_index : numpy.array
+        The hit index of the table with the event number and the index of the first row of every event.
     Returns
     -------
     iterable to numpy.histogram
@@ -1343,6 +1652,24 @@ def data_aligned_at_events(table, start_event_number=None, stop_event_number=Non
         do_something(data)
     '''
 
+    if hit_index is not None:  # the event boundaries are known, thus the table is read in event aligned slices
+        start_index, stop_index = get_hit_index_range(hit_index, table.nrows, start_event_number=start_event_number, stop_event_number=stop_event_number)
+        start_index = start_index if start is None else max(start_index, start)
+        stop_index = stop_index if stop is None else min(stop_index, stop)
+        event_start = hit_index['start_hit_index']
+        while start_index < stop_index:
+            chunk_stop_index = start_index + chunk_size
+            if chunk_stop_index < stop_index:
+                event_index = np.searchsorted(event_start, chunk_stop_index, side='right') - 1  # the last event of the chunk is read with the next chunk
+                if event_start[event_index] <= start_index:  # event larger than the chunk size, read the whole event
+                    event_index = np.searchsorted(event_start, start_index, side='right')
+                chunk_stop_index = min(event_start[event_index], stop_index) if event_index < event_start.shape[0] else stop_index
+            else:
+                chunk_stop_index = stop_index
+            yield table.read(start=start_index, stop=chunk_stop_index), chunk_stop_index
+            start_index = chunk_stop_index
+        return
+
     # initialize variables
     start_index_known = False
     stop_index_known = False
@@ -1398,6 +1725,214 @@ def data_aligned_at_events(table, start_event_number=None, stop_event_number=Non
             start_index = start_index + nrows  # events fully read, increase start index and continue reading
 
 
+def data_aligned_at_events_in_tables(tables, start_event_number=None, stop_event_number=None, chunk_size=10000000):
+    '''Takes several tables with a sorted event_number column (e.g. the hits of several front-ends) and returns chunks of all tables with the data of the
+    same events. The tables are read once in parallel (sorted merge), at most about chunk_size rows per table are in memory. Events are not splitted.
+
+    Parameters
+    ----------
+    tables : iterable of pytables.table
+    start_event_number : int
+        Only data starting from the start_event number is returned. Lower event numbers are discarded.
+    stop_event_number : int
+        Only data up to the stop_event number is returned. The stop_event number is not included.
+    chunk_size : int
+        The number of rows read from each table at once.
+    Returns
+    -------
+    iterable to list of numpy.array
+        The data of the actual events, one array per table.
+    last_indices: list of int
+        The index of the last table part already used for every table.
+    Example
+    -------
+    for (hits_fe_1, hits_fe_2), _ in data_aligned_at_events_in_tables((hit_table_fe_1, hit_table_fe_2)):
+        index_fe_1, index_fe_2 = get_event_join_index(hits_fe_1['event_number'], hits_fe_2['event_number'])
+        do_something(hits_fe_1[index_fe_1], hits_fe_2[index_fe_2])
+    '''
+    tables = list(tables)
+    read_indices = [0 for _ in tables]  # the next row to read of every table
+    read_sizes = [chunk_size for _ in tables]  # increased if one event does not fit into the chunk
+    buffers = [table.read(start=0, stop=0) for table in tables]  # the read but not yet returned rows
+    while True:
+        for index, table in enumerate(tables):
+            if buffers[index].shape[0] < read_sizes[index] and read_indices[index] < table.nrows:
+                data = table.read(start=read_indices[index], stop=read_indices[index] + read_sizes[index] - buffers[index].shape[0])
+                read_indices[index] += data.shape[0]
+                buffers[index] = np.concatenate((buffers[index], data))
+        open_tables = [index for index, table in enumerate(tables) if read_indices[index] < table.nrows]  # tables with rows of the last buffered event possibly not read yet
+        stop_event = min(buffers[index]['event_number'][-1] for index in open_tables) if open_tables else None  # the events below are complete in all buffers
+        if stop_event_number is not None:
+            stop_event = stop_event_number if stop_event is None else min(stop_event, stop_event_number)
+        chunks, n_rows = [], 0
+        for index in range(len(tables)):
+            split_index = np.searchsorted(buffers[index]['event_number'], stop_event, side='left') if stop_event is not None else buffers[index].shape[0]
+            chunk, buffers[index] = buffers[index][:split_index], buffers[index][split_index:]
+            n_rows += chunk.shape[0]
+            if start_event_number is not None:
+                chunk = chunk[np.searchsorted(chunk['event_number'], start_event_number, side='left'):]
+            chunks.append(chunk)
+        if any(chunk.shape[0] != 0 for chunk in chunks):
+            yield chunks, [read_indices[index] - buffers[index].shape[0] for index in range(len(tables))]
+        if n_rows != 0:
+            read_sizes = [chunk_size for _ in tables]
+        elif open_tables and (stop_event_number is None or stop_event < stop_event_number):  # one event of a table does not fit into the chunk, read more
+            for index in open_tables:
+                if buffers[index]['event_number'][-1] == stop_event:
+                    read_sizes[index] += chunk_size
+        if not open_tables or (stop_event_number is not None and stop_event == stop_event_number):  # all data returned
+            break
+
+
+hdf5_lock = threading.RLock()  # the HDF5 library is usually not compiled thread safe, thus all HDF5 accesses from concurrent threads have to be serialized with this lock
+
+
+def _put(queue, item, stop):  # blocking put that gives up if the consumer signaled to stop
+    while not stop.is_set():
+        try:
+            queue.put(item, timeout=0.1)
+            return True
+        except Queue.Full:
+            continue
+    return False
+
+
+def prefetch(iterable, queue_depth=2):
+    '''Takes an iterable and evaluates it in a background thread. Up to queue_depth items are buffered in advance, thus the
+    memory usage is limited by the queue depth. Exceptions raised during the evaluation are re-raised in the calling thread.
+    If the iterable accesses HDF5 files this has to be protected with the hdf5_lock.
+
+    Parameters
+    ----------
+    iterable : iterable
+    queue_depth : int
+        Maximum number of buffered items. If 0 the iterable is evaluated in the calling thread without any buffering.
+
+    Returns
+    -------
+    iterable
+        The items of the given iterable in the same order.
+    '''
+    if not queue_depth:
+        for item in iterable:
+            yield item
+        return
+
+    queue = Queue.Queue(maxsize=queue_depth)
+    stop = threading.Event()
+    end = object()
+
+    def produce():
+        try:
+            for item in iterable:
+                if not _put(queue, (item, None), stop):
+                    return
+        except Exception:
+            _put(queue, (end, sys.exc_info()), stop)
+        else:
+            _put(queue, (end, None), stop)
+
+    producer = threading.Thread(target=produce, name='Prefetch')
+    producer.daemon = True
+    producer.start()
+    try:
+        while True:
+            item, exc_info = queue.get()
+            if item is end:
+                if exc_info is not None:
+                    raise exc_info[0], exc_info[1], exc_info[2]
+                break
+            yield item
+    finally:
+        stop.set()
+        producer.join()
+
+
+class AsyncTableWriter(object):
+
+    '''Appends data to pytables tables in a background thread to overlap the HDF5 compression with the data analysis.
+    The number of pending write requests is limited by queue_depth. The data is copied before queuing, thus buffers that are
+    reused by the analysis (e.g. the hit array of the interpreter) can be given. Exceptions raised during writing
+    are re-raised in the calling thread on the next call or on close. All table operations are protected with the hdf5_lock.
+
+    Parameters
+    ----------
+    queue_depth : int
+        Maximum number of pending write requests. If 0 the data is written immediately in the calling thread.
+
+    Example
+    -------
+    with AsyncTableWriter(queue_depth=2) as writer:
+        writer.append(hit_table, hits)
+        writer.flush(hit_table)
+    '''
+
+    def __init__(self, queue_depth=2):
+        self.queue_depth = queue_depth
+        self._exc_info = None
+        self._abort = False
+        if self.queue_depth:
+            self._queue = Queue.Queue(maxsize=queue_depth)
+            self._thread = threading.Thread(target=self._write, name='AsyncTableWriter')
+            self._thread.daemon = True
+            self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close(raise_exception=exc_info[0] is None)
+
+    def _write(self):
+        while True:
+            request = self._queue.get()
+            if request is None:
+                break
+            if self._abort or self._exc_info is not None:  # drop all data after an error, the exception is raised in the calling thread
+                continue
+            function, args = request
+            try:
+                with hdf5_lock:
+                    function(*args)
+            except Exception:
+                self._exc_info = sys.exc_info()
+
+    def _check(self):
+        if self._exc_info is not None:
+            exc_info, self._exc_info = self._exc_info, None
+            self.close(raise_exception=False)
+            raise exc_info[0], exc_info[1], exc_info[2]
+
+    def _request(self, function, *args):
+        if not self.queue_depth:
+            function(*args)
+        else:
+            self._check()
+            self._queue.put((function, args))
+
+    def append(self, table, data):
+        self._request(table.append, np.array(data, copy=True) if self.queue_depth else data)
+
+    def flush(self, table):
+        self._request(table.flush)
+
+    def write(self, array, key, data):
+        '''Writes data to the given slice (key) of a pytables array (e.g. CArray).
+        '''
+        self._request(array.__setitem__, key, np.array(data, copy=True) if self.queue_depth else data)
+
+    def close(self, raise_exception=True):
+        '''Waits until all pending data is written and stops the writer thread.
+        '''
+        if self.queue_depth and self._thread.is_alive():
+            if not raise_exception:  # error in the calling thread, pending data is dropped
+                self._abort = True
+            self._queue.put(None)
+            self._thread.join()
+        if raise_exception:
+            self._check()
+
+
 def select_good_pixel_region(hits, col_span, row_span, min_cut_threshold=0.2, max_cut_threshold=2.0):
     '''Takes the hit array and masks all pixels with a certain occupancy.
 
@@ -1506,6 +2041,43 @@ def get_pixel_thresholds_from_calibration_array(gdacs, calibration_gdacs, thresh
     return interpolation(gdacs)
 
 
+def get_tot_charge_calibration(mean_tot, charges, n_tot=14, fill_value=None):
+    '''Inverts the per pixel ToT calibration (mean ToT at the injected charges, e.g. from the HitOrCalibration result) into a ToT to charge
+    lookup table for all pixels at once. The charge at each ToT code is linearly interpolated between the calibration points, outside of the calibrated
+    range the charge of the first/last calibration point is taken (like numpy.interp). The mean ToT has to increase with the charge.
+
+    Parameters
+    ----------
+    mean_tot : numpy.array, shape=(80,336,# of charges during calibration)
+        The mean ToT of each pixel at the injected charges.
+    charges : array like
+        The injected charges (e.g. PlsrDAC) used during calibration, needed to translate the index of the calibration array to a value.
+    n_tot : int
+        The number of ToT codes of the lookup table.
+    fill_value : float
+        The charge of pixels without calibration data (mean ToT always 0). If None the standard charge of the clusterizer (ToT + 1) is taken.
+
+    Returns
+    -------
+    numpy.array, shape=(80,336,n_tot)
+        The charge at each ToT code for each pixel.
+    '''
+    mean_tot = np.asarray(mean_tot, dtype=np.float64)
+    charges = np.asarray(charges, dtype=np.float64)
+    if charges.shape[0] != mean_tot.shape[-1] or charges.shape[0] < 2:
+        raise ValueError('Length of the provided charges does not match the last dimension of the calibration array')
+    tot = np.arange(n_tot, dtype=np.float64)
+    upper = np.clip(np.sum(mean_tot[..., np.newaxis, :] < tot[:, np.newaxis], axis=-1), 1, charges.shape[0] - 1)  # index of the first calibration point with a mean ToT >= ToT code, shape=(80,336,n_tot)
+    tot_low = np.take_along_axis(mean_tot, upper - 1, axis=-1)
+    tot_high = np.take_along_axis(mean_tot, upper, axis=-1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        fraction = np.clip(np.where(tot_high > tot_low, (tot - tot_low) / (tot_high - tot_low), 0.), 0., 1.)
+    charge = charges[upper - 1] + fraction * (charges[upper] - charges[upper - 1])
+    not_calibrated = np.all(mean_tot == 0, axis=-1)
+    charge[not_calibrated] = (tot + 1.) if fill_value is None else fill_value
+    return charge
+
+
 class ETA(progressbar.Timer):
 
     'Widget which estimate the time of arrival for the progress bar via exponential moving average.'
@@ -1584,8 +2156,142 @@ def get_data_statistics(interpreted_files):
                 print '|', os.path.basename(interpreted_file), '|', int(os.path.getsize(interpreted_file) / (1024 * 1024.)), 'Mb |', time.ctime(os.path.getctime(interpreted_file)), '|', n_events, '|', n_bad_events, '|', measurement_time, 's |', n_sr, '|', n_hits, '|'  # , mean_tot, '|', mean_bcid, '|'
 
 
+mergeable_hist_names = ('HistOcc', 'HistTot', 'HistTotPixel', 'HistTdc', 'HistTdcPixel', 'HistRelBcid', 'HistErrorCounter', 'HistTriggerErrorCounter', 'HistServiceRecord', 'HistTdcCounter', 'HistClusterSize', 'HistClusterTot', 'HistClusterCharge', 'HistNClusterPerEvent', 'HistClusterSeed', 'HistClusterPosition')  # count histograms that can be summed, the threshold/noise histograms are derived and have to be recalculated
+
+
+def read_hists(analyzed_data_file, hist_names=mergeable_hist_names):
+    '''Reads the count histograms of an analyzed data file. The sparse pixel histograms (CSR groups) are returned as scipy.sparse.csr_matrix
+    with one row per pixel (index = column + row * 80). The returned dictionary can be send between processes and merged with merge_hists.
+
+    Parameters
+    ----------
+    analyzed_data_file : string, pytables.File
+        The analyzed data file name or the opened file.
+    hist_names : iterable
+        The histogram node names to read, not existing nodes are omitted.
+
+    Returns
+    -------
+    dict
+        The histograms {node name: array}.
+    '''
+    if not isinstance(analyzed_data_file, tb.File):
+        with tb.openFile(analyzed_data_file, mode="r") as in_file_h5:
+            return read_hists(in_file_h5, hist_names=hist_names)
+    hists = {}
+    for hist_name in hist_names:
+        try:
+            node = analyzed_data_file.getNode(analyzed_data_file.root, hist_name)
+        except tb.NoSuchNodeError:
+            continue
+        if isinstance(node, tb.Group):  # sparse pixel histogram
+            shape = node._v_attrs.shape
+            hists[hist_name] = csr_matrix((node.data[:], node.indices[:], node.indptr[:]), shape=(shape[0] * shape[1], shape[2]))
+        else:
+            hists[hist_name] = node[:]
+    return hists
+
+
+def merge_hists(hists, concatenate_parameters=False):
+    '''Sums the histograms of several partial analyses (e.g. per file or per process) into one histogram set.
+    1-dim. histograms with a different number of bins (e.g. the number of cluster per event) are padded with zeros.
+
+    Parameters
+    ----------
+    hists : iterable of dict
+        The histograms {node name: array} of the partial analyses, see read_hists.
+    concatenate_parameters : boolean
+        If True the histograms per scan parameter (occupancy, cluster seeds) are concatenated along the parameter axis instead of summed,
+        e.g. for partial analyses of files with different scan parameters.
+
+    Returns
+    -------
+    dict
+        The merged histograms {node name: array}, a histogram is included if it exists in at least one partial result.
+    '''
+    merged_hists = {}
+    for partial_hists in hists:
+        for hist_name, hist in partial_hists.items():
+            if hist_name not in merged_hists:
+                merged_hists[hist_name] = hist.copy()
+                continue
+            merged_hist = merged_hists[hist_name]
+            if isinstance(hist, spmatrix):
+                if merged_hist.shape != hist.shape:
+                    raise NotSupportedError('Cannot merge %s with shape %s and %s' % (hist_name, str(merged_hist.shape), str(hist.shape)))
+                merged_hists[hist_name] = (merged_hist + hist).astype(merged_hist.dtype)
+            elif concatenate_parameters and hist_name in ('HistOcc', 'HistClusterSeed'):
+                merged_hists[hist_name] = np.concatenate((merged_hist, hist.astype(merged_hist.dtype)), axis=2)
+            elif merged_hist.ndim == 1 and hist.ndim == 1:
+                if hist.shape[0] > merged_hist.shape[0]:
+                    merged_hist = np.concatenate((merged_hist, np.zeros(hist.shape[0] - merged_hist.shape[0], dtype=merged_hist.dtype)))
+                merged_hist[:hist.shape[0]] += hist.astype(merged_hist.dtype)
+                merged_hists[hist_name] = merged_hist
+            elif merged_hist.shape == hist.shape:
+                merged_hist += hist.astype(merged_hist.dtype)
+            else:  # e.g. the occupancy of different scan parameters
+                raise NotSupportedError('Cannot merge %s with shape %s and %s' % (hist_name, str(merged_hist.shape), str(hist.shape)))
+    return merged_hists
+
+
+def write_hists(analyzed_data_file, hists, titles=None, filters=tb.Filters(complib='blosc', complevel=5, fletcher32=False)):
+    '''Writes histograms into the root of an analyzed data file with the node layout of AnalyzeRawData.
+    Sparse pixel histograms (scipy.sparse matrices) are stored as CSR groups.
+
+    Parameters
+    ----------
+    analyzed_data_file : pytables.File
+        The opened output file.
+    hists : dict
+        The histograms {node name: array}.
+    titles : dict
+        The node titles {node name: title}, if not given the node name is used.
+    '''
+    for hist_name, hist in sorted(hists.items()):
+        title = titles[hist_name] if (titles is not None and hist_name in titles) else hist_name
+        if isinstance(hist, spmatrix):
+            hist = hist.tocsr()
+            hist.sum_duplicates()
+            hist_group = analyzed_data_file.createGroup(analyzed_data_file.root, name=hist_name, title=title)
+            hist_group._v_attrs.shape = (hist.shape[0] / 80, 80, hist.shape[1])
+            for array_name, array in (('data', hist.data.astype(np.uint32)), ('indices', hist.indices.astype(np.uint32)), ('indptr', hist.indptr.astype(np.uint32))):
+                array_out = analyzed_data_file.createEArray(hist_group, name=array_name, atom=tb.Atom.from_dtype(array.dtype), shape=(0, ), filters=filters, expectedrows=max(array.shape[0], 1))
+                array_out.append(array)
+        else:
+            hist_out = analyzed_data_file.createCArray(analyzed_data_file.root, name=hist_name, title=title, atom=tb.Atom.from_dtype(hist.dtype), shape=hist.shape, filters=filters)
+            hist_out[:] = hist
+
+
+def merge_analyzed_data_files(analyzed_data_files, output_file, hist_names=mergeable_hist_names, concatenate_parameters=False):
+    '''Reduces the histograms of several analyzed data files (e.g. of file fragments analyzed in parallel processes) into one analyzed data file.
+    Only the count histograms are merged; tables and derived histograms (e.g. threshold, noise) are not copied.
+
+    Parameters
+    ----------
+    analyzed_data_files : iterable of strings
+        The analyzed data file names.
+    output_file : string
+        The merged analyzed data file name.
+    hist_names : iterable
+        The histogram node names to merge.
+    concatenate_parameters : boolean
+        If True the histograms per scan parameter are concatenated in the order of the files, see merge_hists.
+    '''
+    logging.info('Merge histograms of %d files into %s', len(analyzed_data_files), output_file)
+    merged_hists, titles = {}, {}
+    for analyzed_data_file in analyzed_data_files:
+        with tb.openFile(analyzed_data_file, mode="r") as in_file_h5:
+            merged_hists = merge_hists((merged_hists, read_hists(in_file_h5, hist_names=hist_names)), concatenate_parameters=concatenate_parameters)  # only one file is in memory at a time
+            for hist_name in merged_hists:
+                if hist_name not in titles:
+                    titles[hist_name] = in_file_h5.getNode(in_file_h5.root, hist_name)._v_title
+    with tb.openFile(output_file, mode="w") as out_file_h5:
+        write_hists(out_file_h5, merged_hists, titles=titles)
+
+
 def correlate_events(data_frame_fe_1, data_frame_fe_2):
-    '''Correlates events from different Fe by the event number
+    '''Correlates events from different Fe by the event number. The data frames are merged in memory, for large tables see
+    data_aligned_at_events_in_tables and get_event_join_index.
 
     Parameters
     ----------
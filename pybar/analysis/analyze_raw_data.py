@@ -6,10 +6,17 @@ import logging
 import progressbar
 import warnings
 import os
+import shutil
+import tempfile
 import multiprocessing as mp
+import Queue
+import collections
+from multiprocessing.pool import ThreadPool
 from functools import partial
 from scipy.optimize import curve_fit, OptimizeWarning
 from scipy.special import erf
+from scipy.sparse import csr_matrix, spmatrix
+import matplotlib
 from matplotlib.backends.backend_pdf import PdfPages
 
 from pybar.analysis import analysis_utils
@@ -42,6 +49,108 @@ def fit_scurve(scurve_data, PlsrDAC):  # data of some pixels to fit, has to be g
     return popt[1:3]
 
 
+def _scurve_jacobian(x, A, mu, sigma):  # derivatives of the S-curve after A, mu and sigma, shape (pixel, PlsrDAC, 3)
+    z = (x - mu[:, np.newaxis]) / (np.sqrt(2) * sigma[:, np.newaxis])
+    d_mu = -A[:, np.newaxis] * np.exp(-z ** 2) / (np.sqrt(2 * np.pi) * sigma[:, np.newaxis])
+    return np.dstack((0.5 * erf(z) + 0.5, d_mu, d_mu * np.sqrt(2) * z))
+
+
+def fit_scurves(scurve_data, PlsrDAC, max_iterations=200):  # data of many pixels (pixel, PlsrDAC) fitted at once, has to be global for the multiprocessing module
+    '''Fits the S-curves of all given pixels at once. The start values are calculated in closed form from the integral of the S-curve
+    (M. Mertens, PhD thesis, Juelich 2010), the fit is a Levenberg-Marquardt minimization vectorized over the pixels.
+    The result is the same as from fit_scurve. Returns an array (pixel, 2) with threshold and noise, both are 0 if the fit failed.
+    '''
+    x = np.asarray(PlsrDAC, dtype=np.float64)
+    y = np.asarray(scurve_data, dtype=np.float64)
+    if x.shape[0] < 3:
+        raise analysis_utils.NotSupportedError('Less than 3 points found for S-curve fit.')
+    result = np.zeros(shape=(y.shape[0], 2), dtype=np.float64)
+
+    index = np.argmax(np.diff(y, axis=1), axis=1)
+    max_occ = np.nanmedian(np.where(np.arange(y.shape[1]) >= index[:, np.newaxis], y, np.nan), axis=1)
+    selection = np.abs(max_occ) > 1e-08  # occupancy is zero or close to zero otherwise
+    y, max_occ, index = y[selection], max_occ[selection], index[selection]
+
+    # closed form start values from the integral of the S-curve, fit_scurve start values if the estimate fails
+    d = (x[-1] - x[0]) / (x.shape[0] - 1)
+    mu = x[-1] - d * np.sum(y, axis=1) / max_occ
+    above = x >= mu[:, np.newaxis]
+    sigma = d * np.sum(np.where(above, max_occ[:, np.newaxis] - y, y), axis=1) / max_occ * np.sqrt(np.pi / 2)
+    bad_estimate = ~np.isfinite(mu) | ~np.isfinite(sigma) | (sigma <= 0) | (mu < x[0]) | (mu > x[-1])
+    mu[bad_estimate], sigma[bad_estimate] = x[index[bad_estimate]], 2.5
+    p = np.column_stack((max_occ, mu, sigma))
+
+    cost = np.sum((scurve(x, p[:, 0:1], p[:, 1:2], p[:, 2:3]) - y) ** 2, axis=1)
+    damping = np.full(p.shape[0], 1e-3)
+    active = np.ones(p.shape[0], dtype=np.bool)
+    for _ in range(max_iterations):
+        fitting = np.nonzero(active)[0]
+        if fitting.shape[0] == 0:
+            break
+        p_fit, y_fit = p[fitting], y[fitting]
+        residuals = scurve(x, p_fit[:, 0:1], p_fit[:, 1:2], p_fit[:, 2:3]) - y_fit
+        jacobian = _scurve_jacobian(x, p_fit[:, 0], p_fit[:, 1], p_fit[:, 2])
+        jtj = np.einsum('nki,nkj->nij', jacobian, jacobian)
+        gradient = np.einsum('nki,nk->ni', jacobian, residuals)
+        diagonal = np.einsum('nii->ni', jtj) + 1e-12
+        step = np.linalg.solve(jtj + damping[fitting, np.newaxis, np.newaxis] * diagonal[:, :, np.newaxis] * np.eye(3), -gradient)
+        p_new = p_fit + step
+        cost_new = np.sum((scurve(x, p_new[:, 0:1], p_new[:, 1:2], p_new[:, 2:3]) - y_fit) ** 2, axis=1)
+        improved = np.isfinite(cost_new) & (cost_new <= cost[fitting])
+        converged = improved & ((cost[fitting] - cost_new <= 1.49012e-08 * cost[fitting]) | (np.sqrt(np.sum(step ** 2, axis=1)) <= 1.49012e-08 * (np.sqrt(np.sum(p_fit ** 2, axis=1)) + 1.49012e-08)))
+        p[fitting[improved]], cost[fitting[improved]] = p_new[improved], cost_new[improved]
+        damping[fitting] = np.where(improved, damping[fitting] * 0.1, damping[fitting] * 10.)
+        active[fitting[converged | (damping[fitting] > 1e16)]] = False  # no improvement possible anymore, at the minimum within precision
+
+    p[active] = 0  # fit failed
+    p[p[:, 1] < 0] = 0  # threshold < 0 rarely happens if fit does not work
+    result[selection] = p[:, 1:3]
+    return result
+
+
+output_products = collections.OrderedDict([  # output node: settings needed to create the node, the first setting creates the node
+    ('Hits', ('create_hit_table', )),
+    ('HitIndex', ('create_hit_index', 'create_hit_table')),
+    ('Events', ('create_event_table', )),
+    ('EventMetaData', ('create_meta_word_index', )),
+    ('meta_data', ('create_meta_event_index', )),
+    ('Cluster', ('create_cluster_table', )),
+    ('ClusterHits', ('create_cluster_hit_table', )),
+    ('HistOcc', ('create_occupancy_hist', )),
+    ('HistTot', ('create_tot_hist', )),
+    ('HistTotPixel', ('create_tot_pixel_hist', )),
+    ('HistRelBcid', ('create_rel_bcid_hist', )),
+    ('HistTdc', ('create_tdc_hist', )),
+    ('HistTdcPixel', ('create_tdc_pixel_hist', )),
+    ('HistErrorCounter', ('create_error_hist', )),
+    ('HistTriggerErrorCounter', ('create_trigger_error_hist', )),
+    ('HistServiceRecord', ('create_service_record_hist', )),
+    ('HistTdcCounter', ('create_tdc_counter_hist', )),
+    ('HistThreshold', ('create_threshold_hists', 'create_occupancy_hist')),
+    ('HistNoise', ('create_threshold_hists', 'create_occupancy_hist')),
+    ('HistThresholdFitted', ('create_fitted_threshold_hists', 'create_occupancy_hist')),
+    ('HistNoiseFitted', ('create_fitted_threshold_hists', 'create_occupancy_hist')),
+    ('HistThresholdFittedCalib', ('create_fitted_threshold_hists', 'create_occupancy_hist')),
+    ('HistNoiseFittedCalib', ('create_fitted_threshold_hists', 'create_occupancy_hist')),
+    ('HistClusterSize', ('create_cluster_size_hist', )),
+    ('HistClusterTot', ('create_cluster_tot_hist', )),
+    ('HistClusterCharge', ('create_cluster_charge_hist', )),
+    ('HistNClusterPerEvent', ('create_n_cluster_per_event_hist', )),
+    ('HistClusterSeed', ('create_cluster_seed_hist', )),
+    ('HistClusterPosition', ('create_cluster_position_hist', )),
+    ('InterpreterState', ('create_interpreter_state', ))
+])
+
+plotting_settings = ('create_threshold_hists', 'create_threshold_mask', 'create_fitted_threshold_hists', 'create_fitted_threshold_mask', 'create_occupancy_hist', 'create_source_scan_hist', 'create_tot_hist', 'create_tot_pixel_hist', 'sparse_pixel_hists', 'create_tdc_counter_hist', 'create_tdc_hist', 'create_cluster_size_hist', 'create_cluster_tot_hist', 'create_n_cluster_per_event_hist', 'create_cluster_seed_hist', 'create_cluster_position_hist', 'create_rel_bcid_hist', 'set_stop_mode', 'create_tdc_pixel_hist', 'create_error_hist', 'create_service_record_hist', 'create_trigger_error_hist')  # settings that select the plots of plot_histograms
+
+
+def render_plot(plot, dpi=150):  # renders one plot (plotting function name, arguments, file name) into its own image file, has to be global for the multiprocessing module
+    plot_function, kwargs, filename = plot
+    with matplotlib.rc_context({'savefig.dpi': dpi}):
+        getattr(plotting, plot_function)(filename=filename, **kwargs)
+    return filename
+
+
 class AnalyzeRawData(object):
 
     """A class to analyze FE-I4 raw data"""
@@ -69,6 +178,31 @@ class AnalyzeRawData(object):
         self.interpreter = PyDataInterpreter()
         self.histograming = PyDataHistograming()
         self.clusterizer = PyDataClusterizer()
+        self.cluster_seed_histograming = PyDataHistograming()  # histograms the cluster seeds with the scan parameter settings of the hit histograming
+        self.cluster_seed_histograming.create_occupancy_hist(True)
+        self._reset_cluster_hists()
+        self.output_pdf = None
+        self.set_standard_settings()
+        self.set_raw_data_file(raw_data_file=raw_data_file, analyzed_data_file=analyzed_data_file, create_pdf=create_pdf, scan_parameter_name=scan_parameter_name)
+
+    def set_raw_data_file(self, raw_data_file, analyzed_data_file=None, create_pdf=True, scan_parameter_name=None):
+        '''Sets the raw data file(s) and the output analyzed data file. The constructed c++ objects can be reused for other files
+        (e.g. in a batch analysis), reset() and set_standard_settings() start a new analysis with standard settings.
+
+        Parameters
+        ----------
+        raw_data_file : string or tuple, list
+            A string or a list of strings with the raw data file name(s). File ending (.h5)
+            does not not have to be set.
+        analyzed_data_file : string
+            The file name of the output analyzed data file. File ending (.h5)
+            Does not have to be set.
+        create_pdf : boolean
+            Creates interpretation plots into one PDF file. Only active if raw_data_file is given.
+        scan_parameter_name : string or iterable
+            The name/names of scan parameter(s) to be used during analysis. If not set the scan parameter
+            table is used to extract the scan parameters. Otherwise no scan parameter is set.
+        '''
         raw_data_files = []
 
         if isinstance(raw_data_file, (list, set, tuple)):
@@ -111,7 +245,9 @@ class AnalyzeRawData(object):
             self.files_dict = None
             self.scan_parameters = None
 
-        self.set_standard_settings()
+        if self.output_pdf is not None:  # the plots of the previous raw data file are finished
+            logging.info('Closing output PDF file: %s', str(self.output_pdf._file.fh.name))
+            self.output_pdf.close()
         if raw_data_file is not None and create_pdf:
             if isinstance(raw_data_file, list):  # for multiple raw data files name pdf accorfing to the first file
                 output_pdf_filename = os.path.splitext(raw_data_file[0])[0] + ".pdf"
@@ -122,6 +258,8 @@ class AnalyzeRawData(object):
         else:
             self.output_pdf = None
         self._scan_parameter_name = scan_parameter_name
+        self._interpreted_words = None  # set by interpret_word_table to be able to resume the interpretation
+        self._planned_products, self._kept_products = None, None  # set by plan_analysis
         self._settings_from_file_set = False  # the scan settings are in a list of files only in the first one, thus set this flag to suppress warning for other files
 
     def __enter__(self):
@@ -131,6 +269,7 @@ class AnalyzeRawData(object):
         del self.interpreter
         del self.histograming
         del self.clusterizer
+        del self.cluster_seed_histograming
         if self.output_pdf is not None and isinstance(self.output_pdf, PdfPages):
             logging.info('Closing output PDF file: %s', str(self.output_pdf._file.fh.name))
             self.output_pdf.close()
@@ -151,6 +290,9 @@ class AnalyzeRawData(object):
         self.meta_event_index = None
         self.fei4b = False
         self.create_hit_table = False
+        self.create_hit_index = False  # stores the index of the first hit of every event of the hit table (HitIndex node) for direct event access
+        self.create_compact_hits = False  # hits with column, row, ToT, relative BCID and event number only, the event information is stored once per event in the Events table
+        self.create_event_table = False  # the Events table is always created for compact hits
         self.create_meta_event_index = True
         self.create_tot_hist = True
         self.create_tot_pixel_hist = True
@@ -158,20 +300,33 @@ class AnalyzeRawData(object):
         self.create_error_hist = True
         self.create_service_record_hist = True
         self.create_occupancy_hist = True
+        self.occupancy_window = None  # number of scan parameters of the occupancy histogram kept in memory, finished parameters are written to the output file during the analysis, None = all parameters in memory
         self.create_meta_word_index = False
+        self.create_interpreter_state = False  # stores the interpreter state and the event number per read out in the analyzed data file, needed to resume the interpretation with interpret_word_table(resume=True)
         self.create_source_scan_hist = False
         self.create_tdc_hist = False
         self.create_tdc_counter_hist = False
         self.create_tdc_pixel_hist = False
+        self.sparse_pixel_hists = False  # the ToT/TDC pixel histograms are filled sparse with 32-bit counts and stored in the CSR format
         self.create_trigger_error_hist = False
         self.create_threshold_hists = False
         self.create_threshold_mask = True  # threshold/noise histogram mask: masking all pixels out of bounds
         self.create_fitted_threshold_mask = True  # fitted threshold/noise histogram mask: masking all pixels out of bounds
         self.create_fitted_threshold_hists = False
+        self.n_fit_cores = None  # number of CPU cores used for the S-curve fit, None = all cores
+        self.n_plot_processes = 1  # number of processes rendering the plots of plot_histograms, None = all cores
+        self.defer_plotting = False  # plot_histograms only stores the plot settings in the analyzed data file, the plots are created later with analysis.plot_deferred_histograms
         self.create_cluster_hit_table = False
         self.create_cluster_table = False
         self.create_cluster_size_hist = False
         self.create_cluster_tot_hist = False
+        self.create_cluster_charge_hist = False  # cluster charge histogram per cluster size in units of the charge calibration
+        self.create_n_cluster_per_event_hist = False  # histogram of the number of cluster per event with cluster, filled during clustering
+        self.create_cluster_seed_hist = False  # cluster seed occupancy per scan parameter, filled during clustering
+        self.create_cluster_position_hist = False  # occupancy of the mean cluster position, filled during clustering
+        self.charge_calibration = None  # per pixel ToT to charge lookup table with the shape (80, 336, ToT) used for the cluster charge, None = charge is ToT + 1
+        self.n_cluster_threads = 1  # number of clusterizers clustering the event aligned hit chunks of analyze_hit_table in parallel threads, None = all cores
+        self.sparse_clustering = False  # the cluster seeds are searched in the sorted hits of the event instead of the hit map area, same result but faster for events with few hits spread over a large area
         self.align_at_trigger = False  # use the trigger word to align the events
         self.align_at_tdc = False  # use the trigger word to align the events
         self.use_trigger_time_stamp = False  # the trigger number is a time stamp
@@ -179,6 +334,7 @@ class AnalyzeRawData(object):
         self.max_tdc_delay = 255
         self.max_trigger_number = 2 ** 16 - 1
         self.set_stop_mode = False  # the FE is read out with stop mode, therefore the BCID plot is different
+        self.pipeline_depth = 2  # number of raw data chunks read in advance and number of pending table writes, 0 disables the background reading/writing
 
     def reset(self):
         '''Reset the c++ libraries for new analysis.
@@ -186,6 +342,12 @@ class AnalyzeRawData(object):
         self.interpreter.reset()
         self.histograming.reset()
         self.clusterizer.reset()
+        self.cluster_seed_histograming.reset()
+        self._reset_cluster_hists()
+
+    def _reset_cluster_hists(self):
+        self._n_cluster_per_event_hist = np.zeros(shape=(1, ), dtype=np.uint32)
+        self._cluster_position_hist = np.zeros(shape=(80, 336), dtype=np.uint32)
 
     @property
     def chunk_size(self):
@@ -204,6 +366,32 @@ class AnalyzeRawData(object):
     def create_hit_table(self, value):
         self._create_hit_table = value
 
+    @property
+    def create_hit_index(self):
+        return self._create_hit_index
+
+    @create_hit_index.setter
+    def create_hit_index(self, value):
+        self._create_hit_index = value
+
+    @property
+    def create_compact_hits(self):
+        return self._create_compact_hits
+
+    @create_compact_hits.setter
+    def create_compact_hits(self, value):
+        self.interpreter.create_compact_hits(value)
+        self._create_compact_hits = value
+
+    @property
+    def create_event_table(self):
+        return self._create_event_table
+
+    @create_event_table.setter
+    def create_event_table(self, value):
+        self.interpreter.create_event_info_array(value)
+        self._create_event_table = value
+
     @property
     def create_occupancy_hist(self):
         return self._create_occupancy_hist
@@ -223,7 +411,7 @@ class AnalyzeRawData(object):
 
     @property
     def create_tot_hist(self):
-        return self.create_tot_hist
+        return self._create_tot_hist
 
     @create_tot_hist.setter
     def create_tot_hist(self, value):
@@ -257,6 +445,24 @@ class AnalyzeRawData(object):
         self._create_tot_pixel_hist = value
         self.histograming.create_tot_pixel_hist(value)
 
+    @property
+    def sparse_pixel_hists(self):
+        return self._sparse_pixel_hists
+
+    @sparse_pixel_hists.setter
+    def sparse_pixel_hists(self, value):
+        self._sparse_pixel_hists = value
+        self.histograming.set_sparse_pixel_hists(value)
+
+    @property
+    def occupancy_window(self):
+        return self._occupancy_window
+
+    @occupancy_window.setter
+    def occupancy_window(self, value):
+        self._occupancy_window = value
+        self.histograming.set_occupancy_window(value if value else 0)
+
     @property
     def create_rel_bcid_hist(self):
         return self._create_rel_bcid_hist
@@ -290,6 +496,30 @@ class AnalyzeRawData(object):
     def create_fitted_threshold_mask(self, value):
         self._create_fitted_threshold_mask = value
 
+    @property
+    def n_fit_cores(self):
+        return self._n_fit_cores
+
+    @n_fit_cores.setter
+    def n_fit_cores(self, value):
+        self._n_fit_cores = value
+
+    @property
+    def n_plot_processes(self):
+        return self._n_plot_processes
+
+    @n_plot_processes.setter
+    def n_plot_processes(self, value):
+        self._n_plot_processes = value
+
+    @property
+    def defer_plotting(self):
+        return self._defer_plotting
+
+    @defer_plotting.setter
+    def defer_plotting(self, value):
+        self._defer_plotting = value
+
     @property
     def create_fitted_threshold_hists(self):
         return self._create_fitted_threshold_hists
@@ -338,6 +568,14 @@ class AnalyzeRawData(object):
     def create_meta_event_index(self, value):
         self._create_meta_event_index = value
 
+    @property
+    def create_interpreter_state(self):
+        return self._create_interpreter_state
+
+    @create_interpreter_state.setter
+    def create_interpreter_state(self, value):
+        self._create_interpreter_state = value
+
     @property
     def create_meta_word_index(self):
         return self._create_meta_word_index
@@ -428,6 +666,83 @@ class AnalyzeRawData(object):
     def create_cluster_tot_hist(self, value):
         self._create_cluster_tot_hist = value
 
+    @property
+    def create_cluster_charge_hist(self):
+        return self._create_cluster_charge_hist
+
+    @create_cluster_charge_hist.setter
+    def create_cluster_charge_hist(self, value):
+        self._create_cluster_charge_hist = value
+
+    @property
+    def create_n_cluster_per_event_hist(self):
+        return self._create_n_cluster_per_event_hist
+
+    @create_n_cluster_per_event_hist.setter
+    def create_n_cluster_per_event_hist(self, value):
+        self._create_n_cluster_per_event_hist = value
+
+    @property
+    def create_cluster_seed_hist(self):
+        return self._create_cluster_seed_hist
+
+    @create_cluster_seed_hist.setter
+    def create_cluster_seed_hist(self, value):
+        self._create_cluster_seed_hist = value
+
+    @property
+    def create_cluster_position_hist(self):
+        return self._create_cluster_position_hist
+
+    @create_cluster_position_hist.setter
+    def create_cluster_position_hist(self, value):
+        self._create_cluster_position_hist = value
+
+    @property
+    def create_cluster_hists(self):
+        return self._create_cluster_size_hist and self._create_cluster_tot_hist and self._create_n_cluster_per_event_hist and self._create_cluster_seed_hist and self._create_cluster_position_hist
+
+    @create_cluster_hists.setter
+    def create_cluster_hists(self, value):
+        '''Enables/disables all standard cluster histograms. They are filled during clustering, the Cluster/ClusterHits tables are not needed.
+        '''
+        self.create_cluster_size_hist = value
+        self.create_cluster_tot_hist = value
+        self.create_n_cluster_per_event_hist = value
+        self.create_cluster_seed_hist = value
+        self.create_cluster_position_hist = value
+
+    @property
+    def charge_calibration(self):
+        return self._charge_calibration
+
+    @charge_calibration.setter
+    def charge_calibration(self, value):
+        self._charge_calibration = value
+        self.clusterizer.set_charge_calibration(self._get_charge_calibration())
+
+    def _get_charge_calibration(self):
+        if self._charge_calibration is None:
+            return np.broadcast_to(np.arange(1, 15, dtype=np.float32), (80, 336, 14))  # the standard charge ToT + 1 of the clusterizer
+        return self._charge_calibration
+
+    @property
+    def n_cluster_threads(self):
+        return self._n_cluster_threads
+
+    @n_cluster_threads.setter
+    def n_cluster_threads(self, value):
+        self._n_cluster_threads = value
+
+    @property
+    def sparse_clustering(self):
+        return self._sparse_clustering
+
+    @sparse_clustering.setter
+    def sparse_clustering(self, value):
+        self._sparse_clustering = value
+        self.clusterizer.set_sparse_clustering(value)
+
     @property
     def align_at_trigger(self):
         return self._align_at_trigger
@@ -490,7 +805,204 @@ class AnalyzeRawData(object):
     def set_stop_mode(self, value):
         self._set_stop_mode = value
 
-    def interpret_word_table(self, analyzed_data_file=None, use_settings_from_file=True, fei4b=None):
+    @property
+    def pipeline_depth(self):
+        return self._pipeline_depth
+
+    @pipeline_depth.setter
+    def pipeline_depth(self, value):
+        self._pipeline_depth = value
+
+    def plan_analysis(self, products, skip_existing=True):
+        '''Enables only the settings needed to create the given output products (node names of the analyzed data file, see output_products)
+        and disables all other outputs. The plan with the estimated memory and IO is logged. If skip_existing is set, products that exist
+        already in the analyzed data file are not created again and are kept by interpret_word_table.
+
+        Parameters
+        ----------
+        products : iterable of strings
+            The output node names, e.g. ('HistOcc', 'HistClusterSize', 'Cluster').
+        skip_existing : boolean
+            True if existing products in the analyzed data file are kept.
+
+        Returns
+        -------
+        dict
+            The plan with the products to create, the intermediate products (created as a side effect), the existing products, the
+            enabled settings and the estimated memory, raw data read and output write in bytes. The write estimate is an upper bound.
+        '''
+        for product in products:
+            if product not in output_products:
+                raise analysis_utils.NotSupportedError('Unknown output product %s, possible products: %s' % (product, ', '.join(output_products.keys())))
+        existing_products = []
+        if skip_existing and self._analyzed_data_file is not None and os.path.isfile(self._analyzed_data_file):
+            with tb.open_file(self._analyzed_data_file, mode="r") as in_file_h5:
+                existing_products = [product for product in output_products if product in in_file_h5.root]
+        missing_products = [product for product in products if product not in existing_products]
+        settings = set(setting for product in missing_products for setting in output_products[product])
+        for setting in set(setting for product_settings in output_products.values() for setting in product_settings):
+            setattr(self, setting, setting in settings)
+        created_products = [product for product, product_settings in output_products.items() if product_settings[0] in settings]
+        self._kept_products = [product for product in existing_products if product not in created_products] if skip_existing else None
+        self._planned_products = missing_products
+
+        n_words = analysis_utils.get_total_n_data_words(self.files_dict, precise=True) if self.files_dict else 0
+        n_parameters = 1 if self.scan_parameters is None else np.unique(analysis_utils.get_scan_parameters_index(self.scan_parameters)).shape[0]
+        hit_size = dtype_from_descr(data_struct.CompactHitInfoTable if self._create_compact_hits else data_struct.HitInfoTable).itemsize
+        n_hits = 2 * n_words  # a data record holds at most two hits
+        table_sizes = {'Hits': n_hits * hit_size, 'HitIndex': n_hits * dtype_from_descr(data_struct.HitIndexTable).itemsize, 'Events': n_words * dtype_from_descr(data_struct.EventInfoTable).itemsize, 'EventMetaData': n_words * dtype_from_descr(data_struct.MetaInfoWordTable).itemsize, 'Cluster': n_hits * dtype_from_descr(data_struct.ClusterInfoTable).itemsize, 'ClusterHits': n_hits * dtype_from_descr(data_struct.ClusterHitInfoTable).itemsize}
+        hist_sizes = {'HistOcc': 80 * 336 * (min(n_parameters, self._occupancy_window) if self._occupancy_window else n_parameters) * 4, 'HistTotPixel': 80 * 336 * 16 * 2, 'HistTdcPixel': 80 * 336 * 4096 * 2, 'HistClusterSeed': 80 * 336 * n_parameters * 4}
+        memory = (self._pipeline_depth + 1) * self._chunk_size * 4 + 2 * self._chunk_size * hit_size  # raw data chunks and hit array
+        if self.is_cluster_hits():
+            memory += 2 * self._chunk_size * (dtype_from_descr(data_struct.ClusterInfoTable).itemsize + dtype_from_descr(data_struct.ClusterHitInfoTable).itemsize)
+        memory += sum(hist_sizes[product] for product in created_products if product in hist_sizes)
+        if not missing_products:  # nothing to do
+            n_words, memory = 0, 0
+        plan = {
+            'products': [product for product in products if product in created_products],
+            'intermediate_products': [product for product in created_products if product not in products],
+            'existing_products': [product for product in products if product not in created_products],
+            'settings': sorted(settings),
+            'memory': memory,
+            'read': n_words * 4,
+            'write': sum(table_sizes[product] for product in created_products if product in table_sizes) + sum(hist_sizes.get(product, 0) for product in created_products)
+        }
+        logging.info('Analysis plan: create %s', ', '.join(plan['products']) if plan['products'] else 'nothing')
+        if plan['intermediate_products']:
+            logging.info('Analysis plan: intermediate products %s', ', '.join(plan['intermediate_products']))
+        if plan['existing_products']:
+            logging.info('Analysis plan: skip existing %s', ', '.join(plan['existing_products']))
+        logging.info('Analysis plan: enabled settings %s', ', '.join(plan['settings']) if plan['settings'] else 'None')
+        logging.info('Analysis plan: ~%d MB memory, %d MB raw data read, up to %d MB output', plan['memory'] / 1024 ** 2, plan['read'] / 1024 ** 2, plan['write'] / 1024 ** 2)
+        return plan
+
+    def add_raw_data_files(self, raw_data_file):
+        '''Adds raw data files to the analysis, e.g. the new files of a running measurement. The added files are interpreted
+        by calling interpret_word_table with resume set to True.
+
+        Parameters
+        ----------
+        raw_data_file : string or tuple, list
+            A string or a list of strings with the raw data file name(s). File ending (.h5)
+            does not not have to be set.
+        '''
+        if isinstance(raw_data_file, basestring):
+            raw_data_file = (raw_data_file, )
+        raw_data_files = [os.path.splitext(one_raw_data_file)[0] + ".h5" for one_raw_data_file in raw_data_file]
+        files_dict = collections.OrderedDict() if self.files_dict is None else self.files_dict.copy()
+        files_dict.update(analysis_utils.get_parameter_from_files([one_raw_data_file for one_raw_data_file in raw_data_files if one_raw_data_file not in files_dict], parameters=self._scan_parameter_name, sort=False))  # the interpreted files keep their order
+        if not analysis_utils.check_parameter_similarity(files_dict):
+            raise analysis_utils.NotSupportedError('Different scan parameters in multiple files are not supported.')
+        self.files_dict = files_dict
+        self.scan_parameters = analysis_utils.create_parameter_table(self.files_dict)
+
+    def _get_resume_hist_names(self):
+        '''Returns the names of the enabled histograms that are filled during the interpretation and have to be restored to resume the interpretation.
+        '''
+        hist_names = []
+        if self.is_histogram_hits():
+            hist_names.extend(hist_name for hist_name, create_hist in (('HistOcc', self._create_occupancy_hist), ('HistTot', self._create_tot_hist), ('HistTotPixel', self._create_tot_pixel_hist), ('HistTdc', self._create_tdc_hist), ('HistTdcPixel', self._create_tdc_pixel_hist), ('HistRelBcid', self._create_rel_bcid_hist)) if create_hist)
+        if self.is_cluster_hits():
+            hist_names.extend(hist_name for hist_name, create_hist in (('HistClusterSize', self._create_cluster_size_hist), ('HistClusterTot', self._create_cluster_tot_hist), ('HistClusterCharge', self._create_cluster_charge_hist), ('HistNClusterPerEvent', self._create_n_cluster_per_event_hist), ('HistClusterSeed', self._create_cluster_seed_hist), ('HistClusterPosition', self._create_cluster_position_hist)) if create_hist)
+        return hist_names
+
+    def _read_resume_state(self):
+        '''Reads the state of the interpretation stored in the analyzed data file to be able to resume the interpretation: the interpreted words per
+        raw data file, the interpreter state, the event number per read out and the histograms. The interpretation can thus be resumed by any
+        AnalyzeRawData object with the same settings, e.g. in a new process.
+        '''
+        if self._analyzed_data_file is None or not os.path.isfile(self._analyzed_data_file):
+            raise analysis_utils.NotSupportedError('Cannot resume, the raw data was not interpreted before')
+        if self._occupancy_window:
+            raise analysis_utils.NotSupportedError('Cannot resume the interpretation with an occupancy window')
+        with tb.open_file(self._analyzed_data_file, mode="r") as in_file_h5:
+            interpreted_words = getattr(in_file_h5.root._v_attrs, 'interpreted_words', None)
+            if interpreted_words is None or 'InterpreterState' not in in_file_h5.root:
+                raise analysis_utils.NotSupportedError('Cannot resume, the analyzed data file %s has no interpreter state (create_interpreter_state)' % self._analyzed_data_file)
+            raw_data_files = self.files_dict.keys()
+            if set(raw_data_files[:len(interpreted_words)]) != set(interpreted_words):
+                raise analysis_utils.NotSupportedError('Cannot resume, the analyzed data file %s was not created from the first given raw data files' % self._analyzed_data_file)
+            for raw_data_file in raw_data_files[:len(interpreted_words) - 1]:  # the event numbers of the read outs are kept, thus only the last interpreted file can grow
+                if analysis_utils.get_raw_data_file_info(raw_data_file)['n_words'] != interpreted_words[raw_data_file]:
+                    raise analysis_utils.NotSupportedError('Cannot resume, the raw data file %s changed and is not the last interpreted file' % raw_data_file)
+            hist_names = self._get_resume_hist_names()
+            hists = analysis_utils.read_hists(in_file_h5, hist_names=hist_names)
+            missing_hist_names = [hist_name for hist_name in hist_names if hist_name not in hists]
+            if missing_hist_names:
+                raise analysis_utils.NotSupportedError('Cannot resume, the analyzed data file %s has no %s' % (self._analyzed_data_file, ', '.join(missing_hist_names)))
+            state_group = in_file_h5.root.InterpreterState
+            resume_state = dict((node._v_name, node[:]) for node in state_group)
+        resume_state['interpreted_words'] = interpreted_words
+        resume_state['hists'] = hists
+        return resume_state
+
+    def _restore_resume_state(self, resume_state):
+        '''Restores the interpreter state read by _read_resume_state.
+        '''
+        self.interpreter.set_state(resume_state['State'])
+        self.interpreter.set_hit_buffer(resume_state['HitBuffer'])
+        self.interpreter.set_service_records_counters(resume_state['ServiceRecordCounter'])
+        self.interpreter.set_error_counters(resume_state['ErrorCounter'])
+        self.interpreter.set_trigger_error_counters(resume_state['TriggerErrorCounter'])
+        self.interpreter.set_tdc_counters(resume_state['TdcCounter'])
+
+    def _restore_hists(self, hists):
+        '''Restores the histograms read by _read_resume_state, the scan parameters have to be set before.
+        '''
+        def set_pixel_hist(hist, set_hist, set_hist_sparse):  # the pixel histograms can be stored sparse or dense (row, column, value)
+            if self._sparse_pixel_hists:
+                hist = csr_matrix(hist.reshape((336 * 80, hist.shape[2]))) if not isinstance(hist, spmatrix) else hist.tocsr()
+                hist.sort_indices()
+                set_hist_sparse((hist.data, hist.indices, hist.indptr))
+            else:
+                hist = hist.toarray().reshape((336, 80, hist.shape[1])) if isinstance(hist, spmatrix) else hist
+                set_hist(np.swapaxes(hist, 0, 1))  # swap axis row, col --> col, row
+
+        for hist_name, hist in hists.items():
+            if hist_name == 'HistOcc':
+                self.histograming.set_occupancy(np.swapaxes(hist, 0, 1))
+            elif hist_name == 'HistTot':
+                self.histograming.set_tot_hist(hist)
+            elif hist_name == 'HistTotPixel':
+                set_pixel_hist(hist, self.histograming.set_tot_pixel_hist, self.histograming.set_tot_pixel_hist_sparse)
+            elif hist_name == 'HistTdc':
+                self.histograming.set_tdc_hist(hist)
+            elif hist_name == 'HistTdcPixel':
+                set_pixel_hist(hist, self.histograming.set_tdc_pixel_hist, self.histograming.set_tdc_pixel_hist_sparse)
+            elif hist_name == 'HistRelBcid':
+                self.histograming.set_rel_bcid_hist(hist)
+            elif hist_name == 'HistClusterSize':
+                self.clusterizer.set_cluster_size_hist(hist)
+            elif hist_name == 'HistClusterTot':
+                self.clusterizer.set_cluster_tot_hist(hist)
+            elif hist_name == 'HistClusterCharge':
+                self.clusterizer.set_cluster_charge_hist(hist)
+            elif hist_name == 'HistNClusterPerEvent':
+                self._n_cluster_per_event_hist = hist.astype(np.uint32)
+            elif hist_name == 'HistClusterSeed':
+                self.cluster_seed_histograming.set_occupancy(np.swapaxes(hist, 0, 1))
+            elif hist_name == 'HistClusterPosition':
+                self._cluster_position_hist = np.ascontiguousarray(np.swapaxes(hist, 0, 1), dtype=np.uint32)
+
+    def _write_interpreter_state(self):
+        '''Stores the interpreter state (counters, variables and buffered hits of the not finished event) and the event number per read out
+        in the analyzed data file. Together with the histograms the interpretation can be resumed from the file.
+        '''
+        state_group = self.out_file_h5.create_group(self.out_file_h5.root, name='InterpreterState', title='Interpreter state to resume the interpretation')
+        self.out_file_h5.create_table(state_group, name='State', obj=self.interpreter.get_state(), title='Interpreter counters and event variables')
+        self.out_file_h5.create_table(state_group, name='HitBuffer', obj=self.interpreter.get_hit_buffer(), title='Hits of the not finished event')
+        for name, counters in (('ServiceRecordCounter', self.interpreter.get_service_records_counters()), ('ErrorCounter', self.interpreter.get_error_counters()), ('TriggerErrorCounter', self.interpreter.get_trigger_error_counters()), ('TdcCounter', self.interpreter.get_tdc_counters())):
+            self.out_file_h5.create_carray(state_group, name=name, obj=counters, filters=self._filter_table)
+        self.out_file_h5.create_carray(state_group, name='MetaEventIndex', obj=self.meta_event_index['metaEventIndex'], filters=self._filter_table)
+
+    def _create_output_table(self, name, description, title, resume=False, **kwargs):
+        '''Creates a table in the analyzed data file. If the interpretation is resumed the existing table is returned to be extended.
+        '''
+        if resume and name in self.out_file_h5.root:
+            return self.out_file_h5.get_node(self.out_file_h5.root, name)
+        return self.out_file_h5.create_table(self.out_file_h5.root, name=name, description=description, title=title, filters=self._filter_table, **kwargs)
+
+    def interpret_word_table(self, analyzed_data_file=None, use_settings_from_file=True, fei4b=None, resume=False, finish=True):
         '''Interprets the raw data word table of all given raw data files with the c++ library.
         Creates the h5 output file and PDF plots.
 
@@ -503,44 +1015,91 @@ class AnalyzeRawData(object):
             True if the raw data is from FE-I4B.
         use_settings_from_file : boolean
             True if the needed parameters should be extracted from the raw data file
+        resume : boolean
+            True if the interpretation stored in the analyzed data file should be continued with the raw data words added since then
+            (e.g. of a growing raw data file or of files added with add_raw_data_files). The interpreter state and the histograms are
+            restored from the analyzed data file, thus also another AnalyzeRawData object with the same settings (e.g. in a new process)
+            can resume the interpretation. The interpreter state is only stored if create_interpreter_state is set. The tables of the analyzed data file are extended and the histograms are recreated.
+        finish : boolean
+            True if the last event is stored at the end of the raw data. Set to False if more raw data will be added and the
+            interpretation will be resumed, the last event is then completed and stored by a later call.
         '''
 
         if analyzed_data_file:
             self._analyzed_data_file = analyzed_data_file
 
+        if self._planned_products is not None and not self._planned_products and not resume:
+            logging.info('All planned output products exist already in %s', self._analyzed_data_file)
+            return
+
+        if resume:
+            resume_state = self._read_resume_state()
+            self._interpreted_words = resume_state['interpreted_words']
+        else:
+            self._interpreted_words = {}  # the number of interpreted words per raw data file, the interpretation can be continued from there
+
         if(self._create_meta_word_index):
             meta_word = np.empty((self._chunk_size,), dtype=dtype_from_descr(data_struct.MetaInfoWordTable))
             self.interpreter.set_meta_data_word_index(meta_word)
 
         self._filter_table = tb.Filters(complib='blosc', complevel=5, fletcher32=False)
+        create_event_table = self._create_event_table or (self._create_hit_table and self._create_compact_hits)  # the event information of compact hits is only stored in the event table
+        create_hit_index = self._create_hit_table and self._create_hit_index
 
         if(self._analyzed_data_file is not None):
-            self.out_file_h5 = tb.openFile(self._analyzed_data_file, mode="w", title="Interpreted FE-I4 raw data")
+            kept_nodes = set(self._kept_products) if self._kept_products else set()  # existing products not created again
+            if resume:  # the tables are extended, all other nodes are recreated at the end
+                kept_nodes.update(('Hits', 'HitIndex', 'Events', 'EventMetaData', 'Cluster', 'ClusterHits'))
+            self.out_file_h5 = tb.openFile(self._analyzed_data_file, mode="a" if (kept_nodes and os.path.isfile(self._analyzed_data_file)) else "w", title="Interpreted FE-I4 raw data")
+            for node in self.out_file_h5.list_nodes(self.out_file_h5.root):
+                if node._v_name not in kept_nodes:
+                    node._f_remove(recursive=True)
             if (self._create_hit_table is True):
-                description = data_struct.HitInfoTable().columns.copy()
+                if self._create_compact_hits:
+                    hit_table = self._create_output_table(name='Hits', description=data_struct.CompactHitInfoTable, title='hit_data', resume=resume, chunkshape=(self._chunk_size / 100,))
+                else:
+                    description = data_struct.HitInfoTable().columns.copy()
+                    if self.use_trigger_time_stamp:  # replace the column name if trigger gives you a time stamp
+                        description['trigger_time_stamp'] = description.pop('trigger_number')
+                    hit_table = self._create_output_table(name='Hits', description=description, title='hit_data', resume=resume, chunkshape=(self._chunk_size / 100,))
+                if create_hit_index:
+                    hit_index_table = self._create_output_table(name='HitIndex', description=data_struct.HitIndexTable, title='hit_index', resume=resume, expectedrows=self._chunk_size)  # the event boundaries of the hit table for direct event access
+                    if hit_index_table.nrows == 0 and hit_table.nrows != 0:  # resumed hit table without hit index
+                        hit_index_table.append(analysis_utils.get_hit_index(hit_table.col('event_number')))
+                    n_hit_table_rows = hit_table.nrows
+                    last_hit_event_number = hit_index_table[-1]['event_number'] if hit_index_table.nrows != 0 else None
+            if create_event_table:
+                description = data_struct.EventInfoTable().columns.copy()
                 if self.use_trigger_time_stamp:  # replace the column name if trigger gives you a time stamp
                     description['trigger_time_stamp'] = description.pop('trigger_number')
-                hit_table = self.out_file_h5.create_table(self.out_file_h5.root, name='Hits', description=description, title='hit_data', filters=self._filter_table, chunkshape=(self._chunk_size / 100,))
+                event_table = self._create_output_table(name='Events', description=description, title='event_data', resume=resume, expectedrows=self._chunk_size)
             if (self._create_meta_word_index is True):
-                meta_word_index_table = self.out_file_h5.create_table(self.out_file_h5.root, name='EventMetaData', description=data_struct.MetaInfoWordTable, title='event_meta_data', filters=self._filter_table, chunkshape=(self._chunk_size / 10,))
+                meta_word_index_table = self._create_output_table(name='EventMetaData', description=data_struct.MetaInfoWordTable, title='event_meta_data', resume=resume, chunkshape=(self._chunk_size / 10,))
             if(self._create_cluster_table):
-                cluster_table = self.out_file_h5.create_table(self.out_file_h5.root, name='Cluster', description=data_struct.ClusterInfoTable, title='cluster_hit_data', filters=self._filter_table, expectedrows=self._chunk_size)
+                cluster_table = self._create_output_table(name='Cluster', description=data_struct.ClusterInfoTable, title='cluster_hit_data', resume=resume, expectedrows=self._chunk_size)
             if(self._create_cluster_hit_table):
                 description = data_struct.ClusterHitInfoTable().columns.copy()
                 if self.use_trigger_time_stamp:  # replace the column name if trigger gives you a time stamp
                     description['trigger_time_stamp'] = description.pop('trigger_number')
-                cluster_hit_table = self.out_file_h5.create_table(self.out_file_h5.root, name='ClusterHits', description=description, title='cluster_hit_data', filters=self._filter_table, expectedrows=self._chunk_size)
+                cluster_hit_table = self._create_output_table(name='ClusterHits', description=description, title='cluster_hit_data', resume=resume, expectedrows=self._chunk_size)
 
-        logging.info('Interpreting raw data file(s): ' + (', ').join(self.files_dict.keys()))
+        logging.info('%s raw data file(s): %s', 'Resume interpreting' if resume else 'Interpreting', (', ').join(self.files_dict.keys()))
 
-        self.interpreter.reset_event_variables()
-        self.interpreter.reset_counters()
+        if resume:
+            self._restore_resume_state(resume_state)
+        else:
+            self.interpreter.reset_event_variables()
+            self.interpreter.reset_counters()
 
         if self.scan_parameters is None:
-            self.histograming.set_no_scan_parameter()
+            for histograming in self._get_histogramings():
+                histograming.set_no_scan_parameter()
         else:
             self.scan_parameter_index = analysis_utils.get_scan_parameters_index(self.scan_parameters)  # a array that labels unique scan parameter combinations
-            self.histograming.add_scan_parameter(self.scan_parameter_index)  # just add an index for the different scan parameter combinations
+            for histograming in self._get_histogramings():
+                histograming.add_scan_parameter(self.scan_parameter_index)  # just add an index for the different scan parameter combinations
+        if resume:  # the scan parameter index of the interpreted read outs is kept, thus the occupancy of these parameters can be restored
+            self._restore_hists(resume_state['hists'])
 
         self.meta_data = analysis_utils.combine_meta_data(self.files_dict)
 
@@ -549,61 +1108,165 @@ class AnalyzeRawData(object):
 
         self.interpreter.set_meta_data(self.meta_data)  # tell interpreter the word index per readout to be able to calculate the event number per read out
         meta_data_size = self.meta_data.shape[0]
-        self.meta_event_index = np.zeros((meta_data_size,), dtype=[('metaEventIndex', np.uint64)])  # this array is filled by the interpreter and holds the event number per read out
+        meta_event_index = np.zeros((meta_data_size,), dtype=[('metaEventIndex', np.uint64)])  # this array is filled by the interpreter and holds the event number per read out
+        if resume:  # the event numbers of the already interpreted read outs are kept
+            meta_event_index['metaEventIndex'][:resume_state['MetaEventIndex'].shape[0]] = resume_state['MetaEventIndex']
+        self.meta_event_index = meta_event_index
         self.interpreter.set_meta_event_data(self.meta_event_index)  # tell the interpreter the data container to write the meta event index to
+        occupancy_window_array = self._create_occupancy_window_array()
+        self.clusterizer.create_cluster_info_array(self._create_cluster_table or self.is_histogram_cluster())
 
         logging.info("Interpreting...")
-        progress_bar = progressbar.ProgressBar(widgets=['', progressbar.Percentage(), ' ', progressbar.Bar(marker='*', left='|', right='|'), ' ', progressbar.AdaptiveETA()], maxval=analysis_utils.get_total_n_data_words(self.files_dict), term_width=80)
+        progress_bar = progressbar.ProgressBar(widgets=['', progressbar.Percentage(), ' ', progressbar.Bar(marker='*', left='|', right='|'), ' ', progressbar.AdaptiveETA()], maxval=analysis_utils.get_total_n_data_words(self.files_dict, precise=True), term_width=80)  # the number of words is cached with the meta data
         progress_bar.start()
         total_words = 0
-
-        for index, raw_data_file in enumerate(self.files_dict.keys()):  # loop over all raw data files
-            self.interpreter.reset_meta_data_counter()
-            with tb.open_file(raw_data_file, mode="r") as in_file_h5:
-                table_size = in_file_h5.root.raw_data.shape[0]
-                if use_settings_from_file:
-                    self._deduce_settings_from_file(in_file_h5)
-                else:
-                    self.fei4b = fei4b
-                for iWord in range(0, table_size, self._chunk_size):  # loop over all words in the actual raw data file
-                    try:
-                        raw_data = in_file_h5.root.raw_data.read(iWord, iWord + self._chunk_size)
-                    except OverflowError, e:
-                        logging.error('%s: 2^31 xrange() limitation in 32-bit Python', e)
-                    self.interpreter.interpret_raw_data(raw_data)  # interpret the raw data
-                    if(index == len(self.files_dict.keys()) - 1 and iWord == range(0, table_size, self._chunk_size)[-1]):  # store hits of the latest event of the last file
-                        self.interpreter.store_event()  # all actual buffered events in the interpreter are stored
-                    hits = self.interpreter.get_hits()
-                    if(self.scan_parameters is not None):
-                        nEventIndex = self.interpreter.get_n_meta_data_event()
-                        self.histograming.add_meta_event_index(self.meta_event_index, nEventIndex)
-                    if self.is_histogram_hits():
+        last_raw_data_file = self.files_dict.keys()[-1]
+
+        with analysis_utils.AsyncTableWriter(queue_depth=self._pipeline_depth) as writer:  # the tables are written in a background thread
+            for raw_data_file, table_size, iWord, raw_data in analysis_utils.prefetch(self._read_raw_data_chunks(start_words=self._interpreted_words), queue_depth=self._pipeline_depth):  # the raw data is read in a background thread
+                if raw_data is None:
+                    if iWord is None:  # start of a raw data file
+                        if raw_data_file not in self._interpreted_words:  # the word index of a resumed raw data file is kept
+                            self.interpreter.reset_meta_data_counter()
+                        if use_settings_from_file:
+                            self._deduce_settings_from_file(raw_data_file)
+                        else:
+                            self.fei4b = fei4b
+                    else:  # end of the raw data file
+                        total_words += table_size
+                        self._interpreted_words[raw_data_file] = table_size
+                        if (self._analyzed_data_file is not None and self._create_hit_table is True):
+                            writer.flush(hit_table)
+                            if create_hit_index:
+                                writer.flush(hit_index_table)
+                        if (self._analyzed_data_file is not None and create_event_table):
+                            writer.flush(event_table)
+                    continue
+                self.interpreter.interpret_raw_data(raw_data)  # interpret the raw data
+                if(finish and raw_data_file == last_raw_data_file and iWord + self._chunk_size >= table_size):  # store hits of the latest event of the last file
+                    self.interpreter.store_event()  # all actual buffered events in the interpreter are stored
+                hits = self.interpreter.get_hits()
+                if(self.scan_parameters is not None):
+                    nEventIndex = self.interpreter.get_n_meta_data_event()
+                    for histograming in self._get_histogramings():
+                        histograming.add_meta_event_index(self.meta_event_index, nEventIndex)
+                if self.is_histogram_hits():
+                    if occupancy_window_array is not None:
+                        self._histogram_hits_in_occupancy_window(hits, occupancy_window_array, writer=writer)
+                    else:
                         self.histogram_hits(hits)
-                    if self.is_cluster_hits():
-                        self.cluster_hits(hits)
-                        if(self._create_cluster_hit_table):
-                            cluster_hits = self.clusterizer.get_hit_cluster()
-                            cluster_hit_table.append(cluster_hits)
-                        if(self._create_cluster_table):
-                            cluster = self.clusterizer.get_cluster()
-                            cluster_table.append(cluster)
-
-                    if (self._analyzed_data_file is not None and self._create_hit_table is True):
-                        hit_table.append(hits)
-                    if (self._analyzed_data_file is not None and self._create_meta_word_index is True):
-                        size = self.interpreter.get_n_meta_data_word()
-                        meta_word_index_table.append(meta_word[:size])
-
-                    if total_words + iWord < progress_bar.maxval:  # otherwise unwanted exception is thrown
-                        progress_bar.update(total_words + iWord)
-                total_words += table_size
+                if self.is_cluster_hits():
+                    self.cluster_hits(hits)
+                    if(self._create_cluster_hit_table):
+                        cluster_hits = self.clusterizer.get_hit_cluster()
+                        writer.append(cluster_hit_table, cluster_hits)
+                    if(self._create_cluster_table):
+                        cluster = self.clusterizer.get_cluster()
+                        writer.append(cluster_table, cluster)
+                    if self.is_histogram_cluster():
+                        self.histogram_cluster(self.clusterizer.get_cluster())
+
                 if (self._analyzed_data_file is not None and self._create_hit_table is True):
-                    hit_table.flush()
+                    writer.append(hit_table, hits)
+                    if create_hit_index:
+                        writer.append(hit_index_table, analysis_utils.get_hit_index(hits['eventNumber'], hit_offset=n_hit_table_rows, last_event_number=last_hit_event_number))
+                        n_hit_table_rows += hits.shape[0]
+                        if hits.shape[0] != 0:
+                            last_hit_event_number = hits['eventNumber'][-1]
+                if (self._analyzed_data_file is not None and create_event_table):
+                    writer.append(event_table, self.interpreter.get_events())
+                if (self._analyzed_data_file is not None and self._create_meta_word_index is True):
+                    size = self.interpreter.get_n_meta_data_word()
+                    writer.append(meta_word_index_table, meta_word[:size])
+
+                if total_words + iWord < progress_bar.maxval:  # otherwise unwanted exception is thrown
+                    progress_bar.update(total_words + iWord)
+            if occupancy_window_array is not None:  # the parameters of the last read outs are finished at the end of the data
+                self._write_finished_occupancy(occupancy_window_array, writer=writer, all_parameters=True)
         progress_bar.finish()
+        if (self._analyzed_data_file is not None and create_event_table and not event_table.cols.event_number.is_indexed):  # index the event number for fast event lookups, a resumed table keeps its index up to date
+            event_table.cols.event_number.create_csindex(filters=self._filter_table)
+        self._log_buffer_usage(interpreter=True)
         self._create_additional_data()
         if(self._analyzed_data_file is not None):
+            if self._create_interpreter_state:
+                self._write_interpreter_state()
+            self.out_file_h5.root._v_attrs.interpreted_words = self._interpreted_words  # the interpretation can be resumed from here
             self.out_file_h5.close()
 
+    def _read_raw_data_chunks(self, start_words=None):
+        '''Reads the raw data of all raw data files in chunks of chunk_size words. Yields the raw data file name, the number of words
+        in the file, the word index and the raw data. The start and the end of each file is marked with raw data set to None
+        and the word index set to None or the number of words, respectively. If start words {file name: word index} are given
+        the reading of these files starts at the word index.
+        '''
+        for raw_data_file in self.files_dict.keys():  # loop over all raw data files
+            start_word = start_words.get(raw_data_file, 0) if start_words else 0
+            with analysis_utils.hdf5_lock:
+                in_file_h5 = tb.open_file(raw_data_file, mode="r")
+                table_size = in_file_h5.root.raw_data.shape[0]
+            try:
+                yield raw_data_file, table_size, None, None
+                for iWord in range(start_word, table_size, self._chunk_size):  # loop over all words in the actual raw data file
+                    try:
+                        with analysis_utils.hdf5_lock:
+                            raw_data = in_file_h5.root.raw_data.read(iWord, iWord + self._chunk_size)
+                    except OverflowError, e:
+                        logging.error('%s: 2^31 xrange() limitation in 32-bit Python', e)
+                        continue
+                    yield raw_data_file, table_size, iWord, raw_data
+                yield raw_data_file, table_size, table_size, None
+            finally:
+                with analysis_utils.hdf5_lock:
+                    in_file_h5.close()
+
+    def _create_occupancy_window_array(self):
+        '''Creates the occupancy histogram array in the output file if an occupancy window is set. The finished parameters are
+        written to this array during the analysis, thus only the parameters of the window are kept in memory.
+        '''
+        if not self._occupancy_window or not self._create_occupancy_hist:
+            return None
+        if self._analyzed_data_file is None:
+            raise analysis_utils.NotSupportedError('The occupancy window needs an output file')
+        if self._create_threshold_hists:
+            raise analysis_utils.NotSupportedError('The threshold histograms need the occupancy of all scan parameters in memory, the occupancy window cannot be used')
+        return self.out_file_h5.createCArray(self.out_file_h5.root, name='HistOcc', title='Occupancy Histogram', atom=tb.UInt32Atom(), shape=(336, 80, self.histograming.get_n_parameters()), chunkshape=(336, 80, 1), filters=self._filter_table)  # one chunk per parameter, thus every parameter is written once
+
+    def _histogram_hits_in_occupancy_window(self, hits, occupancy_array, writer=None):
+        '''Histograms the hits and writes the finished parameters of the occupancy window to the occupancy histogram array.
+        If the window is full the histogrammer stops at the first hit of a new parameter, the remaining hits are added after the finished parameters are written.
+        '''
+        start_index = 0
+        while True:
+            start_index += self.histograming.add_hits(hits[start_index:])
+            self._write_finished_occupancy(occupancy_array, writer=writer)
+            if start_index >= hits.shape[0]:
+                break
+
+    def _write_finished_occupancy(self, occupancy_array, writer=None, all_parameters=False):
+        '''Writes the finished parameters of the occupancy window to the occupancy histogram array and frees them in the histogrammer.
+        If all_parameters is set all parameters in memory are written (end of the data).
+        '''
+        while True:
+            parameter_index = self.histograming.get_finished_parameter(all_parameters)
+            if parameter_index < 0:
+                break
+            occupancy_slice = np.swapaxes(self.histograming.get_occupancy_slice(parameter_index), 0, 1)  # swap axis col,row --> row, col
+            if writer is not None:
+                writer.write(occupancy_array, (slice(None), slice(None), parameter_index), occupancy_slice)
+            else:
+                occupancy_array[:, :, parameter_index] = occupancy_slice
+            self.histograming.release_occupancy_slice(parameter_index)
+
+    def _log_buffer_usage(self, interpreter=True):
+        '''Logs the maximum number of hits/clusters stored per chunk (high-water mark). The hit and cluster arrays grow automatically,
+        the high-water mark can be used to tune the chunk size and thus the memory consumption.
+        '''
+        if interpreter:
+            logging.info('Hit array high-water mark: %d hits per chunk (hit array size %d, %.1f MB)', self.interpreter.get_max_n_array_hits(), self.interpreter.get_hit_array_size(), self.interpreter.get_hit_array_size() * self.interpreter.get_hit_size() / 1024. ** 2)
+        if self.is_cluster_hits():
+            logging.info('Cluster array high-water mark: %d clusters and %d cluster hits per chunk', self.clusterizer.get_max_n_clusters(), self.clusterizer.get_max_n_cluster_hits())
+
     def _create_additional_data(self):
         logging.info('Create selected event histograms')
         if (self._analyzed_data_file is not None and self._create_meta_event_index):
@@ -619,22 +1282,19 @@ class AnalyzeRawData(object):
                     for index, scan_par_name in enumerate(self.scan_parameters.dtype.names):
                         dtype, _ = self.scan_parameters.dtype.fields[scan_par_name][:2]
                         description[scan_par_name] = Col.from_dtype(dtype, dflt=0, pos=last_pos + index)
-                meta_data_out_table = self.out_file_h5.create_table(self.out_file_h5.root, name='meta_data', description=description, title='MetaData', filters=self._filter_table)
-                entry = meta_data_out_table.row
-                for i in range(0, n_event_index):
-                    if self.interpreter.meta_table_v2:
-                        entry['event_number'] = self.meta_event_index[i][0]  # event index
-                        entry['timestamp_start'] = self.meta_data[i][3]  # timestamp
-                        entry['timestamp_stop'] = self.meta_data[i][4]  # timestamp
-                        entry['error_code'] = self.meta_data[i][5]  # error code
-                    else:
-                        entry['event_number'] = self.meta_event_index[i][0]  # event index
-                        entry['time_stamp'] = self.meta_data[i][3]  # time stamp
-                        entry['error_code'] = self.meta_data[i][4]  # error code
-                    if (self.scan_parameters is not None):  # scan parameter if available
-                        for scan_par_name in self.scan_parameters.dtype.names:
-                            entry[scan_par_name] = self.scan_parameters[scan_par_name][i]
-                    entry.append()
+                meta_data_out_table = self.out_file_h5.create_table(self.out_file_h5.root, name='meta_data', description=description, title='MetaData', filters=self._filter_table, expectedrows=n_event_index)
+                meta_data_out = np.empty(shape=(n_event_index, ), dtype=meta_data_out_table.dtype)  # the output is filled column wise and written at once
+                meta_data_out['event_number'] = self.meta_event_index['metaEventIndex'][:n_event_index]  # event index
+                if self.interpreter.meta_table_v2:
+                    meta_data_out['timestamp_start'] = self.meta_data['timestamp_start'][:n_event_index]  # timestamp
+                    meta_data_out['timestamp_stop'] = self.meta_data['timestamp_stop'][:n_event_index]  # timestamp
+                else:
+                    meta_data_out['time_stamp'] = self.meta_data['timestamp'][:n_event_index]  # time stamp
+                meta_data_out['error_code'] = self.meta_data['error'][:n_event_index]  # error code
+                if (self.scan_parameters is not None):  # scan parameter if available
+                    for scan_par_name in self.scan_parameters.dtype.names:
+                        meta_data_out[scan_par_name] = self.scan_parameters[scan_par_name][:n_event_index]
+                meta_data_out_table.append(meta_data_out)
                 meta_data_out_table.flush()
                 if self.scan_parameters is not None:
                     logging.info("Save meta data with scan parameter " + scan_par_name)
@@ -664,6 +1324,17 @@ class AnalyzeRawData(object):
         self._create_additional_hit_data()
         self._create_additional_cluster_data()
 
+    def _write_sparse_pixel_hist(self, name, title, hist, shape):
+        '''Stores a sparse pixel histogram in a group with the CSR arrays data, indices and indptr (one row per pixel, index = column + row * 80).
+
+        The dense histogram has the given shape (row, column, value).
+        '''
+        hist_group = self.out_file_h5.createGroup(self.out_file_h5.root, name=name, title=title)
+        hist_group._v_attrs.shape = shape
+        for array_name, array in zip(('data', 'indices', 'indptr'), hist):
+            array_out = self.out_file_h5.createEArray(hist_group, name=array_name, atom=tb.Atom.from_dtype(array.dtype), shape=(0, ), filters=self._filter_table, expectedrows=max(array.shape[0], 1))  # extendable array, can also be empty
+            array_out.append(array)
+
     def _create_additional_hit_data(self, safe_to_file=True):
         logging.info('Create selected hit histograms')
         if (self._create_tot_hist):
@@ -671,7 +1342,11 @@ class AnalyzeRawData(object):
             if (self._analyzed_data_file is not None and safe_to_file):
                 tot_hist_table = self.out_file_h5.createCArray(self.out_file_h5.root, name='HistTot', title='ToT Histogram', atom=tb.Atom.from_dtype(self.tot_hist.dtype), shape=self.tot_hist.shape, filters=self._filter_table)
                 tot_hist_table[:] = self.tot_hist
-        if (self._create_tot_pixel_hist):
+        if (self._create_tot_pixel_hist and self._sparse_pixel_hists):
+            self.tot_pixel_hist_sparse = self.histograming.get_tot_pixel_hist_sparse()
+            if (self._analyzed_data_file is not None and safe_to_file):
+                self._write_sparse_pixel_hist(name='HistTotPixel', title='Tot Pixel Histogram', hist=self.tot_pixel_hist_sparse, shape=(336, 80, 16))
+        elif (self._create_tot_pixel_hist):
             if (self._analyzed_data_file is not None and safe_to_file):
                 self.tot_pixel_hist_array = np.swapaxes(self.histograming.get_tot_pixel_hist(), 0, 1)
                 tot_pixel_hist_out = self.out_file_h5.createCArray(self.out_file_h5.root, name='HistTotPixel', title='Tot Pixel Histogram', atom=tb.Atom.from_dtype(self.tot_pixel_hist_array.dtype), shape=self.tot_pixel_hist_array.shape, filters=self._filter_table)
@@ -681,7 +1356,11 @@ class AnalyzeRawData(object):
             if (self._analyzed_data_file is not None and safe_to_file):
                 tdc_hist_table = self.out_file_h5.createCArray(self.out_file_h5.root, name='HistTdc', title='Tdc Histogram', atom=tb.Atom.from_dtype(self.tdc_hist.dtype), shape=self.tdc_hist.shape, filters=self._filter_table)
                 tdc_hist_table[:] = self.tdc_hist
-        if (self._create_tdc_pixel_hist):
+        if (self._create_tdc_pixel_hist and self._sparse_pixel_hists):
+            self.tdc_pixel_hist_sparse = self.histograming.get_tdc_pixel_hist_sparse()
+            if (self._analyzed_data_file is not None and safe_to_file):
+                self._write_sparse_pixel_hist(name='HistTdcPixel', title='Tdc Pixel Histogram', hist=self.tdc_pixel_hist_sparse, shape=(336, 80, 4096))
+        elif (self._create_tdc_pixel_hist):
             if (self._analyzed_data_file is not None and safe_to_file):
                 self.tdc_pixel_hist_array = np.swapaxes(self.histograming.get_tdc_pixel_hist(), 0, 1)
                 tdc_pixel_hist_out = self.out_file_h5.createCArray(self.out_file_h5.root, name='HistTdcPixel', title='Tdc Pixel Histogram', atom=tb.Atom.from_dtype(self.tdc_pixel_hist_array.dtype), shape=self.tdc_pixel_hist_array.shape, filters=self._filter_table)
@@ -695,7 +1374,9 @@ class AnalyzeRawData(object):
                 else:
                     rel_bcid_hist_table = self.out_file_h5.createCArray(self.out_file_h5.root, name='HistRelBcid', title='relative BCID Histogram', atom=tb.Atom.from_dtype(self.rel_bcid_hist.dtype), shape=self.rel_bcid_hist.shape, filters=self._filter_table)
                     rel_bcid_hist_table[:] = self.rel_bcid_hist
-        if (self._create_occupancy_hist):
+        if (self._create_occupancy_hist and self._occupancy_window):  # the occupancy was already written per scan parameter during the analysis
+            self.occupancy, self.occupancy_array = None, None
+        elif (self._create_occupancy_hist):
             self.occupancy = self.histograming.get_occupancy()
             self.occupancy_array = np.swapaxes(self.occupancy, 0, 1)
             if (self._analyzed_data_file is not None and safe_to_file):
@@ -726,18 +1407,40 @@ class AnalyzeRawData(object):
                 self.threshold_hist_calib, self.noise_hist_calib = self._get_plsr_dac_charge(self.scurve_fit_results[:, :, 0]), self._get_plsr_dac_charge(self.scurve_fit_results[:, :, 1], no_offset=True)
                 fitted_threshold_hist_table[:], fitted_noise_hist_table[:] = self.threshold_hist_calib, self.noise_hist_calib
 
-    def _create_additional_cluster_data(self, safe_to_file=True):
+    def _create_additional_cluster_data(self, safe_to_file=True, clusterizers=None):
         logging.info('Create selected cluster histograms')
+        if clusterizers is None:
+            clusterizers = [self.clusterizer]
         if(self._create_cluster_size_hist):
-            self.cluster_size_hist = self.clusterizer.get_cluster_size_hist()
+            self.cluster_size_hist = np.sum([clusterizer.get_cluster_size_hist() for clusterizer in clusterizers], axis=0, dtype=np.uint32)
             if (self._analyzed_data_file is not None and safe_to_file):
                 cluster_size_hist_table = self.out_file_h5.createCArray(self.out_file_h5.root, name='HistClusterSize', title='Cluster Size Histogram', atom=tb.Atom.from_dtype(self.cluster_size_hist.dtype), shape=self.cluster_size_hist.shape, filters=self._filter_table)
                 cluster_size_hist_table[:] = self.cluster_size_hist
         if(self._create_cluster_tot_hist):
-            self.cluster_tot_hist = self.clusterizer.get_cluster_tot_hist()
+            self.cluster_tot_hist = np.sum([clusterizer.get_cluster_tot_hist() for clusterizer in clusterizers], axis=0, dtype=np.uint32)
             if (self._analyzed_data_file is not None and safe_to_file):
                 cluster_tot_hist_table = self.out_file_h5.createCArray(self.out_file_h5.root, name='HistClusterTot', title='Cluster Tot Histogram', atom=tb.Atom.from_dtype(self.cluster_tot_hist.dtype), shape=self.cluster_tot_hist.shape, filters=self._filter_table)
                 cluster_tot_hist_table[:] = self.cluster_tot_hist
+        if(self._create_cluster_charge_hist):
+            self.cluster_charge_hist = np.sum([clusterizer.get_cluster_charge_hist() for clusterizer in clusterizers], axis=0, dtype=np.uint32)
+            if (self._analyzed_data_file is not None and safe_to_file):
+                cluster_charge_hist_table = self.out_file_h5.createCArray(self.out_file_h5.root, name='HistClusterCharge', title='Cluster Charge Histogram', atom=tb.Atom.from_dtype(self.cluster_charge_hist.dtype), shape=self.cluster_charge_hist.shape, filters=self._filter_table)
+                cluster_charge_hist_table[:] = self.cluster_charge_hist
+        if(self._create_n_cluster_per_event_hist):
+            self.n_cluster_per_event_hist = self._n_cluster_per_event_hist
+            if (self._analyzed_data_file is not None and safe_to_file):
+                n_cluster_per_event_hist_table = self.out_file_h5.createCArray(self.out_file_h5.root, name='HistNClusterPerEvent', title='Number of Cluster per Event Histogram', atom=tb.Atom.from_dtype(self.n_cluster_per_event_hist.dtype), shape=self.n_cluster_per_event_hist.shape, filters=self._filter_table)
+                n_cluster_per_event_hist_table[:] = self.n_cluster_per_event_hist
+        if(self._create_cluster_seed_hist):
+            self.cluster_seed_array = np.swapaxes(self.cluster_seed_histograming.get_occupancy(), 0, 1)
+            if (self._analyzed_data_file is not None and safe_to_file):
+                cluster_seed_hist_table = self.out_file_h5.createCArray(self.out_file_h5.root, name='HistClusterSeed', title='Cluster Seed Occupancy Histogram', atom=tb.Atom.from_dtype(self.cluster_seed_array.dtype), shape=self.cluster_seed_array.shape, filters=self._filter_table)
+                cluster_seed_hist_table[:] = self.cluster_seed_array  # swap axis col,row,parameter --> row, col,parameter
+        if(self._create_cluster_position_hist):
+            self.cluster_position_array = np.swapaxes(self._cluster_position_hist, 0, 1)
+            if (self._analyzed_data_file is not None and safe_to_file):
+                cluster_position_hist_table = self.out_file_h5.createCArray(self.out_file_h5.root, name='HistClusterPosition', title='Mean Cluster Position Histogram', atom=tb.Atom.from_dtype(self.cluster_position_array.dtype), shape=self.cluster_position_array.shape, filters=self._filter_table)
+                cluster_position_hist_table[:] = self.cluster_position_array  # swap axis col,row --> row, col
 
     def analyze_hit_table(self, analyzed_data_file=None, analyzed_data_out_file=None):
         '''Analyzes a hit table with the c++ histogramer/clusterizer.
@@ -780,22 +1483,24 @@ class AnalyzeRawData(object):
             cluster_hit_table = self.out_file_h5.create_table(self.out_file_h5.root, name='ClusterHits', description=data_struct.ClusterHitInfoTable, title='cluster_hit_data', filters=self._filter_table, expectedrows=self._chunk_size)
 
         try:
-            meta_data_table = in_file_h5.root.meta_data
-            meta_data = meta_data_table[:]
-            self.scan_parameters = analysis_utils.get_unique_scan_parameter_combinations(meta_data, scan_parameter_columns_only=True)
+            meta_data_at_scan_parameter = analysis_utils.get_unique_scan_parameter_combinations(in_file_h5.root.meta_data[:])  # the first read out of every scan parameter setting
+            self.scan_parameters = meta_data_at_scan_parameter[list(meta_data_at_scan_parameter.dtype.names[4:])] if meta_data_at_scan_parameter is not None else None
             if self.scan_parameters is not None:  # check if there is an additional column after the error code column, if yes this column has scan parameter infos
-                meta_event_index = np.ascontiguousarray(analysis_utils.get_unique_scan_parameter_combinations(meta_data)['event_number'].astype(np.uint64))
-                self.histograming.add_meta_event_index(meta_event_index, array_length=len(meta_event_index))
+                meta_event_index = np.ascontiguousarray(meta_data_at_scan_parameter['event_number'].astype(np.uint64))
                 self.scan_parameter_index = analysis_utils.get_scan_parameters_index(self.scan_parameters)  # a array that labels unique scan parameter combinations
-                self.histograming.add_scan_parameter(self.scan_parameter_index)  # just add an index for the different scan parameter combinations
+                for histograming in self._get_histogramings():
+                    histograming.add_meta_event_index(meta_event_index, array_length=len(meta_event_index))
+                    histograming.add_scan_parameter(self.scan_parameter_index)  # just add an index for the different scan parameter combinations
                 scan_parameter_names = analysis_utils.get_scan_parameter_names(self.scan_parameters)
                 logging.info('Adding scan parameter(s) for analysis: %s', (', ').join(scan_parameter_names) if scan_parameter_names else 'None',)
             else:
                 logging.info("No scan parameter data provided")
-                self.histograming.set_no_scan_parameter()
+                for histograming in self._get_histogramings():
+                    histograming.set_no_scan_parameter()
         except tb.exceptions.NoSuchNodeError:
             logging.info("No meta data provided")
-            self.histograming.set_no_scan_parameter()
+            for histograming in self._get_histogramings():
+                histograming.set_no_scan_parameter()
 
         table_size = in_file_h5.root.Hits.shape[0]
         n_hits = 0  # number of hits in actual chunk
@@ -807,38 +1512,112 @@ class AnalyzeRawData(object):
             in_file_h5.close()
             return
 
+        occupancy_window_array = self._create_occupancy_window_array()
+
+        self.clusterizer.create_cluster_info_array(self._create_cluster_table or self.is_histogram_cluster())
+        clusterizers = [self.clusterizer]
+        if self.is_cluster_hits():
+            n_cluster_threads = mp.cpu_count() if self._n_cluster_threads is None else self._n_cluster_threads
+            clusterizers.extend(self._create_clusterizer() for _ in range(1, n_cluster_threads))
+            if len(clusterizers) > 1:
+                logging.info('Cluster hits in %d threads', len(clusterizers))
+
         logging.info('Analyze hits...')
         progress_bar = progressbar.ProgressBar(widgets=['', progressbar.Percentage(), ' ', progressbar.Bar(marker='*', left='|', right='|'), ' ', progressbar.ETA()], maxval=table_size, term_width=80)
         progress_bar.start()
 
-        for hits, index in analysis_utils.data_aligned_at_events(in_file_h5.root.Hits, chunk_size=self._chunk_size):
+        hit_chunks = analysis_utils.data_aligned_at_events(in_file_h5.root.Hits, chunk_size=self._chunk_size, hit_index=analysis_utils.read_hit_index(in_file_h5))  # the hit index gives the event boundaries of the chunks
+        for hits, index, cluster, cluster_hits in self._cluster_hit_chunks(hit_chunks, clusterizers):
             n_hits += hits.shape[0]
 
-            if (self.is_cluster_hits()):
-                self.cluster_hits(hits)
-
             if (self.is_histogram_hits()):
-                self.histogram_hits(hits)
+                if occupancy_window_array is not None:
+                    self._histogram_hits_in_occupancy_window(hits, occupancy_window_array)
+                else:
+                    self.histogram_hits(hits)
 
             if(self._analyzed_data_file is not None and self._create_cluster_hit_table):
-                cluster_hits = self.clusterizer.get_hit_cluster()
                 cluster_hit_table.append(cluster_hits)
             if(self._analyzed_data_file is not None and self._create_cluster_table):
-                cluster = self.clusterizer.get_cluster()
                 cluster_table.append(cluster)
+            if self.is_histogram_cluster():
+                self.histogram_cluster(cluster)
 
             progress_bar.update(index)
 
+        if occupancy_window_array is not None:
+            self._write_finished_occupancy(occupancy_window_array, all_parameters=True)
+
         if (n_hits != table_size):
             logging.warning('Not all hits analyzed, check analysis!')
 
         progress_bar.finish()
+        self._log_buffer_usage(interpreter=False)
         self._create_additional_hit_data()
-        self._create_additional_cluster_data()
+        self._create_additional_cluster_data(clusterizers=clusterizers)
 
         self.out_file_h5.close()
         in_file_h5.close()
 
+    def _create_clusterizer(self):
+        '''Creates an additional clusterizer with the settings of self.clusterizer, also the settings applied directly to self.clusterizer (e.g. cluster distances, output).
+        '''
+        clusterizer = PyDataClusterizer()
+        clusterizer.copy_settings(self.clusterizer)  # cluster settings, charge calibration and output settings
+        clusterizer.set_cluster_info_array_size(2 * self._chunk_size)
+        clusterizer.create_cluster_info_array(self._create_cluster_table or self.is_histogram_cluster())
+        clusterizer.set_cluster_hit_info_array_size(2 * self._chunk_size)
+        clusterizer.create_cluster_hit_info_array(self._create_cluster_hit_table)
+        return clusterizer
+
+    def _cluster_hit_chunks(self, hit_chunks, clusterizers):
+        '''Clusters the event aligned hit chunks and yields the hits, the chunk index and the cluster/cluster hit arrays of every chunk
+        in the order of the chunks. With more than one clusterizer the chunks are clustered in parallel threads, one clusterizer per thread.
+        The events are independent, thus the cluster do not depend on the clusterizer used; the cluster histograms are distributed over the clusterizers.
+        Up to one chunk per clusterizer is clustered in advance, thus the memory usage is limited by the number of clusterizers.
+        '''
+        def get_cluster_arrays(clusterizer, copy=False):
+            cluster = clusterizer.get_cluster() if (self._create_cluster_table or self.is_histogram_cluster()) else None
+            cluster_hits = clusterizer.get_hit_cluster() if self._create_cluster_hit_table else None
+            if copy:  # the arrays are views of the clusterizer memory that is overwritten by the next chunk
+                cluster = None if cluster is None else cluster.copy()
+                cluster_hits = None if cluster_hits is None else cluster_hits.copy()
+            return cluster, cluster_hits
+
+        if not self.is_cluster_hits() or len(clusterizers) == 1:
+            for hits, index in hit_chunks:
+                if (self.is_cluster_hits()):
+                    clusterizers[0].add_hits(hits)
+                yield (hits, index) + get_cluster_arrays(clusterizers[0])
+            return
+
+        free_clusterizers = Queue.Queue()
+        for clusterizer in clusterizers:
+            free_clusterizers.put(clusterizer)
+
+        def cluster_chunk(hits):  # the clusterizer releases the GIL, thus the chunks are clustered concurrently
+            clusterizer = free_clusterizers.get()
+            try:
+                clusterizer.add_hits(hits)
+                return get_cluster_arrays(clusterizer, copy=True)
+            finally:
+                free_clusterizers.put(clusterizer)
+
+        pool = ThreadPool(len(clusterizers))
+        pending = collections.deque()
+        try:
+            for hits, index in hit_chunks:
+                pending.append((hits, index, pool.apply_async(cluster_chunk, (hits,))))
+                if len(pending) > len(clusterizers):
+                    hits, index, result = pending.popleft()
+                    yield (hits, index) + result.get()
+            while pending:
+                hits, index, result = pending.popleft()
+                yield (hits, index) + result.get()
+        finally:
+            pool.close()
+            pool.join()
+
     def analyze_hits(self, hits, scan_parameter=None):
         n_hits = hits.shape[0]
         logging.debug('Analyze %d hits' % n_hits)
@@ -886,13 +1665,31 @@ class AnalyzeRawData(object):
         else:
             self.histograming.add_hits(hits[start_index:])
 
+    def histogram_cluster(self, cluster):
+        '''Fills the cluster histograms that need the cluster of every chunk (number of cluster per event, cluster seed and cluster position occupancy).
+        The cluster are histogrammed directly after the clustering, thus no cluster table has to be written and read again.
+        '''
+        if self._create_n_cluster_per_event_hist and cluster.shape[0] != 0:  # the chunks are aligned at events, thus the cluster of one event are in one chunk
+            n_cluster_per_event_hist = np.bincount(analysis_utils.get_n_cluster_in_events(cluster['eventNumber'])[:, 1])
+            if n_cluster_per_event_hist.shape[0] > self._n_cluster_per_event_hist.shape[0]:
+                self._n_cluster_per_event_hist = np.append(self._n_cluster_per_event_hist, np.zeros(shape=(n_cluster_per_event_hist.shape[0] - self._n_cluster_per_event_hist.shape[0], ), dtype=np.uint32))
+            self._n_cluster_per_event_hist[:n_cluster_per_event_hist.shape[0]] += n_cluster_per_event_hist.astype(np.uint32)
+        if self._create_cluster_seed_hist:
+            self.cluster_seed_histograming.add_cluster_seed_hits(cluster, cluster.shape[0])
+        if self._create_cluster_position_hist:  # the mean position of a cluster in the pixel with index column - 1 is within [column, column + 1[
+            cluster = cluster[np.isfinite(cluster['mean_column']) & np.isfinite(cluster['mean_row'])]  # a not finite position cannot be histogrammed
+            self._cluster_position_hist += analysis_utils.hist_2d_index(np.clip(cluster['mean_column'] - 1., 0, 79), np.clip(cluster['mean_row'] - 1., 0, 335), shape=(80, 336))
+
     def histogram_cluster_seed_hits(self, cluster, start_index=0, stop_index=None):
         if stop_index is not None:
             self.histograming.add_hits(cluster[start_index:stop_index])
         else:
             self.histograming.add_hits(cluster[start_index:])
 
-    def plot_histograms(self, pdf_filename=None, analyzed_data_file=None, maximum=None, create_hit_hists_only=False):  # plots the histogram from output file if available otherwise from ram
+    def plot_histograms(self, pdf_filename=None, analyzed_data_file=None, maximum=None, create_hit_hists_only=False, plsr_dac_range=None):  # plots the histogram from output file if available otherwise from ram, the PlsrDAC range (min, max) of the S-curves is taken from the scan parameters if not given
+        if self._defer_plotting:
+            self._defer_plot_histograms(pdf_filename=pdf_filename, analyzed_data_file=analyzed_data_file, maximum=maximum, create_hit_hists_only=create_hit_hists_only, plsr_dac_range=plsr_dac_range)
+            return
         logging.info('Creating histograms%s', (' (source: %s)' % analyzed_data_file) if analyzed_data_file is not None else (' (source: %s)' % self._analyzed_data_file) if self._analyzed_data_file is not None else '')
         if analyzed_data_file is not None:
             out_file_h5 = tb.openFile(analyzed_data_file, mode="r")
@@ -917,6 +1714,35 @@ class AnalyzeRawData(object):
             raise analysis_utils.IncompleteInputError('Output PDF file descriptor not given.')
         logging.info('Saving histograms to PDF file: %s', str(output_pdf._file.fh.name))
 
+        try:
+            plots = self._get_plots(out_file_h5=out_file_h5, analyzed_data_file=analyzed_data_file, maximum=maximum, create_hit_hists_only=create_hit_hists_only, plsr_dac_range=plsr_dac_range)
+        finally:
+            if (out_file_h5 is not None):
+                out_file_h5.close()
+        n_processes = min(self._n_plot_processes if self._n_plot_processes else mp.cpu_count(), len(plots))
+        if n_processes <= 1:
+            for plot_function, kwargs in plots:
+                getattr(plotting, plot_function)(filename=output_pdf, **kwargs)
+        else:  # every plot is rendered into its own image file by a pool of processes, the images are merged into the PDF file
+            logging.info('Rendering %d plot(s) on %d CPU core(s)', len(plots), n_processes)
+            plot_folder = tempfile.mkdtemp(prefix='pybar_plots_')
+            try:
+                pool = mp.Pool(n_processes)
+                try:
+                    image_files = pool.map(render_plot, [(plot_function, kwargs, os.path.join(plot_folder, '%03d_%s.png' % (index, plot_function))) for index, (plot_function, kwargs) in enumerate(plots)])
+                finally:
+                    pool.close()
+                    pool.join()
+                plotting.merge_image_files(image_files, filename=output_pdf)
+            finally:
+                shutil.rmtree(plot_folder, ignore_errors=True)
+
+        if pdf_filename is not None:
+            logging.info('Closing output PDF file: %s', str(output_pdf._file.fh.name))
+            output_pdf.close()
+
+    def _get_plots(self, out_file_h5=None, analyzed_data_file=None, maximum=None, create_hit_hists_only=False, plsr_dac_range=None):  # returns the enabled plots as (plotting function name, arguments) with the data read from file if available otherwise from ram
+        plots = []
         if (self._create_threshold_hists):
             if self._create_threshold_mask:  # mask pixel with bad data for plotting
                 if out_file_h5 is not None:
@@ -929,8 +1755,8 @@ class AnalyzeRawData(object):
             noise_hist = np.ma.array(out_file_h5.root.HistNoise[:] if out_file_h5 is not None else self.noise_hist, mask=self.threshold_mask)
             mask_cnt = np.ma.count_masked(noise_hist)
             logging.info('Fast algorithm: masking %d pixel(s)', mask_cnt)
-            plotting.plotThreeWay(hist=threshold_hist, title='Threshold%s' % ((' (masked %i pixel(s))' % mask_cnt) if self._create_threshold_mask else ''), x_axis_title="threshold [PlsrDAC]", filename=output_pdf, bins=100, minimum=0, maximum=maximum)
-            plotting.plotThreeWay(hist=noise_hist, title='Noise%s' % ((' (masked %i pixel(s))' % mask_cnt) if self._create_threshold_mask else ''), x_axis_title="noise [PlsrDAC]", filename=output_pdf, bins=100, minimum=0, maximum=maximum)
+            plots.append(('plotThreeWay', dict(hist=threshold_hist, title='Threshold%s' % ((' (masked %i pixel(s))' % mask_cnt) if self._create_threshold_mask else ''), x_axis_title="threshold [PlsrDAC]", bins=100, minimum=0, maximum=maximum)))
+            plots.append(('plotThreeWay', dict(hist=noise_hist, title='Noise%s' % ((' (masked %i pixel(s))' % mask_cnt) if self._create_threshold_mask else ''), x_axis_title="noise [PlsrDAC]", bins=100, minimum=0, maximum=maximum)))
         if (self._create_fitted_threshold_hists):
             if self._create_fitted_threshold_mask:
                 if out_file_h5 is not None:
@@ -945,75 +1771,110 @@ class AnalyzeRawData(object):
             noise_hist_calib = np.ma.array(out_file_h5.root.HistNoiseFittedCalib[:] if out_file_h5 is not None else self.noise_hist_calib[:], mask=self.fitted_threshold_mask)
             mask_cnt = np.ma.count_masked(noise_hist)
             logging.info('S-curve fit: masking %d pixel(s)', mask_cnt)
-            plotting.plotThreeWay(hist=threshold_hist, title='Threshold (S-curve fit, masked %i pixel(s))' % mask_cnt, x_axis_title="Threshold [PlsrDAC]", filename=output_pdf, bins=100, minimum=0, maximum=maximum)
-            plotting.plotThreeWay(hist=noise_hist, title='Noise (S-curve fit, masked %i pixel(s))' % mask_cnt, x_axis_title="Noise [PlsrDAC]", filename=output_pdf, bins=100, minimum=0, maximum=maximum)
-            plotting.plotThreeWay(hist=threshold_hist_calib, title='Threshold (S-curve fit, masked %i pixel(s))' % mask_cnt, x_axis_title="Threshold [e]", filename=output_pdf, bins=100, minimum=0)
-            plotting.plotThreeWay(hist=noise_hist_calib, title='Noise (S-curve fit, masked %i pixel(s))' % mask_cnt, x_axis_title="Noise [e]", filename=output_pdf, bins=100, minimum=0)
+            plots.append(('plotThreeWay', dict(hist=threshold_hist, title='Threshold (S-curve fit, masked %i pixel(s))' % mask_cnt, x_axis_title="Threshold [PlsrDAC]", bins=100, minimum=0, maximum=maximum)))
+            plots.append(('plotThreeWay', dict(hist=noise_hist, title='Noise (S-curve fit, masked %i pixel(s))' % mask_cnt, x_axis_title="Noise [PlsrDAC]", bins=100, minimum=0, maximum=maximum)))
+            plots.append(('plotThreeWay', dict(hist=threshold_hist_calib, title='Threshold (S-curve fit, masked %i pixel(s))' % mask_cnt, x_axis_title="Threshold [e]", bins=100, minimum=0)))
+            plots.append(('plotThreeWay', dict(hist=noise_hist_calib, title='Noise (S-curve fit, masked %i pixel(s))' % mask_cnt, x_axis_title="Noise [e]", bins=100, minimum=0)))
         if (self._create_occupancy_hist):
+            occupancy_hist = out_file_h5.root.HistOcc[:] if out_file_h5 is not None else self.occupancy_array[:]
             if(self._create_fitted_threshold_hists):
-                plotting.plot_scurves(occupancy_hist=out_file_h5.root.HistOcc[:] if out_file_h5 is not None else self.occupancy_array[:], filename=output_pdf, scan_parameters=np.linspace(np.amin(self.scan_parameters['PlsrDAC']), np.amax(self.scan_parameters['PlsrDAC']), num=self.histograming.get_n_parameters(), endpoint=True))
+                if plsr_dac_range is None:
+                    plsr_dac_range = self._get_plsr_dac_range()
+                plots.append(('plot_scurves', dict(occupancy_hist=occupancy_hist, scan_parameters=np.linspace(plsr_dac_range[0], plsr_dac_range[1], num=occupancy_hist.shape[2], endpoint=True))))
             else:
-                hist = np.sum(out_file_h5.root.HistOcc[:], axis=2) if out_file_h5 is not None else np.sum(self.occupancy_array[:], axis=2)
-                occupancy_array_masked = np.ma.masked_equal(hist, 0)
+                occupancy_array_masked = np.ma.masked_equal(np.sum(occupancy_hist, axis=2), 0)
                 if self._create_source_scan_hist:
-                    plotting.plot_fancy_occupancy(hist=occupancy_array_masked, filename=output_pdf, z_max='median')
-                    plotting.plot_occupancy(hist=occupancy_array_masked, filename=output_pdf, z_max='maximum')
+                    plots.append(('plot_fancy_occupancy', dict(hist=occupancy_array_masked, z_max='median')))
+                    plots.append(('plot_occupancy', dict(hist=occupancy_array_masked, z_max='maximum')))
                 else:
-                    plotting.plotThreeWay(hist=occupancy_array_masked, title="Occupancy", x_axis_title="occupancy", filename=output_pdf, maximum=maximum)
-                    plotting.plot_occupancy(hist=occupancy_array_masked, filename=output_pdf, z_max='median')
+                    plots.append(('plotThreeWay', dict(hist=occupancy_array_masked, title="Occupancy", x_axis_title="occupancy", maximum=maximum)))
+                    plots.append(('plot_occupancy', dict(hist=occupancy_array_masked, z_max='median')))
         if (self._create_tot_hist):
-            plotting.plot_tot(hist=out_file_h5.root.HistTot if out_file_h5 is not None else self.tot_hist, filename=output_pdf)
-        if (self._create_tot_pixel_hist):
+            plots.append(('plot_tot', dict(hist=out_file_h5.root.HistTot[:] if out_file_h5 is not None else self.tot_hist)))
+        if (self._create_tot_pixel_hist and self._sparse_pixel_hists):
+            tot_pixel_hist = (out_file_h5.root.HistTotPixel.data[:], out_file_h5.root.HistTotPixel.indices[:], out_file_h5.root.HistTotPixel.indptr[:]) if out_file_h5 is not None else self.tot_pixel_hist_sparse
+            mean_pixel_tot = np.ma.masked_invalid(analysis_utils.get_mean_from_sparse_pixel_hist(*tot_pixel_hist))
+            plots.append(('plotThreeWay', dict(hist=mean_pixel_tot, title='Mean TOT', x_axis_title='mean TOT', minimum=0, maximum=15)))
+        elif (self._create_tot_pixel_hist):
             tot_pixel_hist = out_file_h5.root.HistTotPixel[:] if out_file_h5 is not None else self.tot_pixel_hist_array
             mean_pixel_tot = np.average(np.ma.masked_invalid(tot_pixel_hist), axis=2, weights=range(16)) * sum(range(0, 16)) / np.sum(tot_pixel_hist, axis=2)
-            plotting.plotThreeWay(mean_pixel_tot, title='Mean TOT', x_axis_title='mean TOT', filename=output_pdf, minimum=0, maximum=15)
+            plots.append(('plotThreeWay', dict(hist=mean_pixel_tot, title='Mean TOT', x_axis_title='mean TOT', minimum=0, maximum=15)))
         if (self._create_tdc_counter_hist):
-            plotting.plot_tdc_counter(hist=out_file_h5.root.HistTdcCounter if out_file_h5 is not None else self.tdc_hist_counter, filename=output_pdf)
+            plots.append(('plot_tdc_counter', dict(hist=out_file_h5.root.HistTdcCounter[:] if out_file_h5 is not None else self.tdc_hist_counter)))
         if (self._create_tdc_hist):
-            plotting.plot_tdc(hist=out_file_h5.root.HistTdc if out_file_h5 is not None else self.tdc_hist, filename=output_pdf)
+            plots.append(('plot_tdc', dict(hist=out_file_h5.root.HistTdc[:] if out_file_h5 is not None else self.tdc_hist)))
         if (self._create_cluster_size_hist):
-            plotting.plot_cluster_size(hist=out_file_h5.root.HistClusterSize if out_file_h5 is not None else self.cluster_size_hist, filename=output_pdf)
+            plots.append(('plot_cluster_size', dict(hist=out_file_h5.root.HistClusterSize[:] if out_file_h5 is not None else self.cluster_size_hist)))
         if (self._create_cluster_tot_hist):
-            plotting.plot_cluster_tot(hist=out_file_h5.root.HistClusterTot if out_file_h5 is not None else self.cluster_tot_hist, filename=output_pdf)
+            plots.append(('plot_cluster_tot', dict(hist=out_file_h5.root.HistClusterTot[:] if out_file_h5 is not None else self.cluster_tot_hist)))
         if (self._create_cluster_tot_hist and self._create_cluster_size_hist):
-            plotting.plot_cluster_tot_size(hist=out_file_h5.root.HistClusterTot if out_file_h5 is not None else self.cluster_tot_hist, filename=output_pdf)
+            plots.append(('plot_cluster_tot_size', dict(hist=out_file_h5.root.HistClusterTot[:] if out_file_h5 is not None else self.cluster_tot_hist)))
+        if (self._create_n_cluster_per_event_hist):
+            plots.append(('plot_n_cluster', dict(hist=(out_file_h5.root.HistNClusterPerEvent[:] if out_file_h5 is not None else self.n_cluster_per_event_hist, ))))
+        if (self._create_cluster_seed_hist):
+            plots.append(('plot_occupancy', dict(hist=np.ma.masked_equal(np.sum(out_file_h5.root.HistClusterSeed[:] if out_file_h5 is not None else self.cluster_seed_array, axis=2), 0), title='Cluster seed occupancy', z_max='median')))
+        if (self._create_cluster_position_hist):
+            plots.append(('plot_occupancy', dict(hist=np.ma.masked_equal(out_file_h5.root.HistClusterPosition[:] if out_file_h5 is not None else self.cluster_position_array, 0), title='Mean cluster position', z_max='median')))
         if (self._create_rel_bcid_hist):
             if self.set_stop_mode:
-                plotting.plot_relative_bcid_stop_mode(hist=out_file_h5.root.HistRelBcid if out_file_h5 is not None else self.rel_bcid_hist, filename=output_pdf)
+                plots.append(('plot_relative_bcid_stop_mode', dict(hist=out_file_h5.root.HistRelBcid[:] if out_file_h5 is not None else self.rel_bcid_hist)))
             else:
-                plotting.plot_relative_bcid(hist=out_file_h5.root.HistRelBcid[0:16] if out_file_h5 is not None else self.rel_bcid_hist[0:16], filename=output_pdf)
-        if (self._create_tdc_pixel_hist):
+                plots.append(('plot_relative_bcid', dict(hist=out_file_h5.root.HistRelBcid[0:16] if out_file_h5 is not None else self.rel_bcid_hist[0:16])))
+        if (self._create_tdc_pixel_hist and self._sparse_pixel_hists):
+            tdc_pixel_hist = (out_file_h5.root.HistTdcPixel.data[:], out_file_h5.root.HistTdcPixel.indices[:], out_file_h5.root.HistTdcPixel.indptr[:]) if out_file_h5 is not None else self.tdc_pixel_hist_sparse
+            mean_pixel_tdc = analysis_utils.get_mean_from_sparse_pixel_hist(*tdc_pixel_hist, max_value=1024)  # same TDC range as for the dense histogram
+            plots.append(('plotThreeWay', dict(hist=np.ma.masked_invalid(mean_pixel_tdc), title='Mean TDC', x_axis_title='mean TDC')))
+        elif (self._create_tdc_pixel_hist):
             tdc_pixel_hist = out_file_h5.root.HistTdcPixel[:, :, :1024] if out_file_h5 is not None else self.tdc_pixel_hist_array[:, :, :1024]  # only take first 1024 values, otherwise memory error likely
             mean_pixel_tdc = np.average(tdc_pixel_hist, axis=2, weights=range(1024)) * sum(range(0, 1024)) / np.sum(tdc_pixel_hist, axis=2)
-            plotting.plotThreeWay(np.ma.masked_invalid(mean_pixel_tdc), title='Mean TDC', x_axis_title='mean TDC', filename=output_pdf)
+            plots.append(('plotThreeWay', dict(hist=np.ma.masked_invalid(mean_pixel_tdc), title='Mean TDC', x_axis_title='mean TDC')))
         if not create_hit_hists_only:
             if (analyzed_data_file is None and self._create_error_hist):
-                plotting.plot_event_errors(hist=out_file_h5.root.HistErrorCounter if out_file_h5 is not None else self.error_counter_hist, filename=output_pdf)
+                plots.append(('plot_event_errors', dict(hist=out_file_h5.root.HistErrorCounter[:] if out_file_h5 is not None else self.error_counter_hist)))
             if (analyzed_data_file is None and self._create_service_record_hist):
-                plotting.plot_service_records(hist=out_file_h5.root.HistServiceRecord if out_file_h5 is not None else self.service_record_hist, filename=output_pdf)
+                plots.append(('plot_service_records', dict(hist=out_file_h5.root.HistServiceRecord[:] if out_file_h5 is not None else self.service_record_hist)))
             if (analyzed_data_file is None and self._create_trigger_error_hist):
-                plotting.plot_trigger_errors(hist=out_file_h5.root.HistTriggerErrorCounter if out_file_h5 is not None else self.trigger_error_counter_hist, filename=output_pdf)
-
-        if (out_file_h5 is not None):
-            out_file_h5.close()
-        if pdf_filename is not None:
-            logging.info('Closing output PDF file: %s', str(output_pdf._file.fh.name))
-            output_pdf.close()
+                plots.append(('plot_trigger_errors', dict(hist=out_file_h5.root.HistTriggerErrorCounter[:] if out_file_h5 is not None else self.trigger_error_counter_hist)))
+        return plots
+
+    def _get_plsr_dac_range(self):  # returns the PlsrDAC range (min, max) of the S-curves from the scan parameters
+        return np.amin(self.scan_parameters['PlsrDAC']), np.amax(self.scan_parameters['PlsrDAC'])
+
+    def _defer_plot_histograms(self, pdf_filename=None, analyzed_data_file=None, maximum=None, create_hit_hists_only=False, plsr_dac_range=None):  # stores the plot settings in the analyzed data file, the plots are created later with analysis.plot_deferred_histograms from the analyzed data file only
+        deferred_file = analyzed_data_file if analyzed_data_file is not None else self._analyzed_data_file
+        if deferred_file is None or not os.path.isfile(deferred_file):
+            raise analysis_utils.IncompleteInputError('Deferred plotting needs an analyzed data file.')
+        if pdf_filename is None and self.output_pdf is not None:
+            pdf_filename = str(self.output_pdf._file.fh.name)
+        if plsr_dac_range is None and self._create_occupancy_hist and self._create_fitted_threshold_hists:  # the only plotted data not stored in the analyzed data file
+            plsr_dac_range = self._get_plsr_dac_range()
+        plot_settings = {
+            'settings': dict((setting, getattr(self, setting)) for setting in plotting_settings),
+            'plsr_dac_range': tuple(int(value) for value in plsr_dac_range) if plsr_dac_range is not None else None,
+            'pdf_filename': pdf_filename if pdf_filename is not None else os.path.splitext(deferred_file)[0] + '.pdf',
+            'analyzed_data_file': analyzed_data_file,
+            'maximum': maximum,
+            'create_hit_hists_only': create_hit_hists_only
+        }
+        with tb.openFile(deferred_file, mode="r+") as out_file_h5:
+            out_file_h5.root._v_attrs.plot_settings = plot_settings
+        logging.info('Plotting deferred, create the plots later with analysis.plot_deferred_histograms(\'%s\')', deferred_file)
 
     def fit_scurves_multithread(self, hit_table_file=None, PlsrDAC=None):
-        logging.info("Start S-curve fit on %d CPU core(s)", mp.cpu_count())
+        n_cores = self._n_fit_cores if self._n_fit_cores else mp.cpu_count()
+        logging.info("Start S-curve fit on %d CPU core(s)", n_cores)
         occupancy_hist = hit_table_file.root.HistOcc[:] if hit_table_file is not None else self.occupancy_array[:]  # take data from RAM if no file is opened
         occupancy_hist_shaped = occupancy_hist.reshape(occupancy_hist.shape[0] * occupancy_hist.shape[1], occupancy_hist.shape[2])
-        partialfit_scurve = partial(fit_scurve, PlsrDAC=PlsrDAC)  # trick to give a function more than one parameter, needed for pool.map
-        pool = mp.Pool()  # create as many workers as physical cores are available
-        try:
-            result_list = pool.map(partialfit_scurve, occupancy_hist_shaped.tolist())
-        except TypeError:
-            raise analysis_utils.NotSupportedError('Less than 3 points found for S-curve fit.')
-        finally:
-            pool.close()
-            pool.join()
-        result_array = np.array(result_list)
+        partialfit_scurves = partial(fit_scurves, PlsrDAC=PlsrDAC)  # trick to give a function more than one parameter, needed for pool.map
+        if n_cores == 1:
+            result_array = partialfit_scurves(occupancy_hist_shaped)
+        else:
+            pool = mp.Pool(n_cores)
+            try:
+                result_array = np.concatenate(pool.map(partialfit_scurves, np.array_split(occupancy_hist_shaped, 4 * n_cores)))  # several pixel batches per core to balance the load
+            finally:
+                pool.close()
+                pool.join()
         logging.info("S-curve fit finished")
         return result_array.reshape(occupancy_hist.shape[0], occupancy_hist.shape[1], 2)
 
@@ -1025,29 +1886,51 @@ class AnalyzeRawData(object):
         return True
 
     def is_histogram_hits(self):  # returns true if a setting needs to have the hit histogramming active
-        if (self._create_occupancy_hist or self._create_tot_hist or self._create_rel_bcid_hist or self._create_hit_table or self._create_threshold_hists or self._create_fitted_threshold_hists):
+        if (self._create_occupancy_hist or self._create_tot_hist or self._create_tot_pixel_hist or self._create_rel_bcid_hist or self._create_tdc_hist or self._create_tdc_pixel_hist or self._create_hit_table or self._create_threshold_hists or self._create_fitted_threshold_hists):
             return True
         return False
 
     def is_cluster_hits(self):  # returns true if a setting needs to have the clusterizer active
-        if (self.create_cluster_hit_table or self.create_cluster_table or self.create_cluster_size_hist or self.create_cluster_tot_hist):
+        if (self.create_cluster_hit_table or self.create_cluster_table or self.create_cluster_size_hist or self.create_cluster_tot_hist or self.create_cluster_charge_hist or self.is_histogram_cluster()):
             return True
         return False
 
-    def _deduce_settings_from_file(self, opened_raw_data_file):  # TODO: parse better
-        '''Tries to get the scan parameters needed for analysis from the raw data file
+    def is_histogram_cluster(self):  # returns true if a setting needs to have the cluster histogramming during clustering active
+        if (self._create_n_cluster_per_event_hist or self._create_cluster_seed_hist or self._create_cluster_position_hist):
+            return True
+        return False
+
+    def _get_histogramings(self):  # the cluster seed histograming uses the scan parameter settings of the hit histograming
+        if self._create_cluster_seed_hist:
+            return (self.histograming, self.cluster_seed_histograming)
+        return (self.histograming, )
+
+    def _deduce_settings_from_file(self, raw_data_file):  # TODO: parse better
+        '''Tries to get the scan parameters needed for analysis from the (cached) configuration of the raw data file
         '''
+        configuration = analysis_utils.get_raw_data_file_info(raw_data_file)['configuration']
+
+        def get_value(node_name, name):  # raises the exceptions of the former table lookups
+            if node_name not in configuration:
+                raise tb.exceptions.NoSuchNodeError('Configuration node %s does not exist' % node_name)
+            if name is None:
+                return configuration[node_name]
+            try:
+                return configuration[node_name][name]
+            except KeyError:
+                raise IndexError('Configuration value %s does not exist' % name)
+
         try:  # take infos raw data files (not avalable in old files)
-            flavor = opened_raw_data_file.root.configuration.miscellaneous[:][np.where(opened_raw_data_file.root.configuration.miscellaneous[:]['name'] == 'Flavor')]['value'][0]
+            flavor = get_value('miscellaneous', 'Flavor')
             self._settings_from_file_set = True
-            bcid = opened_raw_data_file.root.configuration.global_register[:][np.where(opened_raw_data_file.root.configuration.global_register[:]['name'] == 'Trig_Count')]['value'][0]
-            vcal_c0 = opened_raw_data_file.root.configuration.calibration_parameters[:][np.where(opened_raw_data_file.root.configuration.calibration_parameters[:]['name'] == 'Vcal_Coeff_0')]['value'][0]
-            vcal_c1 = opened_raw_data_file.root.configuration.calibration_parameters[:][np.where(opened_raw_data_file.root.configuration.calibration_parameters[:]['name'] == 'Vcal_Coeff_1')]['value'][0]
-            c_low = opened_raw_data_file.root.configuration.calibration_parameters[:][np.where(opened_raw_data_file.root.configuration.calibration_parameters[:]['name'] == 'C_Inj_Low')]['value'][0]
-            c_mid = opened_raw_data_file.root.configuration.calibration_parameters[:][np.where(opened_raw_data_file.root.configuration.calibration_parameters[:]['name'] == 'C_Inj_Med')]['value'][0]
-            c_high = opened_raw_data_file.root.configuration.calibration_parameters[:][np.where(opened_raw_data_file.root.configuration.calibration_parameters[:]['name'] == 'C_Inj_High')]['value'][0]
-            self.c_low_mask = opened_raw_data_file.root.configuration.C_Low[:]
-            self.c_high_mask = opened_raw_data_file.root.configuration.C_High[:]
+            bcid = get_value('global_register', 'Trig_Count')
+            vcal_c0 = get_value('calibration_parameters', 'Vcal_Coeff_0')
+            vcal_c1 = get_value('calibration_parameters', 'Vcal_Coeff_1')
+            c_low = get_value('calibration_parameters', 'C_Inj_Low')
+            c_mid = get_value('calibration_parameters', 'C_Inj_Med')
+            c_high = get_value('calibration_parameters', 'C_Inj_High')
+            self.c_low_mask = get_value('C_Low', None)
+            self.c_high_mask = get_value('C_High', None)
             self.fei4b = False if str(flavor) == 'fei4a' else True
             self.n_bcid = int(bcid)
             self.vcal_c0 = float(vcal_c0)
@@ -1055,13 +1938,13 @@ class AnalyzeRawData(object):
             self.c_low = float(c_low)
             self.c_mid = float(c_mid)
             self.c_high = float(c_high)
-            repeat_command = opened_raw_data_file.root.configuration.run_conf[:][np.where(opened_raw_data_file.root.configuration.run_conf[:]['name'] == 'repeat_command')]['value'][0]
+            repeat_command = get_value('run_conf', 'repeat_command')
             self.n_injections = int(repeat_command)
         except tb.exceptions.NoSuchNodeError:
             if not self._settings_from_file_set:
-                logging.warning('No settings stored in raw data file %s, use standard settings', opened_raw_data_file.filename)
+                logging.warning('No settings stored in raw data file %s, use standard settings', raw_data_file)
             else:
-                logging.info('No settings provided in raw data file %s, use already set settings', opened_raw_data_file.filename)
+                logging.info('No settings provided in raw data file %s, use already set settings', raw_data_file)
         except IndexError:  # happens if setting is not available (e.g. repeat_command)
             pass
 
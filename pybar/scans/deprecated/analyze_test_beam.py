@@ -23,7 +23,6 @@ import progressbar
 import re
 import numpy as np
 from math import sqrt, ceil
-import pandas as pd
 import tables as tb
 from multiprocessing import Pool, cpu_count
 from scipy.optimize import curve_fit, minimize_scalar
@@ -158,31 +157,31 @@ def align_events(input_file, output_file, chunk_size=10000000):
         logging.info('Found %d inconsistencies in the event number. %d events had to be corrected.', jumps[jumps != 0].shape[0], n_fixed_events)
 
 
-def correlate_hits(hit_files, alignment_file, max_column, max_row):
+def correlate_hits(hit_files, alignment_file, max_column, max_row, chunk_size=10000000):
     '''Histograms the hit column (row)  of two different devices on an event basis. If the hits are correlated a line should be seen.
-    The correlation is done very simple. Not all hits of the first device are correlated with all hits of the second device. This is sufficient
-    as long as you do not have too many hits per event.
+    All hits of the first device are correlated with all hits of the second device of the same event. The hit tables are read in event aligned chunks,
+    thus the memory does not depend on the number of hits.
 
     Parameters
     ----------
     input_file : pytables file
     alignment_file : pytables file
         Output file with the correlation data
+    chunk_size : int
+        The number of hits read from each hit file at once.
     '''
     logging.info('Correlate the position of %d DUTs', len(hit_files))
     with tb.open_file(alignment_file, mode="w") as out_file_h5:
-        for index, hit_file in enumerate(hit_files):
-            with tb.open_file(hit_file, 'r') as in_file_h5:
-                hit_table = in_file_h5.root.Hits[:]
-                if index == 0:
-                    first_reference = pd.DataFrame({'event_number': hit_table[:]['event_number'], 'column_%d' % index: hit_table[:]['column'], 'row_%d' % index: hit_table[:]['row'], 'tot_%d' % index: hit_table[:]['tot']})
-                else:
+        with tb.open_file(hit_files[0], 'r') as reference_file_h5:
+            for index, hit_file in enumerate(hit_files[1:], start=1):
+                with tb.open_file(hit_file, 'r') as in_file_h5:
                     logging.info('Correlate detector %d with detector %d', index, 0)
-                    dut = pd.DataFrame({'event_number': hit_table[:]['event_number'], 'column_1': hit_table[:]['column'], 'row_1': hit_table[:]['row'], 'tot_1': hit_table[:]['tot']})
-                    df = first_reference.merge(dut, how='left', on='event_number')
-                    df.dropna(inplace=True)
-                    col_corr = analysis_utils.hist_2d_index(df['column_0'] - 1, df['column_1'] - 1, shape=(max_column, max_column))
-                    row_corr = analysis_utils.hist_2d_index(df['row_0'] - 1, df['row_1'] - 1, shape=(max_row, max_row))
+                    col_corr = np.zeros(shape=(max_column, max_column), dtype=np.uint32)
+                    row_corr = np.zeros(shape=(max_row, max_row), dtype=np.uint32)
+                    for (reference_hits, dut_hits), _ in analysis_utils.data_aligned_at_events_in_tables((reference_file_h5.root.Hits, in_file_h5.root.Hits), chunk_size=chunk_size):
+                        reference_index, dut_index = analysis_utils.get_event_join_index(reference_hits['event_number'], dut_hits['event_number'])  # all hit pairs of the same event
+                        col_corr += analysis_utils.hist_2d_index(reference_hits['column'][reference_index] - 1, dut_hits['column'][dut_index] - 1, shape=(max_column, max_column))
+                        row_corr += analysis_utils.hist_2d_index(reference_hits['row'][reference_index] - 1, dut_hits['row'][dut_index] - 1, shape=(max_row, max_row))
                     out = out_file_h5.createCArray(out_file_h5.root, name='CorrelationColumn_0_%d' % index, title='Column Correlation between DUT %d and %d' % (0, index), atom=tb.Atom.from_dtype(col_corr.dtype), shape=col_corr.shape, filters=tb.Filters(complib='blosc', complevel=5, fletcher32=False))
                     out_2 = out_file_h5.createCArray(out_file_h5.root, name='CorrelationRow_0_%d' % index, title='Row Correlation between DUT %d and %d' % (0, index), atom=tb.Atom.from_dtype(row_corr.dtype), shape=row_corr.shape, filters=tb.Filters(complib='blosc', complevel=5, fletcher32=False))
                     out.attrs.filenames = [str(hit_files[0]), str(hit_files[index])]
@@ -3,15 +3,21 @@
 
 import unittest
 import os
+import re
+import shutil
+import threading
 import tables as tb
 import numpy as np
 import progressbar
+from scipy.special import erf
 
-from pybar.analysis.analyze_raw_data import AnalyzeRawData
+from pybar.analysis.analyze_raw_data import AnalyzeRawData, fit_scurve, fit_scurves
 from pybar.analysis.RawDataConverter.data_interpreter import PyDataInterpreter
 from pybar.analysis.RawDataConverter.data_histograming import PyDataHistograming
 from pybar.analysis.RawDataConverter.data_clusterizer import PyDataClusterizer
 from pybar.analysis import analysis_utils
+from pybar.analysis import analysis
+from pybar.analysis.plotting import plotting
 from pybar.analysis.RawDataConverter import data_struct
 from pybar.scans.calibrate_hit_or import create_hitor_calibration
 from pybar.daq.readout_utils import get_col_row_array_from_data_record_array, convert_data_array, is_data_record
@@ -115,6 +121,13 @@ def compare_h5_files(first_file, second_file, expected_nodes=None, detailed_comp
     return checks_passed, error_msg
 
 
+class KillingChunkSize(object):
+    '''Chunk size setting that kills the analysis process, e.g. like a crash in the c++ code.
+    '''
+    def __rmul__(self, other):
+        os._exit(1)
+
+
 class TestAnalysis(unittest.TestCase):
 
     @classmethod
@@ -293,6 +306,836 @@ class TestAnalysis(unittest.TestCase):
         occ_hist_python, _, _ = np.histogram2d(col_arr, row_arr, bins=(80, 336), range=[[1, 80], [1, 336]])
         self.assertTrue(np.all(occ_hist_cpp == occ_hist_python))
 
+    def test_scan_parameter_histograming(self):  # the parameter lookup per hit has to be independent of the hit order and of not yet set meta event index entries
+        meta_event_index = np.array([0, 10, 10, 25, 40, 55, 70, 0, 0], dtype=np.uint64)  # entries at the end are not set yet by the interpreter
+        scan_parameter_index = np.array([0, 0, 1, 1, 1, 2, 0, 2, 2], dtype=np.uint32)
+        hits = np.zeros((2000,), dtype=tb.dtype_from_descr(data_struct.HitInfoTable))
+        hits['event_number'] = np.sort(np.random.RandomState(0).randint(0, 100, hits.shape[0]))
+        hits['column'] = hits['event_number'] % 80 + 1
+        hits['row'] = hits['event_number'] % 336 + 1
+        readout_index = np.searchsorted(meta_event_index[:7], hits['event_number'], side='right') - 1
+        occupancy_python = np.zeros((80, 336, 3), dtype=np.uint32)
+        np.add.at(occupancy_python, (hits['column'] - 1, hits['row'] - 1, scan_parameter_index[readout_index]), 1)
+        for permutation in (np.arange(hits.shape[0]), np.random.RandomState(1).permutation(hits.shape[0])):
+            histograming = PyDataHistograming()
+            histograming.create_occupancy_hist(True)
+            histograming.add_scan_parameter(scan_parameter_index)
+            histograming.add_meta_event_index(meta_event_index, array_length=4)  # the meta event index is added chunk wise during interpretation
+            histograming.add_meta_event_index(meta_event_index, array_length=meta_event_index.shape[0])
+            histograming.add_hits(hits[permutation])
+            self.assertTrue(np.array_equal(histograming.get_occupancy(), occupancy_python))
+
+    def test_sparse_pixel_hists(self):  # the sparse ToT/TDC pixel histograms have to give the dense histograms
+        with tb.open_file(tests_data_folder + 'unit_test_data_1.h5', mode="r") as in_file_h5:
+            raw_data = in_file_h5.root.raw_data[:]
+        interpreter = PyDataInterpreter()
+        interpreter.set_warning_output(False)
+        interpreter.interpret_raw_data(raw_data)
+        interpreter.store_event()
+        hits = interpreter.get_hits().copy()
+        hits['TDC'] = np.arange(hits.shape[0]) % 3000  # TDC values >= 2048 are set to 0 in both modes
+        results = []
+        for sparse in (False, True):
+            histograming = PyDataHistograming()
+            histograming.set_info_output(False)
+            histograming.set_no_scan_parameter()
+            histograming.create_tot_pixel_hist(True)
+            histograming.create_tdc_pixel_hist(True)
+            histograming.set_sparse_pixel_hists(sparse)
+            histograming.add_hits(hits[:hits.shape[0] / 2])  # the sparse histograms have to be accumulated over several calls
+            histograming.add_hits(hits[hits.shape[0] / 2:])
+            if sparse:
+                for (counts, values, pixel_pointer), n_values in ((histograming.get_tot_pixel_hist_sparse(), 16), (histograming.get_tdc_pixel_hist_sparse(), 4096)):
+                    self.assertEqual(counts.dtype, np.uint32)
+                    hist = np.zeros((80 * 336, n_values), dtype=np.uint32)
+                    hist[np.repeat(np.arange(80 * 336), np.diff(pixel_pointer).astype(np.int64)), values] = counts
+                    results.append(hist.reshape((336, 80, n_values)).swapaxes(0, 1))
+            else:
+                results.extend((histograming.get_tot_pixel_hist().copy(), histograming.get_tdc_pixel_hist()[:, :, :2048].copy()))
+        self.assertTrue(np.array_equal(results[0], results[2]))
+        self.assertTrue(np.array_equal(results[1], results[3][:, :, :2048]))
+        self.assertFalse(np.any(results[3][:, :, 2048:]))
+        with AnalyzeRawData(raw_data_file=tests_data_folder + 'unit_test_data_1.h5', analyzed_data_file=tests_data_folder + 'unit_test_data_1_sparse.h5', create_pdf=False) as analyze_raw_data:
+            analyze_raw_data.sparse_pixel_hists = True
+            analyze_raw_data.interpret_word_table(use_settings_from_file=False, fei4b=False)
+        with tb.open_file(tests_data_folder + 'unit_test_data_1_sparse.h5', mode="r") as in_file_h5:
+            with tb.open_file(tests_data_folder + 'unit_test_data_1_result.h5', mode="r") as result_file_h5:
+                tot_pixel_hist = result_file_h5.root.HistTotPixel[:]
+            self.assertEqual(tuple(in_file_h5.root.HistTotPixel._v_attrs.shape), tot_pixel_hist.shape)
+            counts, values, pixel_pointer = in_file_h5.root.HistTotPixel.data[:], in_file_h5.root.HistTotPixel.indices[:], in_file_h5.root.HistTotPixel.indptr[:]
+            hist = np.zeros((80 * 336, 16), dtype=np.uint32)
+            hist[np.repeat(np.arange(80 * 336), np.diff(pixel_pointer).astype(np.int64)), values] = counts
+            self.assertTrue(np.array_equal(hist.reshape(tot_pixel_hist.shape), tot_pixel_hist))
+            mean_tot = analysis_utils.get_mean_from_sparse_pixel_hist(counts, values, pixel_pointer)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                self.assertTrue(np.allclose(mean_tot, np.sum(tot_pixel_hist * np.arange(16), axis=2) / np.sum(tot_pixel_hist, axis=2).astype(np.float64), equal_nan=True))
+        os.remove(tests_data_folder + 'unit_test_data_1_sparse.h5')
+
+    def test_occupancy_window(self):  # the occupancy streamed per finished scan parameter to the output file has to be the occupancy of the in memory histogramming
+        occupancies = []
+        for occupancy_window in (None, 1):
+            with AnalyzeRawData(raw_data_file=[tests_data_folder + 'unit_test_data_4_parameter_128.h5', tests_data_folder + 'unit_test_data_4_parameter_256.h5'], analyzed_data_file=tests_data_folder + 'unit_test_data_4_window.h5', scan_parameter_name='parameter', create_pdf=False) as analyze_raw_data:
+                analyze_raw_data.chunk_size = 3000
+                analyze_raw_data.create_hit_table = True
+                analyze_raw_data.occupancy_window = occupancy_window
+                analyze_raw_data.interpret_word_table(use_settings_from_file=False, fei4b=False)
+            with tb.open_file(tests_data_folder + 'unit_test_data_4_window.h5', mode="r") as in_file_h5:
+                occupancies.append(in_file_h5.root.HistOcc[:])
+            with AnalyzeRawData(raw_data_file=None, analyzed_data_file=tests_data_folder + 'unit_test_data_4_window.h5', create_pdf=False) as analyze_raw_data:
+                analyze_raw_data.chunk_size = 3000
+                analyze_raw_data.create_tot_hist = False
+                analyze_raw_data.create_tot_pixel_hist = False
+                analyze_raw_data.create_rel_bcid_hist = False
+                analyze_raw_data.occupancy_window = occupancy_window
+                analyze_raw_data.analyze_hit_table(analyzed_data_out_file=tests_data_folder + 'unit_test_data_4_window_analyzed.h5')
+            with tb.open_file(tests_data_folder + 'unit_test_data_4_window_analyzed.h5', mode="r") as in_file_h5:
+                occupancies.append(in_file_h5.root.HistOcc[:])
+        self.assertEqual(occupancies[0].shape[2], 2)
+        self.assertTrue(np.all(np.sum(occupancies[0], axis=(0, 1)) > 0))
+        for occupancy in occupancies[1:]:
+            self.assertTrue(np.array_equal(occupancy, occupancies[0]))
+        os.remove(tests_data_folder + 'unit_test_data_4_window.h5')
+        os.remove(tests_data_folder + 'unit_test_data_4_window_analyzed.h5')
+
+    def test_scurve_fit(self):  # the vectorized S-curve fit of all pixels has to give the single pixel fit results
+        np.random.seed(0)
+        plsr_dac = np.arange(0, 100, dtype=np.float64)
+        threshold, noise = np.random.uniform(20, 80, size=(336, 80)), np.random.uniform(1, 5, size=(336, 80))
+        occupancy = np.random.binomial(100, 0.5 * erf((plsr_dac - threshold[:, :, np.newaxis]) / (np.sqrt(2) * noise[:, :, np.newaxis])) + 0.5).astype(np.uint32)
+        occupancy[:10] = 0  # not responding pixels
+        occupancy_shaped = occupancy.reshape(336 * 80, plsr_dac.shape[0])
+        fit_results = np.array([fit_scurve(scurve_data, plsr_dac) for scurve_data in occupancy_shaped[::17]])  # the single pixel fit is slow, check only some pixels
+        good_fits = (fit_results[:, 1] > 0.5) | (fit_results[:, 0] == 0)  # the single pixel fit rarely ends in a local minimum with a steep S-curve, the vectorized fit has better start values
+        self.assertGreater(np.count_nonzero(good_fits), 0.99 * fit_results.shape[0])
+        self.assertTrue(np.allclose(fit_scurves(occupancy_shaped[::17], plsr_dac)[good_fits], fit_results[good_fits], rtol=1e-5, atol=1e-5))
+        with AnalyzeRawData(raw_data_file=None, analyzed_data_file=tests_data_folder + 'unit_test_data_scurve_fit.h5', create_pdf=False) as analyze_raw_data:  # the output file is not used, the occupancy is taken from RAM
+            analyze_raw_data.occupancy_array = occupancy
+            analyze_raw_data.n_fit_cores = 2
+            scurve_fit_results = analyze_raw_data.fit_scurves_multithread(PlsrDAC=plsr_dac)
+        self.assertEqual(scurve_fit_results.shape, (336, 80, 2))
+        self.assertTrue(np.all(scurve_fit_results[:10] == 0))
+        self.assertTrue(np.allclose(scurve_fit_results.reshape(336 * 80, 2)[::17][good_fits], fit_results[good_fits], rtol=1e-5, atol=1e-5))
+
+    def test_threaded_interpretation(self):  # the compiled libraries release the GIL, check that independent instances give identical results when run in parallel threads
+        with tb.open_file(tests_data_folder + 'unit_test_data_1.h5', mode="r") as in_file_h5:
+            raw_data = in_file_h5.root.raw_data[:]
+
+        def analyze(result, index):
+            interpreter = PyDataInterpreter()
+            histograming = PyDataHistograming()
+            clusterizer = PyDataClusterizer()
+            interpreter.set_warning_output(False)
+            histograming.set_no_scan_parameter()
+            histograming.create_occupancy_hist(True)
+            interpreter.interpret_raw_data(raw_data)
+            interpreter.store_event()
+            hits = interpreter.get_hits()
+            histograming.add_hits(hits)
+            clusterizer.add_hits(hits)
+            result[index] = (histograming.get_occupancy().copy(), clusterizer.get_cluster_size_hist().copy())
+
+        results = {}
+        threads = [threading.Thread(target=analyze, args=(results, i)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        expected = {}
+        analyze(expected, 0)
+        self.assertEqual(len(results), 4)
+        for occupancy, cluster_size_hist in results.values():
+            self.assertTrue(np.all(occupancy == expected[0][0]))
+            self.assertTrue(np.all(cluster_size_hist == expected[0][1]))
+
+    def test_growing_hit_arrays(self):  # too small hit/cluster arrays have to grow without changing the result
+        with tb.open_file(tests_data_folder + 'unit_test_data_1.h5', mode="r") as in_file_h5:
+            raw_data = in_file_h5.root.raw_data[:]
+        results = []
+        for array_size in (10, 2 * raw_data.shape[0]):
+            interpreter = PyDataInterpreter()
+            clusterizer = PyDataClusterizer()
+            interpreter.set_warning_output(False)
+            interpreter.set_hit_array_size(array_size)
+            clusterizer.create_cluster_hit_info_array(True)
+            clusterizer.set_cluster_hit_info_array_size(array_size)
+            clusterizer.set_cluster_info_array_size(array_size)
+            interpreter.interpret_raw_data(raw_data)
+            interpreter.store_event()
+            hits = interpreter.get_hits()
+            clusterizer.add_hits(hits)
+            self.assertEqual(interpreter.get_max_n_array_hits(), hits.shape[0])
+            self.assertEqual(clusterizer.get_max_n_cluster_hits(), hits.shape[0])
+            self.assertEqual(clusterizer.get_max_n_clusters(), clusterizer.get_n_clusters())
+            self.assertTrue(interpreter.get_hit_array_size() >= hits.shape[0])
+            results.append((hits.copy(), clusterizer.get_cluster().copy(), clusterizer.get_hit_cluster().copy()))
+        for small, large in zip(results[0], results[1]):
+            self.assertTrue(np.array_equal(small, large))
+
+    def test_sparse_clustering(self):  # searching the cluster seeds in the sorted event hits has to give the same cluster as the hit map loop
+        with tb.open_file(tests_data_folder + 'unit_test_data_1.h5', mode="r") as in_file_h5:
+            raw_data = in_file_h5.root.raw_data[:]
+        interpreter = PyDataInterpreter()
+        interpreter.set_warning_output(False)
+        interpreter.set_hit_array_size(2 * raw_data.shape[0])
+        interpreter.interpret_raw_data(raw_data)
+        interpreter.store_event()
+        hits = interpreter.get_hits().copy()
+        results = []
+        for sparse in (False, True):
+            clusterizer = PyDataClusterizer()
+            clusterizer.set_warning_output(False)
+            clusterizer.create_cluster_hit_info_array(True)
+            clusterizer.set_cluster_hit_info_array_size(2 * hits.shape[0])
+            clusterizer.set_cluster_info_array_size(2 * hits.shape[0])
+            clusterizer.set_sparse_clustering(sparse)
+            clusterizer.add_hits(hits)
+            results.append((clusterizer.get_cluster().copy(), clusterizer.get_hit_cluster().copy(), clusterizer.get_cluster_size_hist().copy(), clusterizer.get_cluster_tot_hist().copy()))
+        self.assertTrue(results[0][0].shape[0] > 0)
+        for hit_map_loop, sorted_hits in zip(results[0], results[1]):
+            self.assertTrue(np.array_equal(hit_map_loop, sorted_hits))
+
+    def test_cluster_charge_calibration(self):  # the cluster charge has to be the sum of the calibrated hit charges and has to be histogrammed during clustering
+        with tb.open_file(tests_data_folder + 'hit_or_calibration_result.h5', mode="r") as in_file_h5:
+            mean_tot = in_file_h5.root.HitOrCalibration[:, :, :, 0]
+            charges = in_file_h5.root.HitOrCalibration.attrs.scan_parameter_values[:]
+        charge_calibration = analysis_utils.get_tot_charge_calibration(mean_tot, charges)
+        calibrated_pixels = np.argwhere(np.all(np.diff(mean_tot, axis=2) > 0, axis=2))
+        self.assertTrue(calibrated_pixels.shape[0] > 0)
+        for column, row in calibrated_pixels:
+            self.assertTrue(np.allclose(charge_calibration[column, row], np.interp(np.arange(14), mean_tot[column, row], charges)))
+        not_calibrated = np.all(mean_tot == 0, axis=2)
+        self.assertTrue(np.all(charge_calibration[not_calibrated] == np.arange(1, 15)))  # pixels without calibration keep the standard charge ToT + 1
+        self.assertTrue(np.all(analysis_utils.get_tot_charge_calibration(mean_tot, charges, fill_value=0.)[not_calibrated] == 0.))
+
+        with tb.open_file(tests_data_folder + 'unit_test_data_1.h5', mode="r") as in_file_h5:
+            raw_data = in_file_h5.root.raw_data[:]
+        interpreter = PyDataInterpreter()
+        interpreter.set_warning_output(False)
+        interpreter.set_hit_array_size(2 * raw_data.shape[0])
+        interpreter.interpret_raw_data(raw_data)
+        interpreter.store_event()
+        hits = interpreter.get_hits().copy()
+        charge_lookup = np.random.RandomState(0).uniform(0, 100, size=(80, 336, 14)).astype(np.float32)
+        positions = []
+        for calibrated in (False, True):
+            clusterizer = PyDataClusterizer()
+            clusterizer.set_warning_output(False)
+            clusterizer.create_cluster_hit_info_array(True)
+            clusterizer.set_cluster_hit_info_array_size(2 * hits.shape[0])
+            clusterizer.set_cluster_info_array_size(2 * hits.shape[0])
+            if calibrated:
+                clusterizer.set_charge_calibration(charge_lookup)
+            clusterizer.add_hits(hits)
+            cluster, cluster_hits = clusterizer.get_cluster(), clusterizer.get_hit_cluster()
+            positions.append(cluster[['mean_column', 'mean_row']].copy())
+            if calibrated:
+                cluster_keys, cluster_index = np.unique(cluster_hits['eventNumber'] * 2 ** 16 + cluster_hits['clusterID'], return_inverse=True)
+                self.assertTrue(np.array_equal(cluster_keys, cluster['eventNumber'] * 2 ** 16 + cluster['ID']))
+                hit_charge = charge_lookup[cluster_hits['column'] - 1, cluster_hits['row'] - 1, cluster_hits['tot']]
+                self.assertTrue(np.allclose(cluster['charge'], np.bincount(cluster_index, weights=hit_charge), rtol=1e-5))
+            else:  # the standard charge is ToT + 1 per hit
+                self.assertTrue(np.array_equal(cluster['charge'], cluster['tot'] + cluster['size']))
+            cluster_charge_hist = clusterizer.get_cluster_charge_hist()
+            histogrammed = cluster['size'] <= 30  # clusters with too many hits are not histogrammed
+            self.assertTrue(np.array_equal(cluster_charge_hist[:, 1:], analysis_utils.hist_2d_index(cluster['charge'][histogrammed].astype(np.uint32), cluster['size'][histogrammed], shape=(4096, 1024))[:, 1:]))
+            self.assertTrue(np.array_equal(cluster_charge_hist[:, 0], np.sum(cluster_charge_hist[:, 1:], axis=1)))
+            self.assertEqual(np.sum(cluster_charge_hist[:, 0]), np.sum(clusterizer.get_cluster_size_hist()))
+        self.assertTrue(np.array_equal(positions[0], positions[1]))  # the cluster position does not depend on the charge calibration
+
+    def test_cluster_hists(self):  # the cluster histograms filled during clustering have to be the histograms of the cluster table
+        for create_cluster_table in (True, False):
+            with AnalyzeRawData(raw_data_file=[tests_data_folder + 'unit_test_data_4_parameter_128.h5', tests_data_folder + 'unit_test_data_4_parameter_256.h5'], analyzed_data_file=tests_data_folder + 'unit_test_data_4_cluster_hists_%d.h5' % create_cluster_table, scan_parameter_name='parameter', create_pdf=False) as analyze_raw_data:
+                analyze_raw_data.chunk_size = 3000
+                analyze_raw_data.create_cluster_table = create_cluster_table
+                analyze_raw_data.create_cluster_hists = True
+                analyze_raw_data.interpret_word_table(use_settings_from_file=False, fei4b=False)
+        analysis.histogram_cluster_table(tests_data_folder + 'unit_test_data_4_cluster_hists_1.h5', tests_data_folder + 'unit_test_data_4_cluster_seeds.h5')
+        with tb.open_file(tests_data_folder + 'unit_test_data_4_cluster_hists_1.h5', mode="r") as table_file_h5:
+            with tb.open_file(tests_data_folder + 'unit_test_data_4_cluster_hists_0.h5', mode="r") as hists_file_h5:
+                self.assertFalse('Cluster' in hists_file_h5.root)
+                self.assertFalse('ClusterHits' in hists_file_h5.root)
+                cluster = table_file_h5.root.Cluster[:]
+                self.assertTrue(cluster.shape[0] > 0)
+                n_cluster_per_event_hist = np.bincount(analysis_utils.get_n_cluster_in_events(cluster['event_number'])[:, 1])
+                self.assertTrue(np.array_equal(hists_file_h5.root.HistNClusterPerEvent[:], n_cluster_per_event_hist))
+                self.assertTrue(np.array_equal(hists_file_h5.root.HistClusterPosition[:], analysis_utils.hist_2d_index(cluster['mean_column'] - 1., cluster['mean_row'] - 1., shape=(80, 336)).T))
+                with tb.open_file(tests_data_folder + 'unit_test_data_4_cluster_seeds.h5', mode="r") as seed_file_h5:
+                    self.assertEqual(hists_file_h5.root.HistClusterSeed.shape[2], 2)
+                    self.assertTrue(np.array_equal(hists_file_h5.root.HistClusterSeed[:], np.transpose(seed_file_h5.root.HistOcc[:], (1, 2, 0))))  # histogram_cluster_table stores (parameter, row, column)
+                for node in ('HistNClusterPerEvent', 'HistClusterSeed', 'HistClusterPosition', 'HistClusterSize', 'HistClusterTot'):
+                    self.assertTrue(np.array_equal(table_file_h5.get_node('/' + node)[:], hists_file_h5.get_node('/' + node)[:]))
+        for file_name in ('unit_test_data_4_cluster_hists_0.h5', 'unit_test_data_4_cluster_hists_1.h5', 'unit_test_data_4_cluster_seeds.h5'):
+            os.remove(tests_data_folder + file_name)
+
+    def test_incomplete_charge_calibration(self):  # an incomplete charge calibration must not corrupt the cluster positions or abort the cluster histogramming
+        with tb.open_file(tests_data_folder + 'hit_or_calibration_result.h5', mode="r") as in_file_h5:
+            mean_tot = in_file_h5.root.HitOrCalibration[:, :, :, 0]
+            charges = in_file_h5.root.HitOrCalibration.attrs.scan_parameter_values[:]
+        charge_calibration = analysis_utils.get_tot_charge_calibration(mean_tot, charges, fill_value=np.nan)
+        charge_calibration[:40] = np.nan  # no calibration for the first 40 columns
+        for calibrated in (False, True):
+            with AnalyzeRawData(raw_data_file=tests_data_folder + 'unit_test_data_1.h5', analyzed_data_file=tests_data_folder + 'unit_test_data_1_calibration_%d.h5' % calibrated, create_pdf=False) as analyze_raw_data:
+                analyze_raw_data.create_cluster_table = True
+                analyze_raw_data.create_cluster_hists = True
+                analyze_raw_data.create_cluster_position_hist = True
+                if calibrated:
+                    analyze_raw_data.charge_calibration = charge_calibration
+                analyze_raw_data.interpret_word_table(use_settings_from_file=False, fei4b=False)
+        with tb.open_file(tests_data_folder + 'unit_test_data_1_calibration_0.h5', mode="r") as uncalibrated_file_h5:
+            with tb.open_file(tests_data_folder + 'unit_test_data_1_calibration_1.h5', mode="r") as calibrated_file_h5:
+                cluster = calibrated_file_h5.root.Cluster[:]
+                self.assertTrue(np.any(np.isnan(cluster['charge'])))
+                for name in ('mean_column', 'mean_row'):
+                    self.assertTrue(np.array_equal(cluster[name], uncalibrated_file_h5.root.Cluster[:][name]))
+                self.assertTrue(np.array_equal(calibrated_file_h5.root.HistClusterPosition[:], uncalibrated_file_h5.root.HistClusterPosition[:]))
+        cluster = cluster.view(np.recarray).copy()
+        cluster['mean_column'][:10] = np.nan  # clusters without a position are not histogrammed
+        with AnalyzeRawData(raw_data_file=None, analyzed_data_file=tests_data_folder + 'unit_test_data_1_calibration_1.h5', create_pdf=False) as analyze_raw_data:
+            analyze_raw_data.create_cluster_position_hist = True
+            analyze_raw_data._cluster_position_hist = np.zeros(shape=(80, 336), dtype=np.uint32)
+            analyze_raw_data.histogram_cluster(cluster)
+            self.assertEqual(analyze_raw_data._cluster_position_hist.sum(), cluster.shape[0] - 10)
+        for calibrated in (False, True):
+            os.remove(tests_data_folder + 'unit_test_data_1_calibration_%d.h5' % calibrated)
+
+    def test_parallel_clustering(self):  # clustering the event aligned hit chunks in parallel threads has to give the same cluster tables and histograms
+        with AnalyzeRawData(raw_data_file=tests_data_folder + 'unit_test_data_1.h5', analyzed_data_file=tests_data_folder + 'unit_test_data_1_parallel.h5', create_pdf=False) as analyze_raw_data:
+            analyze_raw_data.create_hit_table = True
+            analyze_raw_data.interpret_word_table(use_settings_from_file=False, fei4b=False)
+        for n_cluster_threads in (1, 3):
+            with AnalyzeRawData(raw_data_file=None, analyzed_data_file=tests_data_folder + 'unit_test_data_1_parallel.h5', create_pdf=False) as analyze_raw_data:
+                analyze_raw_data.chunk_size = 100000
+                analyze_raw_data.create_cluster_hit_table = True
+                analyze_raw_data.create_cluster_size_hist = True
+                analyze_raw_data.create_cluster_tot_hist = True
+                analyze_raw_data.n_cluster_threads = n_cluster_threads
+                analyze_raw_data.analyze_hit_table(analyzed_data_out_file=tests_data_folder + 'unit_test_data_1_parallel_%d.h5' % n_cluster_threads)
+        with tb.open_file(tests_data_folder + 'unit_test_data_1_parallel_1.h5', mode="r") as sequential_file_h5:
+            with tb.open_file(tests_data_folder + 'unit_test_data_1_parallel_3.h5', mode="r") as parallel_file_h5:
+                for node in ('Cluster', 'ClusterHits', 'HistClusterSize', 'HistClusterTot'):
+                    self.assertTrue(np.array_equal(sequential_file_h5.get_node('/' + node)[:], parallel_file_h5.get_node('/' + node)[:]))
+        with AnalyzeRawData(raw_data_file=None, analyzed_data_file=tests_data_folder + 'unit_test_data_1_parallel.h5', create_pdf=False) as analyze_raw_data:  # the settings applied to the clusterizer have to be used by the additional clusterizers
+            analyze_raw_data.create_cluster_table = True
+            analyze_raw_data.clusterizer.set_min_cluster_hits(2)
+            analyze_raw_data.clusterizer.set_warning_output(False)
+            clusterizer = analyze_raw_data._create_clusterizer()
+            with tb.open_file(tests_data_folder + 'unit_test_data_1_parallel.h5', mode="r") as in_file_h5:
+                hits = in_file_h5.root.Hits[:]
+            analyze_raw_data.clusterizer.add_hits(hits)
+            clusterizer.add_hits(hits)
+            self.assertTrue(np.array_equal(analyze_raw_data.clusterizer.get_cluster(), clusterizer.get_cluster()))
+            self.assertGreaterEqual(clusterizer.get_cluster()['size'].min(), 2)
+        for file_name in ('unit_test_data_1_parallel.h5', 'unit_test_data_1_parallel_1.h5', 'unit_test_data_1_parallel_3.h5'):
+            os.remove(tests_data_folder + file_name)
+
+    def test_merge_hists(self):  # the merged histograms of per file analyses have to be the histograms of the analysis of all files
+        file_names = ['unit_test_data_4_parameter_128.h5', 'unit_test_data_4_parameter_256.h5']
+        for sparse in (False, True):
+            for raw_data_files, analyzed_data_file in ((file_names, 'unit_test_data_4_all.h5'), (file_names[:1], 'unit_test_data_4_128.h5'), (file_names[1:], 'unit_test_data_4_256.h5')):
+                with AnalyzeRawData(raw_data_file=[tests_data_folder + file_name for file_name in raw_data_files], analyzed_data_file=tests_data_folder + analyzed_data_file, scan_parameter_name='parameter', create_pdf=False) as analyze_raw_data:
+                    analyze_raw_data.chunk_size = 3000
+                    analyze_raw_data.create_tot_pixel_hist = True
+                    analyze_raw_data.sparse_pixel_hists = sparse
+                    analyze_raw_data.create_cluster_hists = True
+                    analyze_raw_data.interpret_word_table(use_settings_from_file=False, fei4b=False)
+            with self.assertRaises(analysis_utils.NotSupportedError):  # the occupancies of different scan parameters cannot be summed
+                analysis_utils.merge_analyzed_data_files([tests_data_folder + 'unit_test_data_4_all.h5', tests_data_folder + 'unit_test_data_4_128.h5'], tests_data_folder + 'unit_test_data_4_merged.h5')
+            analysis_utils.merge_analyzed_data_files([tests_data_folder + 'unit_test_data_4_128.h5', tests_data_folder + 'unit_test_data_4_256.h5'], tests_data_folder + 'unit_test_data_4_merged.h5', concatenate_parameters=True)
+            hists, merged_hists = analysis_utils.read_hists(tests_data_folder + 'unit_test_data_4_all.h5'), analysis_utils.read_hists(tests_data_folder + 'unit_test_data_4_merged.h5')
+            self.assertEqual(sorted(hists.keys()), sorted(merged_hists.keys()))
+            for hist_name in hists:
+                if hist_name in ('HistOcc', 'HistClusterSeed'):  # the event at the file border can have a different scan parameter, thus only the sum over the parameters is the same
+                    self.assertEqual(merged_hists[hist_name].shape, hists[hist_name].shape)
+                    self.assertTrue(np.array_equal(np.sum(merged_hists[hist_name], axis=2), np.sum(hists[hist_name], axis=2)))
+                elif sparse and hist_name == 'HistTotPixel':
+                    self.assertTrue(np.array_equal(merged_hists[hist_name].toarray(), hists[hist_name].toarray()))
+                else:
+                    self.assertTrue(np.array_equal(merged_hists[hist_name], hists[hist_name]))
+        for file_name in ('unit_test_data_4_all.h5', 'unit_test_data_4_128.h5', 'unit_test_data_4_256.h5', 'unit_test_data_4_merged.h5'):
+            os.remove(tests_data_folder + file_name)
+
+    def test_resume_interpretation(self):  # the interpretation continued in a new process on a growing raw data file and on added raw data files has to give the result of one interpretation
+        def set_settings(analyze_raw_data):
+            analyze_raw_data.create_hit_table = True
+            analyze_raw_data.create_event_table = True
+            analyze_raw_data.create_meta_word_index = True
+            analyze_raw_data.create_interpreter_state = True
+            analyze_raw_data.create_cluster_table = True
+            analyze_raw_data.create_cluster_size_hist = True
+            analyze_raw_data.create_cluster_seed_hist = True
+            analyze_raw_data.create_tot_pixel_hist = True
+            analyze_raw_data.sparse_pixel_hists = True
+
+        def assert_files_equal(file_name, other_file_name, word_index_fields=()):  # the word indices of the interpreter state are relative to the last raw data file
+            with tb.open_file(file_name, mode="r") as in_file_h5:
+                with tb.open_file(other_file_name, mode="r") as other_file_h5:
+                    self.assertEqual(sorted(node._v_pathname for node in in_file_h5.walk_nodes(classname='Leaf')), sorted(node._v_pathname for node in other_file_h5.walk_nodes(classname='Leaf')))
+                    for node in in_file_h5.walk_nodes(classname='Leaf'):
+                        array, other_array = node[:], other_file_h5.get_node(node._v_pathname)[:]
+                        if node._v_pathname == '/InterpreterState/State':
+                            for field in word_index_fields:
+                                array[field], other_array[field] = 0, 0
+                        self.assertTrue(np.array_equal(array, other_array))
+
+        with AnalyzeRawData(raw_data_file=tests_data_folder + 'unit_test_data_1.h5', analyzed_data_file=tests_data_folder + 'unit_test_data_1_once.h5', create_pdf=False) as analyze_raw_data:
+            set_settings(analyze_raw_data)
+            analyze_raw_data.interpret_word_table(use_settings_from_file=False, fei4b=False)
+        with tb.open_file(tests_data_folder + 'unit_test_data_1.h5', mode="r") as in_file_h5:  # split the raw data into two files at read out boundaries
+            raw_data, meta_data = in_file_h5.root.raw_data[:], in_file_h5.root.meta_data[:]
+        first_file_stop, second_file_start = meta_data[8]['index_start'], meta_data[13]['index_start']
+        meta_data_second_file = meta_data[13:].copy()
+        meta_data_second_file['index_start'] -= second_file_start
+        meta_data_second_file['index_stop'] -= second_file_start
+        for file_name, raw_data_file, meta_data_file in (('unit_test_data_1_resume_first.h5', raw_data[:first_file_stop], meta_data[:8]), ('unit_test_data_1_resume_second.h5', raw_data[second_file_start:], meta_data_second_file)):
+            with tb.open_file(tests_data_folder + file_name, mode="w") as out_file_h5:
+                out_file_h5.create_earray(out_file_h5.root, name='raw_data', obj=raw_data_file)
+                out_file_h5.create_table(out_file_h5.root, name='meta_data', obj=meta_data_file)
+        with AnalyzeRawData(raw_data_file=tests_data_folder + 'unit_test_data_1_resume_first.h5', analyzed_data_file=tests_data_folder + 'unit_test_data_1_resumed.h5', create_pdf=False) as analyze_raw_data:
+            set_settings(analyze_raw_data)
+            with self.assertRaises(analysis_utils.NotSupportedError):  # nothing to resume yet
+                analyze_raw_data.interpret_word_table(use_settings_from_file=False, fei4b=False, resume=True)
+            analyze_raw_data.interpret_word_table(use_settings_from_file=False, fei4b=False, finish=False)
+        with tb.open_file(tests_data_folder + 'unit_test_data_1_resume_first.h5', mode="a") as out_file_h5:  # the raw data file grows
+            out_file_h5.root.raw_data.append(raw_data[first_file_stop:second_file_start])
+            out_file_h5.root.meta_data.append(meta_data[8:13])
+        with AnalyzeRawData(raw_data_file=tests_data_folder + 'unit_test_data_1_resume_first.h5', analyzed_data_file=tests_data_folder + 'unit_test_data_1_resumed.h5', create_pdf=False) as analyze_raw_data:  # the state is restored from the analyzed data file
+            set_settings(analyze_raw_data)
+            analyze_raw_data.interpret_word_table(use_settings_from_file=False, fei4b=False, resume=True, finish=False)
+        with AnalyzeRawData(raw_data_file=tests_data_folder + 'unit_test_data_1_resume_second.h5', analyzed_data_file=tests_data_folder + 'unit_test_data_1_resumed.h5', create_pdf=False) as analyze_raw_data:
+            set_settings(analyze_raw_data)
+            with self.assertRaises(analysis_utils.NotSupportedError):  # the interpreted raw data file is missing
+                analyze_raw_data.interpret_word_table(use_settings_from_file=False, fei4b=False, resume=True)
+        with AnalyzeRawData(raw_data_file=[tests_data_folder + 'unit_test_data_1_resume_first.h5', tests_data_folder + 'unit_test_data_1_resume_second.h5'], analyzed_data_file=tests_data_folder + 'unit_test_data_1_resumed.h5', create_pdf=False) as analyze_raw_data:
+            set_settings(analyze_raw_data)
+            analyze_raw_data.interpret_word_table(use_settings_from_file=False, fei4b=False, resume=True)
+        assert_files_equal(tests_data_folder + 'unit_test_data_1_once.h5', tests_data_folder + 'unit_test_data_1_resumed.h5', word_index_fields=('dataWordIndex', 'lastWordIndexSet'))
+        # raw data with scan parameters
+        raw_data_files = [tests_data_folder + 'unit_test_data_4_parameter_128.h5', tests_data_folder + 'unit_test_data_4_parameter_256.h5']
+        with AnalyzeRawData(raw_data_file=raw_data_files, analyzed_data_file=tests_data_folder + 'unit_test_data_4_once.h5', scan_parameter_name='parameter', create_pdf=False) as analyze_raw_data:
+            set_settings(analyze_raw_data)
+            analyze_raw_data.interpret_word_table(use_settings_from_file=False, fei4b=False)
+        with AnalyzeRawData(raw_data_file=raw_data_files[0], analyzed_data_file=tests_data_folder + 'unit_test_data_4_resumed.h5', scan_parameter_name='parameter', create_pdf=False) as analyze_raw_data:
+            set_settings(analyze_raw_data)
+            analyze_raw_data.interpret_word_table(use_settings_from_file=False, fei4b=False, finish=False)
+        with AnalyzeRawData(raw_data_file=raw_data_files, analyzed_data_file=tests_data_folder + 'unit_test_data_4_resumed.h5', scan_parameter_name='parameter', create_pdf=False) as analyze_raw_data:
+            set_settings(analyze_raw_data)
+            analyze_raw_data.interpret_word_table(use_settings_from_file=False, fei4b=False, resume=True)
+        assert_files_equal(tests_data_folder + 'unit_test_data_4_once.h5', tests_data_folder + 'unit_test_data_4_resumed.h5')
+        for file_name in ('unit_test_data_1_once.h5', 'unit_test_data_1_resume_first.h5', 'unit_test_data_1_resume_second.h5', 'unit_test_data_1_resumed.h5', 'unit_test_data_4_once.h5', 'unit_test_data_4_resumed.h5'):
+            os.remove(tests_data_folder + file_name)
+
+    def test_meta_data_output(self):  # the meta data table filled column wise has to be byte identical to the row wise filled table for the V1 and V2 meta data format
+        def write_meta_data_row_wise(analyze_raw_data, file_name):  # the former per read out row loop
+            n_event_index = analyze_raw_data.meta_data.shape[0]
+            meta_table_v2 = 'timestamp_stop' in analyze_raw_data.meta_data.dtype.names
+            description = data_struct.MetaInfoEventTableV2().columns.copy() if meta_table_v2 else data_struct.MetaInfoEventTable().columns.copy()
+            last_pos = len(description)
+            if analyze_raw_data.scan_parameters is not None:
+                for index, scan_par_name in enumerate(analyze_raw_data.scan_parameters.dtype.names):
+                    dtype, _ = analyze_raw_data.scan_parameters.dtype.fields[scan_par_name][:2]
+                    description[scan_par_name] = tb.Col.from_dtype(dtype, dflt=0, pos=last_pos + index)
+            with tb.open_file(file_name, mode="w") as out_file_h5:
+                meta_data_out_table = out_file_h5.create_table(out_file_h5.root, name='meta_data', description=description, title='MetaData')
+                entry = meta_data_out_table.row
+                for i in range(0, n_event_index):
+                    if meta_table_v2:
+                        entry['event_number'] = analyze_raw_data.meta_event_index[i][0]
+                        entry['timestamp_start'] = analyze_raw_data.meta_data[i][3]
+                        entry['timestamp_stop'] = analyze_raw_data.meta_data[i][4]
+                        entry['error_code'] = analyze_raw_data.meta_data[i][5]
+                    else:
+                        entry['event_number'] = analyze_raw_data.meta_event_index[i][0]
+                        entry['time_stamp'] = analyze_raw_data.meta_data[i][3]
+                        entry['error_code'] = analyze_raw_data.meta_data[i][4]
+                    if analyze_raw_data.scan_parameters is not None:
+                        for scan_par_name in analyze_raw_data.scan_parameters.dtype.names:
+                            entry[scan_par_name] = analyze_raw_data.scan_parameters[scan_par_name][i]
+                    entry.append()
+                meta_data_out_table.flush()
+
+        def read_tables(file_name):
+            with tb.open_file(file_name, mode="r") as in_file_h5:
+                return in_file_h5.root.meta_data[:], in_file_h5.root.EventMetaData[:] if 'EventMetaData' in in_file_h5.root else None
+
+        for raw_data_file in ('unit_test_data_1', 'unit_test_data_3'):
+            shutil.copy(tests_data_folder + raw_data_file + '.h5', tests_data_folder + raw_data_file + '_meta_v1.h5')
+            with tb.open_file(tests_data_folder + raw_data_file + '_meta_v1.h5', mode="a") as out_file_h5:  # convert the meta data to the V1 format
+                meta_data = out_file_h5.root.meta_data[:]
+                meta_data_v1 = np.empty(shape=meta_data.shape, dtype=tb.dtype_from_descr(data_struct.MetaTable))
+                for name in ('index_start', 'index_stop', 'data_length', 'error'):
+                    meta_data_v1[name] = meta_data[name]
+                meta_data_v1['timestamp'] = meta_data['timestamp_start']
+                out_file_h5.remove_node(out_file_h5.root, 'meta_data')
+                out_file_h5.create_table(out_file_h5.root, name='meta_data', obj=meta_data_v1)
+            analysis_utils.clear_raw_data_file_info_cache()
+            output = {}
+            for version, file_name in (('V2', raw_data_file), ('V1', raw_data_file + '_meta_v1')):
+                with AnalyzeRawData(raw_data_file=tests_data_folder + file_name + '.h5', analyzed_data_file=tests_data_folder + file_name + '_meta_column_wise.h5', create_pdf=False) as analyze_raw_data:
+                    analyze_raw_data.create_hit_table = True
+                    analyze_raw_data.create_meta_word_index = True
+                    analyze_raw_data.create_meta_event_index = True
+                    analyze_raw_data.interpret_word_table(use_settings_from_file=False, fei4b=False)
+                    write_meta_data_row_wise(analyze_raw_data, tests_data_folder + file_name + '_meta_row_wise.h5')
+                meta_data_column_wise, event_meta_data = read_tables(tests_data_folder + file_name + '_meta_column_wise.h5')
+                meta_data_row_wise, _ = read_tables(tests_data_folder + file_name + '_meta_row_wise.h5')
+                self.assertEqual(meta_data_column_wise.dtype, meta_data_row_wise.dtype)
+                self.assertEqual(meta_data_column_wise.tostring(), meta_data_row_wise.tostring())
+                self.assertEqual('timestamp_stop' in meta_data_column_wise.dtype.names, version == 'V2')
+                output[version] = meta_data_column_wise, event_meta_data
+            self.assertTrue(np.array_equal(output['V1'][0]['event_number'], output['V2'][0]['event_number']))
+            self.assertTrue(np.array_equal(output['V1'][0]['time_stamp'], output['V2'][0]['timestamp_start']))
+            self.assertTrue(np.array_equal(output['V1'][0]['error_code'], output['V2'][0]['error_code']))
+            self.assertEqual(output['V1'][1].tostring(), output['V2'][1].tostring())  # the event meta data does not depend on the meta data format
+            with tb.open_file(tests_data_folder + raw_data_file + '_result.h5', mode="r") as in_file_h5:  # the V2 output has to be the stored output
+                self.assertEqual(output['V2'][0].tostring(), in_file_h5.root.meta_data[:].tostring())
+                self.assertEqual(output['V2'][1].tostring(), in_file_h5.root.EventMetaData[:].tostring())
+            for file_name in (raw_data_file + '_meta_v1.h5', raw_data_file + '_meta_column_wise.h5', raw_data_file + '_meta_row_wise.h5', raw_data_file + '_meta_v1_meta_column_wise.h5', raw_data_file + '_meta_v1_meta_row_wise.h5'):
+                os.remove(tests_data_folder + file_name)
+            analysis_utils.clear_raw_data_file_info_cache()
+
+    def test_raw_data_file_info(self):  # the raw data file information has to be read once and read again if the file changed
+        shutil.copy(tests_data_folder + 'hit_or_calibration.h5', tests_data_folder + 'hit_or_calibration_info.h5')
+        raw_data_file_info = analysis_utils.get_raw_data_file_info(tests_data_folder + 'hit_or_calibration_info.h5')
+        self.assertTrue(analysis_utils.get_raw_data_file_info(tests_data_folder + 'hit_or_calibration_info.h5') is raw_data_file_info)
+        with tb.open_file(tests_data_folder + 'hit_or_calibration_info.h5', mode="r") as in_file_h5:
+            self.assertEqual(raw_data_file_info['n_words'], in_file_h5.root.raw_data.shape[0])
+            self.assertTrue(np.array_equal(raw_data_file_info['meta_data'], in_file_h5.root.meta_data[:]))
+            self.assertEqual(raw_data_file_info['configuration']['global_register']['Trig_Count'], in_file_h5.root.configuration.global_register[:][np.where(in_file_h5.root.configuration.global_register[:]['name'] == 'Trig_Count')]['value'][0])
+            self.assertTrue(np.array_equal(raw_data_file_info['configuration']['C_Low'], in_file_h5.root.configuration.C_Low[:]))
+        with tb.open_file(tests_data_folder + 'hit_or_calibration_info.h5', mode="a") as out_file_h5:
+            out_file_h5.root.meta_data.truncate(1)
+        os.utime(tests_data_folder + 'hit_or_calibration_info.h5', (0, os.path.getmtime(tests_data_folder + 'hit_or_calibration_info.h5') + 1))  # the modification time can have a low resolution
+        raw_data_file_info = analysis_utils.get_raw_data_file_info(tests_data_folder + 'hit_or_calibration_info.h5')
+        self.assertEqual(raw_data_file_info['meta_data'].shape[0], 1)
+        with self.assertRaises(ValueError):  # the cached arrays are shared and read-only
+            raw_data_file_info['meta_data']['index_start'] = 0
+        cache_size = analysis_utils._raw_data_file_info_cache_size
+        analysis_utils._raw_data_file_info_cache_size = 1  # the least recently used file is removed from the cache
+        try:
+            analysis_utils.get_raw_data_file_info(tests_data_folder + 'unit_test_data_1.h5')
+            self.assertFalse(analysis_utils.get_raw_data_file_info(tests_data_folder + 'hit_or_calibration_info.h5') is raw_data_file_info)
+        finally:
+            analysis_utils._raw_data_file_info_cache_size = cache_size
+        raw_data_file_info = analysis_utils.get_raw_data_file_info(tests_data_folder + 'hit_or_calibration_info.h5')
+        analysis_utils.clear_raw_data_file_info_cache()
+        self.assertFalse(analysis_utils.get_raw_data_file_info(tests_data_folder + 'hit_or_calibration_info.h5') is raw_data_file_info)
+        os.remove(tests_data_folder + 'hit_or_calibration_info.h5')
+
+    def test_plan_analysis(self):  # only the requested output products have to be created, existing products have to be kept
+        with AnalyzeRawData(raw_data_file=tests_data_folder + 'unit_test_data_1.h5', analyzed_data_file=tests_data_folder + 'unit_test_data_1_all.h5', create_pdf=False) as analyze_raw_data:
+            analyze_raw_data.create_cluster_table = True
+            analyze_raw_data.create_cluster_size_hist = True
+            analyze_raw_data.interpret_word_table(use_settings_from_file=False, fei4b=False)
+        with AnalyzeRawData(raw_data_file=tests_data_folder + 'unit_test_data_1.h5', analyzed_data_file=tests_data_folder + 'unit_test_data_1_planned.h5', create_pdf=False) as analyze_raw_data:
+            with self.assertRaises(analysis_utils.NotSupportedError):
+                analyze_raw_data.plan_analysis(['HistOccupancy'])
+            plan = analyze_raw_data.plan_analysis(['HistOcc', 'HistClusterSize'])
+            self.assertEqual(plan['products'], ['HistOcc', 'HistClusterSize'])
+            self.assertEqual(plan['settings'], ['create_cluster_size_hist', 'create_occupancy_hist'])
+            self.assertFalse(analyze_raw_data.create_tot_hist)
+            analyze_raw_data.interpret_word_table(use_settings_from_file=False, fei4b=False)
+        with tb.open_file(tests_data_folder + 'unit_test_data_1_planned.h5', mode="r") as in_file_h5:
+            self.assertEqual(sorted(node._v_name for node in in_file_h5.root), ['HistClusterSize', 'HistOcc'])
+        with AnalyzeRawData(raw_data_file=tests_data_folder + 'unit_test_data_1.h5', analyzed_data_file=tests_data_folder + 'unit_test_data_1_planned.h5', create_pdf=False) as analyze_raw_data:
+            plan = analyze_raw_data.plan_analysis(['HistOcc', 'HistTot', 'Cluster'])
+            self.assertEqual(plan['products'], ['HistTot', 'Cluster'])
+            self.assertEqual(plan['existing_products'], ['HistOcc'])
+            analyze_raw_data.interpret_word_table(use_settings_from_file=False, fei4b=False)
+            self.assertEqual(analyze_raw_data.plan_analysis(['HistOcc', 'HistTot'])['products'], [])
+            analyze_raw_data.interpret_word_table(use_settings_from_file=False, fei4b=False)  # nothing to do
+        with tb.open_file(tests_data_folder + 'unit_test_data_1_all.h5', mode="r") as in_file_h5:
+            with tb.open_file(tests_data_folder + 'unit_test_data_1_planned.h5', mode="r") as planned_file_h5:
+                self.assertEqual(sorted(node._v_name for node in planned_file_h5.root), ['Cluster', 'HistClusterSize', 'HistOcc', 'HistTot'])
+                for node in planned_file_h5.root:
+                    self.assertTrue(np.array_equal(node[:], in_file_h5.get_node(in_file_h5.root, node._v_name)[:]))
+        for file_name in ('unit_test_data_1_all.h5', 'unit_test_data_1_planned.h5'):
+            os.remove(tests_data_folder + file_name)
+
+    def test_batch_analysis(self):  # a batch analysis has to give the results of single analyses, also with reused analysis objects and failing files
+        file_names = ['unit_test_data_4_parameter_128', 'unit_test_data_4_not_existing', 'unit_test_data_4_parameter_256']
+        for file_name in file_names[::2]:
+            with AnalyzeRawData(raw_data_file=tests_data_folder + file_name + '.h5', analyzed_data_file=tests_data_folder + file_name + '_single.h5', scan_parameter_name='parameter', create_pdf=False) as analyze_raw_data:
+                analyze_raw_data.chunk_size = 3000
+                analyze_raw_data.create_cluster_size_hist = True
+                analyze_raw_data.interpret_word_table(use_settings_from_file=False, fei4b=False)
+        for n_processes in (1, 2):
+            summary = analysis.analyze_raw_data_files([tests_data_folder + file_name + '.h5' for file_name in file_names], products=['HistOcc', 'HistClusterSize'], settings={'chunk_size': 3000}, n_processes=n_processes, scan_parameter_name='parameter', use_settings_from_file=False, fei4b=False)
+            self.assertEqual([os.path.basename(raw_data_file) for raw_data_file in summary['raw_data_file']], [file_name + '.h5' for file_name in file_names])
+            self.assertTrue(np.array_equal(summary['success'], [True, False, True]))
+            self.assertTrue(summary['error'][1])
+            self.assertTrue(np.all(summary['n_words'][::2] > 0))
+            for file_name in file_names[::2]:
+                with tb.open_file(tests_data_folder + file_name + '_single.h5', mode="r") as in_file_h5:
+                    with tb.open_file(tests_data_folder + file_name + '_interpreted.h5', mode="r") as batch_file_h5:
+                        self.assertEqual(sorted(node._v_name for node in batch_file_h5.root), ['HistClusterSize', 'HistOcc'])
+                        for node in batch_file_h5.root:
+                            self.assertTrue(np.array_equal(node[:], in_file_h5.get_node(in_file_h5.root, node._v_name)[:]))
+                with tb.open_file(tests_data_folder + file_name + '_interpreted.h5', mode="a") as batch_file_h5:  # outdated products (e.g. after a calibration change) are created again
+                    batch_file_h5.root.HistOcc[:] = 0
+        analysis.analyze_raw_data_files([tests_data_folder + file_name + '.h5' for file_name in file_names], products=['HistOcc', 'HistClusterSize'], skip_existing=True, settings={'chunk_size': 3000}, n_processes=1, scan_parameter_name='parameter', use_settings_from_file=False, fei4b=False)
+        for file_name in file_names[::2]:
+            with tb.open_file(tests_data_folder + file_name + '_interpreted.h5', mode="r") as batch_file_h5:  # existing products are kept
+                self.assertFalse(np.any(batch_file_h5.root.HistOcc[:]))
+            os.remove(tests_data_folder + file_name + '_interpreted.h5')
+        for file_name in file_names:
+            os.remove(tests_data_folder + file_name + '_interpreted.log')
+        for file_name in file_names[::2]:
+            os.remove(tests_data_folder + file_name + '_single.h5')
+        summary = analysis.analyze_raw_data_files([tests_data_folder + file_name + '.h5' for file_name in file_names], settings={'chunk_size': KillingChunkSize()}, n_processes=2, scan_parameter_name='parameter', use_settings_from_file=False, fei4b=False, log_files=False)  # died processes must not block the batch analysis
+        self.assertFalse(np.any(summary['success']))
+        self.assertTrue(summary['error'][0].startswith('ProcessDied'))
+        self.assertTrue(summary['error'][2].startswith('ProcessDied'))
+
+    def test_parallel_plotting(self):  # the plots rendered in parallel or deferred have to give the same pages as the sequential plotting
+        def get_n_pages(pdf_filename):
+            with open(pdf_filename, 'rb') as pdf_file:
+                return len(re.findall(r'/Type /Page\b', pdf_file.read()))
+        shutil.copy(tests_data_folder + 'unit_test_data_1.h5', tests_data_folder + 'unit_test_data_1_plots_raw.h5')
+        with AnalyzeRawData(raw_data_file=tests_data_folder + 'unit_test_data_1_plots_raw.h5', analyzed_data_file=tests_data_folder + 'unit_test_data_1_plots.h5', create_pdf=False) as analyze_raw_data:
+            analyze_raw_data.create_tot_hist = True
+            analyze_raw_data.create_cluster_size_hist = True
+            analyze_raw_data.create_cluster_tot_hist = True
+            analyze_raw_data.interpret_word_table(use_settings_from_file=False, fei4b=False)
+            analyze_raw_data.plot_histograms(pdf_filename=tests_data_folder + 'unit_test_data_1_sequential.pdf')
+            analyze_raw_data.n_plot_processes = 2
+            analyze_raw_data.plot_histograms(pdf_filename=tests_data_folder + 'unit_test_data_1_parallel.pdf')
+            analyze_raw_data.defer_plotting = True
+            analyze_raw_data.plot_histograms(pdf_filename=tests_data_folder + 'unit_test_data_1_deferred.pdf')
+        self.assertFalse(os.path.isfile(tests_data_folder + 'unit_test_data_1_deferred.pdf'))
+        os.remove(tests_data_folder + 'unit_test_data_1_plots_raw.h5')  # the deferred plots need the analyzed data file only, e.g. the raw data is archived
+        analysis.plot_deferred_histograms(tests_data_folder + 'unit_test_data_1_plots.h5', n_processes=2)
+        n_pages = get_n_pages(tests_data_folder + 'unit_test_data_1_sequential.pdf')
+        self.assertEqual(n_pages, 10)
+        self.assertEqual(get_n_pages(tests_data_folder + 'unit_test_data_1_parallel.pdf'), n_pages)
+        self.assertEqual(get_n_pages(tests_data_folder + 'unit_test_data_1_deferred.pdf'), n_pages)
+        for file_name in ('unit_test_data_1_plots.h5', 'unit_test_data_1_sequential.pdf', 'unit_test_data_1_parallel.pdf', 'unit_test_data_1_deferred.pdf'):
+            os.remove(tests_data_folder + file_name)
+
+    def test_hit_index(self):  # the hit index has to give the event boundaries of the hit table and the hits selected with it have to be the same as without it
+        with AnalyzeRawData(raw_data_file=[tests_data_folder + 'unit_test_data_4_parameter_128.h5', tests_data_folder + 'unit_test_data_4_parameter_256.h5'], analyzed_data_file=tests_data_folder + 'unit_test_data_4_hit_index.h5', scan_parameter_name='parameter', create_pdf=False) as analyze_raw_data:
+            analyze_raw_data.chunk_size = 3000
+            analyze_raw_data.create_hit_table = True
+            analyze_raw_data.create_hit_index = True
+            analyze_raw_data.interpret_word_table(use_settings_from_file=False, fei4b=False)
+        with tb.open_file(tests_data_folder + 'unit_test_data_4_hit_index.h5', mode="r") as in_file_h5:
+            hits = in_file_h5.root.Hits[:]
+            hit_index = analysis_utils.read_hit_index(in_file_h5)
+            event_numbers, start_hit_index = np.unique(hits['event_number'], return_index=True)
+            self.assertTrue(np.array_equal(hit_index['event_number'], event_numbers))
+            self.assertTrue(np.array_equal(hit_index['start_hit_index'], start_hit_index))
+            for chunk_size in (10, 1000):
+                for start_event_number, stop_event_number in ((None, None), (event_numbers[10] + 1, event_numbers[-10]), (event_numbers[-1] + 1, event_numbers[-1] + 10)):
+                    chunks = [chunk for chunk, _ in analysis_utils.data_aligned_at_events(in_file_h5.root.Hits, start_event_number=start_event_number, stop_event_number=stop_event_number, chunk_size=chunk_size, hit_index=hit_index)]
+                    selected_hits = analysis_utils.get_data_in_event_range(hits, event_start=start_event_number, event_stop=stop_event_number)
+                    self.assertTrue(np.array_equal(np.concatenate(chunks) if chunks else hits[0:0], selected_hits))
+                    for chunk, next_chunk in zip(chunks[:-1], chunks[1:]):  # events are not split
+                        self.assertLess(chunk['event_number'][-1], next_chunk['event_number'][0])
+            meta_data = analysis_utils.get_unique_scan_parameter_combinations(in_file_h5.root.meta_data[:], scan_parameters=['parameter'])
+        parameter_hits = list(analysis_utils.get_hits_of_scan_parameter(tests_data_folder + 'unit_test_data_4_hit_index.h5', scan_parameters=['parameter'], chunk_size=100))
+        self.assertTrue(np.array_equal(np.concatenate([chunk for _, chunk in parameter_hits]), hits))
+        for parameter, chunk in parameter_hits:  # the hits of every chunk are in the events of the scan parameter
+            self.assertTrue(np.all(meta_data['parameter'][np.searchsorted(meta_data['event_number'], chunk['event_number'], side='right') - 1] == parameter[0]))
+        with AnalyzeRawData(raw_data_file=[tests_data_folder + 'unit_test_data_4_parameter_128.h5', tests_data_folder + 'unit_test_data_4_parameter_256.h5'], analyzed_data_file=tests_data_folder + 'unit_test_data_4_hit_index.h5', scan_parameter_name='parameter', create_pdf=False) as analyze_raw_data:  # the hit index is only created if set
+            analyze_raw_data.chunk_size = 3000
+            analyze_raw_data.create_hit_table = True
+            analyze_raw_data.interpret_word_table(use_settings_from_file=False, fei4b=False)
+        with tb.open_file(tests_data_folder + 'unit_test_data_4_hit_index.h5', mode="r") as in_file_h5:
+            self.assertFalse('HitIndex' in in_file_h5.root)
+            self.assertTrue(analysis_utils.read_hit_index(in_file_h5) is None)
+        parameter_hits_without_index = list(analysis_utils.get_hits_of_scan_parameter(tests_data_folder + 'unit_test_data_4_hit_index.h5', scan_parameters=['parameter'], chunk_size=100))
+        self.assertTrue(np.array_equal(np.concatenate([chunk for _, chunk in parameter_hits_without_index]), hits))
+        os.remove(tests_data_folder + 'unit_test_data_4_hit_index.h5')
+
+    def test_selection(self):  # the parsed selection has to select the same hits as numpy, also in the chunked functions
+        np.random.seed(0)
+        hits = np.zeros(10000, dtype=tb.dtype_from_descr(data_struct.HitInfoTable))
+        hits['event_number'] = np.sort(np.random.randint(0, 2000, size=hits.shape[0]))
+        hits['column'], hits['row'], hits['tot'] = np.random.randint(1, 81, size=hits.shape[0]), np.random.randint(1, 337, size=hits.shape[0]), np.random.randint(0, 14, size=hits.shape[0])
+        expected = (hits['tot'] > 5) & (hits['column'] < 40)
+        selection = analysis_utils.Selection('(tot > 5) & (column < 40)')
+        self.assertEqual(sorted(selection.variables), ['column', 'tot'])
+        self.assertTrue(np.array_equal(selection.select(hits), hits[expected]))
+        self.assertTrue(np.array_equal(analysis_utils.select_hits(hits, '(tot > 5) & (column < 40)'), hits[expected]))
+        events = np.arange(0, 2000, 3)
+        self.assertTrue(np.array_equal(analysis_utils.get_hits_in_events(hits, events, condition=selection), hits[expected & np.in1d(hits['event_number'], events)]))
+        with self.assertRaises(analysis_utils.InvalidInputError):
+            selection.select(hits[['event_number', 'tot']])  # no column column
+        with self.assertRaises(analysis_utils.InvalidInputError):
+            analysis_utils.Selection('tot >')
+        with tb.open_file(tests_data_folder + 'selection.h5', mode="w") as out_file_h5:
+            hit_table_in = out_file_h5.create_table(out_file_h5.root, name='Hits', description=data_struct.HitInfoTable)
+            hit_table_in.append(hits)
+            hit_table_out = out_file_h5.create_table(out_file_h5.root, name='SelectedHits', description=data_struct.HitInfoTable)
+            analysis_utils.write_hits_in_event_range(hit_table_in, hit_table_out, chunk_size=999, condition=selection)  # the selection has to be applied to all chunks
+            self.assertTrue(np.array_equal(hit_table_out[:], hits[expected]))
+            hit_table_out.remove_rows(0, hit_table_out.nrows)
+            analysis_utils.write_hits_in_event_range(hit_table_in, hit_table_out, event_start=100, event_stop=1000, chunk_size=999, condition=selection)
+            self.assertTrue(np.array_equal(hit_table_out[:], hits[expected & (hits['event_number'] >= 100) & (hits['event_number'] < 1000)]))
+        n_cluster = np.bincount(hits['event_number'])
+        self.assertTrue(np.array_equal(analysis_utils.get_events_with_n_cluster(hits['event_number'], condition='n_cluster == 5'), np.where(n_cluster == 5)[0]))
+        self.assertTrue(np.array_equal(analysis_utils.get_events_with_cluster_size(hits['event_number'], hits['tot'], condition='cluster_size > 12'), np.unique(hits['event_number'][hits['tot'] > 12])))
+        os.remove(tests_data_folder + 'selection.h5')
+
+    def test_time_resolved_analysis(self):  # the single pass time resolved analysis has to give the values of the separate analysis of every time window
+        with AnalyzeRawData(raw_data_file=tests_data_folder + 'unit_test_data_1.h5', analyzed_data_file=tests_data_folder + 'time_resolved_interpreted.h5', create_pdf=False) as analyze_raw_data:
+            analyze_raw_data.chunk_size = 2999999
+            analyze_raw_data.create_hit_table = True
+            analyze_raw_data.create_cluster_table = True
+            analyze_raw_data.interpret_word_table(use_settings_from_file=False, fei4b=False)
+        occupancies = []
+        result = analysis.analyze_time_resolved([tests_data_folder + 'time_resolved'], combine_n_readouts=7, chunk_size=1000, occupancy_callback=lambda window, occupancy: occupancies.append(occupancy.copy()), output_file=tests_data_folder + 'time_resolved_interpreted.h5')
+        with tb.open_file(tests_data_folder + 'time_resolved_interpreted.h5', mode="r") as in_file_h5:
+            meta_data, hits, cluster = in_file_h5.root.meta_data[:], in_file_h5.root.Hits[:], in_file_h5.root.Cluster[:]
+            time_resolved = in_file_h5.root.TimeResolved[:]
+            for name in ('start_event_number', 'n_hits', 'n_cluster'):
+                self.assertTrue(np.array_equal(time_resolved[name], result[name]))
+        self.assertTrue(np.array_equal(result['time_stamp'], meta_data['timestamp_start'][::7]))
+        self.assertTrue(np.array_equal(result['start_event_number'], meta_data['event_number'][::7]))
+        self.assertEqual(len(occupancies), result.shape[0])
+        self.assertEqual(result['n_hits'].sum(), np.count_nonzero(hits['event_number'] >= result['start_event_number'][0]))
+        for window, occupancy in zip(result, occupancies):
+            window_hits = analysis_utils.get_data_in_event_range(hits, event_start=window['start_event_number'], event_stop=window['stop_event_number'] if window['stop_event_number'] != -1 else None)
+            window_cluster = analysis_utils.get_data_in_event_range(cluster, event_start=window['start_event_number'], event_stop=window['stop_event_number'] if window['stop_event_number'] != -1 else None)
+            self.assertEqual(window['n_hits'], window_hits.shape[0])
+            if window_hits.shape[0] != 0:
+                self.assertAlmostEqual(window['x'], np.mean(window_hits['column'] - 1.))
+                self.assertAlmostEqual(window['y'], np.mean(window_hits['row'] - 1.))
+            self.assertTrue(np.array_equal(occupancy, np.histogram2d(window_hits['row'] - 1, window_hits['column'] - 1, bins=(336, 80), range=((0, 336), (0, 80)))[0]))
+            n_cluster_per_event = analysis_utils.get_n_cluster_in_events(window_cluster['event_number'])[:, 1] if window_cluster.shape[0] != 0 else np.array([])
+            self.assertEqual(window['n_cluster_events'], n_cluster_per_event.shape[0])
+            self.assertTrue(np.array_equal(window['n_cluster'], np.histogram(n_cluster_per_event, bins=10, range=(0, 10))[0]))
+        os.remove(tests_data_folder + 'time_resolved_interpreted.h5')
+
+    def test_event_merge_join(self):  # the chunks of several tables have to hold the same events and the join has to give all row pairs of the same event
+        np.random.seed(0)
+        tables_data = []
+        for n_hits in (5000, 3000, 4000):
+            hits = np.zeros(n_hits, dtype=tb.dtype_from_descr(data_struct.HitInfoTable))
+            hits['event_number'] = np.sort(np.random.randint(0, 1500, size=n_hits))
+            hits['column'] = np.random.randint(1, 81, size=n_hits)
+            tables_data.append(hits)
+        tables_data[1]['event_number'][-200:] = 1600  # one event larger than the chunk size
+        with tb.open_file(tests_data_folder + 'merge_join.h5', mode="w") as out_file_h5:
+            tables = []
+            for index, hits in enumerate(tables_data):
+                table = out_file_h5.create_table(out_file_h5.root, name='Hits_%d' % index, description=data_struct.HitInfoTable)
+                table.append(hits)
+                tables.append(table)
+            for start_event_number, stop_event_number in ((None, None), (100, 1000), (700, None)):
+                merged_chunks = [[] for _ in tables]
+                for chunks, _ in analysis_utils.data_aligned_at_events_in_tables(tables, start_event_number=start_event_number, stop_event_number=stop_event_number, chunk_size=97):
+                    event_range = [(chunk['event_number'][0], chunk['event_number'][-1]) for chunk in chunks if chunk.shape[0] != 0]
+                    for index, chunk in enumerate(chunks):
+                        merged_chunks[index].append(chunk)
+                    if len(merged_chunks[0]) > 1:  # the events of the chunks are not in the previous chunks
+                        for index, previous_chunks in enumerate(merged_chunks):
+                            previous_events = np.concatenate(previous_chunks[:-1])['event_number']
+                            self.assertTrue(previous_events.shape[0] == 0 or previous_events[-1] < min(first for first, _ in event_range))
+                for index, hits in enumerate(tables_data):
+                    self.assertTrue(np.array_equal(np.concatenate(merged_chunks[index]), analysis_utils.get_data_in_event_range(hits, event_start=start_event_number, event_stop=stop_event_number)))
+        os.remove(tests_data_folder + 'merge_join.h5')
+        index_one, index_two = analysis_utils.get_event_join_index(tables_data[0]['event_number'], tables_data[1]['event_number'])
+        pairs = [(i, j) for i, event in enumerate(tables_data[0]['event_number']) for j in np.where(tables_data[1]['event_number'] == event)[0]]
+        self.assertEqual(zip(index_one, index_two), pairs)
+        for index, hits in enumerate(tables_data[:2]):  # the correlation plots are filled chunk wise with all hit pairs of the same event
+            hits['row'] = np.random.randint(1, 337, size=hits.shape[0])
+            with tb.open_file(tests_data_folder + 'merge_join_%d.h5' % index, mode="w") as out_file_h5:
+                out_file_h5.create_table(out_file_h5.root, name='Hits', description=data_struct.HitInfoTable).append(hits)
+        row_corr = plotting.plot_correlations([tests_data_folder + 'merge_join_%d.h5' % index for index in range(2)], chunk_size=97)
+        self.assertTrue(np.array_equal(row_corr[(0, 1)], analysis_utils.hist_2d_index(tables_data[0]['row'][index_one] - 1, tables_data[1]['row'][index_two] - 1, shape=(336, 336))))
+        for file_name in ('merge_join_0.h5', 'merge_join_1.h5'):
+            os.remove(tests_data_folder + file_name)
+        for file_name in ('Row0_Row1.pdf', 'Row1_Row0.pdf'):
+            os.remove(file_name)
+
+    def test_scan_parameter_blocks(self):  # the scan parameter helpers based on the run length encoded parameter blocks have to give the results of np.unique over all rows
+        np.random.seed(0)
+        meta_data = np.zeros(5000, dtype=[('index_start', np.uint32), ('index_stop', np.uint32), ('data_length', np.uint32), ('timestamp_start', np.float64), ('timestamp_stop', np.float64), ('error', np.uint32), ('GDAC', np.uint16), ('PlsrDAC', np.uint16), ('delay', np.uint16)])
+        meta_data['GDAC'] = np.repeat(np.random.randint(0, 5, size=50), 100)  # the same settings also occur again later
+        meta_data['PlsrDAC'] = np.repeat(np.random.randint(0, 3, size=250), 20)
+        meta_data['delay'] = np.repeat(np.random.randint(0, 2, size=1000), 5)
+        scan_parameters = meta_data[['GDAC', 'PlsrDAC', 'delay']]
+        block_start = analysis_utils.get_scan_parameter_blocks(meta_data, columns=('GDAC', 'PlsrDAC', 'delay'))
+        self.assertTrue(np.array_equal(block_start, np.append(0, np.where(scan_parameters[1:] != scan_parameters[:-1])[0] + 1)))
+        self.assertIs(analysis_utils.get_scan_parameter_blocks(meta_data, columns=('GDAC', 'PlsrDAC', 'delay')), block_start)  # cached
+        _, index = np.unique(scan_parameters, return_index=True)
+        self.assertTrue(np.array_equal(analysis_utils.get_unique_scan_parameter_combinations(meta_data), meta_data[np.sort(index)]))
+        _, index = np.unique(meta_data[['GDAC', 'delay']], return_index=True)
+        self.assertTrue(np.array_equal(analysis_utils.get_unique_scan_parameter_combinations(meta_data, scan_parameters=['GDAC', 'delay'], scan_parameter_columns_only=True), meta_data[np.sort(index)][['GDAC', 'delay']]))
+        index = np.sort(np.unique(scan_parameters, return_index=True)[1])
+        self.assertTrue(np.array_equal(analysis_utils.get_scan_parameters_index(scan_parameters), np.repeat(np.arange(index.shape[0]), np.diff(np.append(index, scan_parameters.shape[0])))))
+        for name, values in analysis_utils.get_scan_parameter(meta_data).items():
+            self.assertTrue(np.array_equal(values, np.unique(meta_data[name])))
+        array = np.column_stack((meta_data['GDAC'], meta_data['PlsrDAC']))
+        self.assertTrue(np.array_equal(analysis_utils.unique_row(array, use_columns=[0, 1]), np.array(sorted(set(map(tuple, array)), key=[tuple(row) for row in array].index))))
+
+    def test_compact_hits(self):  # the compact hit format with the additional event table has to give the same hits, histograms and cluster
+        for compact in (False, True):
+            with AnalyzeRawData(raw_data_file=tests_data_folder + 'unit_test_data_1.h5', analyzed_data_file=tests_data_folder + 'unit_test_data_1_compact_%d.h5' % compact, create_pdf=False) as analyze_raw_data:
+                analyze_raw_data.create_hit_table = True
+                analyze_raw_data.create_compact_hits = compact
+                analyze_raw_data.create_cluster_table = True
+                analyze_raw_data.create_cluster_size_hist = True
+                analyze_raw_data.interpret_word_table(use_settings_from_file=False, fei4b=False)
+        with tb.open_file(tests_data_folder + 'unit_test_data_1_compact_0.h5', mode="r") as full_file_h5:
+            with tb.open_file(tests_data_folder + 'unit_test_data_1_compact_1.h5', mode="r") as compact_file_h5:
+                full_hits = full_file_h5.root.Hits[:]
+                compact_hits = compact_file_h5.root.Hits[:]
+                events = compact_file_h5.root.Events[:]
+                self.assertEqual(compact_hits.dtype.itemsize, 13)
+                for name in compact_hits.dtype.names:
+                    self.assertTrue(np.array_equal(full_hits[name], compact_hits[name]))
+                self.assertTrue(np.array_equal(events['event_number'], np.arange(events.shape[0])))  # the event number is the index of the event table
+                self.assertTrue(np.array_equal(events['trigger_number'][compact_hits['event_number']], full_hits['trigger_number']))
+                self.assertTrue(np.array_equal(events['event_status'][compact_hits['event_number']], full_hits['event_status']))
+                self.assertTrue(np.array_equal(full_file_h5.root.HistOcc[:], compact_file_h5.root.HistOcc[:]))
+                self.assertTrue(np.array_equal(full_file_h5.root.HistClusterSize[:], compact_file_h5.root.HistClusterSize[:]))
+                full_cluster = full_file_h5.root.Cluster[:]
+                compact_cluster = compact_file_h5.root.Cluster[:]
+                for name in full_cluster.dtype.names:
+                    if name != 'event_status':  # the event status is only available in the event table
+                        self.assertTrue(np.array_equal(full_cluster[name], compact_cluster[name]))
+        os.remove(tests_data_folder + 'unit_test_data_1_compact_0.h5')
+        os.remove(tests_data_folder + 'unit_test_data_1_compact_1.h5')
+
+    def test_event_table(self):  # the event table has to hold the hit index range of every event and allow direct event lookups
+        with AnalyzeRawData(raw_data_file=tests_data_folder + 'unit_test_data_1.h5', analyzed_data_file=tests_data_folder + 'unit_test_data_1_events.h5', create_pdf=False) as analyze_raw_data:
+            analyze_raw_data.chunk_size = 300000
+            analyze_raw_data.create_hit_table = True
+            analyze_raw_data.create_event_table = True
+            analyze_raw_data.interpret_word_table(use_settings_from_file=False, fei4b=False)
+        with tb.open_file(tests_data_folder + 'unit_test_data_1_events.h5', mode="r") as in_file_h5:
+            hits = in_file_h5.root.Hits[:]
+            events = in_file_h5.root.Events[:]
+            self.assertTrue(in_file_h5.root.Events.cols.event_number.is_indexed)
+            self.assertEqual(events.dtype['start_hit_index'], np.uint64)  # the hit index has to cover more than 2^32 hits
+            self.assertEqual(events[0]['start_hit_index'], 0)
+            self.assertEqual(events[-1]['stop_hit_index'], hits.shape[0])
+            self.assertTrue(np.array_equal(events['start_hit_index'][1:], events['stop_hit_index'][:-1]))
+            n_hits_per_event = (events['stop_hit_index'] - events['start_hit_index']).astype(np.int64)
+            self.assertTrue(np.array_equal(np.repeat(events['event_number'], n_hits_per_event), hits['event_number']))
+            self.assertTrue(np.array_equal(np.repeat(events['trigger_number'], n_hits_per_event), hits['trigger_number']))
+            for event_start, event_stop in ((None, None), (10, 5000), (events[-1]['event_number'] - 100, None), (events[-1]['event_number'] + 1, None)):
+                selected_hits = analysis_utils.read_hits_in_event_range(in_file_h5.root.Hits, in_file_h5.root.Events, event_start=event_start, event_stop=event_stop)
+                selection = np.logical_and(hits['event_number'] >= (event_start if event_start is not None else 0), hits['event_number'] < (event_stop if event_stop is not None else np.iinfo(np.int64).max))
+                self.assertTrue(np.array_equal(selected_hits, hits[selection]))
+        os.remove(tests_data_folder + 'unit_test_data_1_events.h5')
+
+    def test_pipelined_interpretation(self):  # the background reading/writing has to give the same result as the sequential interpretation
+        for pipeline_depth in (0, 3):
+            with AnalyzeRawData(raw_data_file=tests_data_folder + 'unit_test_data_1.h5', analyzed_data_file=tests_data_folder + 'unit_test_data_1_pipeline_%d.h5' % pipeline_depth, create_pdf=False) as analyze_raw_data:
+                analyze_raw_data.chunk_size = 300000  # several chunks to fill the pipeline
+                analyze_raw_data.pipeline_depth = pipeline_depth
+                analyze_raw_data.create_hit_table = True
+                analyze_raw_data.create_cluster_hit_table = True
+                analyze_raw_data.create_cluster_table = True
+                analyze_raw_data.create_meta_word_index = True
+                analyze_raw_data.interpret_word_table(use_settings_from_file=False, fei4b=False)
+        data_equal, error_msg = compare_h5_files(tests_data_folder + 'unit_test_data_1_pipeline_0.h5', tests_data_folder + 'unit_test_data_1_pipeline_3.h5')
+        os.remove(tests_data_folder + 'unit_test_data_1_pipeline_0.h5')
+        os.remove(tests_data_folder + 'unit_test_data_1_pipeline_3.h5')
+        self.assertTrue(data_equal, msg=error_msg)
+
     def test_analysis_utils_in1d_events(self):  # check compiled get_in1d_sorted function
         event_numbers = np.array([[0, 0, 2, 2, 2, 4, 5, 5, 6, 7, 7, 7, 8], [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0]], dtype=np.int64)
         event_numbers_2 = np.array([1, 1, 1, 2, 2, 2, 4, 4, 4, 7], dtype=np.int64)